@@ -0,0 +1,166 @@
+#!/usr/bin/env python3
+"""
+Benchmark de l'indexation des logs (LogSearchService)
+
+Compare le débit (lignes/s) d'une réindexation complète avec l'ancien pipeline
+(une connexion par batch, commit puis un SELECT id par ligne) et avec
+l'indexation en masse actuelle.
+
+Usage: python scripts/benchmark_log_indexing.py [--lines 50000] [--batch-size 1000]
+"""
+
+import argparse
+import asyncio
+import hashlib
+import json
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+import aiosqlite
+
+# Ajouter le dossier parent au PYTHONPATH
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from wakedock.core.log_search_service import LogSearchService
+
+# Ancienne table de termes, remplacée depuis par l'index FTS5: recréée pour le pipeline "avant"
+LEGACY_SCHEMA = [
+    """
+    CREATE TABLE IF NOT EXISTS log_search_index (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        log_id INTEGER NOT NULL,
+        term TEXT NOT NULL,
+        frequency INTEGER DEFAULT 1,
+        FOREIGN KEY (log_id) REFERENCES log_index (id) ON DELETE CASCADE
+    )
+    """,
+    "CREATE INDEX IF NOT EXISTS idx_search_term ON log_search_index (term)",
+    "CREATE INDEX IF NOT EXISTS idx_search_log_id ON log_search_index (log_id)"
+]
+
+MESSAGES = [
+    "GET /api/v1/containers/{i} 200 in {ms}ms",
+    "Database connection failed for worker {i}, retrying in {ms}ms",
+    "Cache miss for key session:{i} after {ms}ms",
+    "Started background job {i} (queue depth {ms})"
+]
+
+
+def generate_log_file(path: Path, lines: int):
+    """Génère un fichier JSONL de logs synthétiques"""
+    path.parent.mkdir(parents=True, exist_ok=True)
+    with open(path, 'w', encoding='utf-8') as f:
+        for i in range(lines):
+            f.write(json.dumps({
+                "timestamp": f"2024-01-01T{(i // 3600) % 24:02d}:{(i // 60) % 60:02d}:{i % 60:02d}",
+                "level": ("info", "warn", "error")[i % 3],
+                "container_id": "bench",
+                "container_name": "bench-container",
+                "service_name": "web",
+                "message": MESSAGES[i % len(MESSAGES)].format(i=i, ms=i % 997),
+                "metadata": {}
+            }) + '\n')
+
+
+async def legacy_index_batch(service: LogSearchService, batch, file_path: str):
+    """Ancien pipeline: connexion par batch et lookup des IDs ligne par ligne"""
+    async with aiosqlite.connect(service.db_path) as db:
+        log_entries = [
+            (
+                log_entry.container_id,
+                log_entry.container_name,
+                log_entry.service_name,
+                log_entry.timestamp.isoformat(),
+                log_entry.level.value,
+                hashlib.md5(log_entry.message.encode()).hexdigest(),
+                file_path,
+                line_number
+            )
+            for log_entry, line_number, *_ in batch
+        ]
+        await db.executemany("""
+            INSERT OR REPLACE INTO log_index
+            (container_id, container_name, service_name, timestamp, level, message_hash, file_path, line_number)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+        """, log_entries)
+        await db.commit()
+
+        search_entries = []
+        for log_entry, line_number, *_ in batch:
+            cursor = await db.execute(
+                "SELECT id FROM log_index WHERE file_path = ? AND line_number = ?",
+                (file_path, line_number)
+            )
+            result = await cursor.fetchone()
+            if result:
+                for term in service._extract_search_terms(log_entry.message):
+                    search_entries.append((result[0], term))
+
+        if search_entries:
+            await db.executemany(
+                "INSERT OR IGNORE INTO log_search_index (log_id, term) VALUES (?, ?)",
+                search_entries
+            )
+            await db.commit()
+
+
+async def run_indexer(storage: Path, log_file: Path, batch_size: int, lines: int, legacy: bool) -> float:
+    """Indexe le fichier dans une base neuve et retourne la durée en secondes"""
+    service = LogSearchService(str(storage), db_path=str(storage / f"bench_{'legacy' if legacy else 'bulk'}.db"))
+    service.index_batch_size = batch_size
+    await service._init_database()
+
+    if legacy:
+        # L'ancien pipeline ouvrait sa propre connexion en mode journal par défaut
+        await service._close_database()
+        async with aiosqlite.connect(service.db_path) as db:
+            await db.execute("PRAGMA journal_mode=DELETE")
+            for statement in LEGACY_SCHEMA:
+                await db.execute(statement)
+            await db.commit()
+        service._index_batch = lambda batch, file_path: legacy_index_batch(service, batch, file_path)
+
+    start = time.perf_counter()
+    if legacy:
+        await service._index_file(log_file)
+    else:
+        # Réindexation complète: index secondaires reconstruits en fin de passe
+        await service._reindex_all()
+    elapsed = time.perf_counter() - start
+
+    # _index_file journalise les erreurs sans les propager: une passe incomplète n'est pas une mesure
+    async with aiosqlite.connect(service.db_path) as db:
+        cursor = await db.execute("SELECT COUNT(*) FROM log_index")
+        indexed = (await cursor.fetchone())[0]
+    stats = await service.get_index_stats() if not legacy else None
+    await service._close_database()
+    if indexed != lines:
+        raise SystemExit(f"❌ Pipeline {'avant' if legacy else 'après'}: {indexed}/{lines} lignes indexées, voir les erreurs ci-dessus")
+    if stats:
+        print(f"   {stats['total_indexed_logs']} lignes indexées, {stats['unique_search_terms']} termes")
+    return elapsed
+
+
+async def main():
+    parser = argparse.ArgumentParser(description="Benchmark de l'indexation des logs")
+    parser.add_argument("--lines", type=int, default=50000)
+    parser.add_argument("--batch-size", type=int, default=1000)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as temp_dir:
+        storage = Path(temp_dir)
+        log_file = storage / "containers" / "bench" / "000000000000.jsonl"
+        generate_log_file(log_file, args.lines)
+
+        print(f"📊 Indexation de {args.lines} lignes (batch de {args.batch_size})")
+        legacy_time = await run_indexer(storage, log_file, args.batch_size, args.lines, legacy=True)
+        print(f"   avant : {args.lines / legacy_time:>10.0f} lignes/s ({legacy_time:.2f}s)")
+        bulk_time = await run_indexer(storage, log_file, args.batch_size, args.lines, legacy=False)
+        print(f"   après : {args.lines / bulk_time:>10.0f} lignes/s ({bulk_time:.2f}s)")
+        print(f"✅ Accélération x{legacy_time / bulk_time:.1f}")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
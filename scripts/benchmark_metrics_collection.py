@@ -0,0 +1,135 @@
+#!/usr/bin/env python3
+"""
+Benchmark de la collecte des métriques des conteneurs
+
+Compare, pour les conteneurs en cours d'exécution, le temps d'obtention d'une
+mesure par l'API Docker (GET /containers/<id>/stats?stream=false) et par la
+lecture directe des fichiers cgroup v2 (CgroupReader), analyse comprise.
+Sans daemon Docker ou sans cgroup v2, --fake mesure seulement la lecture
+cgroup sur une arborescence factice.
+
+Usage: python scripts/benchmark_metrics_collection.py [--rounds 5] [--fake 200]
+"""
+
+import argparse
+import statistics
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+# Ajouter le dossier parent au PYTHONPATH
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from wakedock.core.cgroup_reader import CgroupReader
+from wakedock.core.metrics_collector import MetricsCollector
+
+# _parse_stats n'utilise pas l'état du collecteur: pas de stockage ni de registre à ouvrir
+PARSER = MetricsCollector.__new__(MetricsCollector)
+
+
+def generate_fake_tree(root: Path, containers: int):
+    """Arborescence cgroupfs et /proc factice de containers conteneurs"""
+    cgroup_root, proc_root = root / "cgroup", root / "proc"
+    cgroup_root.mkdir(parents=True)
+    (cgroup_root / "cgroup.controllers").write_text("cpu io memory pids\n")
+    proc_root.mkdir()
+    (proc_root / "stat").write_text("cpu  1000 0 500 10000 0 0 0 0 0 0\ncpu0 500 0 250 5000\ncpu1 500 0 250 5000\n")
+    (proc_root / "meminfo").write_text("MemTotal:        8388608 kB\n")
+
+    ids = []
+    for i in range(containers):
+        container_id = f"{i:064x}"
+        pid = 1000 + i
+        scope = cgroup_root / "system.slice" / f"docker-{container_id}.scope"
+        scope.mkdir(parents=True)
+        (scope / "cgroup.procs").write_text(f"{pid}\n")
+        (scope / "cpu.stat").write_text(f"usage_usec {i * 1000}\nuser_usec {i * 800}\nsystem_usec {i * 200}\n")
+        (scope / "memory.current").write_text(f"{(i + 1) * 1048576}\n")
+        (scope / "memory.max").write_text("max\n")
+        (scope / "memory.stat").write_text("anon 1048576\nfile 524288\nkernel 65536\n")
+        (scope / "io.stat").write_text("8:0 rbytes=4096 wbytes=8192 rios=1 wios=2 dbytes=0 dios=0\n")
+        (scope / "pids.current").write_text("3\n")
+        (proc_root / str(pid) / "net").mkdir(parents=True)
+        (proc_root / str(pid) / "net" / "dev").write_text(
+            "Inter-|   Receive\n face |bytes\n"
+            f"  eth0: {i * 100} {i} 0 0 0 0 0 0 {i * 50} {i} 0 0 0 0 0 0\n"
+        )
+        ids.append(container_id)
+    return CgroupReader(cgroup_root, proc_root), ids
+
+
+def time_samples(sample, container_ids, rounds: int):
+    """Durées (s) de chaque mesure, rounds passes sur tous les conteneurs"""
+    durations = []
+    for _ in range(rounds):
+        for container_id in container_ids:
+            start = time.perf_counter()
+            sample(container_id)
+            durations.append(time.perf_counter() - start)
+    return durations
+
+
+def report(label: str, durations):
+    print(f"   {label:<8}: {statistics.median(durations) * 1000:>9.3f} ms/mesure (médiane), "
+          f"{len(durations) / sum(durations):>10.0f} mesures/s")
+
+
+def run_fake(containers: int, rounds: int):
+    with tempfile.TemporaryDirectory() as temp_dir:
+        reader, ids = generate_fake_tree(Path(temp_dir), containers)
+        for container_id in ids:
+            reader.resolve(container_id)
+
+        print(f"📊 Lecture cgroup de {containers} conteneurs factices ({rounds} passes)")
+        report("cgroup", time_samples(
+            lambda cid: PARSER._parse_stats(cid, cid[:12], None, reader.read_stats(cid)), ids, rounds
+        ))
+
+
+def run_docker(rounds: int):
+    from wakedock.core.docker_manager import DockerManager
+
+    manager = DockerManager()
+    reader = CgroupReader()
+    ids = [container.id for container in manager.list_containers()]
+    if not ids:
+        print("❌ Aucun conteneur en cours d'exécution")
+        return
+
+    resolved = []
+    for container_id in ids:
+        info = manager.get_container_info(container_id) or {}
+        if reader.resolve(container_id, info.get('pid'), info.get('cgroup_parent')):
+            resolved.append(container_id)
+
+    print(f"📊 {len(ids)} conteneurs, {len(resolved)} cgroups lisibles ({rounds} passes)")
+    docker_durations = time_samples(
+        lambda cid: PARSER._parse_stats(cid, cid[:12], None, manager.get_container_stats(cid, False)), ids, rounds
+    )
+    report("docker", docker_durations)
+    if not resolved:
+        print("❌ Cgroups non lisibles (cgroup v1, ou /proc de l'hôte non visible): relancer avec --fake")
+        return
+    cgroup_durations = time_samples(
+        lambda cid: PARSER._parse_stats(cid, cid[:12], None, reader.read_stats(cid)), resolved, rounds
+    )
+    report("cgroup", cgroup_durations)
+    print(f"✅ Accélération x{statistics.median(docker_durations) / statistics.median(cgroup_durations):.0f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark de la collecte des métriques")
+    parser.add_argument("--rounds", type=int, default=5)
+    parser.add_argument("--fake", type=int, default=0, metavar="N",
+                        help="lecture cgroup seule sur N conteneurs factices")
+    args = parser.parse_args()
+
+    if args.fake:
+        run_fake(args.fake, args.rounds)
+    else:
+        run_docker(args.rounds)
+
+
+if __name__ == "__main__":
+    main()
@@ -3,14 +3,28 @@ Tests pour le système de logs centralisé
 """
 import pytest
 import asyncio
+import csv
+import gzip
+import io
 import json
 import tempfile
+import time
 from datetime import datetime, timedelta
 from pathlib import Path
 from unittest.mock import Mock, AsyncMock, patch
 from fastapi.testclient import TestClient
 
+from wakedock.core.log_archive import LogArchive, jsonl_timestamp_bounds
+from wakedock.core.log_classifier import LEVEL_KEYWORDS, classify_level, classify_line, parse_rfc3339
 from wakedock.core.log_collector import LogCollector, LogEntry, LogLevel
+from wakedock.core.log_compression import compress_file
+from wakedock.core.log_export import APPLICATION_LOG_LAYOUT, LogExporter
+from wakedock.core.log_ingestion import LogIngestionEngine
+from wakedock.core.log_parsers import LOG_FORMAT_LABEL, LogParserRegistry
+from wakedock.core.log_pubsub import LogPubSubHub
+from wakedock.core.log_optimization_service import LogOptimizationService
+from wakedock.core.log_retention import LogRetentionEngine, RetentionPolicy
+from wakedock.core.log_storage import COMPACTED_SUFFIX, SegmentedLogStore, to_micros
 from wakedock.core.log_search_service import LogSearchService
 from wakedock.core.docker_manager import DockerManager
 
@@ -35,9 +49,9 @@ def mock_docker_manager():
         'labels': {'com.docker.compose.service': 'web'}
     }
     manager.get_container_logs.return_value = [
-        "2024-01-01T10:00:00.000000Z [INFO] Starting application",
-        "2024-01-01T10:00:01.000000Z [ERROR] Database connection failed",
-        "2024-01-01T10:00:02.000000Z [WARN] Retrying connection"
+        "2024-01-01T10:00:00.000000Z [INFO] Starting application\n",
+        "2024-01-01T10:00:01.000000Z [ERROR] Database connection failed\n",
+        "2024-01-01T10:00:02.000000Z [WARN] Retrying connection\n"
     ]
     return manager
 
@@ -146,6 +160,25 @@ class TestLogCollector:
         assert container_id not in log_collector.monitored_containers
         assert container_id not in log_collector.collection_tasks
     
+    async def test_container_events(self, log_collector, mock_docker_manager):
+        """Test le suivi des conteneurs par les événements Docker"""
+        mock_docker_manager.get_events.return_value = iter([])
+        await log_collector.start()
+        assert log_collector.monitored_containers == {"container1", "container2"}
+        
+        # Démarrage d'un nouveau conteneur: collecte sans nouvelle liste
+        await log_collector.registry.handle_event(
+            {'Action': 'start', 'Actor': {'ID': 'container3', 'Attributes': {}}}
+        )
+        assert "container3" in log_collector.monitored_containers
+        assert mock_docker_manager.list_containers.call_count == 1
+        
+        await log_collector.registry.handle_event(
+            {'Action': 'die', 'Actor': {'ID': 'container3', 'Attributes': {}}}
+        )
+        assert "container3" not in log_collector.monitored_containers
+        assert 'registry' in log_collector.get_stats()
+    
     async def test_log_buffer_management(self, log_collector):
         """Test la gestion des buffers de logs"""
         container_id = "test123"
@@ -157,6 +190,7 @@ class TestLogCollector:
                 level=LogLevel.INFO,
                 container_id=container_id,
                 container_name="test",
+                service_name=None,
                 message=f"Message {i}"
             )
             await log_collector._add_to_buffer(container_id, log_entry)
@@ -169,8 +203,8 @@ class TestLogCollector:
         await log_collector._flush_container_buffer(container_id)
         assert len(log_collector.log_buffers[container_id]) == 0
         
-        # Vérifie que le fichier a été créé
-        log_file = Path(log_collector.storage_path) / f"{container_id}.jsonl"
+        # Vérifie que le segment a été créé
+        log_file = Path(log_collector.storage_path) / container_id / "000000000000.jsonl"
         assert log_file.exists()
     
     def test_get_stats(self, log_collector):
@@ -185,6 +219,731 @@ class TestLogCollector:
         assert 'storage_path' in stats
 
 
+class TestLogIngestionEngine:
+    """Tests pour le moteur d'ingestion non bloquant"""
+    
+    async def test_reader_splits_chunks(self):
+        """Test le découpage des chunks Docker en lignes, y compris réparties sur plusieurs chunks"""
+        engine = LogIngestionEngine(max_queue_size=100)
+        chunks = [b"line 1\nline 2\nline ", "3 split", b"", b" in two\r\nline 4\n", b"last line"]
+        reader = engine.open("c1", lambda: chunks)
+        
+        lines = []
+        while True:
+            batch = await reader.get_batch(10)
+            if not batch:
+                break
+            lines.extend(batch)
+        
+        assert lines == [b"line 1", b"line 2", b"line 3 split in two", b"line 4", b"last line"]
+        assert reader.get_stats()['lines_read'] == 5
+        engine.close_all()
+    
+    async def test_backpressure_bounds_queue(self):
+        """Test que le thread lecteur est suspendu quand la file est pleine"""
+        engine = LogIngestionEngine(max_queue_size=5)
+        reader = engine.open("c1", lambda: (f"line {i}\n" for i in range(50)))
+        
+        # Laisse le thread remplir la file
+        await asyncio.sleep(0.2)
+        assert reader.queue_depth == 5
+        
+        received = []
+        while True:
+            batch = await reader.get_batch(3)
+            if not batch:
+                break
+            received.extend(batch)
+        
+        assert len(received) == 50
+        stats = reader.get_stats()
+        assert stats['backpressure_waits'] > 0
+        assert stats['lines_consumed'] == 50
+        engine.close_all()
+    
+    async def test_collector_consumes_stream(self, log_collector, mock_docker_manager):
+        """Test la collecte de bout en bout via le moteur d'ingestion"""
+        log_collector.is_running = True
+        log_collector.monitored_containers.add("container1")
+        
+        await asyncio.wait_for(log_collector._collect_container_logs("container1"), timeout=5)
+        
+        buffered = log_collector.log_buffers["container1"]
+        assert len(buffered) == 3
+        assert buffered[1].level == LogLevel.ERROR
+        
+        stats = log_collector.get_stats()
+        assert stats['ingestion']['total_lines_read'] == 3
+        assert stats['ingestion']['active_readers'] == 0
+
+
+class TestLogPubSubHub:
+    """Tests pour la diffusion temps réel des logs"""
+    
+    def _entry(self, container_id, level=LogLevel.INFO, message="msg"):
+        return LogEntry(
+            timestamp=datetime.now(),
+            level=level,
+            container_id=container_id,
+            container_name="test",
+            service_name=None,
+            message=message
+        )
+    
+    async def test_filters_by_container_and_level(self):
+        """Test le filtrage par conteneur et niveau minimum"""
+        hub = LogPubSubHub()
+        all_logs = hub.subscribe()
+        errors_c1 = hub.subscribe(container_id="c1", min_level=LogLevel.WARN)
+        
+        hub.publish(self._entry("c1", LogLevel.INFO))
+        hub.publish(self._entry("c1", LogLevel.ERROR))
+        hub.publish(self._entry("c2", LogLevel.FATAL))
+        
+        assert len(await all_logs.get(timeout=0.1)) == 3
+        received = await errors_c1.get(timeout=0.1)
+        assert [e.level for e in received] == [LogLevel.ERROR]
+    
+    async def test_ring_buffer_drops_oldest(self):
+        """Test qu'un abonné lent perd les entrées les plus anciennes"""
+        hub = LogPubSubHub()
+        subscription = hub.subscribe(buffer_size=3)
+        
+        for i in range(5):
+            hub.publish(self._entry("c1", message=f"m{i}"))
+        
+        received = await subscription.get(timeout=0.1)
+        assert [e.message for e in received] == ["m2", "m3", "m4"]
+        assert subscription.dropped == 2
+    
+    async def test_subscriber_woken_on_publish(self):
+        """Test le réveil d'un abonné en attente et la fermeture"""
+        hub = LogPubSubHub()
+        subscription = hub.subscribe(container_id="c1")
+        
+        waiter = asyncio.create_task(subscription.get(timeout=5))
+        await asyncio.sleep(0)
+        hub.publish(self._entry("c1"))
+        assert len(await waiter) == 1
+        
+        subscription.close()
+        assert hub.subscriber_count == 0
+        assert await subscription.get(timeout=5) == []
+    
+    async def test_collector_publishes_entries(self, log_collector):
+        """Test que le collecteur publie chaque entrée ajoutée"""
+        subscription = log_collector.pubsub.subscribe(container_id="c1")
+        await log_collector._add_to_buffer("c1", self._entry("c1"))
+        
+        assert len(await subscription.get(timeout=0.1)) == 1
+        assert log_collector.get_stats()['pubsub']['published'] == 1
+
+
+class TestLogClassifier:
+    """Tests pour le classifieur de lignes compilé"""
+    
+    @staticmethod
+    def _legacy_level(message):
+        """Détection historique: une recherche par sous-chaîne et par niveau"""
+        message_lower = message.lower()
+        for level, keywords in LEVEL_KEYWORDS:
+            if any(keyword in message_lower for keyword in keywords):
+                return level
+        return 'info'
+    
+    def test_level_matches_legacy_priority(self):
+        """Test que la passe unique respecte la priorité des recherches historiques"""
+        keywords = [keyword for _, group in LEVEL_KEYWORDS for keyword in group]
+        messages = ["Normal message", "stacktrace", "tracerr", "tracexception", "panicritical"]
+        messages += [f"{a} then {b}" for a in keywords for b in keywords]
+        messages += [f"{a}{b}".upper() for a in keywords for b in keywords]
+        
+        for message in messages:
+            assert classify_level(message) == self._legacy_level(message), message
+    
+    def test_parse_rfc3339(self):
+        """Test le parsing des horodatages Docker"""
+        assert parse_rfc3339("2025-07-16T10:30:45.123456789Z") == datetime(2025, 7, 16, 10, 30, 45, 123456)
+        assert parse_rfc3339("2025-07-16T10:30:45Z") == datetime(2025, 7, 16, 10, 30, 45)
+        assert parse_rfc3339("2025-07-16T10:30:45.5+02:00") == datetime(2025, 7, 16, 8, 30, 45, 500000)
+        assert parse_rfc3339("not-a-timestamp") is None
+        assert parse_rfc3339("2025-07-16T10:30:45.12x4Z") is None
+    
+    def test_classify_line(self):
+        """Test la classification complète d'une ligne"""
+        parsed = classify_line(b'2025-07-16T10:30:45.123456789Z {"user": "john", "status": "failed"} ')
+        
+        assert parsed.timestamp == datetime(2025, 7, 16, 10, 30, 45, 123456)
+        assert parsed.level == 'error'
+        assert parsed.message == '{"user": "john", "status": "failed"}'
+        assert parsed.metadata == {"user": "john", "status": "failed"}
+        assert classify_line("2025-07-16T10:30:45Z") is None
+    
+    @pytest.mark.slow
+    def test_classifier_throughput(self):
+        """Micro-benchmark: au moins 50k lignes/s sur un seul cœur"""
+        messages = [
+            "GET /api/v1/containers/12 200 in 35ms",
+            "[ERROR] Database connection failed for worker 4, retrying",
+            "WARN: Deprecated feature used by client=abc",
+            "user=john action=delete status=success took=12ms",
+            '{"level": "info", "msg": "started", "port": 8080}'
+        ]
+        lines = [
+            f"2025-07-16T10:30:{i % 60:02d}.{i:09d}Z {messages[i % len(messages)]}"
+            for i in range(20000)
+        ]
+        
+        start = time.perf_counter()
+        for line in lines:
+            classify_line(line)
+        rate = len(lines) / (time.perf_counter() - start)
+        
+        assert rate >= 50000, f"{rate:.0f} lignes/s"
+
+
+class TestLogParsers:
+    """Tests pour les parseurs de logs structurés"""
+    
+    NGINX_LINE = '172.17.0.1 - - [16/Jul/2025:10:30:45 +0000] "GET /api/health HTTP/1.1" 503 12 "-" "curl/8.0"'
+    POSTGRES_LINE = '2025-07-16 10:30:45.123 UTC [42] ERROR:  relation "users" does not exist'
+    
+    def test_format_parsers(self):
+        """Test l'extraction des champs de chaque format"""
+        registry = LogParserRegistry()
+        
+        parsed = registry.parsers['nginx'].parse(self.NGINX_LINE)
+        assert parsed.metadata['status'] == 503
+        assert parsed.metadata['path'] == '/api/health'
+        assert parsed.level == 'error'
+        
+        parsed = registry.parsers['postgres'].parse(self.POSTGRES_LINE)
+        assert parsed.metadata['pid'] == 42
+        assert parsed.level == 'error'
+        
+        parsed = registry.parsers['logfmt'].parse('level=warning msg="disk \\"almost\\" full" used=91')
+        assert parsed.metadata == {'level': 'warning', 'msg': 'disk "almost" full', 'used': '91'}
+        assert parsed.level == 'warn'
+        
+        parsed = registry.parsers['json'].parse('{"severity": "DEBUG", "msg": "failed attempt"}')
+        assert parsed.level == 'debug'
+        
+        assert registry.parsers['json'].parse("plain text") is None
+        assert registry.parsers['logfmt'].parse("retry with x=1") is None
+    
+    def test_auto_detection_is_cached(self):
+        """Test que la détection échantillonne une seule fois puis fige le format"""
+        registry = LogParserRegistry(sample_size=3)
+        parser = registry.for_container("c1")
+        
+        for _ in range(3):
+            parser.parse(self.NGINX_LINE)
+        
+        assert parser.format == 'nginx'
+        assert registry.for_container("c1") is parser
+        # Une ligne hors format ne relance pas la détection
+        assert parser.parse("nginx: worker started").metadata == {}
+        assert parser.sampled == 3
+    
+    def test_auto_detection_falls_back_to_generic(self):
+        """Test le repli sur l'extraction générique pour du texte libre"""
+        registry = LogParserRegistry(sample_size=2)
+        parser = registry.for_container("c1")
+        
+        parser.parse("Starting server")
+        assert parser.parse("user=john logged in").metadata == {'user': 'john'}
+        assert parser.format == 'generic'
+    
+    def test_label_selects_format(self):
+        """Test la sélection du format par label Docker"""
+        registry = LogParserRegistry()
+        
+        parser = registry.for_container("c1", {LOG_FORMAT_LABEL: "Postgres"})
+        assert parser.format == 'postgres'
+        assert parser.source == 'label'
+        assert registry.for_container("c2", {LOG_FORMAT_LABEL: "unknown"}).format == 'auto'
+        assert registry.get_stats()['containers']['c1']['format'] == 'postgres'
+    
+    def test_collector_uses_container_parser(self, log_collector):
+        """Test que le niveau déclaré par le format prime sur les mots-clés"""
+        parser = log_collector.parsers.for_container("c1", {LOG_FORMAT_LABEL: "logfmt"})
+        
+        log_entry = log_collector._parse_log_line(
+            "2025-07-16T10:30:45.123456789Z level=info msg=\"retry failed\" attempt=2",
+            "c1",
+            "test-container",
+            "web",
+            parser.parse
+        )
+        
+        assert log_entry.level == LogLevel.INFO
+        assert log_entry.metadata == {'level': 'info', 'msg': 'retry failed', 'attempt': '2'}
+
+
+class TestLogExporter:
+    """Tests pour l'export en flux"""
+    
+    def _records(self, count):
+        for i in range(count):
+            yield LogEntry(
+                timestamp=datetime(2024, 1, 1, 10, 0, 0) + timedelta(seconds=i),
+                level=LogLevel.INFO,
+                container_id="c1",
+                container_name="web-1",
+                service_name="web",
+                message=f"request {i}, \"quoted\"",
+                metadata={"index": i}
+            )
+    
+    async def _export(self, exporter, records):
+        return [chunk async for chunk in exporter.stream(records)]
+    
+    async def test_ndjson_gzip_streams_in_chunks(self):
+        """Test l'export NDJSON compressé, découpé en plusieurs blocs"""
+        chunks = await self._export(LogExporter(format="ndjson", chunk_size=1024), self._records(500))
+        assert len(chunks) > 2
+        assert all(len(chunk) < 2048 for chunk in chunks)
+        
+        exporter = LogExporter(format="ndjson", compression="gzip", chunk_size=1024)
+        chunks = await self._export(exporter, self._records(500))
+        lines = gzip.decompress(b"".join(chunks)).decode().splitlines()
+        assert len(lines) == 500
+        assert json.loads(lines[7])["metadata"] == {"index": 7}
+        assert exporter.records == 500
+        assert exporter.filename().endswith(".ndjson.gz")
+        assert exporter.media_type == "application/gzip"
+    
+    async def test_text_formats(self):
+        """Test les formats JSON, CSV et texte"""
+        data = b"".join(await self._export(LogExporter(format="json"), self._records(3)))
+        assert [r["message"] for r in json.loads(data)] == [f'request {i}, "quoted"' for i in range(3)]
+        assert json.loads(b"".join(await self._export(LogExporter(format="json"), []))) == []
+        
+        data = b"".join(await self._export(LogExporter(format="csv", include_metadata=False), self._records(2)))
+        rows = list(csv.reader(io.StringIO(data.decode())))
+        assert rows[0] == ['timestamp', 'level', 'container_name', 'service_name', 'message']
+        assert rows[2][4] == 'request 1, "quoted"'
+        
+        data = b"".join(await self._export(LogExporter(format="txt"), self._records(1)))
+        assert data.decode() == '[2024-01-01T10:00:00] [INFO] web-1: request 0, "quoted"\n'
+    
+    async def test_application_layout(self):
+        """Test que l'export des logs applicatifs garde ses colonnes et lignes historiques"""
+        records = [
+            {"timestamp": datetime(2024, 1, 15, 10, 30, 45), "level": "INFO", "message": "hello",
+             "service": "api", "container_id": None, "metadata": {"user": "bob"}},
+            {"timestamp": datetime(2024, 1, 15, 10, 30, 46), "level": "ERROR", "message": "boom",
+             "service": None, "container_id": "c1", "metadata": {}},
+        ]
+        
+        data = b"".join(await self._export(LogExporter(format="csv", layout=APPLICATION_LOG_LAYOUT), records))
+        rows = list(csv.reader(io.StringIO(data.decode())))
+        assert rows == [
+            ['timestamp', 'level', 'message', 'service', 'container_id', 'metadata'],
+            ['2024-01-15T10:30:45', 'INFO', 'hello', 'api', '', '{"user": "bob"}'],
+            ['2024-01-15T10:30:46', 'ERROR', 'boom', '', 'c1', '{}'],
+        ]
+        
+        data = b"".join(await self._export(LogExporter(format="txt", layout=APPLICATION_LOG_LAYOUT), records))
+        assert data.decode().splitlines() == [
+            '2024-01-15T10:30:45 [INFO] hello (service: api)',
+            '2024-01-15T10:30:46 [ERROR] boom (container: c1)',
+        ]
+        
+        data = b"".join(await self._export(LogExporter(format="json", layout=APPLICATION_LOG_LAYOUT), records))
+        assert json.loads(data)[0] == {
+            "timestamp": "2024-01-15T10:30:45", "level": "INFO", "message": "hello",
+            "service": "api", "container_id": None, "user": "bob"
+        }
+        
+        # Sans nom de conteneur, le rendu texte des logs de conteneurs n'écrit pas "None"
+        data = b"".join(await self._export(LogExporter(format="txt"), [
+            {"timestamp": "2024-01-15T10:30:45", "level": "info", "message": "hello", "metadata": {}}
+        ]))
+        assert data.decode() == '[2024-01-15T10:30:45] [INFO] : hello\n'
+    
+    def test_unsupported_options(self):
+        """Test le refus des formats et compressions inconnus"""
+        with pytest.raises(ValueError):
+            LogExporter(format="xml")
+        with pytest.raises(ValueError):
+            LogExporter(compression="brotli")
+    
+    async def test_parquet_export(self):
+        """Test l'export Parquet par groupes de lignes"""
+        pq = pytest.importorskip("pyarrow.parquet")
+        exporter = LogExporter(format="parquet", parquet_row_group_size=100)
+        data = b"".join(await self._export(exporter, self._records(250)))
+        
+        table = pq.read_table(io.BytesIO(data))
+        assert table.num_rows == 250
+        assert pq.ParquetFile(io.BytesIO(data)).num_row_groups == 3
+
+
+class TestSegmentedLogStore:
+    """Tests pour le stockage segmenté indexé"""
+    
+    def _make_entries(self, container_id, count, start=None):
+        start = start or datetime(2024, 1, 1, 10, 0, 0)
+        return [
+            LogEntry(
+                timestamp=start + timedelta(seconds=i),
+                level=LogLevel.ERROR if i % 10 == 0 else LogLevel.INFO,
+                container_id=container_id,
+                container_name="test",
+                service_name=None,
+                message=f"Message {i}"
+            )
+            for i in range(count)
+        ]
+    
+    async def _fill(self, log_collector, container_id, count):
+        log_collector.store = SegmentedLogStore(log_collector.storage_path, segment_size=64 * 1024, block_size=1024)
+        log_collector.log_buffers[container_id] = self._make_entries(container_id, count)
+        await log_collector._flush_container_buffer(container_id)
+    
+    async def test_tail_reads_only_last_blocks(self, log_collector):
+        """Test qu'un tail ne lit que les derniers blocs"""
+        await self._fill(log_collector, "c1", 2000)
+        assert len(log_collector.store.segments("c1")) > 1
+        
+        read_blocks = []
+        original = log_collector._read_block_entries
+        
+        def tracking_read(segment, block, *args):
+            read_blocks.append(block)
+            return original(segment, block, *args)
+        
+        log_collector._read_block_entries = tracking_read
+        entries = [e async for e in log_collector.get_logs(container_id="c1", limit=5)]
+        
+        assert [e.message for e in entries] == [f"Message {i}" for i in range(1999, 1994, -1)]
+        assert len(read_blocks) <= 2
+    
+    async def test_time_range_and_level_filters(self, log_collector):
+        """Test le filtrage par plage de temps et niveau via l'index"""
+        await self._fill(log_collector, "c1", 2000)
+        start = datetime(2024, 1, 1, 10, 0, 0)
+        
+        entries = [e async for e in log_collector.get_logs(
+            container_id="c1",
+            start_time=start + timedelta(seconds=100),
+            end_time=start + timedelta(seconds=199),
+            level=LogLevel.ERROR
+        )]
+        
+        assert [e.message for e in entries] == [f"Message {i}" for i in range(190, 99, -10)]
+    
+    async def test_merge_across_containers(self, log_collector):
+        """Test la fusion ordonnée des logs de plusieurs conteneurs"""
+        log_collector.log_buffers["c1"] = self._make_entries("c1", 10)
+        log_collector.log_buffers["c2"] = self._make_entries("c2", 10, datetime(2024, 1, 1, 10, 0, 5))
+        await log_collector._flush_container_buffer("c1")
+        await log_collector._flush_container_buffer("c2")
+        
+        entries = [e async for e in log_collector.get_logs(limit=4)]
+        
+        assert [e.container_id for e in entries] == ["c2"] * 4
+        
+        results = [e async for e in log_collector.search_logs("message 9")]
+        assert {e.container_id for e in results} == {"c1", "c2"}
+    
+    def test_index_recovery_after_crash(self, temp_storage):
+        """Test la reconstruction de l'index quand des données n'y sont pas référencées"""
+        store = SegmentedLogStore(Path(temp_storage), block_size=256)
+        records = [
+            (to_micros(datetime(2024, 1, 1) + timedelta(seconds=i)), f'{{"i": {i}}}\n'.encode())
+            for i in range(100)
+        ]
+        store.append("c1", records)
+        segment = store.segments("c1")[0]
+        
+        # Simule des écritures non indexées (crash entre données et index)
+        with open(segment.data_path, 'ab') as f:
+            f.write(b'{"i": 100}\n')
+        
+        reopened = SegmentedLogStore(Path(temp_storage), block_size=256)
+        recovered = reopened.segments("c1")[0]
+        assert recovered.record_count == 101
+        
+        lines = [
+            line
+            for seg, block in reopened.iter_blocks_reverse("c1")
+            for line in seg.read_block(block)
+        ]
+        assert len(lines) == 101
+    
+    async def test_legacy_files_migrated(self, log_collector):
+        """Test l'import des anciens fichiers {container_id}.jsonl"""
+        legacy_file = Path(log_collector.storage_path) / "old.jsonl"
+        with open(legacy_file, 'w') as f:
+            for entry in self._make_entries("old", 3):
+                f.write(json.dumps(entry.to_dict()) + '\n')
+        
+        log_collector._migrate_legacy_files()
+        
+        assert not legacy_file.exists()
+        entries = [e async for e in log_collector.get_logs(container_id="old")]
+        assert len(entries) == 3
+
+
+class TestLogRetention:
+    """Tests pour les partitions horaires, la compaction et la rétention"""
+    
+    START = datetime(2024, 1, 1, 10, 0, 0)
+    
+    def _records(self, container_id, hours, per_hour=200):
+        records = []
+        for i in range(hours * per_hour):
+            entry = LogEntry(
+                timestamp=self.START + timedelta(seconds=i * 3600 // per_hour),
+                level=LogLevel.ERROR if i % 10 == 0 else LogLevel.INFO,
+                container_id=container_id,
+                container_name="retention",
+                service_name="web",
+                message=f"Request {i} served",
+                metadata={"index": i}
+            )
+            records.append((to_micros(entry.timestamp), (json.dumps(entry.to_dict()) + '\n').encode()))
+        return records
+    
+    def _engine(self, store, **policy):
+        policy.setdefault('compact_after', timedelta(0))
+        return LogRetentionEngine(store, RetentionPolicy(**policy), block_rows=64)
+    
+    def test_segments_split_by_partition(self, temp_storage):
+        """Test qu'un segment ne couvre qu'une heure, entrées en retard comprises"""
+        store = SegmentedLogStore(Path(temp_storage), block_size=1024)
+        records = self._records("c1", 3)
+        # Une entrée en retard reste dans la partition courante
+        records.insert(250, records[10])
+        store.append("c1", records)
+        
+        segments = store.segments("c1")
+        assert len(segments) == 3
+        assert [segment.record_count for segment in segments] == [200, 201, 200]
+        for segment in segments[::2]:
+            assert store.partition_of(segment.min_ts) == store.partition_of(segment.max_ts)
+    
+    async def test_compaction_preserves_reads(self, log_collector):
+        """Test que les lectures sont identiques avant et après compaction"""
+        store = SegmentedLogStore(log_collector.storage_path, block_size=1024)
+        log_collector.store = store
+        store.append("c1", self._records("c1", 3))
+        before = [e.to_dict() async for e in log_collector.get_logs(container_id="c1", limit=1000)]
+        size_before = store.container_size("c1")
+        
+        engine = self._engine(store, max_bytes=None, max_age=None)
+        await engine.run_once()
+        
+        segments = store.segments("c1")
+        assert [segment.compacted for segment in segments] == [True, True, False]
+        assert not list((log_collector.storage_path / "c1").glob("000000000000.jsonl"))
+        assert store.container_size("c1") < size_before
+        assert engine.get_stats()['segments_compacted'] == 2
+        
+        after = [e.to_dict() async for e in log_collector.get_logs(container_id="c1", limit=1000)]
+        assert after == before
+        
+        errors = [e async for e in log_collector.get_logs(
+            container_id="c1", level=LogLevel.ERROR,
+            start_time=self.START, end_time=self.START + timedelta(minutes=30)
+        )]
+        assert len(errors) == 11
+        
+        # Rechargement: les segments compactés sont relus depuis leur pied de fichier
+        reopened = SegmentedLogStore(log_collector.storage_path)
+        assert [segment.record_count for segment in reopened.segments("c1")] == [200, 200, 200]
+    
+    async def test_compaction_rewrites_index_pointers(self, log_search_service, temp_storage):
+        """Test la réécriture atomique des pointeurs de l'index vers le segment compacté"""
+        store = SegmentedLogStore(Path(temp_storage) / "containers", block_size=1024)
+        store.append("c1", self._records("c1", 2))
+        # Seule une partie du premier segment est indexée avant la compaction
+        await log_search_service._index_file(store.segments("c1")[0].data_path)
+        await log_search_service._index_file(store.segments("c1")[1].data_path)
+        with open(store.segments("c1")[0].data_path, 'rb') as f:
+            assert sum(1 for _ in f) == 200
+        
+        engine = self._engine(store, max_bytes=None, max_age=None)
+        engine.add_listener(log_search_service)
+        await engine.run_once()
+        
+        compacted = store.segments("c1")[0]
+        assert compacted.compacted
+        results = await log_search_service.search_logs(query="request", container_id="c1", limit=1000)
+        assert len(results) == 400
+        assert {r['metadata']['index'] for r in results} == set(range(400))
+        assert all(r['message'] == f"Request {r['metadata']['index']} served" for r in results)
+        assert sum(1 for r in results if r['file_path'].endswith(COMPACTED_SUFFIX)) == 200
+        
+        # Un segment compacté déjà indexé n'est pas réindexé
+        await log_search_service._index_file(compacted.data_path, incremental=True)
+        stats = await log_search_service.get_index_stats()
+        assert stats['total_indexed_logs'] == 400
+        
+        # La réindexation complète lit directement les segments compactés
+        await log_search_service._reindex_all()
+        results = await log_search_service.search_logs(query="served", container_id="c1", limit=1000)
+        assert len(results) == 400
+    
+    async def test_age_and_size_budgets(self, log_search_service, temp_storage):
+        """Test les budgets par conteneur, sans jamais supprimer la partition en cours"""
+        store = SegmentedLogStore(Path(temp_storage) / "containers", block_size=1024)
+        store.append("c1", self._records("c1", 4))
+        store.append("c2", self._records("c2", 4))
+        for segment in store.segments("c1") + store.segments("c2"):
+            await log_search_service._index_file(segment.data_path)
+        
+        engine = self._engine(store, max_bytes=None, max_age=timedelta(hours=2), compaction_enabled=False)
+        budget = sum(segment.data_size for segment in store.segments("c2")[-2:])
+        engine.set_policy("c2", RetentionPolicy(max_bytes=budget, max_age=None, compaction_enabled=False))
+        engine.add_listener(log_search_service)
+        
+        await engine.run_once(now=self.START + timedelta(hours=4))
+        
+        # c1: partitions terminées depuis plus de deux heures supprimées
+        assert [segment.segment_id for segment in store.segments("c1")] == [2, 3]
+        # c2: budget de deux segments
+        assert [segment.segment_id for segment in store.segments("c2")] == [2, 3]
+        stats = engine.get_stats()
+        assert stats['segments_dropped_age'] == 2
+        assert stats['segments_dropped_size'] == 2
+        
+        index_stats = await log_search_service.get_index_stats()
+        assert index_stats['total_indexed_logs'] == 800
+        
+        # Même au-delà de tous les budgets, le segment en cours d'écriture est conservé
+        await engine.run_once(now=self.START + timedelta(days=30))
+        assert [segment.segment_id for segment in store.segments("c1")] == [3]
+
+
+class TestLogArchive:
+    """Tests pour la lecture des archives compressées par trames"""
+    
+    START = datetime(2024, 1, 1, 0, 0, 0)
+    
+    def _write_jsonl(self, source, container_id, count, start):
+        """Écrit un fichier JSONL d'entrées de logs"""
+        source.parent.mkdir(parents=True, exist_ok=True)
+        with open(source, 'w') as f:
+            for i in range(count):
+                entry = LogEntry(
+                    timestamp=start + timedelta(seconds=i),
+                    level=LogLevel.ERROR if i % 10 == 0 else LogLevel.INFO,
+                    container_id=container_id,
+                    container_name="archive",
+                    service_name="web",
+                    message=f"Archived request {i}",
+                    metadata={"index": i}
+                )
+                f.write(json.dumps(entry.to_dict()) + '\n')
+    
+    def _write_archive(self, directory, name, container_id, count, start, codec="gzip"):
+        """Écrit un fichier JSONL puis l'archive par trames (comme LogOptimizationService)"""
+        source = directory / name
+        self._write_jsonl(source, container_id, count, start)
+        extension = {"gzip": ".gz", "lz4": ".lz4"}[codec]
+        target = directory / f"{name}{extension}"
+        compress_file(source, target, codec, chunk_size=4096, frame_bounds=jsonl_timestamp_bounds)
+        source.unlink()
+        return target
+    
+    async def test_collector_spans_hot_and_archived_logs(self, log_collector, temp_storage):
+        """Test que get_logs fusionne segments et archives, en ne décompressant que les trames utiles"""
+        archive_dir = Path(temp_storage) / "compressed"
+        log_collector.archive = LogArchive([archive_dir])
+        self._write_archive(archive_dir, "c1.jsonl", "c1", 1000, self.START)
+        
+        hot = LogEntry(
+            timestamp=self.START + timedelta(hours=2),
+            level=LogLevel.INFO,
+            container_id="c1",
+            container_name="archive",
+            service_name="web",
+            message="Hot request",
+            metadata={}
+        )
+        log_collector.store.append("c1", [(to_micros(hot.timestamp), (json.dumps(hot.to_dict()) + '\n').encode())])
+        
+        logs = [e async for e in log_collector.get_logs(container_id="c1", limit=2000)]
+        assert len(logs) == 1001
+        assert logs[0].message == "Hot request"
+        assert logs[1].message == "Archived request 999"
+        assert logs[-1].message == "Archived request 0"
+        assert all(a.timestamp >= b.timestamp for a, b in zip(logs, logs[1:]))
+        
+        # Plage étroite: seules les trames qui la recouvrent sont décompressées
+        reader = log_collector.archive.readers("c1")[0]
+        log_collector.archive.cache.clear()
+        misses = log_collector.archive.cache.stats['misses']
+        window = [e async for e in log_collector.get_logs(
+            container_id="c1",
+            start_time=self.START + timedelta(seconds=500),
+            end_time=self.START + timedelta(seconds=509)
+        )]
+        assert [e.metadata["index"] for e in window] == list(range(509, 499, -1))
+        assert log_collector.archive.cache.stats['misses'] - misses <= 2 < len(reader.frames)
+        
+        # Recherche texte et autres conteneurs
+        found = [e async for e in log_collector.search_logs("request 42", container_id="c1")]
+        assert [e.metadata["index"] for e in found] == [429, 428, 427, 426, 425, 424, 423, 422, 421, 420, 42]
+        assert [e async for e in log_collector.get_logs(container_id="c2")] == []
+        assert log_collector.get_stats()['archive']['paths'] == [str(archive_dir)]
+    
+    async def test_search_service_indexes_archives(self, log_search_service, temp_storage):
+        """Test l'indexation des archives et la relecture des messages depuis les trames"""
+        archive_dir = Path(temp_storage) / "compressed"
+        log_search_service.archive = LogArchive([archive_dir])
+        archive = self._write_archive(archive_dir, "c1.jsonl", "c1", 500, self.START, codec="lz4")
+        
+        assert archive in log_search_service._list_log_files()
+        await log_search_service._index_file(archive)
+        
+        results = await log_search_service.search_logs(query="archived", container_id="c1", limit=1000)
+        assert len(results) == 500
+        assert all(r['message'] == f"Archived request {r['metadata']['index']}" for r in results)
+        
+        # Les relectures suivantes sont servies par le cache de trames
+        hits = log_search_service.archive.cache.stats['hits']
+        await log_search_service.search_logs(query="archived", container_id="c1", limit=1000)
+        assert log_search_service.archive.cache.stats['hits'] > hits
+        
+        # Une archive déjà indexée n'est pas réindexée
+        await log_search_service._index_file(archive, incremental=True)
+        stats = await log_search_service.get_index_stats()
+        assert stats['total_indexed_logs'] == 500
+    
+    async def test_optimization_archives_read_by_default(self, temp_storage, mock_docker_manager):
+        """Test qu'un fichier compressé par LogOptimizationService est relu avec le câblage par défaut"""
+        optimization_path = Path(temp_storage) / "logs_optimization"
+        optimization = LogOptimizationService(str(optimization_path))
+        source = Path(temp_storage) / "c1.jsonl"
+        self._write_jsonl(source, "c1", 300, self.START)
+        await optimization.compress_log_file(source, "lz4")
+        
+        with patch('wakedock.core.log_collector.LOG_OPTIMIZATION_PATH', optimization_path), \
+                patch('wakedock.core.log_search_service.LOG_OPTIMIZATION_PATH', optimization_path):
+            collector = LogCollector(mock_docker_manager, str(Path(temp_storage) / "containers"))
+            search_service = LogSearchService(temp_storage)
+        
+        try:
+            assert collector.archive.paths == [optimization.compressed_path]
+            assert search_service.archive.paths == [optimization.compressed_path]
+            
+            logs = [e async for e in collector.get_logs(container_id="c1", limit=1000)]
+            assert len(logs) == 300
+            assert logs[0].message == "Archived request 299"
+            
+            await search_service.start()
+            results = await search_service.search_logs(query="archived", container_id="c1", limit=1000)
+            assert len(results) == 300
+            assert all(r['message'] == f"Archived request {r['metadata']['index']}" for r in results)
+        finally:
+            await search_service.stop()
+            await collector.stop()
+
+
 class TestLogSearchService:
     """Tests pour le service de recherche"""
     
@@ -239,6 +998,71 @@ class TestLogSearchService:
         assert stats['total_indexed_logs'] == 2
         assert stats['unique_search_terms'] > 0
     
+    async def test_bulk_index_maps_terms_to_rows(self, log_search_service, temp_storage):
+        """Test que l'indexation en masse associe les termes aux bonnes lignes, même après réindexation"""
+        log_file = Path(temp_storage) / "containers" / "bulk" / "000000000000.jsonl"
+        log_file.parent.mkdir(parents=True, exist_ok=True)
+        
+        with open(log_file, 'w') as f:
+            for i in range(250):
+                f.write(json.dumps({
+                    "timestamp": f"2024-01-01T10:{i // 60:02d}:{i % 60:02d}",
+                    "level": "info",
+                    "container_id": "bulk",
+                    "container_name": "bulk-container",
+                    "service_name": None,
+                    "message": f"request token{i:04d} served",
+                    "metadata": {}
+                }) + '\n')
+        
+        log_search_service.index_batch_size = 100
+        await log_search_service._index_file(log_file)
+        # Une seconde passe remplace les lignes sans dupliquer l'index plein texte
+        await log_search_service._index_file(log_file)
+        
+        async with log_search_service._connection() as db:
+            cursor = await db.execute("""
+                SELECT COUNT(*) FROM log_fts
+                JOIN log_index li ON li.id = log_fts.rowid
+                WHERE log_fts.message = 'request token' || substr('0000' || (li.line_number - 1), -4) || ' served'
+            """)
+            assert (await cursor.fetchone())[0] == 250
+            cursor = await db.execute("SELECT COUNT(*) FROM log_fts")
+            assert (await cursor.fetchone())[0] == 250
+        
+        results = await log_search_service.search_logs(query="token0042", limit=10)
+        assert len(results) == 1
+        assert results[0]['line_number'] == 43
+    
+    async def test_cancelled_commit_not_masked(self, log_search_service):
+        """Test qu'une annulation pendant le COMMIT remonte telle quelle"""
+        db = await log_search_service._open_database()
+        execute = db.execute
+        
+        async def cancelled_commit(sql, *args):
+            # Le COMMIT s'exécute, l'annulation arrive pendant son attente
+            result = await execute(sql, *args)
+            if sql == "COMMIT":
+                raise asyncio.CancelledError()
+            return result
+        
+        db.execute = cancelled_commit
+        entry = LogEntry(datetime(2024, 1, 1), LogLevel.INFO, "c1", "c1", None, "committed line")
+        with pytest.raises(asyncio.CancelledError):
+            await log_search_service._index_batch([(entry, 1, 0, 10)], "c1.jsonl")
+        assert not db.in_transaction
+        cursor = await execute("SELECT COUNT(*) FROM log_index")
+        assert (await cursor.fetchone())[0] == 1
+        
+        # Même garde pour la rétention
+        with pytest.raises(asyncio.CancelledError):
+            await log_search_service.on_segment_dropped("c1", [Path("c1.jsonl")])
+        db.execute = execute
+        
+        assert not db.in_transaction
+        cursor = await db.execute("SELECT COUNT(*) FROM log_index")
+        assert (await cursor.fetchone())[0] == 0
+    
     async def test_search_functionality(self, log_search_service, temp_storage):
         """Test la fonctionnalité de recherche"""
         # Prépare les données de test (comme dans le test précédent)
@@ -297,6 +1121,116 @@ class TestLogSearchService:
         )
         assert len(results) == 2
     
+    async def test_hits_hydrated_by_byte_offset(self, log_search_service, temp_storage):
+        """Test le stockage des offsets, la reprise incrémentale et la lecture des résultats"""
+        log_file = Path(temp_storage) / "containers" / "offsets" / "000000000000.jsonl"
+        log_file.parent.mkdir(parents=True, exist_ok=True)
+        
+        def write_entries(start, count, mode):
+            with open(log_file, mode) as f:
+                for i in range(start, start + count):
+                    f.write(json.dumps({
+                        "timestamp": f"2024-01-01T10:{i // 60:02d}:{i % 60:02d}",
+                        "level": "info",
+                        "container_id": "offsets",
+                        "container_name": "offsets-container",
+                        "service_name": None,
+                        "message": f"événement marker{i:03d}",
+                        "metadata": {"index": i}
+                    }, ensure_ascii=False) + '\n')
+        
+        write_entries(0, 50, 'w')
+        await log_search_service._index_file(log_file)
+        write_entries(50, 10, 'a')
+        await log_search_service._index_file(log_file, incremental=True)
+        
+        raw_lines = log_file.read_bytes().splitlines(keepends=True)
+        async with log_search_service._connection() as db:
+            cursor = await db.execute("SELECT line_number, byte_offset, byte_length FROM log_index ORDER BY line_number")
+            rows = await cursor.fetchall()
+            # Simule une entrée indexée avant l'ajout des offsets
+            await db.execute("UPDATE log_index SET byte_offset = NULL, byte_length = NULL WHERE line_number = 3")
+        
+        assert len(rows) == 60
+        for line_number, byte_offset, byte_length in rows:
+            assert byte_offset == sum(len(line) for line in raw_lines[:line_number - 1])
+            assert byte_length == len(raw_lines[line_number - 1]) - 1
+        
+        results = await log_search_service.search_logs(query=None, container_id="offsets", limit=100)
+        assert len(results) == 60
+        assert {r['metadata']['index'] for r in results} == set(range(60))
+        assert all(r['message'] == f"événement marker{r['metadata']['index']:03d}" for r in results)
+    
+    async def test_iter_logs_pages_by_key(self, log_search_service, temp_storage):
+        """Test le parcours paginé de l'index sans doublon ni perte"""
+        log_file = Path(temp_storage) / "containers" / "pages" / "000000000000.jsonl"
+        log_file.parent.mkdir(parents=True, exist_ok=True)
+        with open(log_file, 'w') as f:
+            for i in range(25):
+                f.write(json.dumps({
+                    # Timestamps en double pour couvrir le départage par id
+                    "timestamp": f"2024-01-01T10:00:{i // 2:02d}",
+                    "level": "info",
+                    "container_id": "pages",
+                    "container_name": "pages-container",
+                    "service_name": None,
+                    "message": f"page entry {i}",
+                    "metadata": {"index": i}
+                }) + '\n')
+        await log_search_service._index_file(log_file)
+        
+        results = [r async for r in log_search_service.iter_logs(container_id="pages", page_size=7)]
+        assert [r['metadata']['index'] for r in results] == list(range(24, -1, -1))
+        
+        limited = [r async for r in log_search_service.iter_logs(limit=10, page_size=4)]
+        assert len(limited) == 10
+    
+    async def test_full_text_query_syntax(self, log_search_service, temp_storage):
+        """Test les phrases, préfixes, OR, exclusions, le classement BM25 et les extraits"""
+        log_file = Path(temp_storage) / "containers" / "fts" / "000000000000.jsonl"
+        log_file.parent.mkdir(parents=True, exist_ok=True)
+        messages = [
+            "Database connection refused by upstream",
+            "Refused connection to cache",
+            "Connection pool exhausted, connection connection retry",
+            "Scheduler started"
+        ]
+        with open(log_file, 'w') as f:
+            for i, message in enumerate(messages):
+                f.write(json.dumps({
+                    "timestamp": f"2024-01-01T10:00:0{i}",
+                    "level": "error",
+                    "container_id": "fts",
+                    "container_name": "fts-container",
+                    "service_name": None,
+                    "message": message,
+                    "metadata": {}
+                }) + '\n')
+        await log_search_service._index_file(log_file)
+        
+        async def messages_for(query, **kwargs):
+            return [r['message'] for r in await log_search_service.search_logs(query=query, limit=10, **kwargs)]
+        
+        assert await messages_for('"connection refused"') == [messages[0]]
+        assert set(await messages_for("sched*")) == {messages[3]}
+        assert set(await messages_for("cache OR upstream")) == {messages[0], messages[1]}
+        assert set(await messages_for("connection -pool")) == {messages[0], messages[1]}
+        # Exclusions seules: tous les logs sauf ceux qui correspondent
+        assert set(await messages_for("-connection")) == {messages[3]}
+        assert set(await messages_for('-pool -"connection refused"')) == {messages[1], messages[3]}
+        # Syntaxe FTS5 brute neutralisée
+        assert await messages_for('message: "unterminated') == []
+        
+        # BM25: le log qui répète le terme arrive en premier
+        results = await log_search_service.search_logs(query="connection", limit=10)
+        assert results[0]['message'] == messages[2]
+        assert results[0]['score'] <= results[-1]['score']
+        assert "<mark>Connection</mark>" in results[0]['highlight']
+        
+        # Tri chronologique explicite
+        assert (await messages_for("connection", sort="time"))[0] == messages[2]
+        assert (await messages_for("refused", sort="time")) == [messages[1], messages[0]]
+    
     async def test_log_statistics(self, log_search_service, temp_storage):
         """Test les statistiques des logs"""
         # Prépare les données (comme dans les tests précédents)
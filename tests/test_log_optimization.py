@@ -6,6 +6,7 @@ import asyncio
 import tempfile
 import shutil
 import json
+from array import array
 from datetime import datetime, timedelta
 from pathlib import Path
 from unittest.mock import Mock, patch, AsyncMock
@@ -14,9 +15,12 @@ from wakedock.core.log_optimization_service import (
     LogOptimizationService,
     LogIndexEntry,
     CompressionStats,
-    SearchIndex
+    SearchIndex,
+    intersect_postings,
+    write_snapshot_file
 )
 from wakedock.core.log_collector import LogEntry, LogLevel
+from wakedock.core.log_compression import CODECS, ZSTD_AVAILABLE, frame_index_path
 
 
 class TestLogOptimizationService:
@@ -171,6 +175,51 @@ class TestLogOptimizationService:
         )
         assert len(results) == 0
 
+    async def test_search_logs_optimized_fts_syntax(self, service, sample_log_entry):
+        """Test les préfixes, OR et exclusions via l'index FTS5"""
+        await service.start()
+        
+        log_id = await service.index_log_entry(sample_log_entry)
+        
+        results, _ = await service.search_logs_optimized(query="keyw*")
+        assert log_id in results
+        
+        results, _ = await service.search_logs_optimized(query="absent OR keywords")
+        assert log_id in results
+        
+        results, _ = await service.search_logs_optimized(query="message -keywords")
+        assert log_id not in results
+
+    async def test_search_negated_phrase(self, service, sample_log_entry):
+        """Test qu'une phrase exclue n'écarte que les logs contenant toute la phrase"""
+        await service.start()
+        
+        log_ids = {}
+        for message in ("error connection reset", "error connection closed", "error reset counter"):
+            entry = LogEntry(**{**sample_log_entry.__dict__, "message": message})
+            log_ids[message] = await service.index_log_entry(entry)
+        
+        results, _ = await service.search_logs_optimized(query='error -"connection reset"')
+        assert set(results) == {log_ids["error connection closed"], log_ids["error reset counter"]}
+        
+        results, _ = await service.search_logs_optimized(query='counter OR "connection closed"')
+        assert set(results) == {log_ids["error connection closed"], log_ids["error reset counter"]}
+
+    async def test_search_negation_only(self, service, sample_log_entry):
+        """Test qu'une requête faite uniquement d'exclusions retourne tous les autres logs"""
+        await service.start()
+        
+        log_ids = {}
+        for message in ("error connection reset", "error connection closed", "debug reset counter"):
+            entry = LogEntry(**{**sample_log_entry.__dict__, "message": message})
+            log_ids[message] = await service.index_log_entry(entry)
+        
+        results, _ = await service.search_logs_optimized(query="-debug")
+        assert set(results) == {log_ids["error connection reset"], log_ids["error connection closed"]}
+        
+        results, _ = await service.search_logs_optimized(query='-debug -"connection closed"')
+        assert results == [log_ids["error connection reset"]]
+
     async def test_search_cache(self, service, sample_log_entry):
         """Test le cache de recherche"""
         await service.start()
@@ -238,6 +287,58 @@ class TestLogOptimizationService:
         with pytest.raises(ValueError):
             await service.compress_log_file(log_file, "invalid")
 
+    @pytest.mark.parametrize("codec", ["lz4", "gzip"])
+    async def test_compress_log_file_seekable_frames(self, service, temp_storage, codec):
+        """Test la compression par trames et la relecture sans décompression complète"""
+        log_file = Path(temp_storage) / "frames.log"
+        lines = [json.dumps({"n": i, "message": f"line {i}"}) + "\n" for i in range(2000)]
+        log_file.write_text("".join(lines))
+        raw = log_file.read_bytes()
+        
+        service.compression_chunk_size = 4096
+        stats = await service.compress_log_file(log_file, codec)
+        
+        compressed_file = service.compressed_path / f"frames.log{CODECS[codec][1]}"
+        assert stats.compressed_size == compressed_file.stat().st_size
+        assert frame_index_path(compressed_file).exists()
+        
+        reader = service.open_compressed_file(compressed_file)
+        assert len(reader.frames) > 1
+        assert all(frame.raw_length <= 4096 for frame in reader.frames)
+        # Chaque trame se termine sur une fin de ligne
+        assert all(raw[frame.raw_offset + frame.raw_length - 1:][:1] == b"\n" for frame in reader.frames)
+        
+        # Une plage est relue en ne décompressant que les trames concernées
+        assert reader.read_range(10000, 5000) == raw[10000:15000]
+        line_number, line = next(reader.iter_lines(1500))
+        assert line_number == 1500
+        assert line.decode() + "\n" == lines[1499]
+        
+        # Le fichier concaténé reste un flux standard
+        if codec == "gzip":
+            import gzip
+            assert gzip.decompress(compressed_file.read_bytes()) == raw
+
+    @pytest.mark.skipif(not ZSTD_AVAILABLE, reason="zstandard non installé")
+    async def test_compress_log_file_zstd_dictionary(self, service, temp_storage):
+        """Test la compression zstd avec un dictionnaire entraîné"""
+        log_file = Path(temp_storage) / "app.log"
+        log_file.write_text("".join(
+            json.dumps({"timestamp": f"2024-01-01T00:00:{i % 60:02d}", "level": "info", "message": f"request {i}"}) + "\n"
+            for i in range(5000)
+        ))
+        raw = log_file.read_bytes()
+        
+        dictionary = await service.train_compression_dictionary([log_file], dict_size=4096)
+        assert dictionary
+        
+        service.compression_chunk_size = 8192
+        await service.compress_log_file(log_file, "zstd")
+        
+        reader = service.open_compressed_file(service.compressed_path / "app.log.zst")
+        assert reader.codec == "zstd"
+        assert reader.read_range(0, len(raw)) == raw
+
     async def test_time_bucket_indexing(self, service):
         """Test l'indexation par buckets temporels"""
         await service.start()
@@ -369,17 +470,220 @@ class TestLogOptimizationService:
         import time
         current_time = time.time()
         
-        service.search_cache["old_key"] = ([], current_time - service.cache_ttl_seconds - 10)
-        service.search_cache["recent_key"] = ([], current_time)
+        service.search_cache.put(("old_key",), [], now=current_time - service.cache_ttl_seconds - 10)
+        service.search_cache.put(("recent_key",), [], now=current_time)
+        
+        assert service.search_cache.purge_expired(current_time) == 1
+        assert service.search_cache.get(("old_key",)) is None
+        assert service.search_cache.get(("recent_key",)) == []
+
+    async def test_cache_lru_and_generations(self, service):
+        """Test l'éviction LRU et l'invalidation par conteneur"""
+        cache = service.search_cache
+        cache.max_entries = 2
+        
+        cache.put(("a",), ["a"], container_id="c1")
+        cache.put(("b",), ["b"], container_id="c2")
+        cache.put(("all",), ["all"])
+        assert len(cache) == 2
+        assert cache.get(("a",), "c1") is None  # évincé (moins récemment utilisé)
+        assert cache.stats["evictions"] == 1
+        
+        # Une nouvelle entrée de c1 n'invalide que les recherches qui peuvent l'inclure
+        cache.invalidate("c1")
+        assert cache.get(("b",), "c2") == ["b"]
+        assert cache.get(("all",)) is None
+        assert cache.stats["invalidations"] == 1
+        
+        stats = service.get_cache_stats()
+        assert stats["size"] == 1
+        assert stats["hits"] == 1
+        assert await service.clear_search_cache() == 1
+
+    async def test_new_entries_invalidate_cached_results(self, service):
+        """Test qu'un résultat vide en cache n'est pas servi après l'arrivée de logs"""
+        await service.start()
+        
+        results, _ = await service.search_logs_optimized(query="outage", container_id="api")
+        assert results == []
         
-        # Simuler le nettoyage du cache
-        expired_keys = []
-        for cache_key, (_, cached_time) in service.search_cache.items():
-            if current_time - cached_time > service.cache_ttl_seconds:
-                expired_keys.append(cache_key)
+        log_id = await service.index_log_entry(LogEntry(
+            timestamp=datetime.now(),
+            level=LogLevel.ERROR,
+            container_id="api",
+            container_name="api",
+            service_name="web",
+            message="Database outage detected"
+        ))
         
-        assert "old_key" in expired_keys
-        assert "recent_key" not in expired_keys
+        results, _ = await service.search_logs_optimized(query="outage", container_id="api")
+        assert results == [log_id]
+
+    async def test_index_snapshot_and_wal_replay(self, service, temp_storage):
+        """Test le redémarrage depuis l'instantané et le rejeu du journal après un arrêt brutal"""
+        await service.start()
+        await service.wait_until_ready()
+
+        base_time = datetime.now()
+
+        def entry(i):
+            return LogEntry(
+                timestamp=base_time + timedelta(seconds=i),
+                level=LogLevel.ERROR if i % 5 == 0 else LogLevel.INFO,
+                container_id=f"container{i % 2}",
+                container_name="app",
+                service_name="web",
+                message=f"Snapshot message {i}"
+            )
+
+        for i in range(200):
+            await service.index_log_entry(entry(i))
+        expected, _ = await service.search_logs_optimized(query="snapshot", container_id="container1", limit=50)
+        await service.stop()
+        assert service.snapshot_path.exists()
+        assert service.wal_path.stat().st_size == 0
+
+        restarted = LogOptimizationService(storage_path=temp_storage)
+        await restarted.start()
+        stats = restarted.get_optimization_stats()
+        assert stats["index_load_source"] == "snapshot"
+        assert stats["index_ready"]
+        assert stats["total_indexed_logs"] == 200
+        results, _ = await restarted.search_logs_optimized(query="snapshot", container_id="container1", limit=50)
+        assert results == expected
+
+        # Entrées écrites en base et journalisées, sans instantané (arrêt brutal)
+        for i in range(200, 260):
+            await restarted.index_log_entry(entry(i))
+        await restarted.flush_index_writes()
+        assert restarted.get_optimization_stats()["wal_records"] == 60
+
+        recovered = LogOptimizationService(storage_path=temp_storage)
+        await recovered.start()
+        try:
+            stats = recovered.get_optimization_stats()
+            assert stats["wal_replayed"] == 60
+            assert stats["total_indexed_logs"] == 260
+            results, _ = await recovered.search_logs_optimized(query="259")
+            assert len(results) == 1
+        finally:
+            await recovered.stop()
+            await restarted.stop()
+
+    async def test_index_warm_up_without_snapshot(self, service, temp_storage):
+        """Test le préchargement progressif depuis la base quand aucun instantané n'existe"""
+        await service.start()
+        await service.wait_until_ready()
+        base_time = datetime.now()
+        for i in range(120):
+            await service.index_log_entry(LogEntry(
+                timestamp=base_time - timedelta(seconds=i),
+                level=LogLevel.INFO,
+                container_id="container1",
+                container_name="app",
+                service_name="web",
+                message=f"Warm up message {i}"
+            ))
+        await service.stop()
+        service.snapshot_path.unlink()
+
+        restarted = LogOptimizationService(storage_path=temp_storage)
+        restarted.warm_up_batch_size = 25
+        await restarted.start()
+        try:
+            # Une entrée reçue pendant le préchargement est ajoutée après l'historique
+            live_id = await restarted.index_log_entry(LogEntry(
+                timestamp=base_time + timedelta(seconds=1),
+                level=LogLevel.INFO,
+                container_id="container1",
+                container_name="app",
+                service_name="web",
+                message="Live message during warm up"
+            ))
+            await asyncio.wait_for(restarted.wait_until_ready(), timeout=10)
+            stats = restarted.get_optimization_stats()
+            assert stats["index_load_source"] == "database"
+            assert stats["total_indexed_logs"] == 121
+            assert restarted.search_index.doc_ids[live_id] == 120
+            assert restarted.search_index.time_order[-1] == 120
+            assert list(restarted.search_index.sorted_timestamps) == sorted(restarted.search_index.timestamps)
+            results, _ = await restarted.search_logs_optimized(query="live")
+            assert results == [live_id]
+            # Le prochain démarrage partira de l'instantané
+            assert restarted.snapshot_path.exists()
+        finally:
+            await restarted.stop()
+
+    async def test_rotation_removes_expired_entries(self, service):
+        """Test la rotation: entrées expirées retirées de l'index (reconstruit hors de la boucle) et de la base"""
+        import aiosqlite
+        await service.start()
+        await service.wait_until_ready()
+        now = datetime.now()
+        log_ids = []
+        for i in range(6):
+            log_ids.append(await service.index_log_entry(LogEntry(
+                timestamp=now - timedelta(days=service.retention_days + 10 if i < 3 else 0, seconds=i),
+                level=LogLevel.INFO,
+                container_id="container1",
+                container_name="app",
+                service_name="web",
+                message=f"Rotation message {i}"
+            )))
+
+        async def remaining_rows():
+            async with aiosqlite.connect(str(service.db_path)) as db:
+                cursor = await db.execute("SELECT COUNT(*) FROM log_index")
+                return (await cursor.fetchone())[0]
+
+        rotation = asyncio.create_task(service._log_rotation_worker())
+        try:
+            for _ in range(100):
+                if len(service.search_index) == 3 and await remaining_rows() == 3:
+                    break
+                await asyncio.sleep(0.05)
+        finally:
+            rotation.cancel()
+            await asyncio.gather(rotation, return_exceptions=True)
+
+        assert set(service.search_index.doc_ids) == set(log_ids[3:])
+        assert await remaining_rows() == 3
+        results, _ = await service.search_logs_optimized(query="rotation")
+        assert sorted(results) == sorted(log_ids[3:])
+
+    async def test_write_behind_batches(self, service):
+        """Test l'écriture différée par transactions et l'écriture de la file à l'arrêt"""
+        import aiosqlite
+        service.write_batch_size = 50
+        await service.start()
+
+        base_time = datetime.now()
+        for i in range(120):
+            await service.index_log_entry(LogEntry(
+                timestamp=base_time + timedelta(seconds=i),
+                level=LogLevel.INFO,
+                container_id="container1",
+                container_name="app1",
+                service_name="web",
+                message=f"Queued log message {i}"
+            ))
+
+        # L'index en mémoire est à jour, la base pas encore
+        assert service.get_optimization_stats()["write_queue_depth"] == 120
+        results, _ = await service.search_logs_optimized(query="queued")
+        assert len(results) == 120
+
+        await service.stop()
+
+        stats = service.get_optimization_stats()
+        assert stats["write_queue_depth"] == 0
+        assert stats["write_batches"] == 3
+        assert stats["written_entries"] == 120
+        async with aiosqlite.connect(str(service.db_path)) as db:
+            cursor = await db.execute("SELECT COUNT(*) FROM log_index")
+            assert (await cursor.fetchone())[0] == 120
+            cursor = await db.execute("SELECT COUNT(*) FROM search_terms WHERE search_terms MATCH 'queued'")
+            assert (await cursor.fetchone())[0] == 120
 
     async def test_memory_usage_with_large_dataset(self, service):
         """Test la gestion mémoire avec un grand dataset"""
@@ -433,6 +737,172 @@ class TestLogOptimizationService:
         assert len(service.search_index.log_metadata) == 20
 
 
+class TestCompactSearchIndex:
+    """Tests pour l'index compact (doc ids entiers et postings triés)"""
+
+    def _entry(self, i, container_id="c1", level="info", terms=None, hours=0):
+        return LogIndexEntry(
+            log_id=f"{i:032x}",
+            timestamp=datetime(2024, 1, 1, 12, 0, 0) + timedelta(hours=hours, seconds=i),
+            container_id=container_id,
+            level=level,
+            message_hash=f"{i:016x}",
+            search_terms=set(terms or {"request", f"term{i % 3}"}),
+            file_path="/var/log/app.log",
+            compressed_size=i
+        )
+
+    def test_intersect_postings(self):
+        """Test l'intersection par fusion et par recherche dichotomique"""
+        from array import array
+        large = array('I', range(0, 10000, 2))
+        small = array('I', [3, 4, 10, 9998, 10001])
+        medium = array('I', range(0, 10000, 3))
+
+        assert list(intersect_postings([large, small])) == [4, 10, 9998]
+        assert list(intersect_postings([large, medium])) == list(range(0, 10000, 6))
+        assert list(intersect_postings([large, array('I')])) == []
+
+    def test_snapshot_roundtrip(self, tmp_path):
+        """Test l'instantané projeté en mémoire et la copie des postings à la première modification"""
+        index = SearchIndex()
+        for i in range(300):
+            index.add(self._entry(i, container_id=f"c{i % 3}", level="error" if i % 7 == 0 else "info"))
+        # Entrée hors ordre (insertion au milieu de l'index temporel)
+        index.add(self._entry(1000, hours=-1))
+
+        path = tmp_path / "index.snapshot"
+        write_snapshot_file(path, len(index), index.snapshot_sections())
+        loaded = SearchIndex.load_snapshot(path)
+
+        assert len(loaded) == len(index)
+        assert all(loaded.entry(doc) == index.entry(doc) for doc in index.all_docs())
+        assert list(loaded.time_order) == list(index.time_order)
+        assert loaded.term_postings.keys() == index.term_postings.keys()
+        assert isinstance(loaded.term_postings["term1"], memoryview)
+
+        postings = [loaded.term_postings["term1"]]
+        expected = index.search([index.term_postings["term1"]], container_id="c2", level="info", limit=20)
+        assert loaded.search(postings, container_id="c2", level="info", limit=20) == expected
+
+        # Ajout après chargement: la liste de postings devient un array modifiable
+        doc = loaded.add(self._entry(2000, container_id="c2", terms={"term1"}, hours=1))
+        assert isinstance(loaded.term_postings["term1"], array)
+        assert loaded.search([loaded.term_postings["term1"]], container_id="c2", limit=1) == [doc]
+
+        # Un fichier corrompu est refusé
+        path.write_bytes(b"XXXX" + path.read_bytes()[4:])
+        with pytest.raises(ValueError):
+            SearchIndex.load_snapshot(path)
+
+    def test_add_and_views(self):
+        """Test les colonnes, l'internement et les vues de compatibilité"""
+        index = SearchIndex()
+        for i in range(10):
+            index.add(self._entry(i, container_id=f"c{i % 2}", hours=i // 5))
+        # Un log_id déjà indexé n'est pas dupliqué
+        index.add(self._entry(0))
+
+        assert len(index) == 10
+        assert len(index.containers) == 2
+        assert len(index.term_postings) == 4
+        assert index.log_metadata[f"{3:032x}"] == self._entry(3, container_id="c1")
+        assert f"{3:032x}" in index.container_index["c1"]
+        assert f"{3:032x}" not in index.container_index["c0"]
+        assert len(index.term_to_logs["term0"]) == 4
+        assert set(index.time_buckets) == {"2024-01-01T12:00:00", "2024-01-01T13:00:00"}
+
+    def test_remove_rebuilds_index(self):
+        """Test la suppression avec reconstruction des doc ids"""
+        index = SearchIndex()
+        for i in range(6):
+            index.add(self._entry(i, terms={"request", f"only{i}"} if i == 5 else None))
+
+        assert index.remove([f"{i:032x}" for i in (0, 5)]) == 2
+        assert len(index) == 4
+        assert list(index.term_postings["request"]) == [0, 1, 2, 3]
+        assert "only5" not in index.term_postings
+        assert index.log_metadata[f"{1:032x}"].compressed_size == 1
+
+    def test_rebuilt_in_time_order(self):
+        """Test la reconstruction d'un index compact sans modifier l'index source"""
+        index = SearchIndex()
+        for i in list(range(5, 10)) + list(range(5)):
+            index.add(self._entry(i))
+
+        _, expired = index.time_range(None, self._entry(2).timestamp.timestamp())
+        rebuilt = index.rebuilt(index.time_order[expired:])
+
+        assert len(index) == 10
+        assert [entry.log_id for entry in map(rebuilt.entry, rebuilt.time_order)] == [f"{i:032x}" for i in range(3, 10)]
+        assert list(rebuilt.time_order) == list(range(7))
+        assert list(rebuilt.term_postings["request"]) == list(range(7))
+
+    def test_time_range_search(self):
+        """Test les plages de temps (index trié) avec les deux stratégies de parcours"""
+        index = SearchIndex()
+        # Insertion dans le désordre: l'index temporel reste trié
+        for i in list(range(50, 100)) + list(range(50)):
+            index.add(self._entry(i, container_id=f"c{i % 2}", level="error" if i % 4 == 0 else "info"))
+        assert list(index.sorted_timestamps) == sorted(index.sorted_timestamps)
+
+        base = datetime(2024, 1, 1, 12, 0, 0)
+        start, end = (base + timedelta(seconds=10)).timestamp(), (base + timedelta(seconds=29)).timestamp()
+        expected = [i for i in range(29, 9, -1) if i % 4 == 0]
+
+        # Plage courte: parcours du plus récent au plus ancien
+        docs = index.search([], container_id="c0", level="error", start=start, end=end, limit=10)
+        assert [int(index.log_ids[doc], 16) for doc in docs] == expected
+
+        # Liste de postings plus courte que la plage: intersection puis tas
+        rare = index.term_postings["term0"]
+        docs = index.search([rare], level="error", start=start, end=end + 3600, limit=3)
+        assert [int(index.log_ids[doc], 16) for doc in docs] == [96, 84, 72]
+
+        docs = index.search([], limit=5)
+        assert [int(index.log_ids[doc], 16) for doc in docs] == [99, 98, 97, 96, 95]
+
+    @pytest.mark.slow
+    def test_recent_errors_query_latency(self):
+        """Test "15 dernières minutes d'erreurs d'un conteneur" en moins d'une milliseconde"""
+        import time as time_module
+        index = SearchIndex()
+        for i in range(100000):
+            index.add(self._entry(i, container_id=f"c{i % 20}", level="error" if i % 7 == 0 else "info"))
+
+        end = (datetime(2024, 1, 1, 12, 0, 0) + timedelta(seconds=99999)).timestamp()
+        timings = []
+        for _ in range(20):
+            started = time_module.perf_counter()
+            docs = index.search([], container_id="c3", level="error", start=end - 900, end=end, limit=100)
+            timings.append(time_module.perf_counter() - started)
+
+        assert docs
+        # Meilleur temps: insensible à la charge de la machine, un parcours linéaire reste bien au-dessus
+        assert min(timings) < 0.001
+
+    async def test_search_orders_and_filters(self, tmp_path):
+        """Test la recherche sur l'index compact: filtres combinés et tri par date"""
+        service = LogOptimizationService(storage_path=str(tmp_path))
+        for i in range(30):
+            service.search_index.add(self._entry(
+                i,
+                container_id=f"c{i % 3}",
+                level="error" if i % 2 else "info",
+                terms={"request", "failed"} if i % 5 == 0 else {"request"},
+                hours=i // 10
+            ))
+
+        results, _ = await service.search_logs_optimized(query="request failed", container_id="c0", limit=10)
+        assert results == [f"{i:032x}" for i in (15, 0)]
+
+        results, _ = await service.search_logs_optimized(level="error", limit=3)
+        assert results == [f"{i:032x}" for i in (29, 27, 25)]
+
+        results, _ = await service.search_logs_optimized(query="unknown")
+        assert results == []
+
+
 class TestLogOptimizationAPI:
     """Tests pour les API d'optimisation"""
 
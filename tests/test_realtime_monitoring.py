@@ -9,15 +9,22 @@ from unittest.mock import Mock, AsyncMock, patch, MagicMock
 from pathlib import Path
 import tempfile
 
+import numpy as np
+
 from wakedock.core.metrics_collector import (
     MetricsCollector, MetricType, AlertLevel, ContainerMetrics, Alert,
-    ThresholdConfig
+    ThresholdConfig, StatsSubscription
 )
 from wakedock.core.websocket_service import (
     MetricsWebSocketService, StreamType, MessageType, WebSocketMessage,
     ClientConnection
 )
 from wakedock.core.docker_manager import DockerManager
+from wakedock.core.cgroup_reader import CgroupReader
+from wakedock.core.container_registry import ContainerInfo, ContainerRegistry
+from wakedock.core.log_storage import to_micros
+from wakedock.core.metrics_query import aggregate_series, counter_increase
+from wakedock.core.metrics_tsdb import SeriesData
 
 class TestMetricsCollector:
     """Tests pour le collecteur de métriques"""
@@ -207,6 +214,84 @@ class TestMetricsCollector:
         assert alert.metric_type == MetricType.CPU_PERCENT
         assert alert.value == 95.0
     
+    @pytest.mark.asyncio
+    async def test_counter_rates_at_ingest(self, metrics_collector):
+        """Test des débits par seconde calculés à l'ingestion et utilisés pour les seuils"""
+        start = datetime.utcnow() - timedelta(seconds=30)
+        alerts_processed = []
+        
+        async def mock_process_alert(alert):
+            alerts_processed.append(alert)
+        
+        metrics_collector._process_alert = mock_process_alert
+        
+        def sample(i, rx, written):
+            return ContainerMetrics(
+                container_id="web1", container_name="web", service_name="web",
+                timestamp=start + timedelta(seconds=5 * i), cpu_percent=1.0, cpu_usage=0, cpu_system_usage=0,
+                memory_usage=0, memory_limit=0, memory_percent=0.0, memory_cache=0,
+                network_rx_bytes=rx, network_tx_bytes=0, network_rx_packets=0, network_tx_packets=0,
+                block_read_bytes=0, block_write_bytes=written, pids=1
+            )
+        
+        gib = 1024 ** 3
+        # Compteurs cumulés élevés (10 Gio) mais faible débit: aucune alerte réseau
+        samples = [
+            sample(0, 10 * gib, 0),
+            sample(1, 10 * gib + 5 * 1024 * 1024, 4096 * 5),
+            # Redémarrage du conteneur: les compteurs repartent de zéro
+            sample(2, 1024 * 1024, 0),
+            sample(3, 1024 * 1024 + 5 * 700 * 1024 * 1024, 0),
+        ]
+        for metrics in samples:
+            await metrics_collector._store_metrics(metrics)
+            await metrics_collector._check_thresholds(metrics)
+        
+        assert samples[0].network_rx_rate == 0.0
+        assert samples[1].network_rx_rate == 1024 * 1024
+        assert samples[1].block_write_rate == 4096
+        assert samples[2].network_rx_rate == pytest.approx(1024 * 1024 / 5)
+        assert samples[2].block_write_rate == 0.0
+        assert metrics_collector.collection_stats['counter_resets'] == 1
+        
+        # Seul le débit de 700 Mio/s dépasse le seuil critique (500 Mio/s)
+        assert [(a.metric_type, a.level) for a in alerts_processed] == [(MetricType.NETWORK_RX, AlertLevel.CRITICAL)]
+        assert alerts_processed[0].value == pytest.approx(700 * 1024 * 1024)
+        
+        # Débits stockés avec les compteurs
+        recent = await metrics_collector.get_recent_metrics("web1", limit=1)
+        assert recent[0].network_rx_rate == pytest.approx(700 * 1024 * 1024)
+        assert recent[0].network_rx_bytes == 1024 * 1024 + 5 * 700 * 1024 * 1024
+    
+    @pytest.mark.asyncio
+    async def test_stream_rates_use_frame_read_time(self, metrics_collector):
+        """Test des débits calculés entre les instants de lecture du daemon, trames répétées ignorées"""
+        start = datetime.utcnow() - timedelta(seconds=30)
+        mib = 1024 * 1024
+        
+        def frame(second):
+            # Trafic constant de 1 Mio/s, trame numéro second + 1
+            read = (start + timedelta(seconds=second)).strftime('%Y-%m-%dT%H:%M:%S.%f') + '123Z'
+            return {'read': read, 'networks': {'eth0': {'rx_bytes': second * mib, 'tx_bytes': 0}}}, 0.1, second + 1
+        
+        subscription = Mock(spec=StatsSubscription)
+        subscription.ended = False
+        metrics_collector.subscriptions["web1"] = subscription
+        metrics_collector.monitored_containers["web1"] = "web"
+        
+        # Cycles décalés par rapport au flux: trame 0 lue deux fois, trame 2 manquée
+        rates = []
+        for second in (0, 0, 1, 3, 4):
+            subscription.latest.return_value = frame(second)
+            metrics = metrics_collector._sample_subscription("web1", "web")
+            if metrics is not None:
+                await metrics_collector._store_metrics(metrics)
+                rates.append(metrics.network_rx_rate)
+        
+        assert rates == [0.0, mib, mib, mib]
+        assert metrics_collector.collection_stats['repeated_frames'] == 1
+        assert metrics_collector.previous_metrics["web1"].timestamp == start + timedelta(seconds=4)
+    
     @pytest.mark.asyncio
     async def test_metrics_storage(self, metrics_collector, temp_storage):
         """Test du stockage des métriques"""
@@ -232,20 +317,616 @@ class TestMetricsCollector:
             pids=25
         )
         
-        # Stocke les métriques
+        # Stocke les métriques (bloc de tête en mémoire)
         await metrics_collector._store_metrics(metrics)
         
-        # Vérifie que le fichier a été créé
+        recent = await metrics_collector.get_recent_metrics(container_id="container123")
+        assert len(recent) == 1
+        assert recent[0].cpu_percent == 50.0
+        assert recent[0].memory_usage == 1073741824
+        assert recent[0].service_name == "web"
+        
+        # Écrit le chunk puis relit depuis le disque
+        metrics_collector.tsdb.flush(force=True)
         date_str = metrics.timestamp.strftime('%Y-%m-%d')
-        metrics_file = Path(temp_storage) / f"metrics_{date_str}.jsonl"
-        assert metrics_file.exists()
-        
-        # Vérifie le contenu
-        with open(metrics_file, 'r') as f:
-            line = f.readline().strip()
-            stored_data = json.loads(line)
-            assert stored_data['container_id'] == "container123"
-            assert stored_data['cpu_percent'] == 50.0
+        assert (Path(temp_storage) / "tsdb" / "container123" / f"{date_str}.tsc").exists()
+        
+        reopened = MetricsCollector(metrics_collector.docker_manager, temp_storage)
+        recent = await reopened.get_recent_metrics(container_id="container123")
+        assert len(recent) == 1
+        assert recent[0].to_dict() == metrics.to_dict()
+    
+    @pytest.mark.asyncio
+    async def test_metrics_storage_chunks(self, metrics_collector, temp_storage):
+        """Test des chunks colonnaires: compression, sélection par conteneur et par période"""
+        metrics_collector.tsdb.chunk_size = 100
+        start = datetime.utcnow() - timedelta(minutes=50)
+        
+        def sample(container_id, i):
+            return ContainerMetrics(
+                container_id=container_id, container_name=f"name-{container_id}", service_name=None,
+                timestamp=start + timedelta(seconds=5 * i),
+                cpu_percent=round(10 + (i % 7) * 0.5, 2), cpu_usage=1_000_000 * i, cpu_system_usage=5_000_000 * i,
+                memory_usage=1024 * (1000 + i % 3), memory_limit=2 ** 31, memory_percent=0.5, memory_cache=0,
+                network_rx_bytes=1500 * i, network_tx_bytes=900 * i, network_rx_packets=i, network_tx_packets=i,
+                block_read_bytes=0, block_write_bytes=4096 * i, pids=12
+            )
+        
+        await metrics_collector._store_metrics_batch(
+            [sample(cid, i) for i in range(600) for cid in ("a", "b")]
+        )
+        tsdb = metrics_collector.tsdb
+        tsdb.flush(force=True)
+        stats = tsdb.get_stats()
+        # 6 chunks par conteneur (un de plus si la période passe minuit)
+        assert stats['chunks'] >= 12
+        assert stats['samples'] == 1200
+        assert stats['compression_ratio'] > 10
+        
+        # Dernière heure d'un conteneur: les chunks de l'autre ne sont pas lus
+        read = []
+        original = tsdb._read_chunk
+        tsdb._read_chunk = lambda chunk, fields: read.append(chunk) or original(chunk, fields)
+        recent = await metrics_collector.get_recent_metrics(container_id="a", hours=1, limit=10)
+        assert [m.timestamp for m in recent] == [sample("a", i).timestamp for i in range(599, 589, -1)]
+        assert recent[0].cpu_usage == 599_000_000
+        assert all(chunk.path.parent.name == "a" for chunk in read)
+        
+        # Période courte: seuls les chunks qui la recouvrent sont lus
+        read.clear()
+        series = tsdb.query("b", start=to_micros(start + timedelta(seconds=5 * 250)),
+                            end=to_micros(start + timedelta(seconds=5 * 260)), fields=["cpu_usage"])
+        assert 1 <= len(read) <= 2
+        assert series[0].columns["cpu_usage"].tolist() == [1_000_000 * i for i in range(250, 261)]
+    
+    @pytest.mark.asyncio
+    async def test_legacy_metrics_migration(self, mock_docker_manager, temp_storage):
+        """Test de l'import des anciens fichiers metrics_*.jsonl au démarrage"""
+        now = datetime.utcnow()
+        legacy = Path(temp_storage) / f"metrics_{now.strftime('%Y-%m-%d')}.jsonl"
+        with open(legacy, 'w') as f:
+            for i in range(3):
+                f.write(json.dumps({
+                    'container_id': 'old', 'container_name': 'legacy', 'service_name': 'db',
+                    'timestamp': (now - timedelta(minutes=3 - i)).isoformat(),
+                    'cpu_percent': 1.5 * i, 'cpu_usage': i, 'cpu_system_usage': 0,
+                    'memory_usage': 0, 'memory_limit': 0, 'memory_percent': 0.0, 'memory_cache': 0,
+                    'network_rx_bytes': 0, 'network_tx_bytes': 0, 'network_rx_packets': 0,
+                    'network_tx_packets': 0, 'block_read_bytes': 0, 'block_write_bytes': 0, 'pids': 3
+                }) + '\n')
+            f.write('ligne invalide\n')
+        
+        collector = MetricsCollector(mock_docker_manager, temp_storage)
+        await collector.start()
+        try:
+            assert not legacy.exists()
+            recent = await collector.get_recent_metrics(container_id='old')
+            assert [m.cpu_percent for m in recent] == [3.0, 1.5, 0.0]
+            assert recent[0].service_name == 'db'
+        finally:
+            await collector.stop()
+    
+    @pytest.mark.asyncio
+    async def test_metric_rollups(self, metrics_collector):
+        """Test des agrégats 1m/5m/1h et du choix du palier selon la résolution"""
+        hour = datetime.utcnow().replace(minute=0, second=0, microsecond=0) - timedelta(hours=3)
+        batch = []
+        for i in range(2 * 720):
+            metrics = ContainerMetrics(
+                container_id="web1", container_name="web", service_name="web", timestamp=hour + timedelta(seconds=5 * i),
+                cpu_percent=float(i % 12), cpu_usage=i, cpu_system_usage=0, memory_usage=1000 + i,
+                memory_limit=4000, memory_percent=25.0, memory_cache=0, network_rx_bytes=0, network_tx_bytes=0,
+                network_rx_packets=0, network_tx_packets=0, block_read_bytes=0, block_write_bytes=0, pids=4
+            )
+            batch.append(metrics)
+        await metrics_collector._store_metrics_batch(batch)
+        
+        # Chaque intervalle d'une minute: 12 mesures, cpu de 0 à 11
+        minutes = await metrics_collector.query_metrics("web1", start=hour, step=60, stat='max')
+        assert minutes[0].resolution == 60
+        assert len(minutes[0]) == 120
+        assert set(minutes[0].columns['count'].tolist()) == {12}
+        assert set(minutes[0].columns['cpu_percent'].tolist()) == {11.0}
+        p95 = await metrics_collector.query_metrics("web1", start=hour, step=60, stat='p95', fields=['cpu_percent'])
+        assert p95[0].columns['cpu_percent'][0] == pytest.approx(10.45)
+        last = await metrics_collector.query_metrics("web1", start=hour, step=3600, stat='last')
+        assert last[0].resolution == 3600
+        assert last[0].columns['memory_usage'].tolist() == [1000 + 719.0, 1000 + 1439.0]
+        
+        # Palier le plus grossier dont le pas ne dépasse pas la résolution
+        assert (await metrics_collector.query_metrics("web1", start=hour, step=900))[0].resolution == 300
+        assert (await metrics_collector.query_metrics("web1", start=hour, step=10))[0].resolution is None
+        
+        # Moyennes sur 5 minutes pour les analyses
+        recent = await metrics_collector.get_recent_metrics("web1", hours=4, limit=1000, resolution=300)
+        assert len(recent) == 24
+        assert recent[0].cpu_percent == pytest.approx(5.5)
+        assert isinstance(recent[0].memory_usage, int)
+    
+    @pytest.mark.asyncio
+    async def test_counter_increase_over_rollups(self, metrics_collector):
+        """Test du trafic d'une période à partir des agrégats d'accroissements, remise à zéro et mesures manquées"""
+        hour = datetime.utcnow().replace(minute=0, second=0, microsecond=0) - timedelta(hours=3)
+        batch = []
+        for i in range(2 * 720):
+            # Une mesure sur sept manquée (trame sautée)
+            if i % 7 == 3:
+                continue
+            # Redémarrage à la 41e mesure d'un intervalle de 5 minutes
+            rx = 1000 * i if i < 700 else 500 + 1000 * (i - 700)
+            batch.append(ContainerMetrics(
+                container_id="web1", container_name="web", service_name="web", timestamp=hour + timedelta(seconds=5 * i),
+                cpu_percent=0.0, cpu_usage=0, cpu_system_usage=0, memory_usage=0, memory_limit=0, memory_percent=0.0,
+                memory_cache=0, network_rx_bytes=rx, network_tx_bytes=0, network_rx_packets=0, network_tx_packets=0,
+                block_read_bytes=0, block_write_bytes=0, pids=1
+            ))
+        await metrics_collector._store_metrics_batch(batch)
+        
+        # Accroissement moyen x nombre de mesures: octets réellement échangés
+        deltas = await metrics_collector.query_metrics("web1", start=hour, step=300, fields=['network_rx_delta'])
+        transferred = np.sum(deltas[0].columns['network_rx_delta'] * deltas[0].columns['count'])
+        assert transferred == pytest.approx(counter_increase(np.array([m.network_rx_bytes for m in batch])))
+        assert transferred == pytest.approx(699000 + 500 + 1000 * 739)
+    
+    @pytest.mark.asyncio
+    async def test_rollup_replay_after_restart(self, mock_docker_manager, temp_storage):
+        """Test du recalcul des agrégats à partir des mesures brutes au démarrage"""
+        collector = MetricsCollector(mock_docker_manager, temp_storage)
+        start = datetime.utcnow().replace(second=0, microsecond=0) - timedelta(minutes=30)
+        for i in range(30 * 12):
+            collector.tsdb.append("db1", "db", None, to_micros(start + timedelta(seconds=5 * i)),
+                                  {'cpu_percent': 2.0, 'pids': 7})
+        collector.tsdb.flush(force=True)
+        
+        for _ in range(2):
+            collector = MetricsCollector(mock_docker_manager, temp_storage)
+            await collector.start()
+            await collector.stop()
+            
+            minutes = await collector.query_metrics("db1", start=start, step=60)
+            # Un intervalle par minute passée, sans doublon après redémarrage
+            assert len(minutes[0]) == 30
+            assert minutes[0].columns['pids'].tolist() == [7.0] * 30
+    
+    def test_aggregate_series(self):
+        """Test de l'agrégation vectorisée par groupe et par intervalle"""
+        base = 1_700_000_000_000_000 - 1_700_000_000_000_000 % 60_000_000
+        ts = base + np.arange(12, dtype=np.int64) * 10_000_000  # 2 minutes, une mesure toutes les 10 s
+        
+        def series(cid, service, cpu, rx):
+            return SeriesData(cid, cid, service, ts, {'cpu_percent': np.asarray(cpu, dtype=float),
+                                                    'network_rx_bytes': np.asarray(rx)})
+        
+        data = [
+            series("a", "web", [10.0] * 6 + [30.0] * 6, np.arange(12) * 1000),
+            series("b", "web", [20.0] * 12, np.arange(12) * 500),
+            # Redémarrage: le compteur repart de zéro au milieu de la 2e minute
+            series("c", "db", np.arange(12, dtype=float), [0, 100, 200, 300, 400, 500, 600, 700, 800, 100, 200, 300]),
+        ]
+        groups = ["web", "web", "db"]
+        end = int(ts[-1])
+        
+        axis, result = aggregate_series(data, 'cpu_percent', groups, base, end, 60, 'avg')
+        assert axis.tolist() == [base, base + 60_000_000]
+        assert [r.group for r in result] == ["web", "db"]
+        assert result[0].containers == ["a", "b"]
+        assert result[0].values.tolist() == [15.0, 25.0]
+        assert result[1].values.tolist() == [2.5, 8.5]
+        
+        _, result = aggregate_series(data, 'cpu_percent', groups, base, end, 60, 'max')
+        assert result[0].values.tolist() == [20.0, 30.0]
+        
+        _, result = aggregate_series(data, 'cpu_percent', groups, base, end, 60, 'percentile', percentile=50)
+        assert result[1].values.tolist() == [2.5, 8.5]
+        
+        # Taux par seconde sommés sur les conteneurs du service, remise à zéro comprise
+        _, result = aggregate_series(data, 'network_rx_bytes', groups, base, end, 60, 'rate')
+        assert result[0].values.tolist() == [150.0, 150.0]
+        assert result[1].values.tolist() == [10.0, 10.0]
+        
+        # Intervalle sans mesure
+        _, result = aggregate_series(data, 'cpu_percent', groups, base - 60_000_000, end, 60, 'avg')
+        assert result[0].to_dict()['values'] == [None, 15.0, 25.0]
+        
+        with pytest.raises(ValueError):
+            aggregate_series(data, 'cpu_percent', groups, base, end, 60, 'median')
+    
+    @pytest.mark.asyncio
+    async def test_aggregate_metrics_by_label(self, metrics_collector):
+        """Test du regroupement par label et du filtre par service avant la limite"""
+        now = datetime.utcnow()
+        labels = {"a": "blue", "b": "blue", "c": "green"}
+        for cid, team in labels.items():
+            metrics_collector.registry.containers[cid] = ContainerInfo(
+                id=cid, name=cid, labels={"team": team, "com.docker.compose.service": "db" if cid == "c" else "web"}
+            )
+            for i in range(6):
+                metrics_collector.tsdb.append(cid, cid, "db" if cid == "c" else "web",
+                                              to_micros(now - timedelta(seconds=50 - 10 * i)),
+                                              {'cpu_percent': 10.0 if cid != "c" else 50.0})
+        
+        timestamps, series = await metrics_collector.aggregate_metrics(
+            'cpu_percent', start=now - timedelta(minutes=1), end=now, step=60,
+            group_by='label', label='team'
+        )
+        by_group = {item.group: item for item in series}
+        assert sorted(by_group["blue"].containers) == ["a", "b"]
+        assert np.nanmax(by_group["green"].values) == 50.0
+        
+        with pytest.raises(ValueError):
+            await metrics_collector.aggregate_metrics('unknown', start=now)
+        
+        # Le conteneur "c" (service db) n'est pas évincé par la limite
+        recent = await metrics_collector.get_recent_metrics(hours=1, limit=3, service_name="db")
+        assert len(recent) == 3
+        assert {m.container_id for m in recent} == {"c"}
+        for cid in labels:
+            metrics_collector.registry.containers.pop(cid)
+    
+    @pytest.mark.asyncio
+    async def test_concurrent_collection_cap(self, metrics_collector, mock_docker_manager, temp_storage):
+        """Test de la collecte parallèle bornée par max_concurrent_collections"""
+        import threading
+        import time
+        
+        lock = threading.Lock()
+        state = {'active': 0, 'peak': 0}
+        
+        def slow_stats(container_id, stream=False):
+            with lock:
+                state['active'] += 1
+                state['peak'] = max(state['peak'], state['active'])
+            time.sleep(0.05)
+            with lock:
+                state['active'] -= 1
+            return {'cpu_stats': {}, 'precpu_stats': {}, 'memory_stats': {'usage': 1, 'limit': 2}}
+        
+        mock_docker_manager.get_container_stats.side_effect = slow_stats
+        metrics_collector.use_stats_stream = False
+        metrics_collector.max_concurrent_collections = 4
+        for i in range(12):
+            metrics_collector.monitored_containers[f"c{i}"] = f"container-{i}"
+            metrics_collector.service_names[f"c{i}"] = None
+        
+        started = time.monotonic()
+        await metrics_collector._collect_cycle()
+        elapsed = time.monotonic() - started
+        
+        assert state['peak'] == 4
+        # 12 conteneurs, 4 à la fois: ~3 vagues au lieu de 12 appels successifs
+        assert elapsed < 12 * 0.05
+        
+        # Un échantillon par conteneur dans les blocs de tête
+        assert metrics_collector.tsdb.get_stats()['head_samples'] == 12
+        
+        await metrics_collector.stop()
+    
+    @pytest.mark.asyncio
+    async def test_collection_timeout_isolated(self, metrics_collector, mock_docker_manager):
+        """Test qu'un conteneur lent n'empêche pas la collecte des autres"""
+        import threading
+        
+        release = threading.Event()
+        
+        def stats(container_id, stream=False):
+            if container_id == "slow":
+                release.wait(5)
+            return {'memory_stats': {'usage': 1, 'limit': 2}}
+        
+        mock_docker_manager.get_container_stats.side_effect = stats
+        metrics_collector.use_stats_stream = False
+        metrics_collector.collection_timeout = 0.1
+        for container_id in ("slow", "fast1", "fast2"):
+            metrics_collector.monitored_containers[container_id] = container_id
+            metrics_collector.service_names[container_id] = None
+        
+        await metrics_collector._collect_cycle()
+        assert set(metrics_collector.previous_metrics) == {"fast1", "fast2"}
+        assert metrics_collector.collection_stats['timeouts'] == 1
+        
+        # La requête bloquée n'est pas relancée au cycle suivant
+        await metrics_collector._collect_cycle()
+        assert metrics_collector.collection_stats['skipped_in_flight'] == 1
+        
+        release.set()
+        await metrics_collector.stop()
+    
+    @pytest.mark.asyncio
+    async def test_stats_stream_subscription(self, metrics_collector, mock_docker_manager):
+        """Test de l'échantillonnage des flux de stats et de leur reconnexion"""
+        import threading
+        from docker.errors import NotFound
+        
+        calls = {'web': 0}
+        
+        def stats(container_id, stream=False):
+            assert stream is True
+            if container_id == "gone":
+                raise NotFound("No such container")
+            calls['web'] += 1
+            if calls['web'] == 1:
+                # Premier flux coupé après une trame
+                yield {'memory_stats': {'usage': 1, 'limit': 4}}
+                raise ConnectionError("flux interrompu")
+            while True:
+                yield {'memory_stats': {'usage': 2, 'limit': 4}}
+                threading.Event().wait(0.01)
+        
+        mock_docker_manager.get_container_stats.side_effect = stats
+        metrics_collector.monitored_containers.update({"web": "web", "gone": "gone"})
+        metrics_collector.service_names.update({"web": "web", "gone": None})
+        subscription = StatsSubscription(mock_docker_manager, "web", reconnect_delay=0.01)
+        metrics_collector.subscriptions["web"] = subscription
+        subscription.start()
+        metrics_collector.is_running = True
+        
+        # Attend la reconnexion du flux
+        for _ in range(100):
+            await metrics_collector._collect_cycle()
+            metrics = metrics_collector.previous_metrics.get("web")
+            if metrics is not None and metrics.memory_usage == 2 and "gone" not in metrics_collector.monitored_containers:
+                break
+            await asyncio.sleep(0.01)
+        
+        metrics = metrics_collector.previous_metrics["web"]
+        assert metrics.memory_percent == 50.0
+        assert metrics.service_name == "web"
+        assert metrics_collector.subscriptions["web"].reconnects >= 1
+        
+        # Le conteneur disparu est retiré du monitoring
+        assert "gone" not in metrics_collector.monitored_containers
+        assert "gone" not in metrics_collector.subscriptions
+        
+        await metrics_collector.stop()
+        assert subscription.closed
+    
+    @pytest.mark.asyncio
+    async def test_cycle_duration_histogram(self, metrics_collector):
+        """Test de l'histogramme des durées de cycle"""
+        metrics_collector.collection_interval = 0.05
+        await metrics_collector.start()
+        await asyncio.sleep(0.2)
+        await metrics_collector.stop()
+        
+        stats = metrics_collector.get_stats()['collection']
+        assert stats['cycles'] >= 2
+        assert stats['cycle_seconds']['count'] == stats['cycles']
+        assert stats['cycle_seconds']['buckets']['+Inf'] == stats['cycles']
+        assert stats['cycle_seconds']['buckets']['0.1'] == stats['cycles']
+
+class TestContainerRegistry:
+    """Tests pour le registre des conteneurs alimenté par les événements Docker"""
+    
+    @pytest.fixture
+    def mock_docker_manager(self):
+        manager = Mock(spec=DockerManager)
+        manager.list_containers.return_value = []
+        manager.get_container_info.side_effect = lambda container_id: {
+            'name': f"name-{container_id}",
+            'labels': {'com.docker.compose.service': 'web'}
+        }
+        manager.get_events.return_value = iter([])
+        return manager
+    
+    @staticmethod
+    def event(action, container_id, **attributes):
+        return {'Type': 'container', 'Action': action, 'time': 1,
+                'Actor': {'ID': container_id, 'Attributes': attributes}}
+    
+    @pytest.mark.asyncio
+    async def test_events_update_collector(self, mock_docker_manager):
+        """Test de la mise à jour du collecteur par les événements"""
+        with tempfile.TemporaryDirectory() as tmpdir:
+            registry = ContainerRegistry(mock_docker_manager)
+            collector = MetricsCollector(mock_docker_manager, tmpdir, registry=registry)
+            collector.use_stats_stream = False
+            await registry.subscribe(collector)
+            
+            await registry.handle_event(self.event('start', "c1"))
+            assert collector.monitored_containers == {"c1": "name-c1"}
+            assert collector.service_names["c1"] == "web"
+            
+            await registry.handle_event(self.event('rename', "c1", name="/renamed"))
+            assert collector.monitored_containers["c1"] == "renamed"
+            
+            await registry.handle_event(self.event('health_status: unhealthy', "c1"))
+            assert registry.get("c1").health == "unhealthy"
+            
+            await registry.handle_event(self.event('die', "c1"))
+            assert "c1" not in collector.monitored_containers
+            
+            # Redémarrage: le conteneur connu n'est pas réinspecté
+            await registry.handle_event(self.event('start', "c1"))
+            assert collector.monitored_containers == {"c1": "renamed"}
+            assert mock_docker_manager.get_container_info.call_count == 1
+            
+            await registry.handle_event(self.event('destroy', "c1"))
+            assert "c1" not in collector.monitored_containers
+            assert registry.get("c1") is None
+            
+            await registry.unsubscribe(collector)
+            assert not registry.is_running
+    
+    @pytest.mark.asyncio
+    async def test_sync_inspects_only_new_containers(self, mock_docker_manager):
+        """Test de la resynchronisation sans inspection des conteneurs connus"""
+        registry = ContainerRegistry(mock_docker_manager)
+        mock_docker_manager.list_containers.return_value = [Mock(id="c1"), Mock(id="c2")]
+        await registry.sync()
+        await registry.sync()
+        
+        mock_docker_manager.list_containers.assert_called_with(all=False, sparse=True)
+        assert {info.id for info in registry.running()} == {"c1", "c2"}
+        assert mock_docker_manager.get_container_info.call_count == 2
+        
+        mock_docker_manager.list_containers.return_value = [Mock(id="c2")]
+        await registry.sync()
+        assert [info.id for info in registry.running()] == ["c2"]
+    
+    @pytest.mark.asyncio
+    async def test_event_stream_dispatch(self, mock_docker_manager):
+        """Test du thread de suivi du flux d'événements"""
+        import threading
+        
+        release = threading.Event()
+        
+        def events(since=None, filters=None):
+            assert filters['type'] == 'container'
+            yield self.event('start', "c1")
+            release.wait(5)
+        
+        mock_docker_manager.get_events.side_effect = events
+        
+        with tempfile.TemporaryDirectory() as tmpdir:
+            collector = MetricsCollector(mock_docker_manager, tmpdir, registry=ContainerRegistry(mock_docker_manager))
+            collector.use_stats_stream = False
+            await collector.start()
+            
+            for _ in range(100):
+                if "c1" in collector.monitored_containers:
+                    break
+                await asyncio.sleep(0.01)
+            
+            assert collector.monitored_containers == {"c1": "name-c1"}
+            assert collector.registry.watching
+            
+            await collector.stop()
+            release.set()
+            assert not collector.registry.is_running
+
+class TestCgroupReader:
+    """Tests de la lecture directe des cgroups v2 (arborescence cgroupfs factice)"""
+    
+    CID = "a" * 64
+    
+    @staticmethod
+    def write_container(cgroup: Path, proc: Path, pid: int, usage_usec: int, rx_bytes: int = 2048):
+        """Fichiers d'un conteneur et de son processus principal"""
+        cgroup.mkdir(parents=True, exist_ok=True)
+        (cgroup / "cgroup.procs").write_text(f"{pid}\n")
+        (cgroup / "cpu.stat").write_text(f"usage_usec {usage_usec}\nuser_usec {usage_usec}\nsystem_usec 0\n")
+        (cgroup / "memory.current").write_text("104857600\n")
+        (cgroup / "memory.max").write_text("max\n")
+        (cgroup / "memory.stat").write_text("anon 73400320\nfile 31457280\n")
+        (cgroup / "io.stat").write_text("8:0 rbytes=4096 wbytes=8192 rios=1 wios=2 dbytes=0 dios=0\n"
+                                        "8:16 rbytes=1024 wbytes=0 rios=1 wios=0 dbytes=0 dios=0\n")
+        (cgroup / "pids.current").write_text("7\n")
+        (proc / str(pid) / "net").mkdir(parents=True, exist_ok=True)
+        (proc / str(pid) / "net" / "dev").write_text(
+            "Inter-|   Receive                                                |  Transmit\n"
+            " face |bytes    packets errs drop fifo frame compressed multicast|bytes    packets errs drop fifo colls carrier compressed\n"
+            "    lo:     999      9    0    0    0     0          0         0      999       9    0    0    0     0       0          0\n"
+            f"  eth0: {rx_bytes}      16    0    0    0     0          0         0     1024       8    0    0    0     0       0          0\n"
+        )
+    
+    @staticmethod
+    def write_host(proc: Path, total_ticks: int):
+        """/proc/stat (2 CPU) et /proc/meminfo de l'hôte"""
+        proc.mkdir(parents=True, exist_ok=True)
+        (proc / "stat").write_text(f"cpu  {total_ticks} 0 0 0 0 0 0 0 0 0\ncpu0 1 0 0 0\ncpu1 1 0 0 0\nintr 0\n")
+        (proc / "meminfo").write_text("MemTotal:        2097152 kB\nMemFree:         1048576 kB\n")
+    
+    @pytest.fixture
+    def fake_roots(self, tmp_path):
+        cgroup_root, proc_root = tmp_path / "cgroup", tmp_path / "proc"
+        cgroup_root.mkdir()
+        (cgroup_root / "cgroup.controllers").write_text("cpu io memory pids\n")
+        self.write_host(proc_root, 1000)
+        return cgroup_root, proc_root
+    
+    def test_resolve_and_read(self, fake_roots, tmp_path):
+        """Test de la résolution du cgroup et de la trame de stats produite"""
+        cgroup_root, proc_root = fake_roots
+        scope = cgroup_root / "system.slice" / f"docker-{self.CID}.scope"
+        self.write_container(scope, proc_root, 4242, usage_usec=1_000_000)
+        
+        reader = CgroupReader(cgroup_root, proc_root)
+        assert reader.available
+        assert reader.resolve(self.CID) == scope
+        assert reader.resolve("b" * 64) is None
+        assert not CgroupReader(tmp_path / "v1", proc_root).available
+        
+        # CgroupParent systemd imbriqué, retrouvé par /proc/<pid>/cgroup ou par le nom de la slice
+        nested = cgroup_root / "apps.slice" / "apps-web.slice" / f"docker-{'c' * 64}.scope"
+        self.write_container(nested, proc_root, 5151, usage_usec=0)
+        assert CgroupReader(cgroup_root, proc_root).resolve("c" * 64, cgroup_parent="apps-web.slice") == nested
+        (proc_root / "5151" / "cgroup").write_text(f"0::/apps.slice/apps-web.slice/docker-{'c' * 64}.scope\n")
+        assert CgroupReader(cgroup_root, proc_root).resolve("c" * 64, pid=5151) == nested
+        
+        first = reader.read_stats(self.CID)
+        assert first['precpu_stats'] == {}
+        # 1s de CPU du conteneur pendant 2s de CPU de l'hôte (2 CPU): 100%
+        self.write_container(scope, proc_root, 4242, usage_usec=2_000_000, rx_bytes=4096)
+        self.write_host(proc_root, 1200)
+        second = reader.read_stats(self.CID)
+        
+        collector = MetricsCollector(Mock(spec=DockerManager), str(tmp_path / "metrics"))
+        metrics = collector._parse_stats(self.CID, "web", "web", second)
+        assert metrics.cpu_usage == 2_000_000_000
+        assert metrics.cpu_percent == pytest.approx(100.0)
+        assert metrics.memory_usage == 104857600
+        assert metrics.memory_limit == 2097152 * 1024
+        assert metrics.memory_percent == pytest.approx(100 / 2048 * 100)
+        assert metrics.memory_cache == 31457280
+        assert (metrics.network_rx_bytes, metrics.network_tx_bytes) == (4096, 1024)
+        assert (metrics.network_rx_packets, metrics.network_tx_packets) == (16, 8)
+        assert (metrics.block_read_bytes, metrics.block_write_bytes) == (5120, 8192)
+        assert metrics.pids == 7
+        
+        # Limite explicite
+        (scope / "memory.max").write_text("209715200\n")
+        assert reader.read_stats(self.CID)['memory_stats']['limit'] == 209715200
+        
+        # Conteneur arrêté: cgroup supprimé
+        for path in scope.iterdir():
+            path.unlink()
+        assert reader.read_stats(self.CID) is None
+        assert reader.stats['errors'] == 1
+    
+    @pytest.mark.asyncio
+    async def test_collector_fast_path_and_fallback(self, fake_roots, tmp_path):
+        """Test de la collecte par les cgroups puis du repli sur le flux de stats Docker"""
+        import threading
+        
+        cgroup_root, proc_root = fake_roots
+        scope = cgroup_root / "system.slice" / f"docker-{self.CID}.scope"
+        self.write_container(scope, proc_root, 4242, usage_usec=1_000_000)
+        
+        def stats(container_id, stream=False):
+            while True:
+                yield {'memory_stats': {'usage': 3, 'limit': 4}}
+                threading.Event().wait(0.01)
+        
+        manager = Mock(spec=DockerManager)
+        manager.get_container_stats.side_effect = stats
+        collector = MetricsCollector(manager, str(tmp_path / "metrics"))
+        collector.cgroup_reader = CgroupReader(cgroup_root, proc_root)
+        collector.is_running = True
+        
+        collector._watch_container(ContainerInfo(id=self.CID, name="web", labels={'com.docker.compose.service': 'web'}))
+        assert self.CID in collector.cgroup_reader.paths
+        assert collector.subscriptions == {}
+        
+        await collector._collect_cycle()
+        metrics = collector.previous_metrics[self.CID]
+        assert metrics.memory_usage == 104857600
+        assert metrics.service_name == "web"
+        assert manager.get_container_stats.call_count == 0
+        
+        # Cgroup devenu illisible: le conteneur passe au flux de stats Docker
+        (scope / "cpu.stat").unlink()
+        for _ in range(100):
+            await collector._collect_cycle()
+            if collector.previous_metrics[self.CID].memory_usage == 3:
+                break
+            await asyncio.sleep(0.01)
+        
+        assert collector.previous_metrics[self.CID].memory_percent == 75.0
+        assert self.CID not in collector.cgroup_reader.paths
+        assert self.CID in collector.subscriptions
+        assert collector.get_stats()['collection']['cgroup_fallbacks'] == 1
+        
+        await collector.stop()
 
 class TestWebSocketService:
     """Tests pour le service WebSocket"""
@@ -411,10 +1092,6 @@ class TestMonitoringIntegration:
                 # Stocke et vérifie le stockage
                 await collector._store_metrics(metrics)
                 
-                date_str = metrics.timestamp.strftime('%Y-%m-%d')
-                metrics_file = Path(tmpdir) / f"metrics_{date_str}.jsonl"
-                assert metrics_file.exists()
-                
                 # Récupère les métriques récentes
                 recent_metrics = await collector.get_recent_metrics(hours=1)
                 assert len(recent_metrics) >= 1
@@ -1,9 +1,6 @@
 """
 API routes pour le système de logs centralisé avec recherche avancée
 """
-import asyncio
-import csv
-import io
 import json
 import logging
 from datetime import datetime, timedelta
@@ -15,6 +12,8 @@ from pydantic import BaseModel, Field
 
 from wakedock.core.docker_manager import DockerManager
 from wakedock.core.log_collector import LogCollector, LogLevel
+from wakedock.core.log_export import LogExporter
+from wakedock.core.log_pubsub import LEVEL_SEVERITY
 from wakedock.core.log_search_service import LogSearchService
 
 logger = logging.getLogger(__name__)
@@ -29,6 +28,8 @@ class LogEntryResponse(BaseModel):
     message: str
     source: str = "stdout"
     metadata: Dict[str, Any] = {}
+    score: Optional[float] = None
+    highlight: Optional[str] = None
 
 class LogSearchRequest(BaseModel):
     query: Optional[str] = None
@@ -38,6 +39,7 @@ class LogSearchRequest(BaseModel):
     start_time: Optional[datetime] = None
     end_time: Optional[datetime] = None
     limit: int = Field(default=1000, le=10000)
+    sort: str = Field(default="relevance", pattern="^(relevance|time)$")
 
 class LogSearchResponse(BaseModel):
     logs: List[LogEntryResponse]
@@ -59,6 +61,10 @@ class LogCollectorStatus(BaseModel):
     buffered_logs: int
     log_files: int
     storage_path: str
+    ingestion: Dict[str, Any] = {}
+    pubsub: Dict[str, Any] = {}
+    parsers: Dict[str, Any] = {}
+    retention: Dict[str, Any] = {}
 
 class LogIndexStatus(BaseModel):
     total_indexed_logs: int
@@ -67,17 +73,22 @@ class LogIndexStatus(BaseModel):
     is_running: bool
 
 class ExportRequest(BaseModel):
-    format: str = Field(default="json", pattern="^(json|csv|txt)$")
+    format: str = Field(default="json", pattern="^(json|ndjson|csv|txt|parquet)$")
+    compression: Optional[str] = Field(default=None, pattern="^(none|gzip|zstd)$")
+    include_metadata: bool = True
     container_id: Optional[str] = None
     service_name: Optional[str] = None
     level: Optional[str] = None
     start_time: Optional[datetime] = None
     end_time: Optional[datetime] = None
-    limit: int = Field(default=10000, le=50000)
+    limit: Optional[int] = Field(default=None, ge=1)  # None: toute la plage
 
 # Router
 router = APIRouter(prefix="/api/v1/logs", tags=["logs"])
 
+# Intervalle des commentaires keepalive du flux SSE
+STREAM_KEEPALIVE_SECONDS = 15
+
 # Instances globales (à injecter via dependency injection en production)
 log_collector: Optional[LogCollector] = None
 log_search_service: Optional[LogSearchService] = None
@@ -91,6 +102,9 @@ async def get_log_collector() -> LogCollector:
         if not docker_manager:
             docker_manager = DockerManager()
         log_collector = LogCollector(docker_manager)
+        if log_search_service:
+            # Les compactions et suppressions de segments mettent l'index à jour
+            log_collector.retention.add_listener(log_search_service)
         await log_collector.start()
     return log_collector
 
@@ -99,6 +113,8 @@ async def get_log_search_service() -> LogSearchService:
     global log_search_service
     if not log_search_service:
         log_search_service = LogSearchService()
+        if log_collector:
+            log_collector.retention.add_listener(log_search_service)
         await log_search_service.start()
     return log_search_service
 
@@ -168,13 +184,14 @@ async def remove_container_monitoring(
 
 @router.get("/search", response_model=LogSearchResponse)
 async def search_logs(
-    query: Optional[str] = Query(None, description="Terme de recherche"),
+    query: Optional[str] = Query(None, description="Recherche plein texte (\"phrase\", préfixe*, OR, -exclusion)"),
     container_id: Optional[str] = Query(None, description="ID du conteneur"),
     service_name: Optional[str] = Query(None, description="Nom du service"),
     level: Optional[str] = Query(None, description="Niveau de log"),
     start_time: Optional[datetime] = Query(None, description="Date de début"),
     end_time: Optional[datetime] = Query(None, description="Date de fin"),
     limit: int = Query(1000, le=10000, description="Limite de résultats"),
+    sort: str = Query("relevance", pattern="^(relevance|time)$", description="Tri: pertinence (BM25) ou date"),
     search_service: LogSearchService = Depends(get_log_search_service)
 ):
     """Recherche dans les logs avec filtrage avancé"""
@@ -197,7 +214,8 @@ async def search_logs(
             start_time=start_time,
             end_time=end_time,
             level=log_level,
-            limit=limit + 1  # +1 pour détecter s'il y a plus de résultats
+            limit=limit + 1,  # +1 pour détecter s'il y a plus de résultats
+            sort=sort
         )
         
         # Convertit les résultats
@@ -210,7 +228,9 @@ async def search_logs(
                 container_name=result['container_name'],
                 service_name=result['service_name'],
                 message=result['message'],
-                metadata=result['metadata']
+                metadata=result['metadata'],
+                score=result.get('score'),
+                highlight=result.get('highlight')
             ))
         
         search_time_ms = int((datetime.now() - start_search).total_seconds() * 1000)
@@ -254,7 +274,8 @@ async def search_logs_post(
             start_time=request.start_time,
             end_time=request.end_time,
             level=log_level,
-            limit=request.limit + 1
+            limit=request.limit + 1,
+            sort=request.sort
         )
         
         # Convertit les résultats
@@ -267,7 +288,9 @@ async def search_logs_post(
                 container_name=result['container_name'],
                 service_name=result['service_name'],
                 message=result['message'],
-                metadata=result['metadata']
+                metadata=result['metadata'],
+                score=result.get('score'),
+                highlight=result.get('highlight')
             ))
         
         search_time_ms = int((datetime.now() - start_search).total_seconds() * 1000)
@@ -286,6 +309,23 @@ async def search_logs_post(
         logger.error(f"Erreur lors de la recherche POST: {e}")
         raise HTTPException(status_code=500, detail=str(e))
 
+def _entry_key(log_entry) -> tuple:
+    """Identifie une entrée de log (sans identifiant propre) pour le dédoublonnage"""
+    return (log_entry.timestamp, log_entry.container_id, log_entry.source, log_entry.message)
+
+def _format_sse_entry(log_entry) -> str:
+    """Formate une entrée de log en événement SSE"""
+    log_data = {
+        'timestamp': log_entry.timestamp.isoformat(),
+        'level': log_entry.level.value,
+        'container_id': log_entry.container_id,
+        'container_name': log_entry.container_name,
+        'service_name': log_entry.service_name,
+        'message': log_entry.message,
+        'metadata': log_entry.metadata
+    }
+    return f"data: {json.dumps(log_data)}\n\n"
+
 @router.get("/stream")
 async def stream_logs(
     container_id: Optional[str] = Query(None, description="ID du conteneur"),
@@ -297,71 +337,74 @@ async def stream_logs(
     
     async def generate_logs():
         """Générateur de logs en streaming"""
+        # Convertit le niveau en enum si fourni
+        min_level = None
+        if level:
+            try:
+                min_level = LogLevel(level.lower())
+            except ValueError:
+                yield f"data: {json.dumps({'error': f'Niveau de log invalide: {level}'})}\n\n"
+                return
+        
+        # S'abonne avant de relire l'historique pour ne rien manquer entre les deux
+        subscription = collector.pubsub.subscribe(container_id=container_id, min_level=min_level) if follow else None
+        
         try:
-            # Convertit le niveau en enum si fourni
-            min_level = None
-            if level:
-                try:
-                    min_level = LogLevel(level.lower())
-                except ValueError:
-                    yield f"data: {json.dumps({'error': f'Niveau de log invalide: {level}'})}\n\n"
-                    return
-            
-            # Stream les logs existants d'abord
+            # Stream les logs existants d'abord (derniers 100, ordre chronologique)
+            history = []
             async for log_entry in collector.get_logs(
                 container_id=container_id,
-                limit=100  # Derniers 100 logs
+                limit=100
             ):
                 # Filtre par niveau si spécifié
-                if min_level and log_entry.level.value < min_level.value:
+                if min_level and LEVEL_SEVERITY[log_entry.level.value] < LEVEL_SEVERITY[min_level.value]:
                     continue
-                
-                log_data = {
-                    'timestamp': log_entry.timestamp.isoformat(),
-                    'level': log_entry.level.value,
-                    'container_id': log_entry.container_id,
-                    'container_name': log_entry.container_name,
-                    'service_name': log_entry.service_name,
-                    'message': log_entry.message,
-                    'metadata': log_entry.metadata
-                }
-                
-                yield f"data: {json.dumps(log_data)}\n\n"
+                history.append(log_entry)
+            
+            for log_entry in reversed(history):
+                yield _format_sse_entry(log_entry)
+            
+            # Les entrées publiées pendant la relecture y figurent peut-être déjà:
+            # seules celles effectivement relues sont ignorées (pas de coupure sur
+            # un timestamp commun, les horloges des conteneurs pouvant diverger)
+            replayed_keys = {_entry_key(log_entry) for log_entry in history}
             
-            # Si follow=True, continue à streamer les nouveaux logs
-            if follow:
-                # Cette partie nécessiterait une implémentation de queue en temps réel
-                # Pour l'instant, on simule avec un polling
-                last_check = datetime.utcnow()
-                while True:
-                    await asyncio.sleep(1)  # Check chaque seconde
+            # Si follow=True, diffuse les nouveaux logs publiés par le collecteur
+            if subscription:
+                dropped = 0
+                while not subscription.closed:
+                    log_entries = await subscription.get(timeout=STREAM_KEEPALIVE_SECONDS)
+                    if not log_entries:
+                        if not subscription.closed:
+                            # Commentaire SSE pour maintenir la connexion
+                            yield ": keepalive\n\n"
+                        continue
                     
-                    # Récupère les nouveaux logs depuis la dernière vérification
-                    async for log_entry in collector.get_logs(
-                        container_id=container_id,
-                        start_time=last_check,
-                        limit=50
-                    ):
-                        if min_level and log_entry.level.value < min_level.value:
+                    if subscription.dropped > dropped:
+                        yield f"event: dropped\ndata: {json.dumps({'dropped': subscription.dropped - dropped})}\n\n"
+                        dropped = subscription.dropped
+                    
+                    if replayed_keys:
+                        fresh = []
+                        for log_entry in log_entries:
+                            key = _entry_key(log_entry)
+                            if key in replayed_keys:
+                                # Chaque entrée relue n'est reçue qu'une fois du flux
+                                replayed_keys.discard(key)
+                            else:
+                                fresh.append(log_entry)
+                        log_entries = fresh
+                        if not log_entries:
                             continue
-                        
-                        log_data = {
-                            'timestamp': log_entry.timestamp.isoformat(),
-                            'level': log_entry.level.value,
-                            'container_id': log_entry.container_id,
-                            'container_name': log_entry.container_name,
-                            'service_name': log_entry.service_name,
-                            'message': log_entry.message,
-                            'metadata': log_entry.metadata
-                        }
-                        
-                        yield f"data: {json.dumps(log_data)}\n\n"
                     
-                    last_check = datetime.utcnow()
+                    yield "".join(_format_sse_entry(log_entry) for log_entry in log_entries)
                     
         except Exception as e:
             logger.error(f"Erreur dans le streaming: {e}")
             yield f"data: {json.dumps({'error': str(e)})}\n\n"
+        finally:
+            if subscription:
+                subscription.close()
     
     return StreamingResponse(
         generate_logs(),
@@ -425,7 +468,7 @@ async def export_logs(
     request: ExportRequest,
     search_service: LogSearchService = Depends(get_log_search_service)
 ):
-    """Exporte les logs dans différents formats"""
+    """Exporte les logs en flux (transfert chunked, compression optionnelle)"""
     try:
         # Convertit le niveau en enum si fourni
         log_level = None
@@ -435,9 +478,17 @@ async def export_logs(
             except ValueError:
                 raise HTTPException(status_code=400, detail=f"Niveau de log invalide: {request.level}")
         
-        # Récupère les logs
-        results = await search_service.search_logs(
-            query=None,  # Pas de recherche textuelle pour l'export
+        try:
+            exporter = LogExporter(
+                format=request.format,
+                compression=request.compression,
+                include_metadata=request.include_metadata
+            )
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+        
+        # Les entrées sont lues page par page depuis l'index pendant l'envoi
+        records = search_service.iter_logs(
             container_id=request.container_id,
             service_name=request.service_name,
             start_time=request.start_time,
@@ -446,50 +497,10 @@ async def export_logs(
             limit=request.limit
         )
         
-        # Génère le contenu selon le format
-        if request.format == "json":
-            content = json.dumps(results, indent=2, default=str)
-            media_type = "application/json"
-            filename = f"logs_{datetime.now().strftime('%Y%m%d_%H%M%S')}.json"
-            
-        elif request.format == "csv":
-            output = io.StringIO()
-            if results:
-                fieldnames = ['timestamp', 'level', 'container_name', 'service_name', 'message']
-                writer = csv.DictWriter(output, fieldnames=fieldnames)
-                writer.writeheader()
-                
-                for result in results:
-                    writer.writerow({
-                        'timestamp': result['timestamp'],
-                        'level': result['level'],
-                        'container_name': result['container_name'],
-                        'service_name': result['service_name'] or '',
-                        'message': result['message']
-                    })
-            
-            content = output.getvalue()
-            media_type = "text/csv"
-            filename = f"logs_{datetime.now().strftime('%Y%m%d_%H%M%S')}.csv"
-            
-        elif request.format == "txt":
-            lines = []
-            for result in results:
-                line = f"[{result['timestamp']}] [{result['level'].upper()}] {result['container_name']}: {result['message']}"
-                lines.append(line)
-            
-            content = "\n".join(lines)
-            media_type = "text/plain"
-            filename = f"logs_{datetime.now().strftime('%Y%m%d_%H%M%S')}.txt"
-        
-        else:
-            raise HTTPException(status_code=400, detail=f"Format d'export non supporté: {request.format}")
-        
-        # Retourne le fichier
         return StreamingResponse(
-            io.BytesIO(content.encode()),
-            media_type=media_type,
-            headers={"Content-Disposition": f"attachment; filename={filename}"}
+            exporter.stream(records),
+            media_type=exporter.media_type,
+            headers={"Content-Disposition": f"attachment; filename={exporter.filename()}"}
         )
         
     except HTTPException:
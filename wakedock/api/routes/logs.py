@@ -5,8 +5,9 @@ import asyncio
 import json
 import logging
 from datetime import datetime, timedelta
+from itertools import islice
 from pathlib import Path
-from typing import Any, AsyncGenerator, Dict, List, Optional
+from typing import Any, AsyncGenerator, Dict, Iterator, List, Optional
 
 from fastapi import APIRouter, Depends, HTTPException, Query, status
 from fastapi.responses import StreamingResponse
@@ -14,6 +15,7 @@ from pydantic import BaseModel, Field
 
 from wakedock.api.auth.dependencies import get_current_user
 from wakedock.core.docker_manager import DockerManager
+from wakedock.core.log_export import APPLICATION_LOG_LAYOUT, LogExporter
 
 logger = logging.getLogger(__name__)
 
@@ -43,10 +45,12 @@ class LogFilter(BaseModel):
     limit: int = Field(default=1000, ge=1, le=10000)
 
 class LogExportRequest(BaseModel):
-    """Requête d'export de logs"""
+    """Requête d'export de logs (filters.limit ne s'applique pas, voir limit)"""
     filters: LogFilter
-    format: str = Field(default="json", regex="^(json|csv|txt)$")
+    format: str = Field(default="json", regex="^(json|ndjson|csv|txt|parquet)$")
+    compression: Optional[str] = Field(default=None, regex="^(none|gzip|zstd)$")
     include_metadata: bool = True
+    limit: Optional[int] = Field(default=None, ge=1)  # None: tous les logs filtrés
 
 class ContainerLogRequest(BaseModel):
     """Requête de logs de conteneur"""
@@ -117,6 +121,38 @@ class LogManager:
         
         return None
     
+    def matches(self, log: LogEntry, filters: LogFilter) -> bool:
+        """Vérifie qu'une entrée satisfait les filtres (hors limite)"""
+        if filters.start_time and log.timestamp < filters.start_time:
+            return False
+        if filters.end_time and log.timestamp > filters.end_time:
+            return False
+        if filters.level and log.level != filters.level:
+            return False
+        if filters.service and log.service != filters.service:
+            return False
+        if filters.container_id and log.container_id != filters.container_id:
+            return False
+        if filters.search_text and filters.search_text.lower() not in log.message.lower():
+            return False
+        return True
+    
+    def iter_logs(self, filters: LogFilter, limit: Optional[int] = None) -> Iterator[LogEntry]:
+        """Parcourt les fichiers ligne à ligne sans charger les logs en mémoire"""
+        count = 0
+        for log_file in self.get_log_files():
+            try:
+                with open(log_file, 'r') as f:
+                    for line in f:
+                        entry = self.parse_log_entry(line)
+                        if entry and self.matches(entry, filters):
+                            yield entry
+                            count += 1
+                            if limit is not None and count >= limit:
+                                return
+            except OSError as e:
+                logger.warning(f"Erreur lors de la lecture du fichier {log_file}: {e}")
+    
     def filter_logs(self, logs: List[LogEntry], filters: LogFilter) -> List[LogEntry]:
         """Filtre les logs selon les critères"""
         filtered = logs
@@ -291,97 +327,41 @@ async def export_logs(
     current_user = Depends(get_current_user)
 ):
     """
-    Exporte les logs dans différents formats
+    Exporte les logs dans différents formats, en flux
     """
     try:
-        # Récupérer les logs filtrés
-        all_logs = []
-        for log_file in log_manager.get_log_files():
-            try:
-                with open(log_file, 'r') as f:
-                    for line in f:
-                        entry = log_manager.parse_log_entry(line)
-                        if entry:
-                            all_logs.append(entry)
-            except Exception as e:
-                logger.warning(f"Erreur lors de la lecture du fichier {log_file}: {e}")
-        
-        # Filtrer
-        filtered_logs = log_manager.filter_logs(all_logs, request.filters)
-        
-        # Générer le contenu selon le format
-        if request.format == "json":
-            content = json.dumps([
-                {
-                    "timestamp": log.timestamp.isoformat(),
+        exporter = LogExporter(
+            format=request.format,
+            compression=request.compression,
+            include_metadata=request.include_metadata,
+            layout=APPLICATION_LOG_LAYOUT
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+    
+    async def records():
+        # Lecture des fichiers hors de la boucle, par lots
+        loop = asyncio.get_running_loop()
+        entries = log_manager.iter_logs(request.filters, request.limit)
+        while True:
+            batch = await loop.run_in_executor(None, lambda: list(islice(entries, 1000)))
+            if not batch:
+                break
+            for log in batch:
+                yield {
+                    "timestamp": log.timestamp,
                     "level": log.level,
                     "message": log.message,
                     "service": log.service,
                     "container_id": log.container_id,
-                    **(log.metadata if request.include_metadata else {})
+                    "metadata": log.metadata
                 }
-                for log in filtered_logs
-            ], indent=2)
-            media_type = "application/json"
-            filename = f"logs_{datetime.now().strftime('%Y%m%d_%H%M%S')}.json"
-            
-        elif request.format == "csv":
-            import csv
-            import io
-            
-            output = io.StringIO()
-            writer = csv.writer(output)
-            
-            # En-têtes
-            headers = ["timestamp", "level", "message", "service", "container_id"]
-            if request.include_metadata:
-                headers.append("metadata")
-            writer.writerow(headers)
-            
-            # Données
-            for log in filtered_logs:
-                row = [
-                    log.timestamp.isoformat(),
-                    log.level,
-                    log.message,
-                    log.service or "",
-                    log.container_id or ""
-                ]
-                if request.include_metadata:
-                    row.append(json.dumps(log.metadata))
-                writer.writerow(row)
-            
-            content = output.getvalue()
-            media_type = "text/csv"
-            filename = f"logs_{datetime.now().strftime('%Y%m%d_%H%M%S')}.csv"
-            
-        else:  # txt
-            lines = []
-            for log in filtered_logs:
-                line = f"{log.timestamp.isoformat()} [{log.level}] {log.message}"
-                if log.service:
-                    line += f" (service: {log.service})"
-                if log.container_id:
-                    line += f" (container: {log.container_id})"
-                lines.append(line)
-            
-            content = "\n".join(lines)
-            media_type = "text/plain"
-            filename = f"logs_{datetime.now().strftime('%Y%m%d_%H%M%S')}.txt"
-        
-        # Retourner le fichier
-        return StreamingResponse(
-            io.BytesIO(content.encode()),
-            media_type=media_type,
-            headers={"Content-Disposition": f"attachment; filename={filename}"}
-        )
-        
-    except Exception as e:
-        logger.error(f"Erreur lors de l'export des logs: {e}")
-        raise HTTPException(
-            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
-            detail=f"Erreur d'export: {str(e)}"
-        )
+    
+    return StreamingResponse(
+        exporter.stream(records()),
+        media_type=exporter.media_type,
+        headers={"Content-Disposition": f"attachment; filename={exporter.filename()}"}
+    )
 
 @router.post("/containers/logs")
 async def get_container_logs(
@@ -2,10 +2,11 @@
 Routes API pour le monitoring temps réel des conteneurs Docker
 """
 import logging
-from datetime import datetime
+from datetime import datetime, timedelta
 from typing import Dict, List, Optional
 from uuid import uuid4
 
+import numpy as np
 from fastapi import (
     APIRouter,
     Body,
@@ -17,12 +18,14 @@ from fastapi import (
 from pydantic import BaseModel, Field
 
 from wakedock.core.docker_manager import get_docker_manager
+from wakedock.core.log_storage import from_micros
 from wakedock.core.metrics_collector import (
     Alert,
     AlertLevel,
     MetricsCollector,
     MetricType,
 )
+from wakedock.core.metrics_query import counter_increase
 from wakedock.core.websocket_service import MetricsWebSocketService
 
 logger = logging.getLogger(__name__)
@@ -175,17 +178,14 @@ async def get_metrics(
     try:
         collector = await get_metrics_collector()
         
-        # Récupère les métriques
+        # Récupère les métriques (filtrées par service avant la limite)
         metrics = await collector.get_recent_metrics(
             container_id=container_id,
             hours=hours,
-            limit=limit
+            limit=limit,
+            service_name=service_name
         )
         
-        # Filtre par service si spécifié
-        if service_name:
-            metrics = [m for m in metrics if m.service_name == service_name]
-        
         # Convertit en dictionnaires
         return [metric.to_dict() for metric in metrics]
         
@@ -204,19 +204,68 @@ async def query_metrics(query: MetricsQuery):
         metrics = await collector.get_recent_metrics(
             container_id=query.container_id,
             hours=query.hours,
-            limit=query.limit
+            limit=query.limit,
+            service_name=query.service_name
         )
         
-        # Filtre par service si spécifié
-        if query.service_name:
-            metrics = [m for m in metrics if m.service_name == query.service_name]
-        
         return [metric.to_dict() for metric in metrics]
         
     except Exception as e:
         logger.error(f"Erreur lors de la requête de métriques: {e}")
         raise HTTPException(status_code=500, detail=str(e))
 
+@router.get("/metrics/series", response_model=Dict)
+async def get_metric_series(
+    metric: str = Query(..., description="Champ de métrique (ex: cpu_percent, network_rx_bytes)"),
+    aggregation: str = Query("avg", pattern="^(avg|max|rate|percentile)$", description="Agrégation"),
+    group_by: str = Query("container", pattern="^(container|service|label)$", description="Regroupement"),
+    label: Optional[str] = Query(None, description="Label Docker pour group_by=label"),
+    step: int = Query(60, ge=1, le=86400, description="Pas des intervalles en secondes"),
+    hours: float = Query(1, gt=0, le=8760, description="Période en heures"),
+    percentile: float = Query(95.0, ge=0, le=100, description="Percentile pour aggregation=percentile"),
+    container_id: Optional[str] = Query(None, description="ID du conteneur"),
+    service_name: Optional[str] = Query(None, description="Nom du service")
+):
+    """
+    Série agrégée d'une métrique, calculée côté serveur
+    
+    Les intervalles de step secondes partagent un axe de temps commun; chaque
+    groupe a un tableau de valeurs (null si aucune mesure). Le palier
+    d'agrégats le plus grossier compatible avec step est utilisé.
+    """
+    try:
+        collector = await get_metrics_collector()
+        
+        end = datetime.utcnow()
+        start = end - timedelta(hours=hours)
+        timestamps, series = await collector.aggregate_metrics(
+            metric,
+            start=start,
+            end=end,
+            step=step,
+            aggregation=aggregation,
+            group_by=group_by,
+            label=label,
+            percentile=percentile,
+            container_id=container_id,
+            service_name=service_name
+        )
+        
+        return {
+            "metric": metric,
+            "aggregation": aggregation,
+            "group_by": group_by,
+            "step": step,
+            "timestamps": [from_micros(ts).isoformat() for ts in timestamps.tolist()],
+            "series": [item.to_dict() for item in series]
+        }
+        
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        logger.error(f"Erreur lors de l'agrégation des métriques: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+
 @router.get("/metrics/{container_id}/latest", response_model=Dict)
 async def get_latest_metrics(container_id: str):
     """
@@ -412,7 +461,9 @@ async def get_monitored_containers():
                     "cpu_percent": metric.cpu_percent,
                     "memory_percent": metric.memory_percent,
                     "network_rx_mb": metric.network_rx_bytes / 1024 / 1024,
-                    "network_tx_mb": metric.network_tx_bytes / 1024 / 1024
+                    "network_tx_mb": metric.network_tx_bytes / 1024 / 1024,
+                    "network_rx_rate": metric.network_rx_rate,
+                    "network_tx_rate": metric.network_tx_rate
                 })
             
             containers.append(container_info)
@@ -446,19 +497,30 @@ async def get_monitoring_statistics():
             "info": len([a for a in recent_alerts if a.level == AlertLevel.INFO])
         }
         
-        # Métriques récentes pour calculer des moyennes
-        recent_metrics = await collector.get_recent_metrics(hours=1, limit=1000)
+        # Colonnes de la dernière heure, toutes mesures comprises
+        fields = ['cpu_percent', 'memory_percent', 'network_rx_bytes', 'network_tx_bytes',
+                  'network_rx_rate', 'network_tx_rate']
+        recent_series = await collector.query_metrics(
+            start=datetime.utcnow() - timedelta(hours=1),
+            fields=fields
+        )
+        columns = {
+            name: np.concatenate([s.columns[name] for s in recent_series]) if recent_series else np.empty(0)
+            for name in fields
+        }
+        metrics_count = len(columns['cpu_percent'])
         
         avg_cpu = 0
         avg_memory = 0
         total_network_rx = 0
         total_network_tx = 0
         
-        if recent_metrics:
-            avg_cpu = sum(m.cpu_percent for m in recent_metrics) / len(recent_metrics)
-            avg_memory = sum(m.memory_percent for m in recent_metrics) / len(recent_metrics)
-            total_network_rx = sum(m.network_rx_bytes for m in recent_metrics) / 1024 / 1024
-            total_network_tx = sum(m.network_tx_bytes for m in recent_metrics) / 1024 / 1024
+        if metrics_count:
+            avg_cpu = float(columns['cpu_percent'].mean())
+            avg_memory = float(columns['memory_percent'].mean())
+            # Trafic de l'heure: accroissement des compteurs de chaque conteneur
+            total_network_rx = sum(counter_increase(s.columns['network_rx_bytes']) for s in recent_series) / 1024 / 1024
+            total_network_tx = sum(counter_increase(s.columns['network_tx_bytes']) for s in recent_series) / 1024 / 1024
         
         return {
             "collector": collector_stats,
@@ -472,7 +534,9 @@ async def get_monitoring_statistics():
                 "avg_memory_percent": round(avg_memory, 2),
                 "total_network_rx_mb": round(total_network_rx, 2),
                 "total_network_tx_mb": round(total_network_tx, 2),
-                "metrics_count_last_hour": len(recent_metrics)
+                "avg_network_rx_rate": round(float(columns['network_rx_rate'].mean()), 2) if metrics_count else 0,
+                "avg_network_tx_rate": round(float(columns['network_tx_rate'].mean()), 2) if metrics_count else 0,
+                "metrics_count_last_hour": metrics_count
             }
         }
         
@@ -243,9 +243,11 @@ class AdvancedAnalyticsService:
         """Analyse les tendances de performance"""
         try:
             # Récupère les métriques récentes
+            # Agrégats 5 minutes: toute la période pour chaque conteneur
             metrics = await self.metrics_collector.get_recent_metrics(
                 hours=self.trend_analysis_hours,
-                limit=10000
+                limit=100000,
+                resolution=300
             )
             
             if len(metrics) < 10:
@@ -384,27 +386,9 @@ class AdvancedAnalyticsService:
     async def _analyze_network_trend(self, metrics: List[ContainerMetrics], container_id: str) -> Optional[PerformanceTrend]:
         """Analyse la tendance du trafic réseau combiné"""
         try:
-            # Calcule le trafic total (RX + TX) en MB/s
-            values = []
-            timestamps = []
-            
-            for i in range(1, len(metrics)):
-                prev_metric = metrics[i-1]
-                curr_metric = metrics[i]
-                
-                time_diff = (curr_metric.timestamp - prev_metric.timestamp).total_seconds()
-                if time_diff <= 0:
-                    continue
-                
-                # Calcule le débit en MB/s
-                rx_diff = curr_metric.network_rx_bytes - prev_metric.network_rx_bytes
-                tx_diff = curr_metric.network_tx_bytes - prev_metric.network_tx_bytes
-                total_bytes = max(0, rx_diff + tx_diff)
-                
-                mbps = (total_bytes / 1024 / 1024) / time_diff
-                
-                values.append(mbps)
-                timestamps.append(curr_metric.timestamp.timestamp())
+            # Trafic total (RX + TX) en MB/s, débits calculés à l'ingestion
+            values = [(m.network_rx_rate + m.network_tx_rate) / 1024 / 1024 for m in metrics]
+            timestamps = [m.timestamp.timestamp() for m in metrics]
             
             if len(values) < 5:
                 return None
@@ -697,7 +681,8 @@ class AdvancedAnalyticsService:
             # Récupère les métriques de la période
             metrics = await self.metrics_collector.get_recent_metrics(
                 hours=24,
-                limit=50000
+                limit=100000,
+                resolution=300
             )
             
             if not metrics:
@@ -708,7 +693,18 @@ class AdvancedAnalyticsService:
             total_containers = len(set(m.container_id for m in metrics))
             avg_cpu = sum(m.cpu_percent for m in metrics) / len(metrics)
             avg_memory = sum(m.memory_percent for m in metrics) / len(metrics)
-            total_network_gb = sum((m.network_rx_bytes + m.network_tx_bytes) for m in metrics) / 1024**3
+            # Trafic de la période: somme des accroissements calculés à l'ingestion
+            # (remises à zéro et mesures manquées comprises), moyenne x nombre de mesures
+            deltas = await self.metrics_collector.query_metrics(
+                start=period_start,
+                end=period_end,
+                fields=['network_rx_delta', 'network_tx_delta'],
+                step=300
+            )
+            total_network_gb = sum(
+                float(np.sum((series.columns['network_rx_delta'] + series.columns['network_tx_delta']) * series.columns['count']))
+                for series in deltas
+            ) / 1024**3
             
             # Trouve les top consommateurs
             container_stats = {}
@@ -366,6 +366,8 @@ class AlertsService:
                 'memory_percent': metric.memory_percent,
                 'network_rx_bytes': metric.network_rx_bytes,
                 'network_tx_bytes': metric.network_tx_bytes,
+                'network_rx_rate': getattr(metric, 'network_rx_rate', 0.0),
+                'network_tx_rate': getattr(metric, 'network_tx_rate', 0.0),
                 'container_name': metric.container_name,
                 'service_name': metric.service_name
             })
@@ -470,6 +472,17 @@ class AlertsService:
             return metric.network_tx_bytes
         elif metric_type == 'network_total_bytes':
             return metric.network_rx_bytes + metric.network_tx_bytes
+        # Débits par seconde calculés à l'ingestion par le collecteur
+        elif metric_type == 'network_rx_rate':
+            return metric.network_rx_rate
+        elif metric_type == 'network_tx_rate':
+            return metric.network_tx_rate
+        elif metric_type == 'network_total_rate':
+            return metric.network_rx_rate + metric.network_tx_rate
+        elif metric_type == 'block_read_rate':
+            return metric.block_read_rate
+        elif metric_type == 'block_write_rate':
+            return metric.block_write_rate
         
         return None
     
@@ -0,0 +1,224 @@
+"""
+Lecture directe des compteurs cgroup v2 des conteneurs
+
+Chaque requête /stats fait travailler le daemon Docker, qui lit lui-même ces
+fichiers. Sur un hôte en cgroup v2, le collecteur peut les lire directement
+sous /sys/fs/cgroup: cpu.stat, memory.current, memory.max, memory.stat,
+io.stat et pids.current. Le trafic réseau, qui ne dépend pas du cgroup, est
+lu dans /proc/<pid>/net/dev d'un processus du conteneur.
+
+Le répertoire cgroup d'un conteneur est résolu une fois, à partir des
+informations d'inspection (pid, CgroupParent). Les compteurs sont renvoyés
+sous la forme d'une trame de stats Docker (cpu_stats/precpu_stats,
+memory_stats...) pour être analysés comme les trames du daemon. Quand le
+cgroup n'est pas lisible (hôte en cgroup v1, /proc de l'hôte non monté,
+conteneur arrêté), le collecteur revient à l'API Docker.
+"""
+import logging
+import os
+import time
+from pathlib import Path
+from typing import Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+CGROUP_ROOT = Path("/sys/fs/cgroup")
+PROC_ROOT = Path("/proc")
+
+# /proc/stat compte en ticks d'horloge (USER_HZ), Docker en nanosecondes
+_NS_PER_TICK = 1_000_000_000 // os.sysconf('SC_CLK_TCK')
+
+
+def _read_int(path: Path) -> int:
+    return int(path.read_text().strip())
+
+
+def _read_keyed(path: Path) -> Dict[str, int]:
+    """Fichier de la forme 'clé valeur' par ligne (cpu.stat, memory.stat)"""
+    values = {}
+    for line in path.read_text().splitlines():
+        key, _, value = line.partition(' ')
+        if value:
+            values[key] = int(value)
+    return values
+
+
+def parse_io_stat(text: str) -> List[Dict]:
+    """Convertit io.stat au format io_service_bytes_recursive de Docker"""
+    entries = []
+    for line in text.splitlines():
+        device, *pairs = line.split()
+        major, _, minor = device.partition(':')
+        counters = dict(pair.split('=', 1) for pair in pairs)
+        for op, key in (('read', 'rbytes'), ('write', 'wbytes')):
+            if key in counters:
+                entries.append({'major': int(major), 'minor': int(minor), 'op': op, 'value': int(counters[key])})
+    return entries
+
+
+def parse_net_dev(text: str) -> Dict[str, Dict[str, int]]:
+    """Convertit /proc/<pid>/net/dev au format networks de Docker (hors loopback)"""
+    networks = {}
+    for line in text.splitlines()[2:]:
+        interface, _, counters = line.partition(':')
+        interface = interface.strip()
+        if not counters or interface == 'lo':
+            continue
+        values = [int(value) for value in counters.split()]
+        networks[interface] = {
+            'rx_bytes': values[0],
+            'rx_packets': values[1],
+            'tx_bytes': values[8],
+            'tx_packets': values[9]
+        }
+    return networks
+
+
+class CgroupReader:
+    """Lecteur des compteurs cgroup v2 des conteneurs, au format des trames de stats Docker"""
+
+    def __init__(self, cgroup_root: Path = CGROUP_ROOT, proc_root: Path = PROC_ROOT):
+        self.cgroup_root = Path(cgroup_root)
+        self.proc_root = Path(proc_root)
+        # Hiérarchie unifiée (cgroup v2) montée à la racine
+        self.available = (self.cgroup_root / "cgroup.controllers").exists()
+        # Conteneur -> répertoire cgroup résolu
+        self.paths: Dict[str, Path] = {}
+        self._precpu: Dict[str, Dict] = {}
+        self.stats = {'resolved': 0, 'unresolved': 0, 'reads': 0, 'errors': 0}
+
+    def resolve(self, container_id: str, pid: Optional[int] = None,
+                cgroup_parent: Optional[str] = None) -> Optional[Path]:
+        """
+        Répertoire cgroup d'un conteneur, ou None s'il n'est pas lisible
+
+        Le cgroup du processus principal (/proc/<pid>/cgroup) est utilisé
+        s'il désigne bien ce conteneur; sinon les emplacements des pilotes
+        systemd et cgroupfs de Docker sont essayés, sous CgroupParent s'il
+        est défini. Les compteurs réseau exigent en plus un processus du
+        conteneur visible dans proc_root.
+        """
+        if not self.available:
+            return None
+        path = self.paths.get(container_id)
+        if path is not None:
+            return path
+
+        for candidate in self._candidates(container_id, pid, cgroup_parent):
+            if (candidate / "cpu.stat").exists() and self._container_pid(candidate) is not None:
+                self.paths[container_id] = candidate
+                self.stats['resolved'] += 1
+                logger.debug(f"Cgroup de {container_id[:12]}: {candidate}")
+                return candidate
+
+        self.stats['unresolved'] += 1
+        return None
+
+    def _candidates(self, container_id: str, pid: Optional[int], cgroup_parent: Optional[str]) -> List[Path]:
+        candidates = []
+        if pid:
+            try:
+                for line in (self.proc_root / str(pid) / "cgroup").read_text().splitlines():
+                    # Hiérarchie unifiée: "0::/system.slice/docker-<id>.scope"
+                    if line.startswith("0::") and container_id in line:
+                        candidates.append(self.cgroup_root / line[3:].lstrip('/'))
+            except OSError:
+                pass
+
+        parent = (cgroup_parent or '').strip('/')
+        if parent.endswith('.slice'):
+            # Pilote systemd: "a-b.slice" est imbriqué dans "a.slice"
+            parts = parent[:-len('.slice')].split('-')
+            slices = ['-'.join(parts[:i + 1]) + '.slice' for i in range(len(parts))]
+            candidates.append(self.cgroup_root.joinpath(*slices, f"docker-{container_id}.scope"))
+        elif parent:
+            candidates.append(self.cgroup_root / parent / container_id)
+        candidates.append(self.cgroup_root / "system.slice" / f"docker-{container_id}.scope")
+        candidates.append(self.cgroup_root / "docker" / container_id)
+        return candidates
+
+    def _container_pid(self, path: Path) -> Optional[int]:
+        """Un processus du cgroup dont l'espace de noms réseau est lisible"""
+        try:
+            for line in (path / "cgroup.procs").read_text().split():
+                if (self.proc_root / line / "net" / "dev").exists():
+                    return int(line)
+        except OSError:
+            pass
+        return None
+
+    def forget(self, container_id: str):
+        self.paths.pop(container_id, None)
+        self._precpu.pop(container_id, None)
+
+    def read_stats(self, container_id: str) -> Optional[Dict]:
+        """
+        Trame de stats Docker d'un conteneur résolu, ou None si son cgroup n'est plus lisible
+
+        precpu_stats reprend les compteurs CPU de la lecture précédente.
+        """
+        path = self.paths.get(container_id)
+        if path is None:
+            return None
+        try:
+            frame = self._read(path)
+        except (OSError, ValueError, IndexError, KeyError) as e:
+            self.stats['errors'] += 1
+            logger.debug(f"Cgroup de {container_id[:12]} illisible: {e}")
+            return None
+
+        frame['precpu_stats'] = self._precpu.get(container_id, {})
+        self._precpu[container_id] = frame['cpu_stats']
+        self.stats['reads'] += 1
+        return frame
+
+    def _read(self, path: Path) -> Dict:
+        pid = self._container_pid(path)
+        if pid is None:
+            raise OSError(f"aucun processus lisible dans {path}")
+
+        cpu = _read_keyed(path / "cpu.stat")
+        memory_stat = _read_keyed(path / "memory.stat")
+        memory_max = (path / "memory.max").read_text().strip()
+        system_usage, online_cpus = self._system_cpu()
+
+        return {
+            'cpu_stats': {
+                'cpu_usage': {'total_usage': cpu['usage_usec'] * 1000},
+                'system_cpu_usage': system_usage,
+                'online_cpus': online_cpus
+            },
+            'memory_stats': {
+                'usage': _read_int(path / "memory.current"),
+                'limit': self._memory_total() if memory_max == 'max' else int(memory_max),
+                # 'cache' est le nom cgroup v1 lu par le collecteur, 'file' en v2
+                'stats': {**memory_stat, 'cache': memory_stat.get('file', 0)}
+            },
+            'networks': parse_net_dev((self.proc_root / str(pid) / "net" / "dev").read_text()),
+            'blkio_stats': {'io_service_bytes_recursive': parse_io_stat((path / "io.stat").read_text())},
+            'pids_stats': {'current': _read_int(path / "pids.current")}
+        }
+
+    def _system_cpu(self):
+        """Temps CPU total de l'hôte (ns) et nombre de CPU, comme system_cpu_usage de Docker"""
+        try:
+            lines = (self.proc_root / "stat").read_text().splitlines()
+            total = sum(int(value) for value in lines[0].split()[1:8]) * _NS_PER_TICK
+            cpus = sum(1 for line in lines[1:] if line.startswith('cpu'))
+            return total, cpus
+        except (OSError, ValueError, IndexError):
+            cpus = os.cpu_count() or 1
+            return time.monotonic_ns() * cpus, cpus
+
+    def _memory_total(self) -> int:
+        """Mémoire de l'hôte, limite d'un conteneur sans memory.max"""
+        try:
+            for line in (self.proc_root / "meminfo").read_text().splitlines():
+                if line.startswith("MemTotal:"):
+                    return int(line.split()[1]) * 1024
+        except (OSError, ValueError, IndexError):
+            pass
+        return 0
+
+    def get_stats(self) -> Dict:
+        return {**self.stats, 'available': self.available, 'containers': len(self.paths)}
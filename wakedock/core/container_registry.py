@@ -0,0 +1,357 @@
+"""
+Registre des conteneurs alimenté par les événements Docker
+
+Plutôt que de lister et d'inspecter tous les conteneurs à chaque cycle, un
+thread suit le flux d'événements du daemon (start, die, destroy, rename,
+health_status) et tient à jour un registre en mémoire (noms, labels, santé).
+Les collecteurs (métriques, logs) s'y abonnent et sont notifiés dans la
+boucle asyncio quelques millisecondes après l'événement.
+
+Un conteneur n'est inspecté qu'une fois, à sa première apparition. Si le flux
+d'événements est coupé, il est rouvert à partir du dernier événement reçu et
+le registre est resynchronisé par une liste des conteneurs.
+"""
+import asyncio
+import logging
+import threading
+import time
+import weakref
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional
+
+from wakedock.core.docker_manager import DockerManager
+
+logger = logging.getLogger(__name__)
+
+WATCHED_EVENTS = ('start', 'die', 'destroy', 'rename', 'health_status')
+
+
+@dataclass
+class ContainerInfo:
+    """Conteneur connu du registre"""
+    id: str
+    name: str
+    labels: Dict[str, str] = field(default_factory=dict)
+    image: Optional[str] = None
+    running: bool = True
+    health: Optional[str] = None
+    # Processus principal et cgroup parent, pour la lecture directe des cgroups
+    pid: Optional[int] = None
+    cgroup_parent: Optional[str] = None
+
+    @property
+    def service_name(self) -> Optional[str]:
+        return self.labels.get('com.docker.compose.service')
+
+    @classmethod
+    def from_info(cls, container_id: str, info: Dict) -> 'ContainerInfo':
+        """Construit l'entrée à partir de DockerManager.get_container_info"""
+        return cls(
+            id=container_id,
+            name=info.get('name') or container_id[:12],
+            labels=info.get('labels') or {},
+            image=info.get('image'),
+            running=True,
+            health=info.get('health'),
+            pid=info.get('pid'),
+            cgroup_parent=info.get('cgroup_parent')
+        )
+
+
+class ContainerListener:
+    """Abonné notifié des changements du registre"""
+
+    async def on_container_started(self, container: ContainerInfo):
+        """Un conteneur a démarré (ou a été découvert à la synchronisation)"""
+
+    async def on_container_stopped(self, container: ContainerInfo):
+        """Un conteneur s'est arrêté ou a été supprimé"""
+
+    async def on_container_updated(self, container: ContainerInfo):
+        """Un conteneur a été renommé ou son état de santé a changé"""
+
+
+class ContainerRegistry:
+    """Registre des conteneurs tenu à jour par le flux d'événements Docker"""
+
+    def __init__(self, docker_manager: DockerManager,
+                 reconnect_delay: float = 1.0, max_reconnect_delay: float = 30.0):
+        self.docker_manager = docker_manager
+        self.reconnect_delay = reconnect_delay
+        self.max_reconnect_delay = max_reconnect_delay
+
+        self.containers: Dict[str, ContainerInfo] = {}
+        self.listeners: List[ContainerListener] = []
+
+        self.is_running = False
+        # Flux d'événements ouvert: sinon les collecteurs reviennent à la scrutation
+        self.watching = False
+
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._queue: Optional[asyncio.Queue] = None
+        self._dispatch_task: Optional[asyncio.Task] = None
+        self._thread: Optional[threading.Thread] = None
+        self._stop = threading.Event()
+        self._stream = None
+        self._sync_lock = asyncio.Lock()
+
+        self.stats = {
+            'events': 0,
+            'syncs': 0,
+            'inspects': 0,
+            'reconnects': 0,
+            'last_event_at': None
+        }
+
+    async def subscribe(self, listener: ContainerListener):
+        """Abonne un collecteur (démarre le registre au premier abonné)"""
+        if listener not in self.listeners:
+            self.listeners.append(listener)
+        await self.start()
+
+    async def unsubscribe(self, listener: ContainerListener):
+        """Désabonne un collecteur (arrête le registre au dernier)"""
+        if listener in self.listeners:
+            self.listeners.remove(listener)
+        if not self.listeners:
+            await self.stop()
+
+    def get(self, container_id: str) -> Optional[ContainerInfo]:
+        """Entrée d'un conteneur"""
+        return self.containers.get(container_id)
+
+    def running(self) -> List[ContainerInfo]:
+        """Conteneurs en cours d'exécution"""
+        return [info for info in self.containers.values() if info.running]
+
+    async def start(self):
+        """Démarre le suivi des événements puis synchronise le registre"""
+        if self.is_running:
+            return
+
+        self.is_running = True
+        self._loop = asyncio.get_running_loop()
+        self._queue = asyncio.Queue()
+        # Nouvel événement d'arrêt: un ancien thread encore bloqué reste arrêté
+        self._stop = threading.Event()
+
+        # Le flux est ouvert avant la liste: aucun événement n'est perdu entre les deux
+        self._dispatch_task = asyncio.create_task(self._dispatch_worker())
+        self._thread = threading.Thread(
+            target=self._watch, args=(time.time(), self._stop), name="wakedock-docker-events", daemon=True
+        )
+        self._thread.start()
+
+        await self.sync()
+
+    async def stop(self):
+        """Arrête le suivi des événements"""
+        if not self.is_running:
+            return
+
+        self.is_running = False
+        self._stop.set()
+        self._close_stream()
+        if self._dispatch_task:
+            self._dispatch_task.cancel()
+            self._dispatch_task = None
+
+        self.watching = False
+        self.containers.clear()
+
+    async def sync(self):
+        """
+        Resynchronise le registre avec la liste des conteneurs actifs
+
+        Seuls les conteneurs inconnus sont inspectés.
+        """
+        async with self._sync_lock:
+            loop = asyncio.get_running_loop()
+            try:
+                containers = await loop.run_in_executor(
+                    None, lambda: self.docker_manager.list_containers(all=False, sparse=True)
+                )
+            except Exception as e:
+                logger.error(f"Erreur lors de la synchronisation des conteneurs: {e}")
+                return
+
+            self.stats['syncs'] += 1
+            running = [container.id for container in containers]
+            running_ids = set(running)
+
+            for info in list(self.containers.values()):
+                if info.running and info.id not in running_ids:
+                    info.running = False
+                    await self._notify('on_container_stopped', info)
+
+            for container_id in running:
+                info = self.containers.get(container_id)
+                if info is not None and info.running:
+                    continue
+                if info is None:
+                    info = await self._inspect(container_id)
+                    if info is None:
+                        continue
+                info.running = True
+                await self._notify('on_container_started', info)
+
+    async def _inspect(self, container_id: str) -> Optional[ContainerInfo]:
+        """Inspecte un conteneur inconnu et l'ajoute au registre"""
+        loop = asyncio.get_running_loop()
+        try:
+            info = await loop.run_in_executor(None, self.docker_manager.get_container_info, container_id)
+        except Exception as e:
+            logger.warning(f"Conteneur {container_id[:12]} non inspecté: {e}")
+            return None
+        self.stats['inspects'] += 1
+        if not info:
+            return None
+
+        container = ContainerInfo.from_info(container_id, info)
+        self.containers[container_id] = container
+        return container
+
+    async def _notify(self, method: str, container: ContainerInfo):
+        """Notifie les abonnés, une erreur d'un abonné n'affectant pas les autres"""
+        for listener in list(self.listeners):
+            try:
+                await getattr(listener, method)(container)
+            except Exception as e:
+                logger.error(f"Erreur d'un abonné du registre ({method}, {container.name}): {e}")
+
+    async def handle_event(self, event: Dict):
+        """Applique un événement Docker au registre"""
+        action = event.get('Action') or event.get('status') or ''
+        actor = event.get('Actor') or {}
+        container_id = actor.get('ID') or event.get('id')
+        attributes = actor.get('Attributes') or {}
+        if not container_id:
+            return
+
+        self.stats['events'] += 1
+        self.stats['last_event_at'] = event.get('time')
+        info = self.containers.get(container_id)
+
+        if action == 'start':
+            if info is None:
+                info = await self._inspect(container_id)
+                if info is None:
+                    return
+            elif info.running:
+                return
+            info.running = True
+            await self._notify('on_container_started', info)
+
+        elif action in ('die', 'destroy'):
+            if info is None:
+                return
+            if action == 'destroy':
+                del self.containers[container_id]
+            if info.running:
+                info.running = False
+                await self._notify('on_container_stopped', info)
+
+        elif action == 'rename':
+            if info is None or not attributes.get('name'):
+                return
+            info.name = attributes['name'].lstrip('/')
+            await self._notify('on_container_updated', info)
+
+        elif action.startswith('health_status'):
+            if info is None:
+                return
+            # Action de la forme "health_status: healthy"
+            info.health = action.partition(':')[2].strip() or None
+            await self._notify('on_container_updated', info)
+
+    async def _dispatch_worker(self):
+        """Applique les événements reçus par le thread de suivi"""
+        while self.is_running:
+            try:
+                kind, event = await self._queue.get()
+                if kind == 'event':
+                    await self.handle_event(event)
+                elif kind == 'reconnected':
+                    # Des événements ont pu être perdus pendant la coupure
+                    await self.sync()
+            except asyncio.CancelledError:
+                break
+            except Exception as e:
+                logger.error(f"Erreur lors du traitement d'un événement Docker: {e}")
+
+    def _post(self, stop: threading.Event, kind: str, event: Optional[Dict] = None):
+        """Transmet un élément à la boucle asyncio depuis le thread de suivi"""
+        if stop.is_set():
+            return
+        try:
+            self._loop.call_soon_threadsafe(self._queue.put_nowait, (kind, event))
+        except RuntimeError:
+            # Boucle fermée
+            stop.set()
+
+    def _watch(self, since: float, stop: threading.Event):
+        """Thread de suivi du flux d'événements, rouvert après une coupure"""
+        delay = self.reconnect_delay
+        connected_once = False
+        while not stop.is_set():
+            try:
+                self._stream = self.docker_manager.get_events(
+                    since=since,
+                    filters={'type': 'container', 'event': list(WATCHED_EVENTS)}
+                )
+                self.watching = True
+                if connected_once:
+                    self._post(stop, 'reconnected')
+                connected_once = True
+                for event in self._stream:
+                    if stop.is_set():
+                        return
+                    # Reprise au dernier événement reçu après une coupure
+                    if event.get('timeNano'):
+                        since = event['timeNano'] / 1e9
+                    self._post(stop, 'event', event)
+                    delay = self.reconnect_delay
+            except Exception as e:
+                if not stop.is_set():
+                    log = logger.warning if delay == self.reconnect_delay else logger.debug
+                    log(f"Flux d'événements Docker interrompu: {e}")
+            finally:
+                self.watching = False
+                self._stream = None
+
+            if stop.wait(delay):
+                return
+            self.stats['reconnects'] += 1
+            delay = min(delay * 2, self.max_reconnect_delay)
+
+    def _close_stream(self):
+        """Interrompt la lecture bloquante du flux d'événements"""
+        stream = self._stream
+        if stream is not None and hasattr(stream, 'close'):
+            try:
+                stream.close()
+            except Exception:
+                pass
+
+    def get_stats(self) -> Dict:
+        """Statistiques du registre"""
+        return {
+            **self.stats,
+            'watching': self.watching,
+            'containers': len(self.containers),
+            'running': len(self.running()),
+            'listeners': len(self.listeners)
+        }
+
+
+# Registres partagés par les collecteurs d'un même DockerManager
+_shared_registries: 'weakref.WeakKeyDictionary[DockerManager, ContainerRegistry]' = weakref.WeakKeyDictionary()
+
+
+def get_container_registry(docker_manager: DockerManager) -> ContainerRegistry:
+    """Registre partagé d'un DockerManager (un seul flux d'événements par daemon)"""
+    registry = _shared_registries.get(docker_manager)
+    if registry is None:
+        registry = ContainerRegistry(docker_manager)
+        _shared_registries[docker_manager] = registry
+    return registry
@@ -10,6 +10,7 @@ from wakedock.core.auto_deployment_service import AutoDeploymentService
 from wakedock.core.cicd_service import CICDService, get_cicd_service
 from wakedock.core.docker_manager import DockerManager
 from wakedock.core.environment_service import EnvironmentService
+from wakedock.core.log_archive import LOG_OPTIMIZATION_PATH
 from wakedock.core.log_optimization_service import LogOptimizationService
 from wakedock.core.metrics_collector import MetricsCollector
 from wakedock.core.rbac_service import get_rbac_service, RBACService
@@ -84,7 +85,7 @@ def get_log_optimization_service() -> LogOptimizationService:
     
     if _log_optimization_service is None:
         _log_optimization_service = LogOptimizationService(
-            storage_path="/var/log/wakedock/logs_optimization"
+            storage_path=str(LOG_OPTIMIZATION_PATH)
         )
     
     return _log_optimization_service
@@ -3,7 +3,8 @@ Gestionnaire Docker pour WakeDock
 Gère les interactions avec l'API Docker
 """
 import logging
-from typing import Any, Dict, List, Optional
+from datetime import datetime
+from typing import Any, Dict, Iterator, List, Optional, Union
 
 import docker
 from docker.errors import ImageNotFound, NotFound
@@ -26,18 +27,20 @@ class DockerManager:
             logger.error(f"Impossible de se connecter au daemon Docker: {e}")
             raise Exception(f"Erreur de connexion Docker: {e}")
     
-    def list_containers(self, all: bool = False) -> List[docker.models.containers.Container]:
+    def list_containers(self, all: bool = False, sparse: bool = False) -> List[docker.models.containers.Container]:
         """
         Liste tous les containers
         
         Args:
             all: Si True, inclut les containers arrêtés
+            sparse: Si True, pas d'inspection de chaque container (attributs
+                partiels: id et labels de la liste, sans nom)
             
         Returns:
             Liste des containers
         """
         try:
-            return self.client.containers.list(all=all)
+            return self.client.containers.list(all=all, sparse=sparse)
         except Exception as e:
             logger.error(f"Erreur lors de la récupération des containers: {e}")
             raise
@@ -253,24 +256,119 @@ class DockerManager:
             logger.error(f"Erreur lors de la mise à jour du container {container_id}: {e}")
             raise
     
-    def get_container_logs(self, container_id: str, tail: int = 100, follow: bool = False) -> str:
+    def get_container_info(self, container_id: str) -> Optional[Dict[str, Any]]:
+        """
+        Récupère les informations principales d'un container
+        
+        Args:
+            container_id: ID ou nom du container
+            
+        Returns:
+            Dictionnaire (id, name, image, status, health, labels, pid, cgroup_parent) ou None si non trouvé
+        """
+        try:
+            container = self.get_container(container_id)
+            if not container:
+                return None
+            
+            attrs = container.attrs or {}
+            return {
+                'id': container.id,
+                'name': container.name,
+                'image': attrs.get('Config', {}).get('Image'),
+                'status': container.status,
+                'health': attrs.get('State', {}).get('Health', {}).get('Status'),
+                'labels': container.labels or {},
+                'created': attrs.get('Created'),
+                'pid': attrs.get('State', {}).get('Pid'),
+                'cgroup_parent': attrs.get('HostConfig', {}).get('CgroupParent')
+            }
+            
+        except Exception as e:
+            logger.error(f"Erreur lors de la récupération des infos du container {container_id}: {e}")
+            raise
+    
+    def get_container_stats(self, container_id: str, stream: bool = False) -> Union[Dict[str, Any], Iterator[Dict[str, Any]]]:
+        """
+        Récupère les statistiques d'utilisation d'un container
+        
+        Utilise directement l'API bas niveau: pas d'inspection préalable du
+        container. Sans streaming, le daemon échantillonne deux fois (environ
+        une seconde) pour renseigner precpu_stats.
+        
+        Args:
+            container_id: ID ou nom du container
+            stream: Flux continu de statistiques (une trame par seconde)
+            
+        Returns:
+            Statistiques décodées, ou générateur bloquant de trames en mode stream
+        """
+        try:
+            return self.client.api.stats(container_id, decode=True if stream else None, stream=stream)
+        except NotFound:
+            raise
+        except Exception as e:
+            logger.error(f"Erreur lors de la récupération des stats du container {container_id}: {e}")
+            raise
+    
+    def get_events(
+        self,
+        since: Optional[Union[datetime, float]] = None,
+        filters: Optional[Dict[str, Any]] = None
+    ) -> Iterator[Dict[str, Any]]:
+        """
+        Flux des événements du daemon Docker
+        
+        Args:
+            since: Rejoue les événements postérieurs à cette date (timestamp Unix accepté)
+            filters: Filtres de l'API (ex: {'type': 'container', 'event': ['start']})
+            
+        Returns:
+            Générateur bloquant d'événements décodés; close() interrompt la lecture
+        """
+        try:
+            return self.client.events(since=since, filters=filters, decode=True)
+        except Exception as e:
+            logger.error(f"Erreur lors de l'ouverture du flux d'événements Docker: {e}")
+            raise
+    
+    def get_container_logs(
+        self,
+        container_id: str,
+        tail: Union[int, str] = 100,
+        follow: bool = False,
+        timestamps: bool = True,
+        since: Optional[datetime] = None
+    ) -> Union[str, Iterator[bytes]]:
         """
         Récupère les logs d'un container
         
         Args:
             container_id: ID ou nom du container
-            tail: Nombre de lignes à récupérer
+            tail: Nombre de lignes à récupérer ("all" pour tout l'historique)
             follow: Mode streaming des logs
+            timestamps: Préfixe chaque ligne par son timestamp RFC3339
+            since: Ne récupère que les logs postérieurs à cette date
             
         Returns:
-            Logs du container
+            Logs du container, ou générateur bloquant de chunks en mode follow
         """
         try:
             container = self.get_container(container_id)
             if not container:
                 raise NotFound(f"Container {container_id} non trouvé")
             
-            logs = container.logs(tail=tail, follow=follow, timestamps=True)
+            if follow:
+                # Flux bloquant: à consommer hors de la boucle asyncio
+                return container.logs(
+                    stream=True,
+                    follow=True,
+                    tail=tail,
+                    timestamps=timestamps,
+                    since=since
+                )
+            
+            logs = container.logs(tail=tail, timestamps=timestamps, since=since)
             return logs.decode('utf-8') if isinstance(logs, bytes) else logs
             
         except Exception as e:
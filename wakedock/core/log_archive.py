@@ -0,0 +1,148 @@
+"""
+Lecture des archives de logs compressées par trames
+
+Les fichiers déplacés dans un répertoire d'archives par
+LogOptimizationService (``{nom}.lz4|.gz|.zst`` accompagnés de leur index
+``.fidx``) restent interrogeables: seules les trames qui recouvrent la
+plage de temps demandée sont décompressées, et les trames récemment lues
+sont conservées dans un FrameCache partagé.
+
+Le conteneur d'une archive est déduit de son nom:
+``{container_id}[.N].jsonl{ext}`` (anciens fichiers plats) ou
+``{container_id}/{segment}.jsonl{ext}`` (segments).
+"""
+import logging
+import re
+from datetime import datetime
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Tuple, Union
+
+from wakedock.core.log_compression import (
+    CODECS,
+    FRAME_INDEX_SUFFIX,
+    FrameCache,
+    SeekableCompressedFile,
+)
+from wakedock.core.log_storage import to_micros, TS_MAX, TS_MIN
+
+logger = logging.getLogger(__name__)
+
+# Répertoire de LogOptimizationService (voir dependencies): ses archives,
+# écrites dans archive_directory(LOG_OPTIMIZATION_PATH), sont relues par
+# défaut par LogCollector et LogSearchService
+LOG_OPTIMIZATION_PATH = Path("/var/log/wakedock/logs_optimization")
+
+_TIMESTAMP_PATTERN = re.compile(rb'"timestamp":\s*"([^"]+)"')
+_ARCHIVE_EXTENSIONS = tuple(extension for _, extension in CODECS.values())
+
+
+def jsonl_timestamp_bounds(chunk: bytes) -> Optional[Tuple[int, int]]:
+    """
+    Timestamps min et max d'un bloc de lignes JSONL (champ "timestamp")
+
+    Les timestamps ISO de même longueur se comparent comme des chaînes:
+    seules les deux bornes sont alors décodées.
+    """
+    values = _TIMESTAMP_PATTERN.findall(chunk)
+    if not values:
+        return None
+    try:
+        if len({len(value) for value in values}) == 1:
+            return (to_micros(datetime.fromisoformat(min(values).decode())),
+                    to_micros(datetime.fromisoformat(max(values).decode())))
+        timestamps = [to_micros(datetime.fromisoformat(value.decode())) for value in values]
+    except (UnicodeDecodeError, ValueError):
+        return None
+    return min(timestamps), max(timestamps)
+
+
+def archive_directory(storage_path: Union[str, Path]) -> Path:
+    """Répertoire des archives compressées d'un LogOptimizationService"""
+    return Path(storage_path) / "compressed"
+
+
+def is_archive_file(path: Path) -> bool:
+    """Indique si un fichier est une archive compressée par trames"""
+    return path.suffix in _ARCHIVE_EXTENSIONS and path.with_name(path.name + FRAME_INDEX_SUFFIX).exists()
+
+
+def archive_container_id(path: Path) -> str:
+    """Conteneur d'une archive, déduit de son nom"""
+    name = path.name[:-len(path.suffix)]
+    base = name.split('.')[0]
+    # Segment d'un répertoire de conteneur ({container_id}/{segment}.jsonl)
+    if base.isdigit():
+        return path.parent.name
+    return base
+
+
+class LogArchive:
+    """Vue en lecture des archives compressées d'un ou plusieurs répertoires"""
+
+    def __init__(self, paths: Iterable[Union[str, Path]], cache: Optional[FrameCache] = None):
+        self.paths = [Path(path) for path in paths]
+        self.cache = cache or FrameCache()
+
+        # Lecteurs ouverts, invalidés si le fichier change
+        self._readers: Dict[Path, Tuple[float, SeekableCompressedFile]] = {}
+
+    def list_files(self) -> List[Path]:
+        """Archives présentes dans les répertoires (et leurs sous-répertoires)"""
+        files = []
+        for directory in self.paths:
+            if not directory.is_dir():
+                continue
+            for path in sorted(directory.rglob("*")):
+                if path.is_file() and is_archive_file(path):
+                    files.append(path)
+        return files
+
+    def list_containers(self) -> List[str]:
+        """Conteneurs ayant des archives"""
+        return sorted({archive_container_id(path) for path in self.list_files()})
+
+    def open(self, path: Union[str, Path]) -> SeekableCompressedFile:
+        """Lecteur d'une archive (index de trames chargé une seule fois)"""
+        path = Path(path)
+        mtime = path.stat().st_mtime
+        cached = self._readers.get(path)
+        if cached is not None and cached[0] == mtime:
+            return cached[1]
+
+        if cached is not None:
+            self.cache.invalidate(path)
+        reader = SeekableCompressedFile(path, self.cache)
+        self._readers[path] = (mtime, reader)
+        return reader
+
+    def readers(self, container_id: Optional[str] = None,
+                start_ts: int = TS_MIN, end_ts: int = TS_MAX) -> List[SeekableCompressedFile]:
+        """Archives d'un conteneur (ou de tous) recouvrant une plage de temps"""
+        files = self.list_files()
+
+        # Oublie les lecteurs des archives supprimées
+        existing = set(files)
+        for path in [path for path in self._readers if path not in existing]:
+            del self._readers[path]
+            self.cache.invalidate(path)
+
+        readers = []
+        for path in files:
+            if container_id is not None and archive_container_id(path) != container_id:
+                continue
+            try:
+                reader = self.open(path)
+            except (OSError, ValueError) as e:
+                logger.warning(f"Archive de logs illisible {path}: {e}")
+                continue
+            if reader.max_ts >= start_ts and reader.min_ts <= end_ts:
+                readers.append(reader)
+        return readers
+
+    def get_stats(self) -> Dict:
+        """Statistiques des archives et du cache de trames"""
+        return {
+            'paths': [str(path) for path in self.paths],
+            'open_archives': len(self._readers),
+            'cache': self.cache.get_stats()
+        }
@@ -0,0 +1,220 @@
+"""
+Classification des lignes de logs Docker en une seule passe
+
+Chaque ligne collectée traverse ce module: il doit rester économe en CPU.
+- niveau: une seule expression régulière compilée couvre tous les mots-clés,
+  la sévérité la plus haute rencontrée l'emporte (même priorité que
+  l'ancienne suite de recherches par sous-chaîne)
+- métadonnées: JSON via orjson s'il est installé, sinon key=value avec un
+  motif précompilé
+- horodatage: parseur RFC3339 à découpage fixe pour le format Docker
+  (nanosecondes tronquées aux microsecondes)
+"""
+import json
+import re
+from datetime import datetime, timedelta
+from typing import Any, Callable, Dict, List, NamedTuple, Optional, Tuple, Union
+
+try:
+    import orjson
+    ORJSON_AVAILABLE = True
+except ImportError:
+    ORJSON_AVAILABLE = False
+    orjson = None
+
+# Mots-clés par niveau (valeurs de LogLevel), du plus sévère au moins sévère
+LEVEL_KEYWORDS: List[Tuple[str, Tuple[str, ...]]] = [
+    ('fatal', ('fatal', 'panic', 'critical')),
+    ('error', ('error', 'err', 'exception', 'failed')),
+    ('warn', ('warn', 'warning', 'deprecated')),
+    ('info', ('info', 'information')),
+    ('debug', ('debug', 'dbg')),
+    ('trace', ('trace',)),
+]
+DEFAULT_LEVEL = 'info'
+
+KEY_VALUE_PATTERN = re.compile(r'(\w+)=([^\s]+)')
+
+# Préfixe Docker "AAAA-MM-JJTHH:MM:SS" (19 caractères)
+_RFC3339_BASE_LENGTH = 19
+
+
+def _build_level_pattern(level_keywords: List[Tuple[str, Tuple[str, ...]]]) -> Tuple['re.Pattern', Dict[str, int]]:
+    """
+    Compile l'alternance des mots-clés et la table mot-clé -> rang
+
+    Un findall ne rapporte pas les occurrences qui se chevauchent: un mot-clé
+    peu sévère pourrait masquer un mot-clé plus sévère qui commence à
+    l'intérieur ("tracerr"). Chaque mot-clé concerné est donc exclu par un
+    lookahead négatif lorsqu'il serait suivi d'un tel chevauchement.
+    """
+    ranks: Dict[str, int] = {}
+    for rank, (_, keywords) in enumerate(level_keywords):
+        for keyword in keywords:
+            ranks.setdefault(keyword, rank)
+
+    # Les mots-clés qui en contiennent un autre sont redondants ("error" ⊃ "err")
+    keywords = [
+        keyword for keyword in ranks
+        if not any(other != keyword and other in keyword and ranks[other] <= ranks[keyword] for other in ranks)
+    ]
+
+    alternatives = []
+    for keyword in sorted(keywords, key=len, reverse=True):
+        continuations = set()
+        for other in keywords:
+            if ranks[other] >= ranks[keyword]:
+                continue
+            for start in range(1, len(keyword)):
+                suffix = keyword[start:]
+                if len(other) > len(suffix) and other.startswith(suffix):
+                    continuations.add(re.escape(other[len(suffix):]))
+        alternative = re.escape(keyword)
+        if continuations:
+            alternative += f"(?!{'|'.join(sorted(continuations))})"
+        alternatives.append(alternative)
+
+    return re.compile('|'.join(alternatives)), ranks
+
+
+LEVEL_PATTERN, _LEVEL_RANKS = _build_level_pattern(LEVEL_KEYWORDS)
+_LEVEL_BY_RANK = [level for level, _ in LEVEL_KEYWORDS]
+
+
+def classify_level(message: str) -> str:
+    """Retourne le niveau (valeur de LogLevel) détecté dans un message"""
+    hits = LEVEL_PATTERN.findall(message.lower())
+    if not hits:
+        return DEFAULT_LEVEL
+    if len(hits) == 1:
+        return _LEVEL_BY_RANK[_LEVEL_RANKS[hits[0]]]
+    return _LEVEL_BY_RANK[min(_LEVEL_RANKS[hit] for hit in hits)]
+
+
+def loads_json(data: Union[str, bytes]) -> Any:
+    """Décode du JSON avec orjson si disponible"""
+    if ORJSON_AVAILABLE:
+        try:
+            return orjson.loads(data)
+        except orjson.JSONDecodeError:
+            # orjson refuse NaN et les entiers hors 64 bits, acceptés par json
+            pass
+    return json.loads(data)
+
+
+def dumps_json(value: Any) -> bytes:
+    """Encode en JSON UTF-8 avec orjson si disponible (types inconnus via str)"""
+    if ORJSON_AVAILABLE:
+        try:
+            return orjson.dumps(value, default=str, option=orjson.OPT_NON_STR_KEYS)
+        except TypeError:
+            # Entiers hors 64 bits notamment
+            pass
+    return json.dumps(value, default=str, ensure_ascii=False).encode('utf-8')
+
+
+def extract_metadata(message: str) -> Dict:
+    """Extrait les métadonnées JSON ou key=value d'un message"""
+    stripped = message.strip()
+    if stripped[:1] == '{' and stripped[-1:] == '}':
+        try:
+            parsed = loads_json(message)
+            if isinstance(parsed, dict):
+                return parsed
+        except ValueError:
+            pass
+
+    if '=' not in message:
+        return {}
+    return dict(KEY_VALUE_PATTERN.findall(message))
+
+
+def parse_rfc3339(value: str) -> Optional[datetime]:
+    """
+    Parse un horodatage RFC3339 (format des logs Docker)
+
+    Les fractions au-delà de la microseconde sont tronquées et les décalages
+    horaires ramenés en UTC naïf, comme le reste du collecteur.
+
+    Returns:
+        datetime UTC naïf, None si la valeur n'est pas un horodatage valide
+    """
+    length = len(value)
+    if length < _RFC3339_BASE_LENGTH or value[4] != '-' or value[10] not in 'Tt ':
+        return None
+
+    # Chemin rapide: "2025-07-16T10:30:45.123456789Z"
+    if value[-1] in 'Zz' and value[19:20] == '.' and length >= 27 and value[20:length - 1].isdigit():
+        try:
+            return datetime.fromisoformat(value[:26])
+        except ValueError:
+            return None
+
+    offset = None
+    end = length
+    if value[-1] in 'Zz':
+        end -= 1
+    elif length >= _RFC3339_BASE_LENGTH + 6 and value[-6] in '+-' and value[-3] == ':':
+        try:
+            hours, minutes = int(value[-5:-3]), int(value[-2:])
+        except ValueError:
+            return None
+        offset = timedelta(hours=hours, minutes=minutes)
+        if value[-6] == '-':
+            offset = -offset
+        end -= 6
+
+    base = value[:_RFC3339_BASE_LENGTH]
+    if end > _RFC3339_BASE_LENGTH:
+        fraction = value[_RFC3339_BASE_LENGTH + 1:end]
+        if value[_RFC3339_BASE_LENGTH] != '.' or not fraction.isdigit():
+            return None
+        base = f"{base}.{fraction[:6].ljust(6, '0')}"
+    elif end < _RFC3339_BASE_LENGTH:
+        return None
+
+    try:
+        timestamp = datetime.fromisoformat(base)
+    except ValueError:
+        return None
+    return timestamp - offset if offset else timestamp
+
+
+class ParsedLine(NamedTuple):
+    """Résultat de la classification d'une ligne"""
+    timestamp: datetime
+    level: str
+    message: str
+    metadata: Dict
+
+
+def classify_line(log_line: Union[str, bytes],
+                  parse_fields: Optional[Callable[[str], Tuple[Dict, Optional[str]]]] = None) -> Optional[ParsedLine]:
+    """
+    Classe une ligne Docker "<horodatage RFC3339> <message>"
+
+    Args:
+        log_line: Ligne brute
+        parse_fields: Extraction (métadonnées, niveau déclaré ou None) propre au
+            format du conteneur, extraction générique par défaut
+
+    Returns:
+        ParsedLine, None si la ligne n'a pas de message
+    """
+    if isinstance(log_line, bytes):
+        log_line = log_line.decode('utf-8', errors='ignore')
+
+    parts = log_line.strip().split(' ', 1)
+    if len(parts) < 2:
+        return None
+
+    timestamp_str, message = parts
+    # Fallback historique: horodatage de réception
+    timestamp = parse_rfc3339(timestamp_str) or datetime.utcnow()
+
+    message = message.strip()
+    if parse_fields is None:
+        return ParsedLine(timestamp, classify_level(message), message, extract_metadata(message))
+
+    metadata, level = parse_fields(message)
+    return ParsedLine(timestamp, level or classify_level(message), message, metadata)
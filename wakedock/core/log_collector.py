@@ -2,20 +2,48 @@
 Service de collecte de logs centralisé pour les conteneurs Docker
 """
 import asyncio
+import heapq
 import json
 import logging
+import re
 from dataclasses import asdict, dataclass
-from datetime import datetime
+from datetime import datetime, timedelta
 from enum import Enum
 from pathlib import Path
-from typing import AsyncGenerator, Dict, List, Optional, Set
-
-import aiofiles
+from typing import AsyncGenerator, Callable, Dict, List, Optional, Set, Tuple
 
+from wakedock.core.container_registry import (
+    ContainerInfo,
+    ContainerListener,
+    ContainerRegistry,
+    get_container_registry,
+)
 from wakedock.core.docker_manager import DockerManager
+from wakedock.core.log_archive import (
+    archive_directory,
+    LOG_OPTIMIZATION_PATH,
+    LogArchive,
+)
+from wakedock.core.log_classifier import classify_level, classify_line, extract_metadata
+from wakedock.core.log_compression import FrameIndexEntry, SeekableCompressedFile
+from wakedock.core.log_ingestion import LogIngestionEngine
+from wakedock.core.log_parsers import LogParserRegistry
+from wakedock.core.log_pubsub import LogPubSubHub
+from wakedock.core.log_retention import LogRetentionEngine, RetentionPolicy
+from wakedock.core.log_storage import (
+    AnySegment,
+    BlockIndexEntry,
+    SegmentedLogStore,
+    to_micros,
+    TS_MAX,
+    TS_MIN,
+)
 
 logger = logging.getLogger(__name__)
 
+# Caractères modifiés par json.dumps (guillemets, antislash, contrôles)
+_JSON_ESCAPED_CHARS = re.compile(r'["\\\x00-\x1f\x7f]')
+
 class LogLevel(Enum):
     """Niveaux de logs supportés"""
     TRACE = "trace"
@@ -25,6 +53,9 @@ class LogLevel(Enum):
     ERROR = "error"
     FATAL = "fatal"
 
+# Résolution directe valeur -> LogLevel (plus rapide que LogLevel(value))
+_LEVELS_BY_VALUE = {level.value: level for level in LogLevel}
+
 @dataclass
 class LogEntry:
     """Entrée de log structurée"""
@@ -56,11 +87,14 @@ class LogEntry:
         data['level'] = LogLevel(data['level'])
         return cls(**data)
 
-class LogCollector:
+class LogCollector(ContainerListener):
     """Collecteur de logs pour les conteneurs Docker"""
     
-    def __init__(self, docker_manager: DockerManager, storage_path: str = "/var/log/wakedock/containers"):
+    def __init__(self, docker_manager: DockerManager, storage_path: str = "/var/log/wakedock/containers",
+                 archive_paths: Optional[List[str]] = None, registry: Optional[ContainerRegistry] = None):
         self.docker_manager = docker_manager
+        # Conteneurs suivis par les événements Docker (registre partagé avec le collecteur de métriques)
+        self.registry = registry or get_container_registry(docker_manager)
         self.storage_path = Path(storage_path)
         self.storage_path.mkdir(parents=True, exist_ok=True)
         
@@ -70,10 +104,38 @@ class LogCollector:
         self.collection_tasks: Dict[str, asyncio.Task] = {}
         
         # Configuration
-        self.max_log_size = 100 * 1024 * 1024  # 100MB par fichier
-        self.rotation_count = 5  # Garder 5 fichiers rotés
+        self.max_log_size = 100 * 1024 * 1024  # 100MB par "génération" de logs
+        self.rotation_count = 5  # Garder 5 générations (500MB par conteneur)
+        self.max_log_age = timedelta(days=7)  # Partitions plus anciennes supprimées
         self.buffer_size = 1000  # Buffer de 1000 logs en mémoire
         self.flush_interval = 10  # Flush toutes les 10 secondes
+        self.ingest_queue_size = 10000  # Lignes en attente max par conteneur
+        self.ingest_batch_size = 500  # Lignes traitées par itération
+        
+        # Moteur d'ingestion (lecture des flux Docker hors de la boucle)
+        self.ingestion = LogIngestionEngine(max_queue_size=self.ingest_queue_size)
+        
+        # Diffusion temps réel vers les abonnés (flux SSE)
+        self.pubsub = LogPubSubHub()
+        
+        # Formats de logs par conteneur (label wakedock.log.format ou détection)
+        self.parsers = LogParserRegistry()
+        
+        # Stockage segmenté indexé ({container_id}/{segment}.jsonl + .idx),
+        # une partition horaire par segment
+        self.store = SegmentedLogStore(self.storage_path)
+        
+        # Compaction des partitions fermées et budgets de rétention par conteneur
+        self.retention = LogRetentionEngine(self.store, RetentionPolicy(
+            max_bytes=self.max_log_size * self.rotation_count,
+            max_age=self.max_log_age
+        ))
+        
+        # Archives compressées par trames (LogOptimizationService), lues à la
+        # demande: les requêtes couvrent à la fois les segments et les archives
+        if archive_paths is None:
+            archive_paths = [archive_directory(LOG_OPTIMIZATION_PATH)]
+        self.archive = LogArchive(archive_paths)
         
         # Buffers en mémoire
         self.log_buffers: Dict[str, List[LogEntry]] = {}
@@ -90,12 +152,17 @@ class LogCollector:
         logger.info("Démarrage du collecteur de logs")
         self.is_running = True
         
+        # Importe les anciens fichiers plats dans le stockage segmenté
+        await asyncio.get_running_loop().run_in_executor(None, self._migrate_legacy_files)
+        
         # Démarre les tâches de fond
         self.flush_task = asyncio.create_task(self._flush_worker())
         self.rotation_task = asyncio.create_task(self._rotation_worker())
         
-        # Découvre et surveille les conteneurs existants
-        await self._discover_containers()
+        # Surveille les conteneurs existants, puis ceux démarrés ensuite (événements Docker)
+        await self.registry.subscribe(self)
+        for container in self.registry.running():
+            await self.add_container(container.id)
     
     async def stop(self):
         """Arrête la collecte de logs"""
@@ -104,10 +171,13 @@ class LogCollector:
         
         logger.info("Arrêt du collecteur de logs")
         self.is_running = False
+        await self.registry.unsubscribe(self)
         
         # Arrête toutes les tâches de collecte
         for task in self.collection_tasks.values():
             task.cancel()
+        self.ingestion.close_all()
+        self.pubsub.close_all()
         
         # Arrête les tâches de fond
         if self.flush_task:
@@ -147,115 +217,121 @@ class LogCollector:
         if container_id in self.collection_tasks:
             self.collection_tasks[container_id].cancel()
             del self.collection_tasks[container_id]
+        self.ingestion.close(container_id)
+        self.parsers.forget(container_id)
         
         # Flush final du buffer
         if container_id in self.log_buffers:
             await self._flush_container_buffer(container_id)
     
     async def _discover_containers(self):
-        """Découvre les conteneurs en cours d'exécution"""
+        """Resynchronise les conteneurs surveillés avec le daemon"""
         try:
-            containers = self.docker_manager.list_containers(all=False)
-            for container in containers:
+            await self.registry.sync()
+            for container in self.registry.running():
                 await self.add_container(container.id)
         except Exception as e:
             logger.error(f"Erreur lors de la découverte des conteneurs: {e}")
     
+    async def on_container_started(self, container: ContainerInfo):
+        if self.is_running:
+            await self.add_container(container.id)
+    
+    async def on_container_stopped(self, container: ContainerInfo):
+        await self.remove_container(container.id)
+    
     async def _collect_container_logs(self, container_id: str):
         """Collecte les logs d'un conteneur spécifique"""
         try:
-            container_info = self.docker_manager.get_container_info(container_id)
-            if not container_info:
-                logger.warning(f"Conteneur {container_id} non trouvé")
-                return
+            # Nom et labels connus du registre, sinon inspection du conteneur
+            container = self.registry.get(container_id)
+            if container is None:
+                loop = asyncio.get_running_loop()
+                container_info = await loop.run_in_executor(
+                    None, self.docker_manager.get_container_info, container_id
+                )
+                if not container_info:
+                    logger.warning(f"Conteneur {container_id} non trouvé")
+                    return
+                container = ContainerInfo.from_info(container_id, container_info)
             
-            container_name = container_info.get('name', container_id[:12])
-            service_name = container_info.get('labels', {}).get('com.docker.compose.service')
+            container_name = container.name
+            labels = container.labels
+            service_name = container.service_name
+            log_parser = self.parsers.for_container(container_id, labels)
             
             logger.info(f"Démarrage de la collecte de logs pour {container_name}")
             
-            # Stream les logs en continu
-            logs_stream = self.docker_manager.get_container_logs(
+            # Le flux Docker est bloquant: il est lu par un thread dédié
+            # (dernière heure seulement pour éviter l'overload initial)
+            since = datetime.utcnow() - timedelta(hours=1)
+            reader = self.ingestion.open(
                 container_id,
-                follow=True,
-                timestamps=True,
-                since='1h'  # Dernière heure pour éviter l'overload initial
+                lambda: self.docker_manager.get_container_logs(
+                    container_id,
+                    tail='all',
+                    follow=True,
+                    timestamps=True,
+                    since=since
+                )
             )
             
-            for log_line in logs_stream:
-                if not self.is_running or container_id not in self.monitored_containers:
+            while self.is_running and container_id in self.monitored_containers:
+                log_lines = await reader.get_batch(self.ingest_batch_size)
+                if not log_lines:
                     break
                 
-                try:
-                    # Parse la ligne de log
-                    log_entry = self._parse_log_line(
-                        log_line, 
-                        container_id, 
-                        container_name, 
-                        service_name
-                    )
-                    
-                    if log_entry:
-                        # Ajoute au buffer
-                        await self._add_to_buffer(container_id, log_entry)
+                # Suit les renommages signalés par le registre
+                container_name = container.name
+                
+                for log_line in log_lines:
+                    try:
+                        # Parse la ligne de log
+                        log_entry = self._parse_log_line(
+                            log_line, 
+                            container_id, 
+                            container_name, 
+                            service_name,
+                            log_parser.parse
+                        )
                         
-                except Exception as e:
-                    logger.warning(f"Erreur lors du parsing du log {container_id}: {e}")
-                    continue
+                        if log_entry:
+                            # Ajoute au buffer
+                            await self._add_to_buffer(container_id, log_entry)
+                            
+                    except Exception as e:
+                        logger.warning(f"Erreur lors du parsing du log {container_id}: {e}")
+                        continue
+                
+                # Rend la main aux autres coroutines entre deux lots
+                await asyncio.sleep(0)
                     
         except Exception as e:
             logger.error(f"Erreur lors de la collecte des logs du conteneur {container_id}: {e}")
         finally:
             # Nettoie les ressources
+            self.ingestion.close(container_id)
             if container_id in self.monitored_containers:
                 self.monitored_containers.remove(container_id)
-            if container_id in self.collection_tasks:
+            if self.collection_tasks.get(container_id) is asyncio.current_task():
                 del self.collection_tasks[container_id]
     
-    def _parse_log_line(self, log_line: str, container_id: str, container_name: str, service_name: Optional[str]) -> Optional[LogEntry]:
-        """Parse une ligne de log Docker"""
+    def _parse_log_line(self, log_line: str, container_id: str, container_name: str, service_name: Optional[str],
+                        parse_fields: Optional[Callable[[str], Tuple[Dict, Optional[str]]]] = None) -> Optional[LogEntry]:
+        """Parse une ligne de log Docker (format: 2025-07-16T10:30:45.123456789Z message)"""
         try:
-            # Décode les bytes si nécessaire
-            if isinstance(log_line, bytes):
-                log_line = log_line.decode('utf-8', errors='ignore')
-            
-            # Parse le timestamp Docker (format: 2025-07-16T10:30:45.123456789Z message)
-            parts = log_line.strip().split(' ', 1)
-            if len(parts) < 2:
+            parsed = classify_line(log_line, parse_fields)
+            if parsed is None:
                 return None
             
-            timestamp_str, message = parts
-            
-            # Parse le timestamp
-            try:
-                # Enlève le Z final et les nanosecondes excessives
-                if timestamp_str.endswith('Z'):
-                    timestamp_str = timestamp_str[:-1]
-                if '.' in timestamp_str:
-                    base, microseconds = timestamp_str.split('.')
-                    # Limite aux microsecondes (6 chiffres)
-                    microseconds = microseconds[:6].ljust(6, '0')
-                    timestamp_str = f"{base}.{microseconds}"
-                
-                timestamp = datetime.fromisoformat(timestamp_str)
-            except ValueError:
-                # Fallback: utilise le timestamp actuel
-                timestamp = datetime.utcnow()
-            
-            # Détecte le niveau de log depuis le message
-            level = self._detect_log_level(message)
-            
-            # Extrait les métadonnées du message si possible
-            metadata = self._extract_metadata(message)
-            
             return LogEntry(
-                timestamp=timestamp,
-                level=level,
+                timestamp=parsed.timestamp,
+                level=_LEVELS_BY_VALUE[parsed.level],
                 container_id=container_id,
                 container_name=container_name,
                 service_name=service_name,
-                message=message.strip(),
-                metadata=metadata
+                message=parsed.message,
+                metadata=parsed.metadata
             )
             
         except Exception as e:
@@ -264,44 +340,11 @@ class LogCollector:
     
     def _detect_log_level(self, message: str) -> LogLevel:
         """Détecte le niveau de log depuis le message"""
-        message_lower = message.lower()
-        
-        if any(keyword in message_lower for keyword in ['fatal', 'panic', 'critical']):
-            return LogLevel.FATAL
-        elif any(keyword in message_lower for keyword in ['error', 'err', 'exception', 'failed']):
-            return LogLevel.ERROR
-        elif any(keyword in message_lower for keyword in ['warn', 'warning', 'deprecated']):
-            return LogLevel.WARN
-        elif any(keyword in message_lower for keyword in ['info', 'information']):
-            return LogLevel.INFO
-        elif any(keyword in message_lower for keyword in ['debug', 'dbg']):
-            return LogLevel.DEBUG
-        elif any(keyword in message_lower for keyword in ['trace']):
-            return LogLevel.TRACE
-        else:
-            return LogLevel.INFO  # Défaut
+        return _LEVELS_BY_VALUE[classify_level(message)]
     
     def _extract_metadata(self, message: str) -> Dict:
         """Extrait les métadonnées depuis le message"""
-        metadata = {}
-        
-        # Détecte les formats JSON dans le message
-        try:
-            if message.strip().startswith('{') and message.strip().endswith('}'):
-                parsed = json.loads(message)
-                if isinstance(parsed, dict):
-                    return parsed
-        except json.JSONDecodeError:
-            pass
-        
-        # Détecte les formats key=value
-        import re
-        kv_pattern = r'(\w+)=([^\s]+)'
-        matches = re.findall(kv_pattern, message)
-        for key, value in matches:
-            metadata[key] = value
-        
-        return metadata
+        return extract_metadata(message)
     
     async def _add_to_buffer(self, container_id: str, log_entry: LogEntry):
         """Ajoute une entrée au buffer"""
@@ -309,6 +352,7 @@ class LogCollector:
             self.log_buffers[container_id] = []
         
         self.log_buffers[container_id].append(log_entry)
+        self.pubsub.publish(log_entry)
         
         # Flush si le buffer est plein
         if len(self.log_buffers[container_id]) >= self.buffer_size:
@@ -331,29 +375,31 @@ class LogCollector:
             await self._flush_container_buffer(container_id)
     
     async def _flush_container_buffer(self, container_id: str):
-        """Flush le buffer d'un conteneur vers le fichier"""
+        """Flush le buffer d'un conteneur vers le stockage segmenté"""
         if container_id not in self.log_buffers or not self.log_buffers[container_id]:
             return
         
+        # Détache le buffer avant l'écriture pour ne pas perdre les logs
+        # ajoutés pendant l'I/O
+        log_entries = self.log_buffers[container_id]
+        self.log_buffers[container_id] = []
+        
         try:
-            log_file = self.storage_path / f"{container_id}.jsonl"
-            
-            # Écrit les logs en mode append
-            async with aiofiles.open(log_file, 'a', encoding='utf-8') as f:
-                for log_entry in self.log_buffers[container_id]:
-                    await f.write(json.dumps(log_entry.to_dict()) + '\n')
-            
-            # Vide le buffer
-            log_count = len(self.log_buffers[container_id])
-            self.log_buffers[container_id].clear()
+            records = [
+                (to_micros(log_entry.timestamp), (json.dumps(log_entry.to_dict()) + '\n').encode('utf-8'))
+                for log_entry in log_entries
+            ]
+            await asyncio.get_running_loop().run_in_executor(
+                None, self.store.append, container_id, records
+            )
             
-            logger.debug(f"Flush de {log_count} logs pour {container_id}")
+            logger.debug(f"Flush de {len(records)} logs pour {container_id}")
             
         except Exception as e:
             logger.error(f"Erreur lors du flush du buffer {container_id}: {e}")
     
     async def _rotation_worker(self):
-        """Worker qui effectue la rotation des logs"""
+        """Worker qui applique la rétention des segments"""
         while self.is_running:
             try:
                 # Vérifie toutes les heures
@@ -365,35 +411,198 @@ class LogCollector:
                 logger.error(f"Erreur dans le rotation worker: {e}")
     
     async def _rotate_logs(self):
-        """Effectue la rotation des logs volumineux"""
-        for log_file in self.storage_path.glob("*.jsonl"):
+        """Compacte les partitions fermées et applique les budgets d'âge et de taille"""
+        await self.retention.run_once()
+    
+    def _migrate_legacy_files(self):
+        """Importe les fichiers {container_id}[.N].jsonl dans le stockage segmenté"""
+        legacy_files = list(self.storage_path.glob("*.jsonl"))
+        
+        def legacy_order(path: Path):
+            # Les fichiers rotés les plus anciens (.N élevé) d'abord
+            parts = path.stem.split('.')
+            generation = int(parts[1]) if len(parts) > 1 and parts[1].isdigit() else 0
+            return parts[0], -generation
+        
+        for legacy_file in sorted(legacy_files, key=legacy_order):
+            container_id = legacy_file.stem.split('.')[0]
+            try:
+                records = []
+                with open(legacy_file, 'rb') as f:
+                    for line in f:
+                        line = line.rstrip(b'\n')
+                        if not line:
+                            continue
+                        try:
+                            timestamp = datetime.fromisoformat(json.loads(line)['timestamp'])
+                        except (json.JSONDecodeError, KeyError, ValueError):
+                            continue
+                        records.append((to_micros(timestamp), line + b'\n'))
+                        if len(records) >= 10000:
+                            self.store.append(container_id, records)
+                            records = []
+                if records:
+                    self.store.append(container_id, records)
+                legacy_file.unlink()
+                logger.info(f"Fichier de logs {legacy_file.name} importé dans le stockage segmenté")
+            except Exception as e:
+                logger.error(f"Erreur lors de l'import de {legacy_file}: {e}")
+    
+    def _read_block_entries(self,
+                            segment: AnySegment,
+                            block: BlockIndexEntry,
+                            start_ts: int,
+                            end_ts: int,
+                            level: Optional[LogLevel],
+                            needle: Optional[bytes]) -> List[LogEntry]:
+        """Lit et filtre les entrées d'un bloc, de la plus récente à la plus ancienne"""
+        if segment.compacted:
+            # Blocs colonnaires: entrées déjà décodées, pas de préfiltre sur la ligne brute
+            records = segment.read_records(block)
+        else:
+            records = segment.read_block(block)
+        return self._filter_records(records, start_ts, end_ts, level, needle)
+    
+    def _read_frame_entries(self,
+                            reader: SeekableCompressedFile,
+                            frame: FrameIndexEntry,
+                            container_id: Optional[str],
+                            start_ts: int,
+                            end_ts: int,
+                            level: Optional[LogLevel],
+                            needle: Optional[bytes]) -> List[LogEntry]:
+        """Lit et filtre les entrées d'une trame d'archive, de la plus récente à la plus ancienne"""
+        entries = self._filter_records(reader.read_lines(frame), start_ts, end_ts, level, needle)
+        if container_id is not None:
+            # Le conteneur d'une archive est déduit de son nom: vérification ligne à ligne
+            entries = [log_entry for log_entry in entries if log_entry.container_id == container_id]
+        return entries
+    
+    def _filter_records(self,
+                        records: List,
+                        start_ts: int,
+                        end_ts: int,
+                        level: Optional[LogLevel],
+                        needle: Optional[bytes]) -> List[LogEntry]:
+        """Décode et filtre des enregistrements (lignes JSON ou dictionnaires), en ordre inverse"""
+        entries = []
+        for record in reversed(records):
+            if isinstance(record, bytes):
+                if not record:
+                    continue
+                # Préfiltre sur la ligne brute pour éviter le décodage JSON
+                if needle is not None and needle not in record.lower():
+                    continue
+                try:
+                    record = json.loads(record)
+                except json.JSONDecodeError as e:
+                    logger.warning(f"Ligne de log invalide ignorée: {e}")
+                    continue
+            
             try:
-                if log_file.stat().st_size > self.max_log_size:
-                    await self._rotate_log_file(log_file)
+                log_entry = LogEntry.from_dict(record)
+            except (KeyError, ValueError, TypeError) as e:
+                logger.warning(f"Ligne de log invalide ignorée: {e}")
+                continue
+            
+            timestamp = to_micros(log_entry.timestamp)
+            if timestamp < start_ts or timestamp > end_ts:
+                continue
+            if level and log_entry.level != level:
+                continue
+            
+            entries.append(log_entry)
+        return entries
+    
+    async def _iter_container_logs(self,
+                                   container_id: str,
+                                   start_ts: int,
+                                   end_ts: int,
+                                   level: Optional[LogLevel],
+                                   needle: Optional[bytes] = None) -> AsyncGenerator[LogEntry, None]:
+        """Parcourt les logs d'un conteneur bloc par bloc, des plus récents aux plus anciens"""
+        loop = asyncio.get_running_loop()
+        blocks = await loop.run_in_executor(
+            None, lambda: list(self.store.iter_blocks_reverse(container_id, start_ts, end_ts))
+        )
+        
+        for segment, block in blocks:
+            try:
+                entries = await loop.run_in_executor(
+                    None, self._read_block_entries, segment, block, start_ts, end_ts, level, needle
+                )
+            except OSError as e:
+                logger.error(f"Erreur lors de la lecture du segment {segment.data_path}: {e}")
+                continue
+            for log_entry in entries:
+                yield log_entry
+    
+    async def _iter_archive_logs(self,
+                                 reader: SeekableCompressedFile,
+                                 container_id: Optional[str],
+                                 start_ts: int,
+                                 end_ts: int,
+                                 level: Optional[LogLevel],
+                                 needle: Optional[bytes] = None) -> AsyncGenerator[LogEntry, None]:
+        """Parcourt une archive trame par trame (seules les trames de la plage sont décompressées)"""
+        loop = asyncio.get_running_loop()
+        for frame in reader.iter_frames_reverse(start_ts, end_ts):
+            try:
+                entries = await loop.run_in_executor(
+                    None, self._read_frame_entries, reader, frame, container_id, start_ts, end_ts, level, needle
+                )
             except Exception as e:
-                logger.error(f"Erreur lors de la rotation de {log_file}: {e}")
+                logger.error(f"Erreur lors de la lecture de l'archive {reader.path}: {e}")
+                return
+            for log_entry in entries:
+                yield log_entry
     
-    async def _rotate_log_file(self, log_file: Path):
-        """Effectue la rotation d'un fichier de log"""
-        base_name = log_file.stem
-        
-        # Déplace les anciens fichiers rotés
-        for i in range(self.rotation_count - 1, 0, -1):
-            old_file = self.storage_path / f"{base_name}.{i}.jsonl"
-            new_file = self.storage_path / f"{base_name}.{i + 1}.jsonl"
+    async def _iter_logs(self,
+                         container_id: Optional[str],
+                         start_time: Optional[datetime],
+                         end_time: Optional[datetime],
+                         level: Optional[LogLevel],
+                         needle: Optional[bytes] = None) -> AsyncGenerator[LogEntry, None]:
+        """Fusionne les logs des conteneurs, du plus récent au plus ancien"""
+        start_ts = to_micros(start_time) if start_time else TS_MIN
+        end_ts = to_micros(end_time) if end_time else TS_MAX
+        
+        container_ids = [container_id] if container_id else self.store.list_containers()
+        iterators = [
+            self._iter_container_logs(cid, start_ts, end_ts, level, needle)
+            for cid in container_ids
+        ]
+        
+        # Archives compressées recouvrant la plage (chacune est un flux de la fusion)
+        readers = await asyncio.get_running_loop().run_in_executor(
+            None, self.archive.readers, container_id, start_ts, end_ts
+        )
+        iterators.extend(
+            self._iter_archive_logs(reader, container_id, start_ts, end_ts, level, needle)
+            for reader in readers
+        )
+        
+        # Fusion k-voies sur le timestamp décroissant
+        heap = []
+        try:
+            for index, iterator in enumerate(iterators):
+                try:
+                    log_entry = await iterator.__anext__()
+                    heapq.heappush(heap, (-to_micros(log_entry.timestamp), index, log_entry))
+                except StopAsyncIteration:
+                    pass
             
-            if old_file.exists():
-                if new_file.exists():
-                    new_file.unlink()
-                old_file.rename(new_file)
-        
-        # Déplace le fichier actuel vers .1
-        rotated_file = self.storage_path / f"{base_name}.1.jsonl"
-        if rotated_file.exists():
-            rotated_file.unlink()
-        log_file.rename(rotated_file)
-        
-        logger.info(f"Rotation du fichier de log {log_file}")
+            while heap:
+                _, index, log_entry = heapq.heappop(heap)
+                yield log_entry
+                try:
+                    next_entry = await iterators[index].__anext__()
+                    heapq.heappush(heap, (-to_micros(next_entry.timestamp), index, next_entry))
+                except StopAsyncIteration:
+                    pass
+        finally:
+            for iterator in iterators:
+                await iterator.aclose()
     
     async def get_logs(self, 
                       container_id: Optional[str] = None,
@@ -401,57 +610,16 @@ class LogCollector:
                       end_time: Optional[datetime] = None,
                       level: Optional[LogLevel] = None,
                       limit: int = 1000) -> AsyncGenerator[LogEntry, None]:
-        """Récupère les logs avec filtrage"""
-        
-        # Détermine les fichiers à lire
-        files_to_read = []
-        if container_id:
-            # Fichiers pour un conteneur spécifique
-            base_pattern = f"{container_id}*.jsonl"
-            files_to_read = list(self.storage_path.glob(base_pattern))
-        else:
-            # Tous les fichiers de logs
-            files_to_read = list(self.storage_path.glob("*.jsonl"))
-        
-        # Trie les fichiers par date de modification (plus récents en premier)
-        files_to_read.sort(key=lambda f: f.stat().st_mtime, reverse=True)
+        """Récupère les logs avec filtrage (les plus récents en premier)"""
+        if limit <= 0:
+            return
         
         count = 0
-        for log_file in files_to_read:
+        async for log_entry in self._iter_logs(container_id, start_time, end_time, level):
+            yield log_entry
+            count += 1
             if count >= limit:
                 break
-                
-            try:
-                # Lit le fichier ligne par ligne (en reverse pour avoir les plus récents)
-                async with aiofiles.open(log_file, 'r', encoding='utf-8') as f:
-                    lines = await f.readlines()
-                    
-                for line in reversed(lines):
-                    if count >= limit:
-                        break
-                    
-                    try:
-                        log_data = json.loads(line.strip())
-                        log_entry = LogEntry.from_dict(log_data)
-                        
-                        # Applique les filtres
-                        if start_time and log_entry.timestamp < start_time:
-                            continue
-                        if end_time and log_entry.timestamp > end_time:
-                            continue
-                        if level and log_entry.level != level:
-                            continue
-                        
-                        yield log_entry
-                        count += 1
-                        
-                    except (json.JSONDecodeError, KeyError, ValueError) as e:
-                        logger.warning(f"Ligne de log invalide ignorée: {e}")
-                        continue
-                        
-            except Exception as e:
-                logger.error(f"Erreur lors de la lecture du fichier {log_file}: {e}")
-                continue
     
     async def search_logs(self, 
                          query: str,
@@ -463,7 +631,13 @@ class LogCollector:
         query_lower = query.lower()
         count = 0
         
-        async for log_entry in self.get_logs(container_id, start_time, end_time, limit=limit * 2):
+        # Le préfiltre sur les octets bruts n'est sûr que si la requête est
+        # sérialisée telle quelle par json.dumps (ASCII sans caractère échappé)
+        needle = None
+        if query_lower.isascii() and not _JSON_ESCAPED_CHARS.search(query_lower):
+            needle = query_lower.encode('ascii')
+        
+        async for log_entry in self._iter_logs(container_id, start_time, end_time, None, needle):
             if count >= limit:
                 break
             
@@ -482,11 +656,19 @@ class LogCollector:
     
     def get_stats(self) -> Dict:
         """Retourne les statistiques du collecteur"""
+        store_stats = self.store.get_stats()
         return {
             'is_running': self.is_running,
             'monitored_containers': len(self.monitored_containers),
             'active_tasks': len(self.collection_tasks),
             'buffered_logs': sum(len(buffer) for buffer in self.log_buffers.values()),
-            'log_files': len(list(self.storage_path.glob("*.jsonl"))),
-            'storage_path': str(self.storage_path)
+            'log_files': store_stats['segments'],
+            'storage_path': str(self.storage_path),
+            'storage': store_stats,
+            'ingestion': self.ingestion.get_stats(),
+            'pubsub': self.pubsub.get_stats(),
+            'parsers': self.parsers.get_stats(),
+            'retention': self.retention.get_stats(),
+            'archive': self.archive.get_stats(),
+            'registry': self.registry.get_stats()
         }
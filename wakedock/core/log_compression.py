@@ -0,0 +1,410 @@
+"""
+Compression en flux des fichiers de logs, par trames indépendantes
+
+Le fichier source est lu par blocs de chunk_size octets coupés sur une fin
+de ligne; chaque bloc devient une trame complète (trame lz4, membre gzip ou
+trame zstd). La concaténation reste lisible par les outils standards
+(lz4 -d, zcat, zstd -d) et un index annexe ``<fichier>.fidx`` décrit les
+trames (offsets compressé et décompressé, première ligne, bornes
+temporelles): une plage du fichier d'origine se relit en ne décompressant
+que les trames concernées, mises en cache par FrameCache.
+
+Pour zstd, un dictionnaire entraîné sur des lignes JSONL peut être fourni;
+il est recopié dans l'index annexe, qui suffit donc à relire le fichier.
+
+Les fonctions de ce module sont bloquantes: elles sont destinées à un
+executor (les codecs libèrent le GIL pendant la compression).
+"""
+import logging
+import os
+import struct
+import threading
+import zlib
+from bisect import bisect_right
+from collections import OrderedDict
+from pathlib import Path
+from typing import (
+    Callable,
+    Dict,
+    Iterable,
+    Iterator,
+    List,
+    NamedTuple,
+    Optional,
+    Tuple,
+    Union,
+)
+
+try:
+    import lz4.frame
+    LZ4_AVAILABLE = True
+except ImportError:
+    LZ4_AVAILABLE = False
+
+try:
+    import zstandard
+    ZSTD_AVAILABLE = True
+except ImportError:
+    ZSTD_AVAILABLE = False
+    zstandard = None
+
+from wakedock.core.log_storage import TS_MAX, TS_MIN
+
+logger = logging.getLogger(__name__)
+
+# Codec -> (identifiant stocké dans l'index, extension)
+CODECS = {
+    'lz4': (1, '.lz4'),
+    'gzip': (2, '.gz'),
+    'zstd': (3, '.zst'),
+}
+_CODEC_NAMES = {codec_id: name for name, (codec_id, _) in CODECS.items()}
+
+FRAME_INDEX_SUFFIX = ".fidx"
+FRAME_INDEX_MAGIC = b"WDFX"
+FRAME_INDEX_VERSION = 2
+# magic, version, codec, taille des blocs, nombre de trames, taille d'origine, taille du dictionnaire
+FRAME_INDEX_HEADER = struct.Struct("<4sHHIIQI")
+# offset compressé, longueur compressée, offset d'origine, longueur d'origine, première ligne,
+# timestamps min et max (microsecondes)
+FRAME_INDEX_ENTRY = struct.Struct("<QIQIQqq")
+# Version 1: sans bornes temporelles
+FRAME_INDEX_ENTRY_V1 = struct.Struct("<QIQIQ")
+
+DEFAULT_CHUNK_SIZE = 4 * 1024 * 1024
+
+
+class FrameIndexEntry(NamedTuple):
+    """Position d'une trame dans le fichier compressé et dans le fichier d'origine"""
+    offset: int
+    length: int
+    raw_offset: int
+    raw_length: int
+    first_line: int  # numéro (à partir de 1) de la première ligne de la trame
+    min_ts: int = TS_MIN  # bornes des timestamps de la trame (inconnues par défaut)
+    max_ts: int = TS_MAX
+
+    def overlaps(self, start_ts: int, end_ts: int) -> bool:
+        return self.max_ts >= start_ts and self.min_ts <= end_ts
+
+
+class CompressionResult(NamedTuple):
+    """Résultat de la compression d'un fichier"""
+    target: Path
+    original_size: int
+    compressed_size: int
+    frames: int
+
+
+def check_codec(codec: str):
+    """Vérifie qu'un codec est connu et disponible"""
+    if codec not in CODECS:
+        raise ValueError(f"Type de compression non supporté: {codec}")
+    if codec == 'lz4' and not LZ4_AVAILABLE:
+        raise ValueError("La compression lz4 nécessite le paquet lz4")
+    if codec == 'zstd' and not ZSTD_AVAILABLE:
+        raise ValueError("La compression zstd nécessite zstandard")
+
+
+def frame_index_path(compressed_path: Union[str, Path]) -> Path:
+    """Chemin de l'index annexe d'un fichier compressé"""
+    compressed_path = Path(compressed_path)
+    return compressed_path.with_name(compressed_path.name + FRAME_INDEX_SUFFIX)
+
+
+def train_dictionary(samples: Iterable[bytes], dict_size: int = 64 * 1024) -> bytes:
+    """Entraîne un dictionnaire zstd sur des échantillons (lignes JSONL)"""
+    if not ZSTD_AVAILABLE:
+        raise ValueError("L'entraînement d'un dictionnaire nécessite zstandard")
+    return zstandard.train_dictionary(dict_size, list(samples)).as_bytes()
+
+
+def sample_lines(paths: Iterable[Union[str, Path]], max_samples: int = 10000) -> List[bytes]:
+    """Collecte des lignes d'exemple pour l'entraînement d'un dictionnaire"""
+    samples = []
+    for path in paths:
+        with open(path, 'rb') as f:
+            for line in f:
+                if line.strip():
+                    samples.append(line)
+                if len(samples) >= max_samples:
+                    return samples
+    return samples
+
+
+class _FrameCodec:
+    """Compression et décompression d'une trame complète"""
+
+    def __init__(self, codec: str, dictionary: Optional[bytes] = None, level: Optional[int] = None):
+        check_codec(codec)
+        self.codec = codec
+        self.level = level
+        self._zstd_dict = zstandard.ZstdCompressionDict(dictionary) if codec == 'zstd' and dictionary else None
+
+    def compress(self, data: bytes) -> bytes:
+        if self.codec == 'lz4':
+            return lz4.frame.compress(data, compression_level=self.level or 0)
+        if self.codec == 'gzip':
+            compressor = zlib.compressobj(self.level or 6, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+            return compressor.compress(data) + compressor.flush()
+        compressor = zstandard.ZstdCompressor(level=self.level or 3, dict_data=self._zstd_dict)
+        return compressor.compress(data)
+
+    def decompress(self, data: bytes) -> bytes:
+        if self.codec == 'lz4':
+            return lz4.frame.decompress(data)
+        if self.codec == 'gzip':
+            return zlib.decompress(data, 16 + zlib.MAX_WBITS)
+        return zstandard.ZstdDecompressor(dict_data=self._zstd_dict).decompress(data)
+
+
+def _iter_chunks(source, chunk_size: int) -> Iterator[bytes]:
+    """
+    Lit source par blocs terminés par une fin de ligne
+
+    Un bloc ne dépasse chunk_size que si une seule ligne est plus longue.
+    """
+    remainder = b""
+    while True:
+        data = source.read(chunk_size - len(remainder) if len(remainder) < chunk_size else chunk_size)
+        if not data:
+            break
+        data = remainder + data
+        cut = data.rfind(b"\n") + 1
+        if cut == 0:
+            # Ligne plus longue qu'un bloc: elle continue dans le bloc suivant
+            remainder = data
+            continue
+        remainder = data[cut:]
+        yield data[:cut]
+    if remainder:
+        yield remainder
+
+
+def compress_file(source_path: Union[str, Path],
+                  target_path: Union[str, Path],
+                  codec: str = 'lz4',
+                  chunk_size: int = DEFAULT_CHUNK_SIZE,
+                  dictionary: Optional[bytes] = None,
+                  level: Optional[int] = None,
+                  frame_bounds: Optional[Callable[[bytes], Optional[Tuple[int, int]]]] = None) -> CompressionResult:
+    """
+    Compresse un fichier en trames indépendantes et écrit son index annexe
+
+    La mémoire utilisée est bornée par chunk_size. frame_bounds calcule les
+    timestamps min et max d'un bloc (None si inconnus); ils permettent
+    d'écarter les trames hors d'une plage de temps sans les décompresser.
+    Le fichier et son index sont écrits sous un nom temporaire puis renommés.
+    """
+    frame_codec = _FrameCodec(codec, dictionary, level)
+    target_path = Path(target_path)
+    index_path = frame_index_path(target_path)
+    temp_target = target_path.with_name(target_path.name + ".tmp")
+    temp_index = index_path.with_name(index_path.name + ".tmp")
+
+    frames: List[FrameIndexEntry] = []
+    raw_offset = 0
+    line = 1
+    try:
+        with open(source_path, 'rb') as source, open(temp_target, 'wb') as target:
+            for chunk in _iter_chunks(source, chunk_size):
+                compressed = frame_codec.compress(chunk)
+                bounds = frame_bounds(chunk) if frame_bounds else None
+                frames.append(FrameIndexEntry(
+                    target.tell(), len(compressed), raw_offset, len(chunk), line, *(bounds or (TS_MIN, TS_MAX))
+                ))
+                target.write(compressed)
+                raw_offset += len(chunk)
+                line += chunk.count(b"\n")
+            target.flush()
+            os.fsync(target.fileno())
+            compressed_size = target.tell()
+
+        dictionary_data = dictionary if codec == 'zstd' and dictionary else b""
+        with open(temp_index, 'wb') as f:
+            f.write(FRAME_INDEX_HEADER.pack(
+                FRAME_INDEX_MAGIC, FRAME_INDEX_VERSION, CODECS[codec][0], chunk_size,
+                len(frames), raw_offset, len(dictionary_data)
+            ))
+            f.write(dictionary_data)
+            for frame in frames:
+                f.write(FRAME_INDEX_ENTRY.pack(*frame))
+            f.flush()
+            os.fsync(f.fileno())
+
+        os.replace(temp_index, index_path)
+        os.replace(temp_target, target_path)
+    except BaseException:
+        for path in (temp_target, temp_index):
+            if path.exists():
+                path.unlink()
+        raise
+
+    return CompressionResult(target_path, raw_offset, compressed_size, len(frames))
+
+
+class FrameCache:
+    """
+    Cache LRU des trames décompressées, borné en octets
+
+    Partagé entre les lecteurs (et les threads de l'executor): les
+    requêtes successives sur une même période ne décompressent qu'une fois.
+    """
+
+    def __init__(self, max_bytes: int = 64 * 1024 * 1024):
+        self.max_bytes = max_bytes
+        self.current_bytes = 0
+        self._frames: "OrderedDict[Tuple[str, int], bytes]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.stats = {
+            'hits': 0,
+            'misses': 0,
+            'evictions': 0
+        }
+
+    def get(self, key: Tuple[str, int]) -> Optional[bytes]:
+        with self._lock:
+            data = self._frames.get(key)
+            if data is None:
+                self.stats['misses'] += 1
+                return None
+            self._frames.move_to_end(key)
+            self.stats['hits'] += 1
+            return data
+
+    def put(self, key: Tuple[str, int], data: bytes):
+        # Une trame plus grande que le cache n'est pas conservée
+        if len(data) > self.max_bytes:
+            return
+        with self._lock:
+            previous = self._frames.pop(key, None)
+            if previous is not None:
+                self.current_bytes -= len(previous)
+            self._frames[key] = data
+            self.current_bytes += len(data)
+            while self.current_bytes > self.max_bytes:
+                _, evicted = self._frames.popitem(last=False)
+                self.current_bytes -= len(evicted)
+                self.stats['evictions'] += 1
+
+    def invalidate(self, path: Union[str, Path]):
+        """Oublie les trames d'un fichier (supprimé ou remplacé)"""
+        path = str(path)
+        with self._lock:
+            for key in [key for key in self._frames if key[0] == path]:
+                self.current_bytes -= len(self._frames.pop(key))
+
+    def clear(self):
+        with self._lock:
+            self._frames.clear()
+            self.current_bytes = 0
+
+    def get_stats(self) -> Dict:
+        with self._lock:
+            lookups = self.stats['hits'] + self.stats['misses']
+            return {
+                **self.stats,
+                'frames': len(self._frames),
+                'bytes': self.current_bytes,
+                'max_bytes': self.max_bytes,
+                'hit_rate': self.stats['hits'] / lookups if lookups else 0.0
+            }
+
+
+class SeekableCompressedFile:
+    """Lecture d'un fichier compressé par trames à l'aide de son index annexe"""
+
+    def __init__(self, path: Union[str, Path], cache: Optional[FrameCache] = None):
+        self.path = Path(path)
+        self.cache = cache
+        with open(frame_index_path(self.path), 'rb') as f:
+            header = f.read(FRAME_INDEX_HEADER.size)
+            if len(header) < FRAME_INDEX_HEADER.size:
+                raise ValueError(f"Index de trames tronqué: {self.path}")
+            magic, version, codec_id, self.chunk_size, count, self.original_size, dict_size = \
+                FRAME_INDEX_HEADER.unpack(header)
+            if magic != FRAME_INDEX_MAGIC or version not in (1, FRAME_INDEX_VERSION) or codec_id not in _CODEC_NAMES:
+                raise ValueError(f"Index de trames invalide: {self.path}")
+            entry_struct = FRAME_INDEX_ENTRY if version == FRAME_INDEX_VERSION else FRAME_INDEX_ENTRY_V1
+            dictionary = f.read(dict_size) if dict_size else None
+            raw = f.read(count * entry_struct.size)
+
+        self.codec = _CODEC_NAMES[codec_id]
+        self._frame_codec = _FrameCodec(self.codec, dictionary)
+        self.frames = [
+            FrameIndexEntry(*entry_struct.unpack_from(raw, position))
+            for position in range(0, len(raw) - entry_struct.size + 1, entry_struct.size)
+        ]
+        self._raw_offsets = [frame.raw_offset for frame in self.frames]
+        self._first_lines = [frame.first_line for frame in self.frames]
+
+    @property
+    def min_ts(self) -> int:
+        return min((frame.min_ts for frame in self.frames), default=TS_MAX)
+
+    @property
+    def max_ts(self) -> int:
+        return max((frame.max_ts for frame in self.frames), default=TS_MIN)
+
+    def read_frame(self, frame: FrameIndexEntry) -> bytes:
+        """Décompresse une trame (ou la reprend du cache)"""
+        key = (str(self.path), frame.offset)
+        if self.cache is not None:
+            data = self.cache.get(key)
+            if data is not None:
+                return data
+
+        fd = os.open(self.path, os.O_RDONLY)
+        try:
+            data = os.pread(fd, frame.length, frame.offset)
+        finally:
+            os.close(fd)
+        data = self._frame_codec.decompress(data)
+
+        if self.cache is not None:
+            self.cache.put(key, data)
+        return data
+
+    def iter_frames_reverse(self, start_ts: int = TS_MIN, end_ts: int = TS_MAX) -> Iterator[FrameIndexEntry]:
+        """Trames recouvrant une plage de temps, des plus récentes aux plus anciennes"""
+        for frame in reversed(self.frames):
+            if frame.overlaps(start_ts, end_ts):
+                yield frame
+
+    def read_lines(self, frame: FrameIndexEntry) -> List[bytes]:
+        """Lignes d'une trame, sans le saut de ligne final (numérotées à partir de frame.first_line)"""
+        lines = self.read_frame(frame).split(b"\n")
+        if not lines[-1]:
+            lines.pop()
+        return lines
+
+    def frame_at(self, raw_offset: int) -> Optional[int]:
+        """Indice de la trame contenant un offset du fichier d'origine"""
+        position = bisect_right(self._raw_offsets, raw_offset) - 1
+        if position < 0 or raw_offset >= self.original_size:
+            return None
+        return position
+
+    def read_range(self, raw_offset: int, length: int) -> bytes:
+        """Lit une plage du fichier d'origine en ne décompressant que les trames concernées"""
+        position = self.frame_at(raw_offset)
+        if position is None or length <= 0:
+            return b""
+        parts = []
+        end = raw_offset + length
+        while position < len(self.frames) and self.frames[position].raw_offset < end:
+            frame = self.frames[position]
+            data = self.read_frame(frame)
+            start = max(raw_offset - frame.raw_offset, 0)
+            parts.append(data[start:end - frame.raw_offset])
+            position += 1
+        return b"".join(parts)
+
+    def iter_lines(self, start_line: int = 1) -> Iterator[Tuple[int, bytes]]:
+        """Parcourt les lignes (numéro, contenu sans saut de ligne) à partir de start_line"""
+        position = max(bisect_right(self._first_lines, start_line) - 1, 0)
+        for frame in self.frames[position:]:
+            for index, line in enumerate(self.read_lines(frame)):
+                line_number = frame.first_line + index
+                if line_number >= start_line:
+                    yield line_number, line
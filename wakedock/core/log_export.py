@@ -0,0 +1,328 @@
+"""
+Export des logs en flux, à mémoire constante
+
+Les entrées sont lues au fil de l'eau (index de recherche ou stockage),
+encodées ligne à ligne puis regroupées en blocs d'environ chunk_size octets,
+éventuellement compressés à la volée. Aucun document complet n'est construit
+en mémoire: l'export d'une semaine de logs tient dans quelques blocs.
+
+Formats: json (tableau), ndjson, csv, txt et parquet (si pyarrow est installé).
+Compression: gzip, zstd (si zstandard est installé) ; pour parquet la
+compression est celle des colonnes du fichier.
+
+Les champs exportés et le rendu texte dépendent du type de logs
+(ExportLayout): logs de conteneurs (CONTAINER_LOG_LAYOUT, par défaut) ou
+logs applicatifs (APPLICATION_LOG_LAYOUT, route /logs/export).
+"""
+import csv
+import io
+import json
+import logging
+import zlib
+from dataclasses import dataclass
+from datetime import datetime
+from typing import (
+    Any,
+    AsyncIterable,
+    AsyncIterator,
+    Callable,
+    Dict,
+    Iterable,
+    List,
+    Optional,
+    Tuple,
+    Union,
+)
+
+from wakedock.core.log_classifier import dumps_json
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+    PYARROW_AVAILABLE = True
+except ImportError:
+    PYARROW_AVAILABLE = False
+    pa = None
+    pq = None
+
+try:
+    import zstandard
+    ZSTD_AVAILABLE = True
+except ImportError:
+    ZSTD_AVAILABLE = False
+    zstandard = None
+
+logger = logging.getLogger(__name__)
+
+EXPORT_FORMATS = {
+    'json': ('application/json', 'json'),
+    'ndjson': ('application/x-ndjson', 'ndjson'),
+    'csv': ('text/csv', 'csv'),
+    'txt': ('text/plain', 'txt'),
+    'parquet': ('application/vnd.apache.parquet', 'parquet'),
+}
+COMPRESSIONS = {
+    'gzip': ('application/gzip', 'gz'),
+    'zstd': ('application/zstd', 'zst'),
+}
+
+@dataclass(frozen=True)
+class ExportLayout:
+    """Champs exportés et rendu texte d'un type de logs"""
+    fields: Tuple[str, ...]  # json, ndjson et parquet (timestamp en premier)
+    csv_fields: Tuple[str, ...]
+    text_line: Callable[[Dict], str]
+    merge_metadata: bool = False  # json/ndjson: métadonnées fusionnées dans l'objet
+    dumps_metadata: Callable[[Dict], str] = lambda metadata: dumps_json(metadata).decode('utf-8')
+
+
+def _container_text_line(record: Dict) -> str:
+    level = (record['level'] or '').upper()
+    return f"[{record['timestamp']}] [{level}] {record['container_name'] or ''}: {record['message']}"
+
+
+def _application_text_line(record: Dict) -> str:
+    line = f"{record['timestamp']} [{record['level']}] {record['message']}"
+    if record['service']:
+        line += f" (service: {record['service']})"
+    if record['container_id']:
+        line += f" (container: {record['container_id']})"
+    return line
+
+
+# Logs de conteneurs (LogCollector / LogSearchService)
+CONTAINER_LOG_LAYOUT = ExportLayout(
+    fields=('timestamp', 'level', 'container_id', 'container_name', 'service_name', 'message'),
+    csv_fields=('timestamp', 'level', 'container_name', 'service_name', 'message'),
+    text_line=_container_text_line
+)
+
+# Logs applicatifs de WakeDock (colonnes historiques de /logs/export)
+APPLICATION_LOG_LAYOUT = ExportLayout(
+    fields=('timestamp', 'level', 'message', 'service', 'container_id'),
+    csv_fields=('timestamp', 'level', 'message', 'service', 'container_id'),
+    text_line=_application_text_line,
+    merge_metadata=True,
+    dumps_metadata=json.dumps
+)
+
+
+def _normalize(record: Union[Dict, Any], layout: ExportLayout) -> Dict:
+    """Ramène une entrée (dict de recherche ou LogEntry) aux champs exportés"""
+    if not isinstance(record, dict):
+        record = record.to_dict()
+    normalized = {field: record.get(field) for field in layout.fields}
+    timestamp = normalized['timestamp']
+    if isinstance(timestamp, datetime):
+        normalized['timestamp'] = timestamp.isoformat()
+    normalized['metadata'] = record.get('metadata') or {}
+    return normalized
+
+
+class _ChunkSink:
+    """Fichier en écriture seule dont le contenu est vidé après chaque groupe de lignes"""
+
+    def __init__(self):
+        self._chunks: List[bytes] = []
+        self._position = 0
+        self.closed = False
+
+    def write(self, data) -> int:
+        data = bytes(data)
+        self._chunks.append(data)
+        self._position += len(data)
+        return len(data)
+
+    def tell(self) -> int:
+        return self._position
+
+    def flush(self):
+        pass
+
+    def close(self):
+        self.closed = True
+
+    def drain(self) -> bytes:
+        data = b''.join(self._chunks)
+        self._chunks.clear()
+        return data
+
+
+class LogExporter:
+    """Encodeur de flux d'export"""
+
+    def __init__(self, format: str = 'ndjson', compression: Optional[str] = None,
+                 include_metadata: bool = True, chunk_size: int = 64 * 1024,
+                 parquet_row_group_size: int = 10000, layout: ExportLayout = CONTAINER_LOG_LAYOUT):
+        if format not in EXPORT_FORMATS:
+            raise ValueError(f"Format d'export non supporté: {format}")
+        if format == 'parquet' and not PYARROW_AVAILABLE:
+            raise ValueError("L'export parquet nécessite pyarrow")
+        if compression in (None, '', 'none'):
+            compression = None
+        elif compression not in COMPRESSIONS:
+            raise ValueError(f"Compression non supportée: {compression}")
+        elif compression == 'zstd' and not ZSTD_AVAILABLE:
+            raise ValueError("La compression zstd nécessite zstandard")
+
+        self.format = format
+        self.compression = compression
+        self.include_metadata = include_metadata
+        self.chunk_size = chunk_size
+        self.parquet_row_group_size = parquet_row_group_size
+        self.layout = layout
+
+        # Compteurs de l'export en cours
+        self.records = 0
+        self.bytes_written = 0
+
+    @property
+    def media_type(self) -> str:
+        """Type MIME du contenu transmis"""
+        if self.compression and self.format != 'parquet':
+            return COMPRESSIONS[self.compression][0]
+        return EXPORT_FORMATS[self.format][0]
+
+    def filename(self, prefix: str = "logs") -> str:
+        """Nom du fichier proposé au téléchargement"""
+        name = f"{prefix}_{datetime.now().strftime('%Y%m%d_%H%M%S')}.{EXPORT_FORMATS[self.format][1]}"
+        if self.compression and self.format != 'parquet':
+            name += f".{COMPRESSIONS[self.compression][1]}"
+        return name
+
+    async def stream(self, records: Union[AsyncIterable, Iterable]) -> AsyncIterator[bytes]:
+        """Encode les entrées et produit des blocs d'octets prêts à être transmis"""
+        if self.format == 'parquet':
+            chunks = self._stream_parquet(records)
+        else:
+            chunks = self._stream_rows(records)
+
+        compressor = self._compressor()
+        async for chunk in chunks:
+            if compressor is not None:
+                chunk = compressor.compress(chunk)
+            if chunk:
+                self.bytes_written += len(chunk)
+                yield chunk
+
+        if compressor is not None:
+            tail = compressor.flush()
+            if tail:
+                self.bytes_written += len(tail)
+                yield tail
+
+        logger.info(f"Export {self.format} terminé: {self.records} entrées, {self.bytes_written} octets")
+
+    def _compressor(self):
+        """Compresseur incrémental (None sans compression ou pour parquet)"""
+        if self.compression is None or self.format == 'parquet':
+            return None
+        if self.compression == 'gzip':
+            return zlib.compressobj(6, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+        return zstandard.ZstdCompressor(level=3).compressobj()
+
+    async def _iterate(self, records: Union[AsyncIterable, Iterable]) -> AsyncIterator[Dict]:
+        """Itère une source synchrone ou asynchrone en normalisant les entrées"""
+        if hasattr(records, '__aiter__'):
+            async for record in records:
+                yield _normalize(record, self.layout)
+        else:
+            for record in records:
+                yield _normalize(record, self.layout)
+
+    async def _stream_rows(self, records) -> AsyncIterator[bytes]:
+        """Formats ligne à ligne: blocs d'environ chunk_size octets"""
+        buffer = bytearray(self._header())
+        csv_buffer = io.StringIO()
+        csv_writer = csv.writer(csv_buffer)
+
+        async for record in self._iterate(records):
+            if self.format == 'json' and self.records:
+                buffer += b",\n"
+            buffer += self._encode_row(record, csv_buffer, csv_writer)
+            self.records += 1
+
+            if len(buffer) >= self.chunk_size:
+                yield bytes(buffer)
+                buffer.clear()
+
+        buffer += self._footer()
+        if buffer:
+            yield bytes(buffer)
+
+    def _header(self) -> bytes:
+        if self.format == 'json':
+            return b"[\n"
+        if self.format == 'csv':
+            fields = list(self.layout.csv_fields) + (['metadata'] if self.include_metadata else [])
+            return (",".join(fields) + "\r\n").encode('utf-8')
+        return b""
+
+    def _footer(self) -> bytes:
+        if self.format == 'json':
+            return b"\n]\n" if self.records else b"]\n"
+        return b""
+
+    def _encode_row(self, record: Dict, csv_buffer: io.StringIO, csv_writer) -> bytes:
+        """Encode une entrée selon le format ligne à ligne"""
+        if self.format in ('json', 'ndjson'):
+            metadata = record.pop('metadata')
+            if self.include_metadata:
+                if self.layout.merge_metadata:
+                    record.update(metadata)
+                else:
+                    record['metadata'] = metadata
+            data = dumps_json(record)
+            return data if self.format == 'json' else data + b"\n"
+
+        if self.format == 'csv':
+            row = [record[field] or '' for field in self.layout.csv_fields]
+            if self.include_metadata:
+                row.append(self.layout.dumps_metadata(record['metadata']))
+            csv_buffer.seek(0)
+            csv_buffer.truncate()
+            csv_writer.writerow(row)
+            return csv_buffer.getvalue().encode('utf-8')
+
+        return (self.layout.text_line(record) + "\n").encode('utf-8')
+
+    async def _stream_parquet(self, records) -> AsyncIterator[bytes]:
+        """Parquet: un groupe de lignes écrit puis transmis tous les parquet_row_group_size"""
+        columns = [pa.field('timestamp', pa.timestamp('us'))]
+        columns += [pa.field(field, pa.string()) for field in self.layout.fields[1:]]
+        if self.include_metadata:
+            columns.append(pa.field('metadata', pa.string()))
+        schema = pa.schema(columns)
+
+        sink = _ChunkSink()
+        writer = pq.ParquetWriter(pa.PythonFile(sink, mode='w'), schema,
+                                  compression=self.compression or 'snappy')
+        rows: Dict[str, List] = {field.name: [] for field in columns}
+
+        def write_row_group():
+            writer.write_table(pa.Table.from_pydict(rows, schema=schema))
+            for values in rows.values():
+                values.clear()
+
+        try:
+            async for record in self._iterate(records):
+                try:
+                    timestamp = datetime.fromisoformat(record['timestamp'])
+                except (TypeError, ValueError):
+                    timestamp = None
+                rows['timestamp'].append(timestamp)
+                for field in self.layout.fields[1:]:
+                    rows[field].append(record[field])
+                if self.include_metadata:
+                    rows['metadata'].append(dumps_json(record['metadata']).decode('utf-8'))
+                self.records += 1
+
+                if len(rows['timestamp']) >= self.parquet_row_group_size:
+                    write_row_group()
+                    yield sink.drain()
+
+            if rows['timestamp']:
+                write_row_group()
+        finally:
+            writer.close()
+        yield sink.drain()
@@ -0,0 +1,188 @@
+"""
+Recherche plein texte SQLite FTS5 partagée par les services de logs
+
+Traduit les requêtes utilisateur en expressions MATCH FTS5 sûres:
+- termes simples (ET implicite) : ``database timeout``
+- phrases exactes : ``"connection refused"``
+- préfixes : ``conn*``
+- alternatives : ``error OR fatal``
+- exclusions : ``timeout -retry``, ou seules (``-debug``: tout sauf debug)
+
+Tous les termes sont cités, la syntaxe FTS5 brute de l'utilisateur
+(colonnes, NEAR, parenthèses) ne peut donc pas produire d'erreur SQL.
+"""
+import re
+from dataclasses import dataclass
+from typing import Callable, Iterable, List, Optional
+
+# Tokenizer commun: insensible aux accents, index de préfixes de 2 et 3
+# caractères pour que les requêtes "abc*" ne parcourent pas tout le vocabulaire
+FTS_TOKENIZE = "unicode61 remove_diacritics 2"
+FTS_PREFIX = "2 3"
+
+# Marqueurs de surlignage des extraits
+HIGHLIGHT_OPEN = "<mark>"
+HIGHLIGHT_CLOSE = "</mark>"
+SNIPPET_ELLIPSIS = "…"
+SNIPPET_TOKENS = 16
+
+_QUERY_TOKEN_PATTERN = re.compile(r'(-?)"([^"]*)"?|(\S+)')
+_WORD_PATTERN = re.compile(r'\w', re.UNICODE)
+
+
+@dataclass(frozen=True)
+class QueryToken:
+    """Élément d'une requête de recherche"""
+    text: str
+    kind: str = "term"  # term, prefix ou phrase
+    negated: bool = False
+    alternative: bool = False  # relié au précédent par OR
+
+
+@dataclass(frozen=True)
+class MatchExpression:
+    """
+    Expression MATCH FTS5 d'une requête
+
+    FTS5 ne sait pas évaluer une requête faite uniquement d'exclusions
+    (``-debug``): expression désigne alors les lignes à écarter
+    (excluded=True) et l'appelant conserve toutes les autres.
+    """
+    expression: str
+    excluded: bool = False
+
+
+def fts_table_sql(table: str, columns: Iterable[str], unindexed: Iterable[str] = ()) -> str:
+    """Génère le CREATE VIRTUAL TABLE FTS5 avec la configuration commune"""
+    unindexed = set(unindexed)
+    column_defs = [f"{column} UNINDEXED" if column in unindexed else column for column in columns]
+    return (
+        f"CREATE VIRTUAL TABLE IF NOT EXISTS {table} USING fts5("
+        f"{', '.join(column_defs)}, tokenize='{FTS_TOKENIZE}', prefix='{FTS_PREFIX}')"
+    )
+
+
+def snippet_sql(table: str, column_index: int = 0) -> str:
+    """Expression SQL d'extrait surligné pour une table FTS5"""
+    return (
+        f"snippet({table}, {column_index}, '{HIGHLIGHT_OPEN}', '{HIGHLIGHT_CLOSE}', "
+        f"'{SNIPPET_ELLIPSIS}', {SNIPPET_TOKENS})"
+    )
+
+
+def parse_search_query(query: Optional[str], stop_words: Iterable[str] = (),
+                       min_term_length: int = 1) -> List[QueryToken]:
+    """Découpe une requête utilisateur en termes, phrases et préfixes"""
+    if not query:
+        return []
+
+    stop_words = set(stop_words)
+    tokens: List[QueryToken] = []
+    alternative = False
+
+    for match in _QUERY_TOKEN_PATTERN.finditer(query):
+        negated_phrase, phrase, word = match.groups()
+
+        if phrase is not None:
+            if _WORD_PATTERN.search(phrase):
+                tokens.append(QueryToken(phrase.strip(), "phrase", bool(negated_phrase), alternative))
+            alternative = False
+            continue
+
+        if word == "OR":
+            alternative = bool(tokens)
+            continue
+
+        negated = word.startswith("-") and len(word) > 1
+        if negated:
+            word = word[1:]
+
+        kind = "term"
+        if word.endswith("*"):
+            kind = "prefix"
+            word = word.rstrip("*")
+
+        word = word.lower()
+        if not _WORD_PATTERN.search(word):
+            alternative = False
+            continue
+
+        # Les mots courts et courants ne filtrent pas (comportement historique)
+        if kind == "term" and not negated and (word in stop_words or len(word) < min_term_length):
+            alternative = False
+            continue
+
+        tokens.append(QueryToken(word, kind, negated, alternative))
+        alternative = False
+
+    return tokens
+
+
+def quote_fts_term(text: str) -> str:
+    """Cite un terme ou une phrase pour FTS5"""
+    return '"' + text.replace('"', '""') + '"'
+
+
+def column_filter(column: str, expression: str) -> str:
+    """Restreint une expression MATCH à une colonne FTS5"""
+    return f"{column} : ({expression})"
+
+
+def _token_expression(token: QueryToken,
+                      phrase_terms: Optional[Callable[[str], Iterable[str]]]) -> Optional[str]:
+    """Expression FTS5 d'un élément de requête, None si la phrase ne contient aucun terme"""
+    if token.kind == "phrase" and phrase_terms is not None:
+        # Index de termes sans positions: la phrase devient la conjonction de ses termes,
+        # un seul groupe pour que l'exclusion ou l'alternative porte sur la phrase entière
+        terms = [quote_fts_term(term) for term in sorted(set(phrase_terms(token.text)))]
+        if not terms:
+            return None
+        return terms[0] if len(terms) == 1 else "(" + " AND ".join(terms) + ")"
+    return quote_fts_term(token.text) + ("*" if token.kind == "prefix" else "")
+
+
+def build_match_expression(tokens: List[QueryToken],
+                           phrase_terms: Optional[Callable[[str], Iterable[str]]] = None) -> Optional[MatchExpression]:
+    """
+    Construit l'expression MATCH FTS5 d'une requête analysée
+
+    Args:
+        phrase_terms: Découpe une phrase en termes pour les index sans
+            positions (phrase = tous ses termes); sans lui, phrase FTS5 exacte
+
+    Returns:
+        Expression MATCH, None si la requête ne contient aucun terme; une
+        requête faite uniquement d'exclusions donne l'expression des
+        lignes à écarter (excluded=True)
+    """
+    expressions = [(token, _token_expression(token, phrase_terms)) for token in tokens]
+    expressions = [(token, expression) for token, expression in expressions if expression]
+    if not expressions:
+        return None
+
+    negatives = [expression for token, expression in expressions if token.negated]
+    if len(negatives) == len(expressions):
+        return MatchExpression(" OR ".join(negatives), excluded=True)
+
+    groups: List[List[str]] = []
+    for token, expression in expressions:
+        if token.negated:
+            continue
+        if token.alternative and groups:
+            groups[-1].append(expression)
+        else:
+            groups.append([expression])
+
+    clauses = [group[0] if len(group) == 1 else "(" + " OR ".join(group) + ")" for group in groups]
+    expression = " AND ".join(clauses)
+
+    for negative in negatives:
+        expression = f"({expression}) NOT {negative}"
+
+    return MatchExpression(expression)
+
+
+def build_fts_query(query: Optional[str], stop_words: Iterable[str] = (),
+                    min_term_length: int = 1) -> Optional[MatchExpression]:
+    """Traduit directement une requête utilisateur en expression MATCH"""
+    return build_match_expression(parse_search_query(query, stop_words, min_term_length))
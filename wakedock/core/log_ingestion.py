@@ -0,0 +1,299 @@
+"""
+Moteur d'ingestion non bloquant pour les flux de logs Docker
+
+Le SDK Docker expose les logs en mode follow sous forme de générateur bloquant.
+Chaque conteneur est donc lu par un thread dédié qui alimente une file bornée
+consommée depuis la boucle asyncio: un conteneur bavard ne bloque plus les
+autres coroutines, et une file pleine suspend le thread lecteur (backpressure)
+au lieu de faire grossir la mémoire.
+"""
+import asyncio
+import logging
+import threading
+import time
+from collections import deque
+from typing import Callable, Deque, Dict, Iterable, List, Optional, Union
+
+logger = logging.getLogger(__name__)
+
+LogChunk = Union[bytes, str]
+StreamFactory = Callable[[], Iterable[LogChunk]]
+
+
+class ThroughputMeter:
+    """Débit glissant (lignes/s) lissé par moyenne exponentielle"""
+
+    def __init__(self, window_seconds: float = 1.0, smoothing: float = 0.3):
+        self.window_seconds = window_seconds
+        self.smoothing = smoothing
+        self.rate = 0.0
+        self._window_start = time.monotonic()
+        self._window_count = 0
+
+    def add(self, count: int):
+        """Comptabilise des lignes consommées"""
+        self._window_count += count
+        now = time.monotonic()
+        elapsed = now - self._window_start
+        if elapsed >= self.window_seconds:
+            instant_rate = self._window_count / elapsed
+            self.rate = self.smoothing * instant_rate + (1 - self.smoothing) * self.rate
+            self._window_start = now
+            self._window_count = 0
+
+    def current_rate(self) -> float:
+        """Retourne le débit lissé, décroissant si le flux est inactif"""
+        idle = time.monotonic() - self._window_start
+        if idle > 2 * self.window_seconds and self._window_count == 0:
+            return self.rate * (1 - self.smoothing) ** int(idle / self.window_seconds)
+        return self.rate
+
+
+class ContainerLogReader:
+    """Lecteur de logs d'un conteneur exécuté dans un thread dédié"""
+
+    def __init__(self, container_id: str, stream_factory: StreamFactory,
+                 loop: asyncio.AbstractEventLoop, max_queue_size: int = 10000):
+        self.container_id = container_id
+        self.stream_factory = stream_factory
+        self.loop = loop
+        self.max_queue_size = max_queue_size
+
+        # File bornée partagée entre le thread lecteur et la boucle asyncio
+        self._lines: Deque[bytes] = deque()
+        self._condition = threading.Condition()
+        self._waiter: Optional[asyncio.Future] = None
+        self._finished = False
+        self._stop_requested = threading.Event()
+        self._stream: Optional[Iterable[LogChunk]] = None
+        self._thread: Optional[threading.Thread] = None
+
+        # Compteurs (écrits par le thread lecteur, lus par get_stats)
+        self.lines_read = 0
+        self.bytes_read = 0
+        self.lines_consumed = 0
+        self.backpressure_waits = 0
+        self.backpressure_seconds = 0.0
+        self.errors = 0
+        self.started_at = time.time()
+        self.last_line_at: Optional[float] = None
+        self.throughput = ThroughputMeter()
+
+    def start(self):
+        """Démarre le thread lecteur"""
+        self._thread = threading.Thread(
+            target=self._run,
+            name=f"wakedock-logs-{self.container_id[:12]}",
+            daemon=True
+        )
+        self._thread.start()
+
+    def stop(self):
+        """Demande l'arrêt du lecteur et ferme le flux Docker sous-jacent"""
+        self._stop_requested.set()
+        with self._condition:
+            self._condition.notify_all()
+        self._wake_consumer()
+
+        # Ferme le flux pour débloquer un thread en attente sur le socket
+        close = getattr(self._stream, 'close', None)
+        if callable(close):
+            try:
+                close()
+            except Exception as e:
+                logger.debug(f"Erreur lors de la fermeture du flux {self.container_id}: {e}")
+
+    @property
+    def is_finished(self) -> bool:
+        """Indique si le flux est terminé et la file vidée"""
+        with self._condition:
+            return self._finished and not self._lines
+
+    @property
+    def queue_depth(self) -> int:
+        """Nombre de lignes en attente de consommation"""
+        return len(self._lines)
+
+    def _run(self):
+        """Boucle du thread lecteur: itère le flux bloquant"""
+        # Fin de ligne incomplète du chunk précédent: une ligne peut être
+        # répartie sur plusieurs chunks (lectures brutes du socket pour les
+        # conteneurs TTY, trames de 16 Ko pour les lignes plus longues)
+        partial = b''
+        try:
+            self._stream = self.stream_factory()
+            for chunk in self._stream:
+                if self._stop_requested.is_set():
+                    return
+                if not chunk:
+                    continue
+                if isinstance(chunk, str):
+                    chunk = chunk.encode('utf-8', errors='ignore')
+
+                # Seules les lignes terminées par \n sont transmises
+                chunk = partial + chunk
+                end = chunk.rfind(b'\n')
+                if end < 0:
+                    partial = chunk
+                    continue
+                partial = chunk[end + 1:]
+                for line in chunk[:end].splitlines():
+                    if line and not self._enqueue(line):
+                        return
+
+            # Dernière ligne du flux, sans \n final
+            if partial.strip():
+                self._enqueue(partial.rstrip(b'\r'))
+        except Exception as e:
+            if not self._stop_requested.is_set():
+                self.errors += 1
+                logger.error(f"Erreur dans le flux de logs du conteneur {self.container_id}: {e}")
+        finally:
+            with self._condition:
+                self._finished = True
+            self._wake_consumer()
+
+    def _enqueue(self, line: bytes) -> bool:
+        """Ajoute une ligne à la file, en bloquant si elle est pleine"""
+        with self._condition:
+            if len(self._lines) >= self.max_queue_size:
+                self.backpressure_waits += 1
+                wait_start = time.monotonic()
+                while len(self._lines) >= self.max_queue_size and not self._stop_requested.is_set():
+                    self._condition.wait(0.5)
+                self.backpressure_seconds += time.monotonic() - wait_start
+
+            if self._stop_requested.is_set():
+                return False
+
+            self._lines.append(line)
+            self.lines_read += 1
+            self.bytes_read += len(line)
+            self.last_line_at = time.time()
+            # Ne réveille la boucle que si le consommateur attend
+            waiter, self._waiter = self._waiter, None
+
+        if waiter is not None:
+            self._schedule_wakeup(waiter)
+        return True
+
+    def _wake_consumer(self):
+        """Réveille le consommateur s'il attend de nouvelles lignes"""
+        with self._condition:
+            waiter, self._waiter = self._waiter, None
+        if waiter is not None:
+            self._schedule_wakeup(waiter)
+
+    def _schedule_wakeup(self, waiter: asyncio.Future):
+        """Résout le future d'attente depuis n'importe quel thread"""
+        try:
+            self.loop.call_soon_threadsafe(self._resolve_waiter, waiter)
+        except RuntimeError:
+            # Boucle fermée: plus de consommateur à réveiller
+            pass
+
+    @staticmethod
+    def _resolve_waiter(waiter: asyncio.Future):
+        """Résout le future d'attente (exécuté dans la boucle)"""
+        if not waiter.done():
+            waiter.set_result(None)
+
+    async def get_batch(self, max_lines: int = 500) -> List[bytes]:
+        """
+        Récupère jusqu'à max_lines lignes, en attendant si la file est vide
+
+        Returns:
+            Lot de lignes brutes, liste vide quand le flux est terminé
+        """
+        while True:
+            with self._condition:
+                if self._lines:
+                    count = min(max_lines, len(self._lines))
+                    batch = [self._lines.popleft() for _ in range(count)]
+                    # Libère de la place pour le thread lecteur
+                    self._condition.notify()
+                    break
+                if self._finished or self._stop_requested.is_set():
+                    return []
+                waiter = self.loop.create_future()
+                self._waiter = waiter
+
+            await waiter
+
+        self.lines_consumed += len(batch)
+        self.throughput.add(len(batch))
+        return batch
+
+    def get_stats(self) -> Dict:
+        """Retourne les compteurs de débit du conteneur"""
+        uptime = max(time.time() - self.started_at, 1e-6)
+        return {
+            'lines_read': self.lines_read,
+            'lines_consumed': self.lines_consumed,
+            'bytes_read': self.bytes_read,
+            'queue_depth': self.queue_depth,
+            'queue_capacity': self.max_queue_size,
+            'lines_per_second': round(self.throughput.current_rate(), 2),
+            'avg_lines_per_second': round(self.lines_read / uptime, 2),
+            'backpressure_waits': self.backpressure_waits,
+            'backpressure_seconds': round(self.backpressure_seconds, 3),
+            'errors': self.errors,
+            'last_line_at': self.last_line_at,
+            'finished': self._finished
+        }
+
+
+class LogIngestionEngine:
+    """Orchestre les lecteurs de logs par conteneur"""
+
+    def __init__(self, max_queue_size: int = 10000):
+        self.max_queue_size = max_queue_size
+        self.readers: Dict[str, ContainerLogReader] = {}
+
+        # Compteurs des lecteurs déjà fermés
+        self.closed_lines = 0
+        self.closed_bytes = 0
+
+    def open(self, container_id: str, stream_factory: StreamFactory) -> ContainerLogReader:
+        """Ouvre (ou réutilise) le lecteur d'un conteneur"""
+        reader = self.readers.get(container_id)
+        if reader and not reader.is_finished:
+            return reader
+
+        reader = ContainerLogReader(
+            container_id,
+            stream_factory,
+            asyncio.get_running_loop(),
+            max_queue_size=self.max_queue_size
+        )
+        self.readers[container_id] = reader
+        reader.start()
+        return reader
+
+    def close(self, container_id: str):
+        """Ferme le lecteur d'un conteneur"""
+        reader = self.readers.pop(container_id, None)
+        if reader:
+            reader.stop()
+            self.closed_lines += reader.lines_read
+            self.closed_bytes += reader.bytes_read
+
+    def close_all(self):
+        """Ferme tous les lecteurs"""
+        for container_id in list(self.readers.keys()):
+            self.close(container_id)
+
+    def get_stats(self) -> Dict:
+        """Statistiques globales et par conteneur"""
+        containers = {
+            container_id: reader.get_stats()
+            for container_id, reader in self.readers.items()
+        }
+        return {
+            'active_readers': len(self.readers),
+            'total_lines_read': self.closed_lines + sum(s['lines_read'] for s in containers.values()),
+            'total_bytes_read': self.closed_bytes + sum(s['bytes_read'] for s in containers.values()),
+            'queued_lines': sum(s['queue_depth'] for s in containers.values()),
+            'lines_per_second': round(sum(s['lines_per_second'] for s in containers.values()), 2),
+            'containers': containers
+        }
@@ -3,24 +3,60 @@ Service d'optimisation et indexation avancée pour les logs centralisés
 Version 0.2.5 - Performance et stockage optimisés
 """
 import asyncio
-import gzip
+import functools
 import hashlib
+import heapq
 import json
 import logging
+import mmap
+import os
+import struct
 import time
+from array import array
+from bisect import bisect_left, bisect_right
+from collections import OrderedDict
+from collections.abc import Mapping
+from collections.abc import Set as AbstractSet
 from dataclasses import dataclass
 from datetime import datetime, timedelta
 from pathlib import Path
-from typing import Any, Dict, List, Optional, Set, Tuple
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Set, Tuple
 
-import aiofiles
 import aiosqlite
-import lz4.frame
 
+from wakedock.core.log_archive import archive_directory, jsonl_timestamp_bounds
 from wakedock.core.log_collector import LogEntry
+from wakedock.core.log_compression import (
+    check_codec,
+    CODECS,
+    compress_file,
+    DEFAULT_CHUNK_SIZE,
+    sample_lines,
+    SeekableCompressedFile,
+    train_dictionary,
+)
+from wakedock.core.log_fts import (
+    build_match_expression,
+    fts_table_sql,
+    parse_search_query,
+)
 
 logger = logging.getLogger(__name__)
 
+# Instantané de l'index: en-tête, table des sections (offset, longueur), sections alignées sur 8 octets
+SNAPSHOT_MAGIC = b"WDSX"
+SNAPSHOT_VERSION = 1
+SNAPSHOT_HEADER = struct.Struct("<4sHHQI")  # magic, version, réservé, documents, sections
+SNAPSHOT_SECTION = struct.Struct("<QQ")
+SNAPSHOT_SECTIONS = (
+    'log_ids', 'timestamps', 'container_column', 'level_column', 'path_column', 'compressed_sizes',
+    'message_hashes', 'term_offsets', 'term_column', 'sorted_timestamps', 'time_order',
+    'terms', 'containers', 'levels', 'paths',
+    'term_posting_offsets', 'term_posting_docs',
+    'container_posting_offsets', 'container_posting_docs',
+    'level_posting_offsets', 'level_posting_docs'
+)
+
 @dataclass
 class LogIndexEntry:
     """Entrée d'index pour recherche rapide"""
@@ -42,14 +78,741 @@ class CompressionStats:
     files_compressed: int
     time_taken: float
 
-@dataclass
+class _InternTable:
+    """Table d'internement chaîne <-> entier"""
+    
+    __slots__ = ('ids', 'values')
+    
+    def __init__(self):
+        self.ids: Dict[str, int] = {}
+        self.values: List[str] = []
+    
+    def intern(self, value: str) -> int:
+        """Retourne l'identifiant de value, en l'ajoutant si nécessaire"""
+        value_id = self.ids.get(value)
+        if value_id is None:
+            value_id = self.ids[value] = len(self.values)
+            self.values.append(value)
+        return value_id
+    
+    def __len__(self) -> int:
+        return len(self.values)
+
+
+def intersect_postings(postings: List[array]) -> array:
+    """
+    Intersection de listes de postings triées
+    
+    Les listes sont traitées de la plus courte à la plus longue; une liste
+    beaucoup plus longue que le résultat courant est sondée par recherche
+    dichotomique plutôt que parcourue.
+    """
+    if not postings:
+        return array('I')
+    
+    postings = sorted(postings, key=len)
+    result = postings[0]
+    for posting in postings[1:]:
+        if not result:
+            break
+        if len(result) * 16 < len(posting):
+            matches = array('I')
+            position = 0
+            for doc in result:
+                position = bisect_left(posting, doc, position)
+                if position == len(posting):
+                    break
+                if posting[position] == doc:
+                    matches.append(doc)
+            result = matches
+        else:
+            result = array('I', filter(set(result).__contains__, posting))
+    return result
+
+
+def _posting_contains(posting: array, doc: int) -> bool:
+    """Appartenance d'un document à une liste de postings triée"""
+    position = bisect_left(posting, doc)
+    return position < len(posting) and posting[position] == doc
+
+
+def _encode_strings(values: List[str]) -> bytes:
+    """Table de chaînes d'un instantané (chaque valeur terminée par un octet nul)"""
+    data = ''.join(value + '\0' for value in values)
+    if data.count('\0') != len(values):
+        raise ValueError("Octet nul dans une valeur de l'index")
+    return data.encode()
+
+
+def _decode_strings(section: memoryview) -> List[str]:
+    return str(section, 'utf-8').split('\0')[:-1]
+
+
+def _encode_postings(table: '_InternTable', postings: Dict[str, Any]) -> Tuple[bytes, bytes]:
+    """Postings d'une famille, dans l'ordre des identifiants internés (offsets, documents concaténés)"""
+    offsets = array('Q', [0])
+    docs = array('I')
+    for value in table.values:
+        posting = postings.get(value)
+        if posting is not None:
+            docs.frombytes(posting.tobytes())
+        offsets.append(len(docs))
+    return offsets.tobytes(), docs.tobytes()
+
+
+def _decode_postings(values: List[str], offsets: memoryview, docs: memoryview) -> Dict[str, memoryview]:
+    """Postings en vues sur l'instantané (copiées à la première modification)"""
+    offsets = offsets.cast('Q')
+    docs = docs.cast('I')
+    postings = {}
+    for value_id, value in enumerate(values):
+        start, end = offsets[value_id], offsets[value_id + 1]
+        if end > start:
+            postings[value] = docs[start:end]
+    return postings
+
+
+def write_snapshot_file(path: Path, doc_count: int, sections: List[bytes]):
+    """Écrit un instantané sous un nom temporaire puis le renomme (bloquant)"""
+    table_end = SNAPSHOT_HEADER.size + SNAPSHOT_SECTION.size * len(sections)
+    offset = (table_end + 7) & ~7
+    table = []
+    for section in sections:
+        table.append((offset, len(section)))
+        offset = (offset + len(section) + 7) & ~7
+    
+    temp_path = path.with_name(path.name + ".tmp")
+    with open(temp_path, 'wb') as f:
+        f.write(SNAPSHOT_HEADER.pack(SNAPSHOT_MAGIC, SNAPSHOT_VERSION, 0, doc_count, len(sections)))
+        for section_offset, length in table:
+            f.write(SNAPSHOT_SECTION.pack(section_offset, length))
+        for (section_offset, _), section in zip(table, sections):
+            f.write(b'\0' * (section_offset - f.tell()))
+            f.write(section)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(temp_path, path)
+
+
+class _LogIdSet(AbstractSet):
+    """Vue en lecture d'une liste de postings sous forme d'ensemble de log_ids"""
+    
+    __slots__ = ('_index', '_posting')
+    
+    def __init__(self, index: 'SearchIndex', posting: array):
+        self._index = index
+        self._posting = posting
+    
+    def __contains__(self, log_id) -> bool:
+        doc = self._index.doc_ids.get(log_id)
+        return doc is not None and _posting_contains(self._posting, doc)
+    
+    def __iter__(self) -> Iterator[str]:
+        log_ids = self._index.log_ids
+        return (log_ids[doc] for doc in self._posting)
+    
+    def __len__(self) -> int:
+        return len(self._posting)
+
+
+class _PostingView(Mapping):
+    """Vue en lecture clé -> ensemble de log_ids d'une famille de postings"""
+    
+    __slots__ = ('_index', '_postings')
+    
+    def __init__(self, index: 'SearchIndex', postings: Dict[str, array]):
+        self._index = index
+        self._postings = postings
+    
+    def __getitem__(self, key: str) -> _LogIdSet:
+        return _LogIdSet(self._index, self._postings[key])
+    
+    def __iter__(self) -> Iterator[str]:
+        return iter(self._postings)
+    
+    def __len__(self) -> int:
+        return len(self._postings)
+
+
+class _MetadataView(Mapping):
+    """Vue en lecture log_id -> LogIndexEntry reconstruite depuis les colonnes"""
+    
+    __slots__ = ('_index',)
+    
+    def __init__(self, index: 'SearchIndex'):
+        self._index = index
+    
+    def __getitem__(self, log_id: str) -> LogIndexEntry:
+        return self._index.entry(self._index.doc_ids[log_id])
+    
+    def __contains__(self, log_id) -> bool:
+        return log_id in self._index.doc_ids
+    
+    def __iter__(self) -> Iterator[str]:
+        return iter(self._index.log_ids)
+    
+    def __len__(self) -> int:
+        return len(self._index.log_ids)
+
+
 class SearchIndex:
-    """Index de recherche optimisé"""
-    term_to_logs: Dict[str, Set[str]]  # terme -> set de log_ids
-    log_metadata: Dict[str, LogIndexEntry]  # log_id -> metadata
-    container_index: Dict[str, Set[str]]  # container_id -> set de log_ids
-    level_index: Dict[str, Set[str]]  # level -> set de log_ids
-    time_buckets: Dict[str, Set[str]]  # bucket temporel -> set de log_ids
+    """
+    Index de recherche compact en mémoire
+    
+    Chaque log reçoit un identifiant entier dense (doc id, attribué dans
+    l'ordre d'indexation). Les métadonnées sont stockées en colonnes (array),
+    conteneurs, niveaux, chemins et termes sont internés, et chaque liste de
+    postings est un tableau trié d'entiers 32 bits. Un index temporel trié
+    (timestamps et doc ids) résout les plages de temps par deux recherches
+    dichotomiques. Les suppressions reconstruisent l'index à partir des colonnes.
+    
+    Les attributs historiques (term_to_logs, log_metadata, container_index,
+    level_index, time_buckets) restent disponibles en lecture seule.
+    """
+    
+    __slots__ = (
+        'log_ids', 'doc_ids', 'timestamps', 'container_column', 'level_column', 'path_column',
+        'compressed_sizes', 'message_hashes', 'term_offsets', 'term_column',
+        'terms', 'containers', 'levels', 'paths',
+        'term_postings', 'container_postings', 'level_postings',
+        'sorted_timestamps', 'time_order'
+    )
+    
+    MESSAGE_HASH_BYTES = 8
+    
+    def __init__(self):
+        self.clear()
+    
+    def clear(self):
+        """Vide l'index"""
+        # Identifiants: doc id -> log_id et inverse
+        self.log_ids: List[str] = []
+        self.doc_ids: Dict[str, int] = {}
+        
+        # Colonnes indexées par doc id
+        self.timestamps = array('d')  # epoch (secondes)
+        self.container_column = array('I')
+        self.level_column = array('B')
+        self.path_column = array('I')
+        self.compressed_sizes = array('q')
+        self.message_hashes = bytearray()  # MESSAGE_HASH_BYTES par document
+        # Termes de chaque document (CSR): term_column[term_offsets[d]:term_offsets[d + 1]]
+        self.term_offsets = array('Q', [0])
+        self.term_column = array('I')
+        
+        # Valeurs internées
+        self.terms = _InternTable()
+        self.containers = _InternTable()
+        self.levels = _InternTable()
+        self.paths = _InternTable()
+        
+        # Postings triés
+        self.term_postings: Dict[str, array] = {}
+        self.container_postings: Dict[str, array] = {}
+        self.level_postings: Dict[str, array] = {}
+        
+        # Index temporel: doc ids triés par timestamp (sorted_timestamps en parallèle)
+        self.sorted_timestamps = array('d')
+        self.time_order = array('I')
+    
+    def __len__(self) -> int:
+        return len(self.log_ids)
+    
+    def __contains__(self, log_id) -> bool:
+        return log_id in self.doc_ids
+    
+    @staticmethod
+    def bucket_of(timestamp: datetime) -> float:
+        """Début de l'heure d'un timestamp (epoch)"""
+        return timestamp.replace(minute=0, second=0, microsecond=0).timestamp()
+    
+    def add(self, entry: LogIndexEntry) -> int:
+        """Ajoute une entrée (sans effet si le log_id est déjà indexé) et retourne son doc id"""
+        doc = self.doc_ids.get(entry.log_id)
+        if doc is not None:
+            return doc
+        
+        doc = len(self.log_ids)
+        self.log_ids.append(entry.log_id)
+        self.doc_ids[entry.log_id] = doc
+        
+        timestamp = entry.timestamp.timestamp()
+        self.timestamps.append(timestamp)
+        self.container_column.append(self.containers.intern(entry.container_id))
+        self.level_column.append(self.levels.intern(entry.level))
+        self.path_column.append(self.paths.intern(entry.file_path))
+        self.compressed_sizes.append(entry.compressed_size)
+        self.message_hashes += bytes.fromhex(entry.message_hash)[:self.MESSAGE_HASH_BYTES].ljust(self.MESSAGE_HASH_BYTES, b'\0')
+        
+        for term in entry.search_terms:
+            self.term_column.append(self.terms.intern(term))
+            self._posting(self.term_postings, term).append(doc)
+        self.term_offsets.append(len(self.term_column))
+        
+        self._posting(self.container_postings, entry.container_id).append(doc)
+        self._posting(self.level_postings, entry.level).append(doc)
+        
+        # Les logs arrivent presque toujours dans l'ordre: ajout en fin d'index temporel
+        if not self.sorted_timestamps or timestamp >= self.sorted_timestamps[-1]:
+            self.sorted_timestamps.append(timestamp)
+            self.time_order.append(doc)
+        else:
+            position = bisect_right(self.sorted_timestamps, timestamp)
+            self.sorted_timestamps.insert(position, timestamp)
+            self.time_order.insert(position, doc)
+        return doc
+    
+    @staticmethod
+    def _posting(postings: Dict, key) -> array:
+        posting = postings.get(key)
+        if posting is None:
+            posting = postings[key] = array('I')
+        elif not isinstance(posting, array):
+            # Vue sur un instantané: copiée avant la première modification
+            posting = postings[key] = array('I', posting)
+        return posting
+    
+    def entry(self, doc: int) -> LogIndexEntry:
+        """Reconstruit l'entrée d'un document"""
+        start = self.MESSAGE_HASH_BYTES * doc
+        return LogIndexEntry(
+            log_id=self.log_ids[doc],
+            timestamp=datetime.fromtimestamp(self.timestamps[doc]),
+            container_id=self.containers.values[self.container_column[doc]],
+            level=self.levels.values[self.level_column[doc]],
+            message_hash=self.message_hashes[start:start + self.MESSAGE_HASH_BYTES].hex(),
+            search_terms=self.document_terms(doc),
+            file_path=self.paths.values[self.path_column[doc]],
+            compressed_size=self.compressed_sizes[doc]
+        )
+    
+    def document_terms(self, doc: int) -> Set[str]:
+        """Termes de recherche d'un document"""
+        values = self.terms.values
+        return {values[term_id] for term_id in self.term_column[self.term_offsets[doc]:self.term_offsets[doc + 1]]}
+    
+    def remove(self, log_ids: Iterable[str]) -> int:
+        """Supprime des entrées en reconstruisant l'index compact, retourne le nombre supprimé"""
+        removed = {self.doc_ids[log_id] for log_id in log_ids if log_id in self.doc_ids}
+        if not removed:
+            return 0
+        
+        entries = [self.entry(doc) for doc in range(len(self.log_ids)) if doc not in removed]
+        self.clear()
+        for entry in entries:
+            self.add(entry)
+        return len(removed)
+    
+    def rebuilt(self, docs: Iterable[int]) -> 'SearchIndex':
+        """
+        Nouvel index compact des documents donnés, dans cet ordre
+        
+        L'index courant n'est pas modifié (lecture seule des colonnes): la
+        reconstruction peut s'exécuter hors de la boucle pendant que des
+        entrées sont ajoutées. Des documents pris dans l'ordre de time_order
+        sont ajoutés en fin d'index temporel.
+        """
+        index = SearchIndex()
+        for doc in docs:
+            index.add(self.entry(doc))
+        return index
+    
+    def all_docs(self) -> range:
+        """Tous les documents (doc ids croissants)"""
+        return range(len(self.log_ids))
+    
+    def memory_usage(self) -> int:
+        """Estimation de la mémoire occupée par les colonnes et postings (octets)"""
+        columns = (
+            self.timestamps, self.container_column, self.level_column, self.path_column,
+            self.compressed_sizes, self.term_offsets, self.term_column
+        )
+        size = sum(column.itemsize * len(column) for column in columns) + len(self.message_hashes)
+        size += 8 * len(self.sorted_timestamps) + 4 * len(self.time_order)
+        for postings in (self.term_postings, self.container_postings, self.level_postings):
+            size += sum(4 * len(posting) for posting in postings.values())
+        return size
+    
+    def snapshot_sections(self) -> List[bytes]:
+        """Sérialise l'index en sections d'instantané (copies mémoire, sans décodage par document)"""
+        term_offsets, term_docs = _encode_postings(self.terms, self.term_postings)
+        container_offsets, container_docs = _encode_postings(self.containers, self.container_postings)
+        level_offsets, level_docs = _encode_postings(self.levels, self.level_postings)
+        return [
+            _encode_strings(self.log_ids),
+            self.timestamps.tobytes(),
+            self.container_column.tobytes(),
+            self.level_column.tobytes(),
+            self.path_column.tobytes(),
+            self.compressed_sizes.tobytes(),
+            bytes(self.message_hashes),
+            self.term_offsets.tobytes(),
+            self.term_column.tobytes(),
+            self.sorted_timestamps.tobytes(),
+            self.time_order.tobytes(),
+            _encode_strings(self.terms.values),
+            _encode_strings(self.containers.values),
+            _encode_strings(self.levels.values),
+            _encode_strings(self.paths.values),
+            term_offsets, term_docs,
+            container_offsets, container_docs,
+            level_offsets, level_docs
+        ]
+    
+    @classmethod
+    def load_snapshot(cls, path: Path) -> 'SearchIndex':
+        """
+        Charge un instantané par projection mémoire (mmap)
+        
+        Les colonnes sont recopiées d'un bloc dans des array; les postings
+        restent des vues sur le fichier projeté jusqu'à leur première
+        modification. Aucun décodage JSON ni reconstruction par document.
+        """
+        with open(path, 'rb') as f:
+            buffer = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        view = memoryview(buffer)
+        
+        magic, version, _, doc_count, section_count = SNAPSHOT_HEADER.unpack_from(view, 0)
+        if magic != SNAPSHOT_MAGIC or version != SNAPSHOT_VERSION or section_count != len(SNAPSHOT_SECTIONS):
+            raise ValueError(f"Instantané d'index invalide: {path}")
+        
+        sections = {}
+        for position, name in enumerate(SNAPSHOT_SECTIONS):
+            offset, length = SNAPSHOT_SECTION.unpack_from(view, SNAPSHOT_HEADER.size + position * SNAPSHOT_SECTION.size)
+            if offset + length > len(view):
+                raise ValueError(f"Instantané d'index tronqué: {path}")
+            sections[name] = view[offset:offset + length]
+        
+        def column(name: str, typecode: str) -> array:
+            values = array(typecode)
+            values.frombytes(sections[name])
+            return values
+        
+        index = cls()
+        index.log_ids = _decode_strings(sections['log_ids'])
+        index.doc_ids = dict(zip(index.log_ids, range(len(index.log_ids))))
+        index.timestamps = column('timestamps', 'd')
+        index.container_column = column('container_column', 'I')
+        index.level_column = column('level_column', 'B')
+        index.path_column = column('path_column', 'I')
+        index.compressed_sizes = column('compressed_sizes', 'q')
+        index.message_hashes = bytearray(sections['message_hashes'])
+        index.term_offsets = column('term_offsets', 'Q')
+        index.term_column = column('term_column', 'I')
+        index.sorted_timestamps = column('sorted_timestamps', 'd')
+        index.time_order = column('time_order', 'I')
+        
+        for name in ('terms', 'containers', 'levels', 'paths'):
+            table = getattr(index, name)
+            table.values = _decode_strings(sections[name])
+            table.ids = dict(zip(table.values, range(len(table.values))))
+        
+        index.term_postings = _decode_postings(
+            index.terms.values, sections['term_posting_offsets'], sections['term_posting_docs'])
+        index.container_postings = _decode_postings(
+            index.containers.values, sections['container_posting_offsets'], sections['container_posting_docs'])
+        index.level_postings = _decode_postings(
+            index.levels.values, sections['level_posting_offsets'], sections['level_posting_docs'])
+        
+        if not (len(index.log_ids) == len(index.timestamps) == len(index.time_order) == doc_count
+                and len(index.term_offsets) == doc_count + 1):
+            raise ValueError(f"Instantané d'index incohérent: {path}")
+        return index
+    
+    def time_range(self, start: Optional[float] = None, end: Optional[float] = None) -> Tuple[int, int]:
+        """Positions [début, fin[ de la plage [start, end] (epoch) dans l'index temporel"""
+        low = bisect_left(self.sorted_timestamps, start) if start is not None else 0
+        high = bisect_right(self.sorted_timestamps, end) if end is not None else len(self.sorted_timestamps)
+        return low, high
+    
+    def search(self,
+               postings: List[array],
+               container_id: Optional[str] = None,
+               level: Optional[str] = None,
+               start: Optional[float] = None,
+               end: Optional[float] = None,
+               limit: int = 1000) -> List[int]:
+        """
+        Retourne les limit documents les plus récents satisfaisant tous les filtres
+        
+        Si la plage de temps est plus petite que la plus courte liste de
+        postings, elle est parcourue du plus récent au plus ancien et le
+        parcours s'arrête dès limit résultats. Sinon les postings sont
+        intersectés puis les plus récents extraits par un tas.
+        
+        Args:
+            postings: Listes de postings (termes, résultats FTS) à intersecter
+            start, end: Bornes incluses (epoch)
+        """
+        filters = list(postings)
+        checks = []
+        if container_id is not None:
+            if container_id not in self.container_postings:
+                return []
+            filters.append(self.container_postings[container_id])
+            checks.append((self.container_column, self.containers.ids[container_id]))
+        if level is not None:
+            if level not in self.level_postings:
+                return []
+            filters.append(self.level_postings[level])
+            checks.append((self.level_column, self.levels.ids[level]))
+        
+        low, high = self.time_range(start, end)
+        if low >= high or limit <= 0 or any(not posting for posting in filters):
+            return []
+        
+        time_order = self.time_order
+        if not filters:
+            return [time_order[position] for position in range(high - 1, max(low, high - limit) - 1, -1)]
+        
+        if min(len(posting) for posting in filters) < high - low:
+            docs = intersect_postings(filters)
+            if start is not None or end is not None:
+                timestamps = self.timestamps
+                lower = start if start is not None else float('-inf')
+                upper = end if end is not None else float('inf')
+                docs = [doc for doc in docs if lower <= timestamps[doc] <= upper]
+            return heapq.nlargest(limit, docs, key=self.timestamps.__getitem__)
+        
+        # Parcours de la plage, du plus récent au plus ancien: les colonnes
+        # suffisent pour conteneur et niveau, les postings sont sondés par dichotomie
+        results = []
+        for position in range(high - 1, low - 1, -1):
+            doc = time_order[position]
+            if any(column[doc] != value for column, value in checks):
+                continue
+            if postings and not all(_posting_contains(posting, doc) for posting in postings):
+                continue
+            results.append(doc)
+            if len(results) >= limit:
+                break
+        return results
+    
+    # Vues de compatibilité (lecture seule)
+    
+    @property
+    def log_metadata(self) -> Mapping:
+        return _MetadataView(self)
+    
+    @property
+    def term_to_logs(self) -> Mapping:
+        return _PostingView(self, self.term_postings)
+    
+    @property
+    def container_index(self) -> Mapping:
+        return _PostingView(self, self.container_postings)
+    
+    @property
+    def level_index(self) -> Mapping:
+        return _PostingView(self, self.level_postings)
+    
+    @property
+    def time_buckets(self) -> Mapping:
+        buckets: Dict[str, array] = {}
+        for timestamp, doc in zip(self.sorted_timestamps, self.time_order):
+            bucket = self.bucket_of(datetime.fromtimestamp(timestamp))
+            self._posting(buckets, datetime.fromtimestamp(bucket).isoformat()).append(doc)
+        for posting in buckets.values():
+            posting[:] = array('I', sorted(posting))
+        return _PostingView(self, buckets)
+
+class IndexWriteAheadLog:
+    """
+    Journal des modifications de l'index depuis le dernier instantané
+    
+    Une ligne JSON par opération (ajout d'une entrée ou suppression de
+    log_ids), rejouée au démarrage après le chargement de l'instantané puis
+    vidée à chaque nouvel instantané. Rejouer une opération déjà présente
+    dans l'instantané est sans effet.
+    """
+    
+    def __init__(self, path: Path):
+        self.path = path
+        self.records = 0
+        self._file = None
+    
+    def _open(self):
+        if self._file is None:
+            self._file = open(self.path, 'ab')
+        return self._file
+    
+    def append_entries(self, entries: List[LogIndexEntry]):
+        """Journalise des entrées ajoutées à l'index"""
+        lines = [
+            json.dumps({
+                "log_id": entry.log_id,
+                "timestamp": entry.timestamp.timestamp(),
+                "container_id": entry.container_id,
+                "level": entry.level,
+                "message_hash": entry.message_hash,
+                "search_terms": list(entry.search_terms),
+                "file_path": entry.file_path,
+                "compressed_size": entry.compressed_size
+            }) + "\n"
+            for entry in entries
+        ]
+        f = self._open()
+        f.write(''.join(lines).encode())
+        f.flush()
+        self.records += len(lines)
+    
+    def append_removal(self, log_ids: List[str]):
+        """Journalise une suppression d'entrées"""
+        f = self._open()
+        f.write((json.dumps({"remove": list(log_ids)}) + "\n").encode())
+        f.flush()
+        self.records += 1
+    
+    def replay(self, index: 'SearchIndex') -> int:
+        """Applique le journal à l'index, retourne le nombre d'opérations rejouées"""
+        if not self.path.exists():
+            return 0
+        
+        replayed = 0
+        pending_removals: Set[str] = set()
+        with open(self.path, 'rb') as f:
+            for line in f:
+                try:
+                    record = json.loads(line)
+                except json.JSONDecodeError:
+                    # Dernière ligne partiellement écrite avant un arrêt brutal
+                    logger.warning(f"Ligne invalide dans le journal de l'index {self.path}, relecture interrompue")
+                    break
+                
+                if "remove" in record:
+                    pending_removals.update(record["remove"])
+                else:
+                    if pending_removals:
+                        # Les suppressions sont regroupées: une seule reconstruction
+                        index.remove(pending_removals)
+                        pending_removals = set()
+                    index.add(LogIndexEntry(
+                        log_id=record["log_id"],
+                        timestamp=datetime.fromtimestamp(record["timestamp"]),
+                        container_id=record["container_id"],
+                        level=record["level"],
+                        message_hash=record["message_hash"],
+                        search_terms=set(record["search_terms"]),
+                        file_path=record["file_path"],
+                        compressed_size=record["compressed_size"]
+                    ))
+                replayed += 1
+        
+        if pending_removals:
+            index.remove(pending_removals)
+        self.records = replayed
+        return replayed
+    
+    def reset(self):
+        """Vide le journal (après l'écriture d'un instantané)"""
+        self.close()
+        with open(self.path, 'wb') as f:
+            os.fsync(f.fileno())
+        self.records = 0
+    
+    def close(self):
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+
+class SearchResultCache:
+    """
+    Cache LRU borné des résultats de recherche
+    
+    Chaque conteneur a un compteur de génération, incrémenté à chaque log
+    indexé. Un résultat mémorise la génération du conteneur recherché, ou la
+    génération globale pour une recherche tous conteneurs confondus: il n'est
+    invalidé que si un conteneur concerné a reçu de nouvelles entrées. La
+    durée de vie reste une borne supérieure.
+    """
+    
+    def __init__(self, max_entries: int = 1024, ttl_seconds: float = 300):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        
+        # clé -> (résultat, génération, horodatage)
+        self._entries: "OrderedDict[Tuple, Tuple[Any, int, float]]" = OrderedDict()
+        self.generations: Dict[str, int] = {}
+        self.global_generation = 0
+        
+        self.stats = {
+            "hits": 0,
+            "misses": 0,
+            "evictions": 0,
+            "invalidations": 0,
+            "expirations": 0
+        }
+    
+    def __len__(self) -> int:
+        return len(self._entries)
+    
+    def _generation(self, container_id: Optional[str]) -> int:
+        if container_id:
+            return self.generations.get(container_id, 0)
+        return self.global_generation
+    
+    def get(self, key: Tuple, container_id: Optional[str] = None) -> Optional[Any]:
+        """Retourne le résultat en cache, None s'il est absent, obsolète ou expiré"""
+        cached = self._entries.get(key)
+        if cached is None:
+            self.stats["misses"] += 1
+            return None
+        
+        result, generation, stored_at = cached
+        if generation != self._generation(container_id):
+            del self._entries[key]
+            self.stats["invalidations"] += 1
+            self.stats["misses"] += 1
+            return None
+        if time.time() - stored_at >= self.ttl_seconds:
+            del self._entries[key]
+            self.stats["expirations"] += 1
+            self.stats["misses"] += 1
+            return None
+        
+        self._entries.move_to_end(key)
+        self.stats["hits"] += 1
+        return result
+    
+    def put(self, key: Tuple, result: Any, container_id: Optional[str] = None, now: Optional[float] = None):
+        """Mémorise un résultat, en évinçant le moins récemment utilisé si le cache est plein"""
+        self._entries[key] = (result, self._generation(container_id), now if now is not None else time.time())
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            self.stats["evictions"] += 1
+    
+    def invalidate(self, container_id: str):
+        """Signale de nouvelles entrées pour un conteneur"""
+        self.generations[container_id] = self.generations.get(container_id, 0) + 1
+        self.global_generation += 1
+    
+    def purge_expired(self, now: Optional[float] = None) -> int:
+        """Supprime les résultats expirés, retourne leur nombre"""
+        now = now if now is not None else time.time()
+        expired = [key for key, (_, _, stored_at) in self._entries.items() if now - stored_at >= self.ttl_seconds]
+        for key in expired:
+            del self._entries[key]
+        self.stats["expirations"] += len(expired)
+        return len(expired)
+    
+    def clear(self) -> int:
+        """Vide le cache, retourne le nombre de résultats supprimés"""
+        count = len(self._entries)
+        self._entries.clear()
+        return count
+    
+    def get_stats(self) -> Dict[str, Any]:
+        """Taille, métriques et taux de succès du cache"""
+        lookups = self.stats["hits"] + self.stats["misses"]
+        return {
+            **self.stats,
+            "size": len(self._entries),
+            "entries": len(self._entries),
+            "max_entries": self.max_entries,
+            "hit_rate": self.stats["hits"] / lookups if lookups else 0.0
+        }
 
 class LogOptimizationService:
     """Service d'optimisation et indexation des logs"""
@@ -57,27 +820,41 @@ class LogOptimizationService:
     def __init__(self, storage_path: str = "/var/log/wakedock"):
         self.storage_path = Path(storage_path)
         self.index_path = self.storage_path / "indexes"
-        self.compressed_path = self.storage_path / "compressed"
+        self.compressed_path = archive_directory(self.storage_path)
         self.db_path = self.index_path / "search_index.db"
+        self.snapshot_path = self.index_path / "search_index.snapshot"
+        self.wal_path = self.index_path / "search_index.wal"
         
         # Configuration
         self.compression_threshold_mb = 10  # Compresser les fichiers > 10MB
+        self.compression_chunk_size = DEFAULT_CHUNK_SIZE  # Taille des trames indépendantes
+        self.compression_dictionary: Optional[bytes] = None  # Dictionnaire zstd (schéma JSONL)
         self.max_search_terms_per_log = 50
         self.time_bucket_hours = 1  # Bucketing par heure
         self.retention_days = 30
         
+        # Écriture différée de l'index en base (write-behind)
+        self.write_batch_size = 500  # Entrées par transaction
+        self.write_flush_interval = 1.0  # Délai max avant écriture (secondes)
+        self.max_pending_writes = 50000  # Au-delà, index_log_entry attend l'écriture
+        self._write_queue: List[LogIndexEntry] = []
+        self._write_event = asyncio.Event()
+        self._write_lock = asyncio.Lock()
+        self._write_db: Optional[aiosqlite.Connection] = None
+        
+        # Instantané de l'index en mémoire et journal des modifications depuis l'instantané
+        self.snapshot_interval = 300  # secondes
+        self.warm_up_batch_size = 5000  # Entrées chargées depuis la base entre deux passages de la boucle
+        self._wal = IndexWriteAheadLog(self.wal_path)
+        self.index_ready = asyncio.Event()
+        self._warm_up_task: Optional[asyncio.Task] = None
+        self._stopping = False
+        
         # Index en mémoire pour recherches rapides
-        self.search_index = SearchIndex(
-            term_to_logs={},
-            log_metadata={},
-            container_index={},
-            level_index={},
-            time_buckets={}
-        )
+        self.search_index = SearchIndex()
         
         # Cache pour recherches fréquentes
-        self.search_cache: Dict[str, Tuple[List[Dict], float]] = {}
-        self.cache_ttl_seconds = 300  # 5 minutes
+        self.search_cache = SearchResultCache(max_entries=1024, ttl_seconds=300)  # 5 minutes
         
         # Statistiques
         self.stats = {
@@ -86,7 +863,16 @@ class LogOptimizationService:
             "database_size_bytes": 0,
             "compression_stats": CompressionStats(0, 0, 0.0, 0, 0.0),
             "cache_hits": 0,
-            "cache_misses": 0
+            "cache_misses": 0,
+            "write_batches": 0,
+            "written_entries": 0,
+            "last_commit_latency_ms": 0.0,
+            "total_commit_latency_ms": 0.0,
+            "index_load_source": None,
+            "index_load_seconds": 0.0,
+            "wal_replayed": 0,
+            "snapshot_writes": 0,
+            "last_snapshot_seconds": 0.0
         }
         
         # Tasks d'arrière-plan
@@ -104,9 +890,16 @@ class LogOptimizationService:
         
         # Initialiser la base de données
         await self._init_database()
+        self._stopping = False
+        
+        # Connexion d'écriture ouverte ici plutôt que dans le worker: une
+        # annulation pendant l'ouverture laisserait le thread aiosqlite actif
+        await self._writer_connection()
         
-        # Charger l'index existant
-        await self._load_search_index()
+        # Charger l'index existant: instantané projeté en mémoire et journal, sinon
+        # préchargement progressif depuis la base (le service répond entre-temps)
+        if not await self._load_index_snapshot():
+            self._warm_up_task = asyncio.create_task(self._load_search_index())
         
         # Démarrer les tâches d'arrière-plan
         self.is_running = True
@@ -123,6 +916,14 @@ class LogOptimizationService:
         rotation_task = asyncio.create_task(self._log_rotation_worker())
         self.background_tasks.add(rotation_task)
         
+        # Écriture différée de l'index
+        write_task = asyncio.create_task(self._write_behind_worker())
+        self.background_tasks.add(write_task)
+        
+        # Instantanés périodiques de l'index
+        snapshot_task = asyncio.create_task(self._snapshot_worker())
+        self.background_tasks.add(snapshot_task)
+        
         logger.info("Service d'optimisation des logs démarré")
     
     async def stop(self):
@@ -130,6 +931,13 @@ class LogOptimizationService:
         logger.info("Arrêt du service d'optimisation des logs")
         
         self.is_running = False
+        self._stopping = True
+        
+        # Le préchargement s'interrompt de lui-même au lot suivant (pas
+        # d'annulation pendant l'ouverture de sa connexion)
+        if self._warm_up_task is not None:
+            await asyncio.gather(self._warm_up_task, return_exceptions=True)
+            self._warm_up_task = None
         
         # Annuler toutes les tâches d'arrière-plan
         for task in self.background_tasks:
@@ -140,6 +948,20 @@ class LogOptimizationService:
             await asyncio.gather(*self.background_tasks, return_exceptions=True)
         
         self.background_tasks.clear()
+        
+        # Écrit les entrées encore en attente avant de fermer la connexion, puis
+        # un instantané pour que le prochain démarrage n'ait rien à rejouer
+        try:
+            await self.flush_index_writes()
+            await self.save_index_snapshot()
+        except Exception as e:
+            logger.error(f"Erreur lors de l'écriture des entrées d'index en attente: {e}")
+        finally:
+            self._wal.close()
+            if self._write_db is not None:
+                await self._write_db.close()
+                self._write_db = None
+        
         logger.info("Service d'optimisation des logs arrêté")
     
     async def _init_database(self):
@@ -170,70 +992,177 @@ class LogOptimizationService:
                 CREATE INDEX IF NOT EXISTS idx_level ON log_index(level)
             ''')
             
-            # Table pour les termes de recherche (full-text search)
-            await db.execute('''
-                CREATE VIRTUAL TABLE IF NOT EXISTS search_terms 
-                USING fts5(log_id, terms, content='log_index', content_rowid='rowid')
-            ''')
+            # Table pour les termes de recherche (full-text search, rowid = log_index.rowid)
+            # Distincte de log_fts (LogSearchService, autre base): même tokenizer, termes sans positions
+            # L'ancienne définition en contenu externe pointait vers une colonne inexistante
+            cursor = await db.execute("SELECT sql FROM sqlite_master WHERE name = 'search_terms'")
+            existing = await cursor.fetchone()
+            if existing and "content='log_index'" in existing[0]:
+                await db.execute('DROP TABLE search_terms')
+            await db.execute(fts_table_sql('search_terms', ['log_id', 'terms'], unindexed=['log_id']))
             
             await db.commit()
     
+    async def _load_index_snapshot(self) -> bool:
+        """Charge l'instantané de l'index et rejoue le journal, False si aucun instantané n'est exploitable"""
+        if not self.snapshot_path.exists():
+            return False
+        
+        started = time.perf_counter()
+        loop = asyncio.get_running_loop()
+        try:
+            index = await loop.run_in_executor(None, SearchIndex.load_snapshot, self.snapshot_path)
+            replayed = await loop.run_in_executor(None, self._wal.replay, index)
+        except (OSError, ValueError, KeyError, TypeError, struct.error) as e:
+            logger.warning(f"Instantané de l'index inutilisable, rechargement depuis la base: {e}")
+            return False
+        
+        # Entrées indexées avant le démarrage
+        previous = self.search_index
+        for doc in previous.all_docs():
+            index.add(previous.entry(doc))
+        
+        self.search_index = index
+        self.search_cache.clear()
+        self._update_index_stats()
+        self.stats["index_load_source"] = "snapshot"
+        self.stats["index_load_seconds"] = round(time.perf_counter() - started, 3)
+        self.stats["wal_replayed"] = replayed
+        if self.db_path.exists():
+            self.stats["database_size_bytes"] = self.db_path.stat().st_size
+        self.index_ready.set()
+        
+        logger.info(
+            f"Index chargé depuis l'instantané: {self.stats['total_indexed_logs']} logs, "
+            f"{replayed} opérations rejouées en {self.stats['index_load_seconds']}s"
+        )
+        return True
+    
     async def _load_search_index(self):
-        """Charge l'index de recherche depuis la base de données"""
+        """
+        Charge l'index de recherche depuis la base de données
+        
+        Utilisé en l'absence d'instantané: les 100000 entrées les plus récentes
+        sont chargées par lots de warm_up_batch_size (dans l'ordre
+        chronologique) dans un index distinct, en rendant la main à la boucle
+        entre deux lots. Les entrées indexées entre-temps restent
+        interrogeables dans l'index courant; plus récentes que l'historique,
+        elles sont ajoutées à sa suite avant l'échange des index, sans
+        insertion au milieu de l'index temporel. Un instantané est écrit à la fin.
+        """
         logger.info("Chargement de l'index de recherche")
+        started = time.perf_counter()
         
-        async with aiosqlite.connect(str(self.db_path)) as db:
-            # Charger les métadonnées des logs
-            async with db.execute('SELECT * FROM log_index ORDER BY timestamp DESC LIMIT 100000') as cursor:
-                async for row in cursor:
-                    log_id, timestamp, container_id, level, message_hash, search_terms_str, file_path, compressed_size = row
-                    
-                    search_terms = set(json.loads(search_terms_str))
-                    
-                    entry = LogIndexEntry(
-                        log_id=log_id,
-                        timestamp=datetime.fromtimestamp(timestamp),
-                        container_id=container_id,
-                        level=level,
-                        message_hash=message_hash,
-                        search_terms=search_terms,
-                        file_path=file_path,
-                        compressed_size=compressed_size
-                    )
-                    
-                    # Ajouter à l'index en mémoire
-                    self.search_index.log_metadata[log_id] = entry
-                    
-                    # Index par termes
-                    for term in search_terms:
-                        if term not in self.search_index.term_to_logs:
-                            self.search_index.term_to_logs[term] = set()
-                        self.search_index.term_to_logs[term].add(log_id)
-                    
-                    # Index par conteneur
-                    if container_id not in self.search_index.container_index:
-                        self.search_index.container_index[container_id] = set()
-                    self.search_index.container_index[container_id].add(log_id)
-                    
-                    # Index par niveau
-                    if level not in self.search_index.level_index:
-                        self.search_index.level_index[level] = set()
-                    self.search_index.level_index[level].add(log_id)
-                    
-                    # Index temporel (bucketing par heure)
-                    time_bucket = entry.timestamp.replace(minute=0, second=0, microsecond=0).isoformat()
-                    if time_bucket not in self.search_index.time_buckets:
-                        self.search_index.time_buckets[time_bucket] = set()
-                    self.search_index.time_buckets[time_bucket].add(log_id)
+        index = await self._load_index_rows()
+        if index is None:
+            # Service arrêté: ni instantané ni prêt
+            return
+        
+        # Entrées indexées pendant le chargement
+        previous = self.search_index
+        for doc in previous.all_docs():
+            index.add(previous.entry(doc))
+        
+        self.search_index = index
+        self.search_cache.clear()
         
         # Mettre à jour les statistiques
-        self.stats["total_indexed_logs"] = len(self.search_index.log_metadata)
-        self.stats["unique_search_terms"] = len(self.search_index.term_to_logs)
+        self._update_index_stats()
+        self.stats["index_load_source"] = "database"
+        self.stats["index_load_seconds"] = round(time.perf_counter() - started, 3)
         
         if self.db_path.exists():
             self.stats["database_size_bytes"] = self.db_path.stat().st_size
         
         logger.info(f"Index chargé: {self.stats['total_indexed_logs']} logs, {self.stats['unique_search_terms']} termes")
+        
+        # Les démarrages suivants partiront de l'instantané
+        try:
+            await self._write_index_snapshot()
+        except Exception as e:
+            logger.error(f"Erreur lors de l'écriture de l'instantané de l'index: {e}")
+        self.index_ready.set()
+    
+    async def _load_index_rows(self) -> Optional[SearchIndex]:
+        """Index des entrées de la base, chargé par lots (None si le service s'arrête entre-temps)"""
+        index = SearchIndex()
+        async with aiosqlite.connect(str(self.db_path)) as db:
+            # Charger les métadonnées des logs
+            async with db.execute(
+                'SELECT * FROM (SELECT * FROM log_index ORDER BY timestamp DESC LIMIT 100000) ORDER BY timestamp'
+            ) as cursor:
+                while True:
+                    if self._stopping:
+                        return None
+                    rows = await cursor.fetchmany(self.warm_up_batch_size)
+                    if not rows:
+                        break
+                    
+                    for row in rows:
+                        log_id, timestamp, container_id, level, message_hash, search_terms_str, file_path, compressed_size = row
+                        
+                        entry = LogIndexEntry(
+                            log_id=log_id,
+                            timestamp=datetime.fromtimestamp(timestamp),
+                            container_id=container_id,
+                            level=level,
+                            message_hash=message_hash,
+                            search_terms=set(json.loads(search_terms_str)),
+                            file_path=file_path,
+                            compressed_size=compressed_size
+                        )
+                        
+                        index.add(entry)
+                    
+                    await asyncio.sleep(0)
+        return index
+    
+    async def wait_until_ready(self):
+        """Attend la fin du chargement de l'index"""
+        await self.index_ready.wait()
+    
+    async def save_index_snapshot(self) -> bool:
+        """
+        Écrit l'instantané de l'index en mémoire et vide le journal
+        
+        Sans effet tant que l'index n'est pas entièrement chargé (un instantané
+        partiel masquerait les entrées restées en base).
+        """
+        if not self.index_ready.is_set():
+            return False
+        await self._write_index_snapshot()
+        return True
+    
+    async def _write_index_snapshot(self):
+        """Écrit l'instantané et vide le journal, sous le verrou d'écriture"""
+        async with self._write_lock:
+            # Le journal ne doit contenir que les opérations postérieures à l'instantané
+            await self._flush_write_queue()
+            
+            started = time.perf_counter()
+            self.index_path.mkdir(parents=True, exist_ok=True)
+            doc_count = len(self.search_index)
+            sections = self.search_index.snapshot_sections()
+            await asyncio.get_running_loop().run_in_executor(
+                None, write_snapshot_file, self.snapshot_path, doc_count, sections
+            )
+            self._wal.reset()
+        
+        self.stats["snapshot_writes"] += 1
+        self.stats["last_snapshot_seconds"] = round(time.perf_counter() - started, 3)
+        logger.debug(f"Instantané de l'index écrit: {doc_count} logs")
+    
+    async def _snapshot_worker(self):
+        """Worker d'instantanés: écrit un instantané si le journal a grandi depuis le précédent"""
+        while self.is_running:
+            try:
+                await asyncio.sleep(self.snapshot_interval)
+                if self._wal.records:
+                    await self.save_index_snapshot()
+            except asyncio.CancelledError:
+                break
+            except Exception as e:
+                logger.error(f"Erreur dans le worker d'instantanés de l'index: {e}")
     
     async def index_log_entry(self, log_entry: LogEntry) -> str:
         """Indexe une nouvelle entrée de log"""
@@ -261,39 +1190,29 @@ class LogOptimizationService:
         )
         
         # Ajouter à l'index en mémoire
-        self.search_index.log_metadata[log_id] = index_entry
-        
-        # Mettre à jour les index
-        for term in search_terms:
-            if term not in self.search_index.term_to_logs:
-                self.search_index.term_to_logs[term] = set()
-            self.search_index.term_to_logs[term].add(log_id)
+        self.search_index.add(index_entry)
         
-        # Index par conteneur
-        if log_entry.container_id not in self.search_index.container_index:
-            self.search_index.container_index[log_entry.container_id] = set()
-        self.search_index.container_index[log_entry.container_id].add(log_id)
+        # Les résultats en cache pouvant inclure ce conteneur deviennent obsolètes
+        self.search_cache.invalidate(log_entry.container_id)
         
-        # Index par niveau
-        if index_entry.level not in self.search_index.level_index:
-            self.search_index.level_index[index_entry.level] = set()
-        self.search_index.level_index[index_entry.level].add(log_id)
-        
-        # Index temporel
-        time_bucket = log_entry.timestamp.replace(minute=0, second=0, microsecond=0).isoformat()
-        if time_bucket not in self.search_index.time_buckets:
-            self.search_index.time_buckets[time_bucket] = set()
-        self.search_index.time_buckets[time_bucket].add(log_id)
-        
-        # Sauvegarder en base de données (en batch pour performance)
-        await self._save_to_database(index_entry)
+        # Sauvegarde différée: le worker d'écriture regroupe les entrées en transactions
+        self._write_queue.append(index_entry)
+        if len(self._write_queue) >= self.write_batch_size:
+            self._write_event.set()
+        if len(self._write_queue) >= self.max_pending_writes:
+            # Backpressure: l'indexation attend que la base rattrape son retard
+            await self.flush_index_writes()
         
         # Mettre à jour les statistiques
-        self.stats["total_indexed_logs"] = len(self.search_index.log_metadata)
-        self.stats["unique_search_terms"] = len(self.search_index.term_to_logs)
+        self._update_index_stats()
         
         return log_id
     
+    def _update_index_stats(self):
+        """Met à jour les compteurs de l'index en mémoire"""
+        self.stats["total_indexed_logs"] = len(self.search_index)
+        self.stats["unique_search_terms"] = len(self.search_index.term_postings)
+    
     def _extract_search_terms(self, message: str) -> Set[str]:
         """Extrait les termes de recherche d'un message"""
         import re
@@ -310,31 +1229,105 @@ class LogOptimizationService:
         
         return set(words)
     
-    async def _save_to_database(self, entry: LogIndexEntry):
-        """Sauvegarde une entrée d'index en base de données"""
-        async with aiosqlite.connect(str(self.db_path)) as db:
-            await db.execute('''
+    async def _write_behind_worker(self):
+        """Worker d'écriture différée: écrit la file toutes les write_flush_interval secondes ou dès qu'un batch est plein"""
+        while self.is_running:
+            try:
+                try:
+                    await asyncio.wait_for(self._write_event.wait(), timeout=self.write_flush_interval)
+                except asyncio.TimeoutError:
+                    pass
+                self._write_event.clear()
+                await self.flush_index_writes()
+            except asyncio.CancelledError:
+                break
+            except Exception as e:
+                logger.error(f"Erreur dans le worker d'écriture de l'index: {e}")
+                await asyncio.sleep(self.write_flush_interval)
+    
+    async def flush_index_writes(self):
+        """Écrit en base les entrées en attente, par transactions de write_batch_size entrées"""
+        async with self._write_lock:
+            await self._flush_write_queue()
+    
+    async def _flush_write_queue(self):
+        """Écrit la file en base puis dans le journal de l'index (appelant détenteur de _write_lock)"""
+        while self._write_queue:
+            batch = self._write_queue[:self.write_batch_size]
+            del self._write_queue[:len(batch)]
+            try:
+                await self._save_batch_to_database(batch)
+            except BaseException:
+                # Remet le batch en tête de file pour la prochaine tentative
+                self._write_queue[:0] = batch
+                raise
+            self._wal.append_entries(batch)
+    
+    async def _writer_connection(self) -> aiosqlite.Connection:
+        """Connexion persistante du worker d'écriture (WAL, transactions explicites)"""
+        if self._write_db is None:
+            db = await aiosqlite.connect(str(self.db_path), isolation_level=None)
+            await db.execute("PRAGMA journal_mode=WAL")
+            await db.execute("PRAGMA synchronous=NORMAL")
+            self._write_db = db
+        return self._write_db
+    
+    async def _save_batch_to_database(self, entries: List[LogIndexEntry]):
+        """Sauvegarde des entrées d'index en base de données en une seule transaction"""
+        started = time.perf_counter()
+        
+        # Une seule version par log_id (la plus récente)
+        entries = list({entry.log_id: entry for entry in entries}.values())
+        
+        db = await self._writer_connection()
+        await db.execute("BEGIN")
+        try:
+            # Retire les anciennes versions des entrées de l'index plein texte
+            await db.executemany(
+                'DELETE FROM search_terms WHERE rowid IN (SELECT rowid FROM log_index WHERE log_id = ?)',
+                [(entry.log_id,) for entry in entries]
+            )
+            
+            await db.executemany('''
                 INSERT OR REPLACE INTO log_index 
                 (log_id, timestamp, container_id, level, message_hash, search_terms, file_path, compressed_size)
                 VALUES (?, ?, ?, ?, ?, ?, ?, ?)
-            ''', (
-                entry.log_id,
-                entry.timestamp.timestamp(),
-                entry.container_id,
-                entry.level,
-                entry.message_hash,
-                json.dumps(list(entry.search_terms)),
-                entry.file_path,
-                entry.compressed_size
-            ))
+            ''', [
+                (
+                    entry.log_id,
+                    entry.timestamp.timestamp(),
+                    entry.container_id,
+                    entry.level,
+                    entry.message_hash,
+                    json.dumps(list(entry.search_terms)),
+                    entry.file_path,
+                    entry.compressed_size
+                )
+                for entry in entries
+            ])
             
-            # Ajouter aux termes de recherche FTS
-            await db.execute('''
-                INSERT OR REPLACE INTO search_terms (log_id, terms)
-                VALUES (?, ?)
-            ''', (entry.log_id, ' '.join(entry.search_terms)))
+            # Ajouter aux termes de recherche FTS (rowid de la ligne insérée)
+            await db.executemany('''
+                INSERT INTO search_terms (rowid, log_id, terms)
+                SELECT rowid, log_id, ? FROM log_index WHERE log_id = ?
+            ''', [(' '.join(entry.search_terms), entry.log_id) for entry in entries])
             
-            await db.commit()
+            await db.execute("COMMIT")
+        except BaseException:
+            # Une annulation pendant l'attente du COMMIT le laisse s'exécuter:
+            # plus de transaction à annuler, l'exception d'origine doit remonter
+            if db.in_transaction:
+                try:
+                    await db.execute("ROLLBACK")
+                except aiosqlite.OperationalError:
+                    pass
+            raise
+        
+        latency_ms = (time.perf_counter() - started) * 1000
+        self.stats["write_batches"] += 1
+        self.stats["written_entries"] += len(entries)
+        self.stats["last_commit_latency_ms"] = round(latency_ms, 3)
+        self.stats["total_commit_latency_ms"] += latency_ms
     
     async def search_logs_optimized(
         self,
@@ -348,120 +1341,105 @@ class LogOptimizationService:
         """Recherche optimisée avec cache et indexation"""
         start_time_search = time.time()
         
-        # Créer une clé de cache
-        cache_key = hashlib.md5(
-            f"{query}{container_id}{level}{start_time}{end_time}{limit}".encode()
-        ).hexdigest()
-        
-        # Vérifier le cache
-        if cache_key in self.search_cache:
-            cached_result, cached_time = self.search_cache[cache_key]
-            if time.time() - cached_time < self.cache_ttl_seconds:
-                self.stats["cache_hits"] += 1
-                return cached_result, time.time() - start_time_search
+        # Vérifier le cache (invalidé par les nouvelles entrées du conteneur recherché)
+        cache_key = (query, container_id, level, start_time, end_time, limit)
+        cached_result = self.search_cache.get(cache_key, container_id)
+        if cached_result is not None:
+            self.stats["cache_hits"] += 1
+            return cached_result, time.time() - start_time_search
         
         self.stats["cache_misses"] += 1
         
-        # Recherche dans l'index
-        matching_log_ids = set(self.search_index.log_metadata.keys())
+        # Recherche dans l'index: une liste de postings triée par critère
+        index = self.search_index
+        postings: List[array] = []
+        
+        # Requêtes avec préfixes, OR ou exclusions: résolues par l'index FTS5
+        query_tokens = parse_search_query(query)
+        if any(token.kind == "prefix" or token.negated or token.alternative for token in query_tokens):
+            # L'index stocke des ensembles de termes: une phrase devient une conjonction de termes
+            match = build_match_expression(query_tokens, phrase_terms=self._extract_search_terms)
+            if match:
+                fts_log_ids = await self._search_fts(match.expression)
+                fts_docs = {index.doc_ids[log_id] for log_id in fts_log_ids if log_id in index.doc_ids}
+                if match.excluded:
+                    # Requête faite uniquement d'exclusions: tous les documents sauf ceux trouvés
+                    postings.append(array('I', (doc for doc in index.all_docs() if doc not in fts_docs)))
+                else:
+                    postings.append(array('I', sorted(fts_docs)))
+            query = None
         
-        # Filtrer par termes de recherche
+        # Filtrer par termes de recherche (les termes absents de l'index sont ignorés)
         if query:
             query_terms = self._extract_search_terms(query)
-            query_matches = set()
-            
-            for term in query_terms:
-                if term in self.search_index.term_to_logs:
-                    if not query_matches:
-                        query_matches = self.search_index.term_to_logs[term].copy()
-                    else:
-                        query_matches &= self.search_index.term_to_logs[term]
-            
-            if query_terms and query_matches:
-                matching_log_ids &= query_matches
-            elif query_terms:
-                matching_log_ids = set()  # Aucun terme trouvé
-        
-        # Filtrer par conteneur
-        if container_id and container_id in self.search_index.container_index:
-            matching_log_ids &= self.search_index.container_index[container_id]
-        elif container_id:
-            matching_log_ids = set()
-        
-        # Filtrer par niveau
-        if level and level in self.search_index.level_index:
-            matching_log_ids &= self.search_index.level_index[level]
-        elif level:
-            matching_log_ids = set()
-        
-        # Filtrer par temps (utiliser les buckets pour performance)
-        if start_time or end_time:
-            time_matches = set()
-            
-            for time_bucket, log_ids in self.search_index.time_buckets.items():
-                bucket_time = datetime.fromisoformat(time_bucket)
-                
-                include_bucket = True
-                if start_time and bucket_time < start_time - timedelta(hours=1):
-                    include_bucket = False
-                if end_time and bucket_time > end_time + timedelta(hours=1):
-                    include_bucket = False
-                
-                if include_bucket:
-                    time_matches.update(log_ids)
-            
-            if time_matches:
-                matching_log_ids &= time_matches
-            else:
-                matching_log_ids = set()
-        
-        # Trier par timestamp (plus récent en premier)
-        sorted_log_ids = sorted(
-            matching_log_ids,
-            key=lambda log_id: self.search_index.log_metadata[log_id].timestamp,
-            reverse=True
-        )
+            term_postings = [index.term_postings[term] for term in query_terms if term in index.term_postings]
+            if query_terms and not term_postings:
+                postings.append(array('I'))  # Aucun terme trouvé
+            postings.extend(term_postings)
         
-        # Appliquer la limite
-        result_log_ids = sorted_log_ids[:limit]
+        # Conteneur, niveau et plage de temps (index temporel trié), plus récents d'abord
+        matching_docs = index.search(
+            postings,
+            container_id=container_id or None,
+            level=level or None,
+            start=start_time.timestamp() if start_time else None,
+            end=end_time.timestamp() if end_time else None,
+            limit=limit
+        )
+        result_log_ids = [index.log_ids[doc] for doc in matching_docs]
         
         search_time = time.time() - start_time_search
         
         # Mettre en cache
-        self.search_cache[cache_key] = (result_log_ids, time.time())
+        self.search_cache.put(cache_key, result_log_ids, container_id)
         
         return result_log_ids, search_time
     
+    async def _search_fts(self, match_expression: str) -> Set[str]:
+        """Exécute une expression MATCH sur la table FTS5 search_terms"""
+        # Les entrées encore en file d'écriture doivent être visibles
+        await self.flush_index_writes()
+        
+        async with aiosqlite.connect(str(self.db_path)) as db:
+            cursor = await db.execute(
+                'SELECT log_id FROM search_terms WHERE search_terms MATCH ?',
+                (match_expression,)
+            )
+            return {row[0] for row in await cursor.fetchall()}
+    
     async def compress_log_file(self, file_path: Path, compression_type: str = "lz4") -> CompressionStats:
-        """Compresse un fichier de logs"""
+        """
+        Compresse un fichier de logs par trames indépendantes
+        
+        La compression s'exécute dans le pool de threads par défaut, par blocs
+        de compression_chunk_size octets: la boucle d'événements n'est pas
+        bloquée et la mémoire reste bornée. Un index de trames est écrit à
+        côté du fichier compressé, avec les bornes temporelles de chaque
+        trame: LogCollector et LogSearchService lisent ces archives sans les
+        décompresser entièrement (voir log_archive).
+        """
         start_time = time.time()
         
         if not file_path.exists():
             raise FileNotFoundError(f"Fichier non trouvé: {file_path}")
         
-        original_size = file_path.stat().st_size
-        
-        # Lire le contenu original
-        async with aiofiles.open(file_path, 'rb') as f:
-            original_data = await f.read()
+        check_codec(compression_type)
+        self.compressed_path.mkdir(parents=True, exist_ok=True)
         
-        # Compresser selon le type
-        if compression_type == "lz4":
-            compressed_data = lz4.frame.compress(original_data)
-            extension = ".lz4"
-        elif compression_type == "gzip":
-            compressed_data = gzip.compress(original_data)
-            extension = ".gz"
-        else:
-            raise ValueError(f"Type de compression non supporté: {compression_type}")
+        compressed_path = self.compressed_path / f"{file_path.name}{CODECS[compression_type][1]}"
+        dictionary = self.compression_dictionary if compression_type == "zstd" else None
         
-        # Écrire le fichier compressé
-        compressed_path = self.compressed_path / f"{file_path.name}{extension}"
-        async with aiofiles.open(compressed_path, 'wb') as f:
-            await f.write(compressed_data)
+        loop = asyncio.get_running_loop()
+        result = await loop.run_in_executor(
+            None, functools.partial(
+                compress_file, file_path, compressed_path, compression_type,
+                self.compression_chunk_size, dictionary, frame_bounds=jsonl_timestamp_bounds
+            )
+        )
         
-        compressed_size = len(compressed_data)
-        compression_ratio = (1 - compressed_size / original_size) * 100
+        original_size = result.original_size
+        compressed_size = result.compressed_size
+        compression_ratio = (1 - compressed_size / original_size) * 100 if original_size else 0.0
         time_taken = time.time() - start_time
         
         # Supprimer le fichier original après compression réussie
@@ -475,10 +1453,36 @@ class LogOptimizationService:
             time_taken=time_taken
         )
         
-        logger.info(f"Fichier compressé: {file_path.name} ({compression_ratio:.1f}% de réduction)")
+        logger.info(
+            f"Fichier compressé: {file_path.name} ({compression_ratio:.1f}% de réduction, "
+            f"{result.frames} trames)"
+        )
         
         return stats
     
+    def open_compressed_file(self, compressed_path: Path) -> SeekableCompressedFile:
+        """Ouvre un fichier compressé pour une lecture par trames (sans décompression complète)"""
+        return SeekableCompressedFile(compressed_path)
+    
+    async def train_compression_dictionary(self, sample_files: Optional[List[Path]] = None,
+                                           dict_size: int = 64 * 1024) -> bytes:
+        """
+        Entraîne le dictionnaire zstd sur des lignes de logs existantes
+        
+        Sans liste explicite, les fichiers *.log du répertoire de stockage
+        servent d'échantillons. Le dictionnaire est utilisé par les
+        compressions zstd suivantes.
+        """
+        if sample_files is None:
+            sample_files = sorted(self.storage_path.glob("*.log"))
+        
+        loop = asyncio.get_running_loop()
+        samples = await loop.run_in_executor(None, sample_lines, sample_files)
+        self.compression_dictionary = await loop.run_in_executor(None, train_dictionary, samples, dict_size)
+        
+        logger.info(f"Dictionnaire de compression entraîné sur {len(samples)} lignes")
+        return self.compression_dictionary
+    
     async def _auto_compression_worker(self):
         """Worker de compression automatique en arrière-plan"""
         while self.is_running:
@@ -514,18 +1518,9 @@ class LogOptimizationService:
         """Worker de nettoyage du cache"""
         while self.is_running:
             try:
-                current_time = time.time()
-                expired_keys = []
-                
-                for cache_key, (_, cached_time) in self.search_cache.items():
-                    if current_time - cached_time > self.cache_ttl_seconds:
-                        expired_keys.append(cache_key)
-                
-                for key in expired_keys:
-                    del self.search_cache[key]
-                
-                if expired_keys:
-                    logger.debug(f"Cache nettoyé: {len(expired_keys)} entrées expirées supprimées")
+                expired = self.search_cache.purge_expired()
+                if expired:
+                    logger.debug(f"Cache nettoyé: {expired} entrées expirées supprimées")
                 
                 await asyncio.sleep(self.cache_ttl_seconds)
                 
@@ -539,44 +1534,41 @@ class LogOptimizationService:
             try:
                 cutoff_date = datetime.now() - timedelta(days=self.retention_days)
                 
-                # Nettoyer l'index des logs anciens
-                old_log_ids = []
-                for log_id, entry in self.search_index.log_metadata.items():
-                    if entry.timestamp < cutoff_date:
-                        old_log_ids.append(log_id)
+                # Logs expirés: début de l'index temporel
+                index = self.search_index
+                _, expired = index.time_range(None, cutoff_date.timestamp())
+                old_log_ids = [index.log_ids[doc] for doc in index.time_order[:expired]]
                 
-                # Supprimer de l'index en mémoire
-                for log_id in old_log_ids:
-                    entry = self.search_index.log_metadata[log_id]
-                    
-                    # Supprimer des index
-                    for term in entry.search_terms:
-                        if term in self.search_index.term_to_logs:
-                            self.search_index.term_to_logs[term].discard(log_id)
-                            if not self.search_index.term_to_logs[term]:
-                                del self.search_index.term_to_logs[term]
-                    
-                    if entry.container_id in self.search_index.container_index:
-                        self.search_index.container_index[entry.container_id].discard(log_id)
-                    
-                    if entry.level in self.search_index.level_index:
-                        self.search_index.level_index[entry.level].discard(log_id)
-                    
-                    # Supprimer des buckets temporels
-                    time_bucket = entry.timestamp.replace(minute=0, second=0, microsecond=0).isoformat()
-                    if time_bucket in self.search_index.time_buckets:
-                        self.search_index.time_buckets[time_bucket].discard(log_id)
-                        if not self.search_index.time_buckets[time_bucket]:
-                            del self.search_index.time_buckets[time_bucket]
+                # Supprimer de l'index en mémoire: reconstruction compacte hors
+                # de la boucle, puis échange (comme le préchargement)
+                if old_log_ids:
+                    doc_count = len(index)
+                    kept = index.time_order[expired:]
+                    rebuilt = await asyncio.get_running_loop().run_in_executor(None, index.rebuilt, kept)
                     
-                    del self.search_index.log_metadata[log_id]
+                    if self.search_index is index:
+                        # Entrées indexées pendant la reconstruction
+                        for doc in range(doc_count, len(index)):
+                            rebuilt.add(index.entry(doc))
+                        self.search_index = rebuilt
+                        self.search_cache.clear()
+                        async with self._write_lock:
+                            self._wal.append_removal(old_log_ids)
+                    else:
+                        # Index remplacé entre-temps (préchargement): suppression au prochain passage
+                        old_log_ids = []
+                self._update_index_stats()
                 
-                # Supprimer de la base de données
+                # Supprimer de la base de données (après écriture de la file en attente)
                 if old_log_ids:
+                    await self.flush_index_writes()
                     async with aiosqlite.connect(str(self.db_path)) as db:
                         placeholders = ','.join(['?' for _ in old_log_ids])
+                        await db.execute(
+                            f'DELETE FROM search_terms WHERE rowid IN (SELECT rowid FROM log_index WHERE log_id IN ({placeholders}))',
+                            old_log_ids
+                        )
                         await db.execute(f'DELETE FROM log_index WHERE log_id IN ({placeholders})', old_log_ids)
-                        await db.execute(f'DELETE FROM search_terms WHERE log_id IN ({placeholders})', old_log_ids)
                         await db.commit()
                     
                     logger.info(f"Rotation: {len(old_log_ids)} logs anciens supprimés")
@@ -588,6 +1580,23 @@ class LogOptimizationService:
                 logger.error(f"Erreur dans le worker de rotation: {e}")
                 await asyncio.sleep(300)
     
+    @property
+    def cache_ttl_seconds(self) -> float:
+        """Durée de vie maximale d'un résultat en cache"""
+        return self.search_cache.ttl_seconds
+    
+    @cache_ttl_seconds.setter
+    def cache_ttl_seconds(self, value: float):
+        self.search_cache.ttl_seconds = value
+    
+    async def clear_search_cache(self) -> int:
+        """Vide le cache de recherche, retourne le nombre de résultats supprimés"""
+        return self.search_cache.clear()
+    
+    def get_cache_stats(self) -> Dict[str, Any]:
+        """Statistiques du cache de recherche"""
+        return self.search_cache.get_stats()
+    
     def get_optimization_stats(self) -> Dict[str, Any]:
         """Retourne les statistiques d'optimisation"""
         # Calculer la taille de la base de données
@@ -598,6 +1607,15 @@ class LogOptimizationService:
             **self.stats,
             "is_running": self.is_running,
             "cache_size": len(self.search_cache),
+            "cache": self.search_cache.get_stats(),
+            "index_memory_bytes": self.search_index.memory_usage(),
+            "write_queue_depth": len(self._write_queue),
+            "index_ready": self.index_ready.is_set(),
+            "wal_records": self._wal.records,
+            "avg_commit_latency_ms": (
+                self.stats["total_commit_latency_ms"] / self.stats["write_batches"]
+                if self.stats["write_batches"] else 0.0
+            ),
             "compression_ratio": self.stats["compression_stats"].compression_ratio,
             "cache_hit_ratio": (
                 self.stats["cache_hits"] / (self.stats["cache_hits"] + self.stats["cache_misses"])
@@ -0,0 +1,310 @@
+"""
+Parseurs de logs structurés sélectionnables par conteneur
+
+Le format d'un conteneur est choisi via le label Docker
+``wakedock.log.format`` (json, logfmt, nginx, postgres, generic, plain ou
+auto). Sans label, les N premières lignes sont échantillonnées une seule fois
+et le format reconnu le plus souvent est mis en cache pour la suite du flux:
+les tentatives JSON inutiles disparaissent sur les logs texte et les champs
+réels (statut HTTP, pid, niveau déclaré...) sont extraits dans les
+métadonnées.
+"""
+import logging
+import re
+from typing import Dict, List, NamedTuple, Optional
+
+from wakedock.core.log_classifier import extract_metadata, loads_json
+
+logger = logging.getLogger(__name__)
+
+LOG_FORMAT_LABEL = 'wakedock.log.format'
+AUTO_FORMAT = 'auto'
+GENERIC_FORMAT = 'generic'
+
+# Noms de niveaux rencontrés dans les champs structurés -> valeurs de LogLevel
+LEVEL_ALIASES = {
+    'trace': 'trace',
+    'debug': 'debug', 'dbg': 'debug',
+    'debug1': 'debug', 'debug2': 'debug', 'debug3': 'debug', 'debug4': 'debug', 'debug5': 'debug',
+    'info': 'info', 'information': 'info', 'notice': 'info', 'log': 'info',
+    'warn': 'warn', 'warning': 'warn',
+    'error': 'error', 'err': 'error',
+    'fatal': 'fatal', 'critical': 'fatal', 'crit': 'fatal', 'panic': 'fatal',
+    'emerg': 'fatal', 'alert': 'fatal'
+}
+LEVEL_FIELDS = ('level', 'lvl', 'severity', 'loglevel')
+
+
+def normalize_level(value) -> Optional[str]:
+    """Convertit un niveau déclaré par l'application en valeur de LogLevel"""
+    if not isinstance(value, str):
+        return None
+    return LEVEL_ALIASES.get(value.lower())
+
+
+def _declared_level(fields: Dict) -> Optional[str]:
+    """Niveau porté par un champ structuré (level, severity...)"""
+    for field in LEVEL_FIELDS:
+        if field in fields:
+            return normalize_level(fields[field])
+    return None
+
+
+class ParsedFields(NamedTuple):
+    """Champs extraits d'un message"""
+    metadata: Dict
+    level: Optional[str] = None  # None: niveau déduit du texte
+
+
+class LogFormatParser:
+    """Parseur d'un format de log"""
+
+    name = ''
+
+    def parse(self, message: str) -> Optional[ParsedFields]:
+        """
+        Extrait les champs d'un message
+
+        Returns:
+            ParsedFields, None si le message n'est pas dans ce format
+        """
+        return None
+
+
+class JsonLogParser(LogFormatParser):
+    """Logs JSON (un objet par ligne)"""
+
+    name = 'json'
+
+    def parse(self, message: str) -> Optional[ParsedFields]:
+        if message[:1] != '{' or message[-1:] != '}':
+            return None
+        try:
+            fields = loads_json(message)
+        except ValueError:
+            return None
+        if not isinstance(fields, dict):
+            return None
+        return ParsedFields(fields, _declared_level(fields))
+
+
+class LogfmtLogParser(LogFormatParser):
+    """Logs logfmt: ``level=info msg="request done" status=200``"""
+
+    name = 'logfmt'
+
+    PAIR_PATTERN = re.compile(r'([\w.\-/]+)=("(?:[^"\\]|\\.)*"|[^\s"]*)')
+    _ESCAPE_PATTERN = re.compile(r'\\(.)')
+
+    # Au moins deux paires: "x=1" isolé dans une phrase n'est pas du logfmt
+    min_pairs = 2
+
+    def parse(self, message: str) -> Optional[ParsedFields]:
+        if '=' not in message:
+            return None
+        pairs = self.PAIR_PATTERN.findall(message)
+        if len(pairs) < self.min_pairs:
+            return None
+
+        fields = {}
+        for key, value in pairs:
+            if value[:1] == '"':
+                value = self._ESCAPE_PATTERN.sub(r'\1', value[1:-1])
+            fields[key] = value
+        return ParsedFields(fields, _declared_level(fields))
+
+
+class NginxLogParser(LogFormatParser):
+    """Logs nginx: format d'accès "combined" et journal d'erreurs"""
+
+    name = 'nginx'
+
+    ACCESS_PATTERN = re.compile(
+        r'(?P<remote_addr>\S+) - (?P<remote_user>\S+) \[(?P<time_local>[^\]]+)\] '
+        r'"(?P<method>[A-Z]+) (?P<path>\S+) (?P<protocol>[^"]+)" '
+        r'(?P<status>\d{3}) (?P<body_bytes_sent>\d+|-)'
+        r'(?: "(?P<referer>[^"]*)" "(?P<user_agent>[^"]*)")?'
+    )
+    ERROR_PATTERN = re.compile(
+        r'\d{4}/\d\d/\d\d \d\d:\d\d:\d\d \[(?P<severity>[a-z]+)\] '
+        r'(?P<pid>\d+)#(?P<tid>\d+): (?:\*(?P<connection>\d+) )?'
+    )
+
+    def parse(self, message: str) -> Optional[ParsedFields]:
+        match = self.ACCESS_PATTERN.match(message)
+        if match:
+            fields = {key: value for key, value in match.groupdict().items() if value is not None}
+            status = int(fields['status'])
+            fields['status'] = status
+            if fields['body_bytes_sent'] != '-':
+                fields['body_bytes_sent'] = int(fields['body_bytes_sent'])
+
+            # Le niveau d'une ligne d'accès découle du statut HTTP
+            level = 'error' if status >= 500 else 'warn' if status >= 400 else 'info'
+            return ParsedFields(fields, level)
+
+        match = self.ERROR_PATTERN.match(message)
+        if match:
+            fields = {key: value for key, value in match.groupdict().items() if value is not None}
+            return ParsedFields(fields, normalize_level(fields['severity']))
+
+        return None
+
+
+class PostgresLogParser(LogFormatParser):
+    """Logs PostgreSQL avec le préfixe par défaut ``%m [%p] ``"""
+
+    name = 'postgres'
+
+    PATTERN = re.compile(
+        r'(?P<log_time>\d{4}-\d\d-\d\d \d\d:\d\d:\d\d(?:\.\d+)?(?: [A-Za-z]+|[+-]\d\d(?::?\d\d)?)?) '
+        r'\[(?P<pid>\d+)\](?: (?P<user>[^@\s]+)@(?P<database>\S+))? '
+        r'(?P<severity>[A-Z][A-Z0-9]+): +'
+    )
+
+    def parse(self, message: str) -> Optional[ParsedFields]:
+        match = self.PATTERN.match(message)
+        if not match:
+            return None
+        fields = {key: value for key, value in match.groupdict().items() if value is not None}
+        fields['pid'] = int(fields['pid'])
+        # DETAIL, HINT, STATEMENT...: niveau déduit du texte
+        return ParsedFields(fields, normalize_level(fields['severity']))
+
+
+class PlainLogParser(LogFormatParser):
+    """Texte libre: aucune extraction de champs"""
+
+    name = 'plain'
+
+
+class GenericLogParser(LogFormatParser):
+    """Comportement historique: JSON complet ou paires key=value"""
+
+    name = GENERIC_FORMAT
+
+    def parse(self, message: str) -> Optional[ParsedFields]:
+        return ParsedFields(extract_metadata(message))
+
+
+class ContainerLogParser:
+    """Parseur d'un conteneur, avec détection automatique du format"""
+
+    def __init__(self, registry: 'LogParserRegistry', parser: Optional[LogFormatParser] = None,
+                 source: str = AUTO_FORMAT):
+        self.registry = registry
+        self.parser = parser
+        self.source = source  # label ou auto
+
+        # Échantillon de détection: nombre de lignes reconnues par format
+        self.sampled = 0
+        self.matches: Dict[str, int] = {}
+
+    @property
+    def format(self) -> str:
+        """Format retenu (auto tant que la détection est en cours)"""
+        return self.parser.name if self.parser else AUTO_FORMAT
+
+    def parse(self, message: str) -> ParsedFields:
+        """Extrait les champs d'un message (vides s'il ne correspond pas au format)"""
+        if self.parser is None:
+            return self._sample(message)
+        return self.parser.parse(message) or ParsedFields({})
+
+    def _sample(self, message: str) -> ParsedFields:
+        """Essaie tous les formats candidats sur une ligne de l'échantillon"""
+        result = None
+        for parser in self.registry.candidates():
+            parsed = parser.parse(message)
+            if parsed is not None:
+                self.matches[parser.name] = self.matches.get(parser.name, 0) + 1
+                result = result or parsed
+
+        self.sampled += 1
+        if self.sampled >= self.registry.sample_size:
+            self.parser = self.registry.choose(self.matches, self.sampled)
+            logger.debug(f"Format de logs détecté: {self.parser.name} ({self.matches})")
+
+        return result or ParsedFields(extract_metadata(message))
+
+    def get_stats(self) -> Dict:
+        """Format retenu et résultat de l'échantillonnage"""
+        return {
+            'format': self.format,
+            'source': self.source,
+            'sampled_lines': self.sampled,
+            'matches': dict(self.matches)
+        }
+
+
+class LogParserRegistry:
+    """Registre des formats et sélection par conteneur"""
+
+    def __init__(self, sample_size: int = 50, detection_threshold: float = 0.8):
+        self.sample_size = sample_size
+        self.detection_threshold = detection_threshold
+        self.parsers: Dict[str, LogFormatParser] = {}
+
+        # Ordre de priorité de la détection automatique
+        self.detection_order: List[str] = []
+
+        # Parseurs par conteneur (format détecté mis en cache)
+        self.containers: Dict[str, ContainerLogParser] = {}
+
+        for parser in (JsonLogParser(), NginxLogParser(), PostgresLogParser(), LogfmtLogParser()):
+            self.register(parser, detect=True)
+        self.register(GenericLogParser())
+        self.register(PlainLogParser())
+
+    def register(self, parser: LogFormatParser, detect: bool = False):
+        """Enregistre un format (détectable automatiquement si detect=True)"""
+        self.parsers[parser.name] = parser
+        if detect and parser.name not in self.detection_order:
+            self.detection_order.append(parser.name)
+
+    def candidates(self) -> List[LogFormatParser]:
+        """Formats essayés pendant la détection automatique"""
+        return [self.parsers[name] for name in self.detection_order]
+
+    def choose(self, matches: Dict[str, int], sampled: int) -> LogFormatParser:
+        """Retient le format majoritaire de l'échantillon, sinon le parseur générique"""
+        best = None
+        for name in self.detection_order:
+            if matches.get(name, 0) >= sampled * self.detection_threshold:
+                if best is None or matches[name] > matches[best]:
+                    best = name
+        return self.parsers[best or GENERIC_FORMAT]
+
+    def for_container(self, container_id: str, labels: Optional[Dict[str, str]] = None) -> ContainerLogParser:
+        """Retourne le parseur d'un conteneur (réutilisé entre deux flux)"""
+        requested = (labels or {}).get(LOG_FORMAT_LABEL, AUTO_FORMAT).strip().lower()
+        if requested != AUTO_FORMAT and requested not in self.parsers:
+            logger.warning(f"Format de logs inconnu '{requested}' pour {container_id}, détection automatique")
+            requested = AUTO_FORMAT
+
+        current = self.containers.get(container_id)
+        if requested == AUTO_FORMAT:
+            if current is not None and current.source == AUTO_FORMAT:
+                return current
+            current = ContainerLogParser(self)
+        else:
+            if current is not None and current.source == 'label' and current.format == requested:
+                return current
+            current = ContainerLogParser(self, self.parsers[requested], source='label')
+
+        self.containers[container_id] = current
+        return current
+
+    def forget(self, container_id: str):
+        """Oublie le format d'un conteneur retiré"""
+        self.containers.pop(container_id, None)
+
+    def get_stats(self) -> Dict:
+        """Formats disponibles et format retenu par conteneur"""
+        return {
+            'formats': list(self.parsers.keys()),
+            'containers': {
+                container_id: parser.get_stats()
+                for container_id, parser in self.containers.items()
+            }
+        }
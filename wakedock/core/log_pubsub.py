@@ -0,0 +1,168 @@
+"""
+Diffusion en mémoire des logs collectés vers les abonnés temps réel
+
+Le collecteur publie chaque LogEntry parsée une seule fois ; chaque abonné
+(flux SSE, WebSocket...) dispose d'un tampon circulaire borné et filtré par
+conteneur et niveau minimum. Un client lent perd les entrées les plus
+anciennes de son tampon au lieu de ralentir la collecte.
+"""
+import asyncio
+import logging
+import time
+from collections import deque
+from typing import Deque, Dict, List, Optional, Set, TYPE_CHECKING
+
+if TYPE_CHECKING:
+    from wakedock.core.log_collector import LogEntry, LogLevel
+
+logger = logging.getLogger(__name__)
+
+# Ordre de sévérité des niveaux (les valeurs de LogLevel sont des chaînes)
+LEVEL_SEVERITY = {
+    'trace': 0,
+    'debug': 1,
+    'info': 2,
+    'warn': 3,
+    'error': 4,
+    'fatal': 5
+}
+
+
+class LogSubscription:
+    """Abonnement filtré avec tampon circulaire borné"""
+
+    def __init__(self, hub: 'LogPubSubHub', container_id: Optional[str] = None,
+                 min_level: Optional['LogLevel'] = None, buffer_size: int = 1000):
+        self.hub = hub
+        self.container_id = container_id
+        self.min_severity = LEVEL_SEVERITY[min_level.value] if min_level else None
+        self.buffer: Deque['LogEntry'] = deque(maxlen=buffer_size)
+        self.created_at = time.time()
+        self.delivered = 0
+        self.dropped = 0
+        self.closed = False
+        self._event = asyncio.Event()
+
+    def matches(self, log_entry: 'LogEntry') -> bool:
+        """Vérifie si une entrée correspond aux filtres de l'abonnement"""
+        if self.min_severity is not None and LEVEL_SEVERITY[log_entry.level.value] < self.min_severity:
+            return False
+        return True
+
+    def push(self, log_entry: 'LogEntry'):
+        """Ajoute une entrée au tampon (écrase la plus ancienne s'il est plein)"""
+        if len(self.buffer) == self.buffer.maxlen:
+            self.dropped += 1
+        self.buffer.append(log_entry)
+        self._event.set()
+
+    async def get(self, timeout: Optional[float] = None) -> List['LogEntry']:
+        """
+        Attend et retourne les entrées disponibles
+
+        Returns:
+            Entrées en attente, liste vide en cas de timeout ou de fermeture
+        """
+        if not self.buffer and not self.closed:
+            self._event.clear()
+            try:
+                await asyncio.wait_for(self._event.wait(), timeout)
+            except asyncio.TimeoutError:
+                return []
+
+        entries = list(self.buffer)
+        self.buffer.clear()
+        self.delivered += len(entries)
+        return entries
+
+    def close(self):
+        """Ferme l'abonnement et réveille le consommateur"""
+        if self.closed:
+            return
+        self.closed = True
+        self.hub.unsubscribe(self)
+        self._event.set()
+
+    async def __aenter__(self) -> 'LogSubscription':
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        self.close()
+
+    def get_stats(self) -> Dict:
+        """Statistiques de l'abonnement"""
+        return {
+            'container_id': self.container_id,
+            'min_level': self.min_severity,
+            'pending': len(self.buffer),
+            'buffer_size': self.buffer.maxlen,
+            'delivered': self.delivered,
+            'dropped': self.dropped,
+            'age_seconds': round(time.time() - self.created_at, 1)
+        }
+
+
+class LogPubSubHub:
+    """Hub de diffusion des logs vers les abonnements actifs"""
+
+    def __init__(self, default_buffer_size: int = 1000):
+        self.default_buffer_size = default_buffer_size
+
+        # Abonnés indexés par conteneur (None = tous les conteneurs)
+        self._subscribers: Dict[Optional[str], Set[LogSubscription]] = {}
+        self.published = 0
+
+    def subscribe(self, container_id: Optional[str] = None,
+                  min_level: Optional['LogLevel'] = None,
+                  buffer_size: Optional[int] = None) -> LogSubscription:
+        """Crée un abonnement filtré"""
+        subscription = LogSubscription(
+            self,
+            container_id=container_id,
+            min_level=min_level,
+            buffer_size=buffer_size or self.default_buffer_size
+        )
+        self._subscribers.setdefault(container_id, set()).add(subscription)
+        logger.debug(f"Nouvel abonnement aux logs (conteneur: {container_id or 'tous'})")
+        return subscription
+
+    def unsubscribe(self, subscription: LogSubscription):
+        """Retire un abonnement"""
+        subscribers = self._subscribers.get(subscription.container_id)
+        if subscribers is None:
+            return
+        subscribers.discard(subscription)
+        if not subscribers:
+            del self._subscribers[subscription.container_id]
+
+    def publish(self, log_entry: 'LogEntry'):
+        """Diffuse une entrée aux abonnés concernés"""
+        self.published += 1
+        if not self._subscribers:
+            return
+
+        for key in (log_entry.container_id, None):
+            for subscription in self._subscribers.get(key, ()):
+                if subscription.matches(log_entry):
+                    subscription.push(log_entry)
+
+    def close_all(self):
+        """Ferme tous les abonnements"""
+        for subscribers in list(self._subscribers.values()):
+            for subscription in list(subscribers):
+                subscription.close()
+
+    @property
+    def subscriber_count(self) -> int:
+        """Nombre d'abonnements actifs"""
+        return sum(len(subscribers) for subscribers in self._subscribers.values())
+
+    def get_stats(self) -> Dict:
+        """Statistiques du hub"""
+        subscriptions = [s for subscribers in self._subscribers.values() for s in subscribers]
+        return {
+            'subscribers': len(subscriptions),
+            'published': self.published,
+            'pending': sum(len(s.buffer) for s in subscriptions),
+            'dropped': sum(s.dropped for s in subscriptions)
+        }
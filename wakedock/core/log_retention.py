@@ -0,0 +1,176 @@
+"""
+Moteur de rétention et de compaction des logs stockés
+
+Remplace la rotation par renommage: le stockage écrit des partitions
+horaires (un segment ne couvre qu'une heure), puis ce moteur
+- compacte les partitions fermées en blocs colonnaires compressés
+- supprime les partitions au-delà de l'âge maximal
+- supprime les partitions les plus anciennes au-delà du budget disque
+
+Budgets par conteneur. Chaque opération est notifiée aux abonnés (index de
+recherche) avant la suppression des anciens fichiers, afin que leurs
+pointeurs soient réécrits dans la même transaction et ne deviennent jamais
+invalides.
+"""
+import asyncio
+import logging
+import time
+from dataclasses import dataclass
+from datetime import datetime, timedelta
+from pathlib import Path
+from typing import Dict, List, Optional
+
+from wakedock.core.log_storage import (
+    CompactedSegment,
+    LogSegment,
+    SegmentedLogStore,
+    to_micros,
+)
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class RetentionPolicy:
+    """Budgets de rétention d'un conteneur"""
+    max_bytes: Optional[int] = 500 * 1024 * 1024
+    max_age: Optional[timedelta] = timedelta(days=7)
+    # Délai d'inactivité d'une partition fermée avant sa compaction
+    compact_after: timedelta = timedelta(minutes=5)
+    compaction_enabled: bool = True
+
+
+class RetentionListener:
+    """Abonné notifié des changements de fichiers du stockage"""
+
+    async def on_segment_compacted(self, container_id: str, old_path: Path, segment: CompactedSegment):
+        """Un segment JSONL va être remplacé par sa version compactée"""
+
+    async def on_segment_dropped(self, container_id: str, paths: List[Path]):
+        """Les fichiers d'un segment vont être supprimés"""
+
+
+class LogRetentionEngine:
+    """Applique compaction et budgets de rétention sur un SegmentedLogStore"""
+
+    def __init__(self, store: SegmentedLogStore, policy: Optional[RetentionPolicy] = None,
+                 block_rows: int = 4096):
+        self.store = store
+        self.default_policy = policy or RetentionPolicy()
+        self.block_rows = block_rows
+        self.policies: Dict[str, RetentionPolicy] = {}
+        self.listeners: List[RetentionListener] = []
+
+        # Une seule passe à la fois
+        self._lock = asyncio.Lock()
+
+        self.stats = {
+            'runs': 0,
+            'segments_compacted': 0,
+            'bytes_before_compaction': 0,
+            'bytes_after_compaction': 0,
+            'segments_dropped_age': 0,
+            'segments_dropped_size': 0,
+            'bytes_dropped': 0,
+            'last_run_at': None,
+            'last_run_seconds': 0.0
+        }
+
+    def add_listener(self, listener: RetentionListener):
+        """Abonne un service aux compactions et suppressions"""
+        if listener not in self.listeners:
+            self.listeners.append(listener)
+
+    def remove_listener(self, listener: RetentionListener):
+        """Désabonne un service"""
+        if listener in self.listeners:
+            self.listeners.remove(listener)
+
+    def set_policy(self, container_id: str, policy: RetentionPolicy):
+        """Définit les budgets propres à un conteneur"""
+        self.policies[container_id] = policy
+
+    def policy_for(self, container_id: str) -> RetentionPolicy:
+        """Budgets applicables à un conteneur"""
+        return self.policies.get(container_id, self.default_policy)
+
+    async def run_once(self, now: Optional[datetime] = None):
+        """Compacte les partitions fermées puis applique les budgets d'âge et de taille"""
+        async with self._lock:
+            started = time.monotonic()
+            now = now or datetime.utcnow()
+
+            for container_id in self.store.list_containers():
+                try:
+                    await self._apply(container_id, now)
+                except Exception as e:
+                    logger.error(f"Erreur lors de la rétention des logs de {container_id}: {e}")
+
+            self.stats['runs'] += 1
+            self.stats['last_run_at'] = now.isoformat()
+            self.stats['last_run_seconds'] = round(time.monotonic() - started, 3)
+
+    async def _apply(self, container_id: str, now: datetime):
+        """Applique la politique d'un conteneur"""
+        policy = self.policy_for(container_id)
+
+        # Le dernier segment (partition en cours d'écriture) n'est jamais modifié
+        if policy.compaction_enabled:
+            idle_before = time.time() - policy.compact_after.total_seconds()
+            for segment in self.store.segments(container_id)[:-1]:
+                if not segment.compacted and segment.data_path.stat().st_mtime <= idle_before:
+                    await self._compact(container_id, segment)
+
+        if policy.max_age is not None:
+            cutoff = to_micros(now - policy.max_age)
+            for segment in self.store.segments(container_id)[:-1]:
+                if segment.max_ts < cutoff:
+                    await self._drop(container_id, segment)
+                    self.stats['segments_dropped_age'] += 1
+
+        if policy.max_bytes is not None:
+            segments = self.store.segments(container_id)
+            total_size = sum(segment.data_size for segment in segments)
+            for segment in segments[:-1]:
+                if total_size <= policy.max_bytes:
+                    break
+                total_size -= segment.data_size
+                await self._drop(container_id, segment)
+                self.stats['segments_dropped_size'] += 1
+
+    async def _compact(self, container_id: str, segment: LogSegment):
+        """Compacte un segment et met à jour les abonnés avant de supprimer l'original"""
+        loop = asyncio.get_running_loop()
+        compacted = await loop.run_in_executor(None, self.store.compact_segment, segment, self.block_rows)
+
+        try:
+            for listener in self.listeners:
+                await listener.on_segment_compacted(container_id, segment.data_path, compacted)
+        except Exception:
+            # L'original reste la référence: le fichier compacté est abandonné
+            compacted.data_path.unlink()
+            raise
+
+        self.store.replace_segment(container_id, segment, compacted)
+        self.stats['segments_compacted'] += 1
+        self.stats['bytes_before_compaction'] += segment.data_size
+        self.stats['bytes_after_compaction'] += compacted.data_size
+        logger.info(
+            f"Compaction: {segment.data_path.name} ({segment.data_size} octets) -> "
+            f"{compacted.data_path.name} ({compacted.data_size} octets)"
+        )
+
+    async def _drop(self, container_id: str, segment):
+        """Supprime un segment après notification des abonnés"""
+        for listener in self.listeners:
+            await listener.on_segment_dropped(container_id, segment.paths)
+        self.store.drop_segment(container_id, segment)
+        self.stats['bytes_dropped'] += segment.data_size
+        logger.info(f"Rétention: segment {segment.data_path} supprimé")
+
+    def get_stats(self) -> Dict:
+        """Statistiques de la rétention"""
+        stats = dict(self.stats)
+        before = stats['bytes_before_compaction']
+        stats['compaction_ratio'] = round(stats['bytes_after_compaction'] / before, 3) if before else None
+        return stats
@@ -2,19 +2,49 @@
 Service d'indexation pour la recherche rapide dans les logs
 """
 import asyncio
+import hashlib
 import json
 import logging
+import os
+import re
+import zlib
+from contextlib import asynccontextmanager
 from dataclasses import dataclass
 from datetime import datetime, timedelta
 from pathlib import Path
-from typing import Dict, List, Optional, Set, Tuple
+from typing import AsyncIterator, Dict, List, Optional, Set, Tuple
 
 import aiosqlite
 
+from wakedock.core.log_archive import (
+    archive_directory,
+    is_archive_file,
+    LOG_OPTIMIZATION_PATH,
+    LogArchive,
+)
 from wakedock.core.log_collector import LogEntry, LogLevel
+from wakedock.core.log_fts import (
+    build_fts_query,
+    column_filter,
+    fts_table_sql,
+    quote_fts_term,
+    snippet_sql,
+)
+from wakedock.core.log_retention import RetentionListener
+from wakedock.core.log_storage import (
+    COMPACTED_SUFFIX,
+    CompactedSegment,
+    read_compacted_rows,
+)
 
 logger = logging.getLogger(__name__)
 
+# Extraction des termes (mots d'au moins 3 caractères hors mots courants)
+SEARCH_TERM_PATTERN = re.compile(r'\b\w{3,}\b')
+STOP_WORDS = frozenset({
+    'the', 'and', 'for', 'are', 'but', 'not', 'you', 'all', 'can', 'had', 'her', 'was', 'one', 'our', 'out', 'day', 'get', 'has', 'him', 'his', 'how', 'its', 'may', 'new', 'now', 'old', 'see', 'two', 'who', 'boy', 'did', 'come', 'from', 'into', 'like', 'make', 'many', 'over', 'such', 'take', 'than', 'them', 'time', 'very', 'when', 'with'
+})
+
 @dataclass
 class LogIndex:
     """Index d'un log pour la recherche"""
@@ -28,21 +58,51 @@ class LogIndex:
     file_path: str
     line_number: int
     
-class LogSearchService:
+# Index secondaires (supprimés pendant une réindexation complète puis reconstruits
+# en une passe, bien plus rapide que leur mise à jour ligne par ligne)
+SECONDARY_INDEXES = {
+    'idx_container_id': 'log_index (container_id)',
+    'idx_timestamp': 'log_index (timestamp)',
+    'idx_level': 'log_index (level)',
+    'idx_service_name': 'log_index (service_name)',
+}
+
+# Colonnes de l'index plein texte: le message (seul pris en compte par BM25) et
+# les filtres exacts, pour que FTS5 restreigne les candidats avant la jointure
+LOG_FTS_COLUMNS = ['message', 'container_id', 'service_name', 'level']
+LOG_FTS_BM25 = "bm25(log_fts, 1.0, 0.0, 0.0, 0.0)"
+
+class LogSearchService(RetentionListener):
     """Service de recherche indexée dans les logs"""
     
-    def __init__(self, storage_path: str = "/var/log/wakedock", db_path: str = None):
+    def __init__(self, storage_path: str = "/var/log/wakedock", db_path: str = None,
+                 archive_paths: Optional[List[str]] = None):
         self.storage_path = Path(storage_path)
         self.db_path = db_path or str(self.storage_path / "logs_index.db")
         
+        # Archives compressées par trames: indexées une fois, relues trame par trame
+        if archive_paths is None:
+            archive_paths = [archive_directory(LOG_OPTIMIZATION_PATH)]
+        self.archive = LogArchive(archive_paths)
+        
         # Configuration de l'indexation
         self.index_batch_size = 1000
+        # Classement BM25 limité aux N correspondances les plus récentes (latence bornée)
+        self.relevance_window = 10000
+        
+        # Lecture des résultats: regroupe les enregistrements proches d'un même fichier
+        self.read_coalesce_gap = 64 * 1024
+        self.read_max_span = 1024 * 1024
         self.reindex_interval = 3600  # 1 heure
         
         # État du service
         self.is_running = False
         self.indexing_task: Optional[asyncio.Task] = None
         
+        # Connexion persistante (WAL) partagée, sérialisée par un verrou
+        self._db: Optional[aiosqlite.Connection] = None
+        self._db_lock = asyncio.Lock()
+        
     async def start(self):
         """Démarre le service d'indexation"""
         if self.is_running:
@@ -63,6 +123,8 @@ class LogSearchService:
     async def stop(self):
         """Arrête le service d'indexation"""
         if not self.is_running:
+            # La connexion peut avoir été ouverte sans démarrage (requêtes directes)
+            await self._close_database()
             return
             
         logger.info("Arrêt du service d'indexation des logs")
@@ -70,44 +132,87 @@ class LogSearchService:
         
         if self.indexing_task:
             self.indexing_task.cancel()
+        
+        await self._close_database()
+    
+    async def _open_database(self) -> aiosqlite.Connection:
+        """Ouvre la connexion persistante et configure SQLite pour l'indexation en masse"""
+        if self._db is None:
+            # isolation_level=None: les transactions sont gérées explicitement
+            db = await aiosqlite.connect(self.db_path, isolation_level=None)
+            await db.execute("PRAGMA journal_mode=WAL")
+            await db.execute("PRAGMA synchronous=NORMAL")
+            await db.execute("PRAGMA foreign_keys=ON")
+            # Les suppressions implicites d'INSERT OR REPLACE déclenchent aussi les triggers
+            await db.execute("PRAGMA recursive_triggers=ON")
+            await db.execute("PRAGMA temp_store=MEMORY")
+            await db.execute("PRAGMA cache_size=-16000")
+            await self._create_schema(db)
+            self._db = db
+        return self._db
+    
+    async def _close_database(self):
+        """Ferme la connexion persistante"""
+        async with self._db_lock:
+            if self._db is not None:
+                await self._db.close()
+                self._db = None
+    
+    @asynccontextmanager
+    async def _connection(self) -> AsyncIterator[aiosqlite.Connection]:
+        """Fournit la connexion partagée avec un accès exclusif"""
+        async with self._db_lock:
+            yield await self._open_database()
     
     async def _init_database(self):
         """Initialise la base de données SQLite pour l'index"""
-        async with aiosqlite.connect(self.db_path) as db:
-            await db.execute("""
-                CREATE TABLE IF NOT EXISTS log_index (
-                    id INTEGER PRIMARY KEY AUTOINCREMENT,
-                    container_id TEXT NOT NULL,
-                    container_name TEXT NOT NULL,
-                    service_name TEXT,
-                    timestamp DATETIME NOT NULL,
-                    level TEXT NOT NULL,
-                    message_hash TEXT NOT NULL,
-                    file_path TEXT NOT NULL,
-                    line_number INTEGER NOT NULL,
-                    indexed_at DATETIME DEFAULT CURRENT_TIMESTAMP,
-                    UNIQUE(file_path, line_number)
-                )
-            """)
-            
-            await db.execute("""
-                CREATE TABLE IF NOT EXISTS log_search_index (
-                    id INTEGER PRIMARY KEY AUTOINCREMENT,
-                    log_id INTEGER NOT NULL,
-                    term TEXT NOT NULL,
-                    frequency INTEGER DEFAULT 1,
-                    FOREIGN KEY (log_id) REFERENCES log_index (id) ON DELETE CASCADE
-                )
-            """)
-            
-            # Index pour améliorer les performances
-            await db.execute("CREATE INDEX IF NOT EXISTS idx_container_id ON log_index (container_id)")
-            await db.execute("CREATE INDEX IF NOT EXISTS idx_timestamp ON log_index (timestamp)")
-            await db.execute("CREATE INDEX IF NOT EXISTS idx_level ON log_index (level)")
-            await db.execute("CREATE INDEX IF NOT EXISTS idx_service_name ON log_index (service_name)")
-            await db.execute("CREATE INDEX IF NOT EXISTS idx_search_term ON log_search_index (term)")
-            
-            await db.commit()
+        async with self._connection():
+            pass
+    
+    async def _create_schema(self, db: aiosqlite.Connection, with_indexes: bool = True):
+        """Crée les tables et index de recherche"""
+        await db.execute("""
+            CREATE TABLE IF NOT EXISTS log_index (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                container_id TEXT NOT NULL,
+                container_name TEXT NOT NULL,
+                service_name TEXT,
+                timestamp DATETIME NOT NULL,
+                level TEXT NOT NULL,
+                message_hash TEXT NOT NULL,
+                file_path TEXT NOT NULL,
+                line_number INTEGER NOT NULL,
+                byte_offset INTEGER,
+                byte_length INTEGER,
+                indexed_at DATETIME DEFAULT CURRENT_TIMESTAMP,
+                UNIQUE(file_path, line_number)
+            )
+        """)
+        
+        # Migration des index créés avant l'ajout des pointeurs d'octets
+        cursor = await db.execute("PRAGMA table_info(log_index)")
+        existing_columns = {row[1] for row in await cursor.fetchall()}
+        for column in ("byte_offset", "byte_length"):
+            if column not in existing_columns:
+                await db.execute(f"ALTER TABLE log_index ADD COLUMN {column} INTEGER")
+        
+        # Index plein texte FTS5 (rowid = log_index.id), remplace l'ancienne table de termes
+        await db.execute("DROP TABLE IF EXISTS log_search_index")
+        await db.execute(fts_table_sql("log_fts", LOG_FTS_COLUMNS))
+        await db.execute("CREATE VIRTUAL TABLE IF NOT EXISTS log_fts_vocab USING fts5vocab(log_fts, 'row')")
+        await db.execute("""
+            CREATE TRIGGER IF NOT EXISTS log_index_fts_delete AFTER DELETE ON log_index
+            BEGIN
+                DELETE FROM log_fts WHERE rowid = old.id;
+            END
+        """)
+        
+        if not with_indexes:
+            return
+        
+        # Index pour améliorer les performances
+        for index_name, index_definition in SECONDARY_INDEXES.items():
+            await db.execute(f"CREATE INDEX IF NOT EXISTS {index_name} ON {index_definition}")
     
     async def _indexing_worker(self):
         """Worker qui effectue l'indexation continue"""
@@ -124,16 +229,26 @@ class LogSearchService:
         """Réindexe tous les fichiers de logs"""
         logger.info("Démarrage de la réindexation complète")
         
-        # Nettoie l'index existant
-        async with aiosqlite.connect(self.db_path) as db:
-            await db.execute("DELETE FROM log_search_index")
+        # Nettoie l'index existant et suspend les index secondaires
+        async with self._connection() as db:
+            await db.execute("DROP TRIGGER IF EXISTS log_index_fts_delete")
+            await db.execute("DROP TABLE IF EXISTS log_fts_vocab")
+            await db.execute("DROP TABLE IF EXISTS log_fts")
             await db.execute("DELETE FROM log_index")
-            await db.commit()
+            for index_name in SECONDARY_INDEXES:
+                await db.execute(f"DROP INDEX IF EXISTS {index_name}")
+            await self._create_schema(db, with_indexes=False)
         
         # Indexe tous les fichiers
-        log_files = list(self.storage_path.glob("containers/*.jsonl"))
-        for log_file in log_files:
-            await self._index_file(log_file)
+        log_files = self._list_log_files()
+        try:
+            for log_file in log_files:
+                await self._index_file(log_file)
+        finally:
+            # Reconstruit les index secondaires en une passe et fusionne les segments FTS
+            async with self._connection() as db:
+                await self._create_schema(db)
+                await db.execute("INSERT INTO log_fts(log_fts) VALUES('optimize')")
         
         logger.info(f"Réindexation complète terminée: {len(log_files)} fichiers")
     
@@ -141,11 +256,14 @@ class LogSearchService:
         """Indexation incrémentale des nouveaux logs"""
         logger.debug("Démarrage de l'indexation incrémentale")
         
+        # Retire les entrées des fichiers supprimés hors du moteur de rétention
+        await self._prune_missing_files()
+        
         # Trouve les fichiers modifiés récemment
         cutoff_time = datetime.utcnow() - timedelta(hours=2)
         
         log_files = []
-        for log_file in self.storage_path.glob("containers/*.jsonl"):
+        for log_file in self._list_log_files():
             if datetime.fromtimestamp(log_file.stat().st_mtime) > cutoff_time:
                 log_files.append(log_file)
         
@@ -156,46 +274,86 @@ class LogSearchService:
         if log_files:
             logger.debug(f"Indexation incrémentale terminée: {len(log_files)} fichiers")
     
+    def _list_log_files(self) -> List[Path]:
+        """Liste les fichiers de logs (segments par conteneur, compactés ou non, anciens fichiers plats et archives)"""
+        return (
+            sorted(self.storage_path.glob("containers/*/*.jsonl"))
+            + sorted(self.storage_path.glob(f"containers/*/*{COMPACTED_SUFFIX}"))
+            + sorted(self.storage_path.glob("containers/*.jsonl"))
+            + self.archive.list_files()
+        )
+    
+    async def _prune_missing_files(self):
+        """Supprime de l'index les entrées dont le fichier n'existe plus"""
+        async with self._connection() as db:
+            cursor = await db.execute("SELECT DISTINCT file_path FROM log_index")
+            missing = [(file_path,) for (file_path,) in await cursor.fetchall() if not os.path.exists(file_path)]
+            if missing:
+                await db.executemany("DELETE FROM log_index WHERE file_path = ?", missing)
+                logger.info(f"{len(missing)} fichiers de logs disparus retirés de l'index")
+    
     async def _index_file(self, log_file: Path, incremental: bool = False):
         """Indexe un fichier de logs"""
+        if log_file.suffix == COMPACTED_SUFFIX:
+            await self._index_compacted_file(log_file, incremental)
+            return
+        if is_archive_file(log_file):
+            await self._index_archive_file(log_file, incremental)
+            return
+        
         try:
-            # Récupère la dernière ligne indexée pour ce fichier
+            # Reprend après la dernière ligne indexée pour ce fichier
             last_line = 0
+            resume_offset = None
             if incremental:
-                async with aiosqlite.connect(self.db_path) as db:
+                async with self._connection() as db:
                     cursor = await db.execute(
-                        "SELECT MAX(line_number) FROM log_index WHERE file_path = ?",
+                        "SELECT line_number, byte_offset + byte_length FROM log_index WHERE file_path = ? ORDER BY line_number DESC LIMIT 1",
                         (str(log_file),)
                     )
                     result = await cursor.fetchone()
-                    if result and result[0]:
-                        last_line = result[0]
+                    if result:
+                        last_line, resume_offset = result
             
-            # Lit et indexe les nouvelles lignes
+            # Lit et indexe les nouvelles lignes en relevant leur position dans le fichier
             batch = []
             current_line = 0
+            offset = 0
             
-            with open(log_file, 'r', encoding='utf-8') as f:
+            with open(log_file, 'rb') as f:
+                if resume_offset is not None and resume_offset <= os.fstat(f.fileno()).st_size:
+                    # Accès direct à la fin de la dernière ligne indexée (saut de ligne inclus)
+                    f.seek(resume_offset)
+                    line_end = f.readline()
+                    if line_end.strip():
+                        # Le fichier a changé depuis l'indexation: relecture depuis le début
+                        f.seek(0)
+                    else:
+                        current_line = last_line
+                        offset = resume_offset + len(line_end)
+                
                 for line in f:
                     current_line += 1
+                    line_offset = offset
+                    offset += len(line)
                     
                     # Skip les lignes déjà indexées
                     if current_line <= last_line:
                         continue
                     
                     try:
-                        log_data = json.loads(line.strip())
+                        log_data = json.loads(line)
                         log_entry = LogEntry.from_dict(log_data)
                         
-                        # Ajoute au batch
-                        batch.append((log_entry, current_line))
+                        # Ajoute au batch (longueur sans le saut de ligne)
+                        batch.append((log_entry, current_line, line_offset, len(line.rstrip(b'\r\n'))))
                         
                         # Flush le batch si plein
                         if len(batch) >= self.index_batch_size:
                             await self._index_batch(batch, str(log_file))
-                            batch.clear()
+                            batch = []
                             
-                    except (json.JSONDecodeError, KeyError, ValueError) as e:
+                    except (json.JSONDecodeError, UnicodeDecodeError, KeyError, ValueError) as e:
                         logger.warning(f"Ligne de log invalide ignorée: {e}")
                         continue
             
@@ -208,78 +366,223 @@ class LogSearchService:
         except Exception as e:
             logger.error(f"Erreur lors de l'indexation du fichier {log_file}: {e}")
     
-    async def _index_batch(self, batch: List[Tuple[LogEntry, int]], file_path: str):
-        """Indexe un batch de logs"""
-        async with aiosqlite.connect(self.db_path) as db:
-            # Insère les entrées dans l'index principal
-            log_entries = []
-            search_entries = []
+    async def _index_compacted_file(self, log_file: Path, incremental: bool = False):
+        """Indexe un segment compacté (pointeur = bloc colonnaire contenant la ligne)"""
+        try:
+            if incremental:
+                # Un segment compacté est immuable: indexé entièrement ou pas du tout
+                async with self._connection() as db:
+                    cursor = await db.execute("SELECT 1 FROM log_index WHERE file_path = ? LIMIT 1", (str(log_file),))
+                    if await cursor.fetchone():
+                        return
             
-            for log_entry, line_number in batch:
-                # Hash du message pour déduplication
-                import hashlib
-                message_hash = hashlib.md5(log_entry.message.encode()).hexdigest()
+            segment = CompactedSegment(log_file.parent, int(log_file.stem))
+            segment.load()
+            
+            batch = []
+            for line_number, block, record in segment.iter_rows():
+                try:
+                    batch.append((LogEntry.from_dict(record), line_number, block.offset, block.length))
+                except (KeyError, ValueError, TypeError) as e:
+                    logger.warning(f"Ligne de log invalide ignorée: {e}")
+                    continue
                 
-                log_entries.append((
-                    log_entry.container_id,
-                    log_entry.container_name,
-                    log_entry.service_name,
-                    log_entry.timestamp.isoformat(),
-                    log_entry.level.value,
-                    message_hash,
-                    file_path,
-                    line_number
-                ))
+                if len(batch) >= self.index_batch_size:
+                    await self._index_batch(batch, str(log_file))
+                    batch = []
+            
+            if batch:
+                await self._index_batch(batch, str(log_file))
             
-            # Insère en batch
-            await db.executemany("""
-                INSERT OR REPLACE INTO log_index 
-                (container_id, container_name, service_name, timestamp, level, message_hash, file_path, line_number)
-                VALUES (?, ?, ?, ?, ?, ?, ?, ?)
-            """, log_entries)
+            logger.debug(f"Indexation du segment compacté {log_file}: {segment.record_count} lignes")
             
-            await db.commit()
+        except Exception as e:
+            logger.error(f"Erreur lors de l'indexation du fichier {log_file}: {e}")
+    
+    async def _index_archive_file(self, log_file: Path, incremental: bool = False):
+        """Indexe une archive compressée (pointeurs exprimés dans le fichier d'origine)"""
+        try:
+            if incremental:
+                # Une archive est immuable: indexée entièrement ou pas du tout
+                async with self._connection() as db:
+                    cursor = await db.execute("SELECT 1 FROM log_index WHERE file_path = ? LIMIT 1", (str(log_file),))
+                    if await cursor.fetchone():
+                        return
             
-            # Récupère les IDs des logs insérés pour l'index de recherche
-            for i, (log_entry, line_number) in enumerate(batch):
-                cursor = await db.execute(
-                    "SELECT id FROM log_index WHERE file_path = ? AND line_number = ?",
-                    (file_path, line_number)
-                )
-                result = await cursor.fetchone()
-                if result:
-                    log_id = result[0]
+            loop = asyncio.get_running_loop()
+            reader = await loop.run_in_executor(None, self.archive.open, log_file)
+            
+            batch = []
+            line_count = 0
+            for frame in reader.frames:
+                lines = await loop.run_in_executor(None, reader.read_lines, frame)
+                offset = frame.raw_offset
+                for index, line in enumerate(lines):
+                    line_offset = offset
+                    # Les lignes de la trame se terminent toutes par un saut de ligne, sauf la dernière du fichier
+                    offset += len(line) + 1
+                    if not line.strip():
+                        continue
+                    line_count += 1
+                    try:
+                        log_entry = LogEntry.from_dict(json.loads(line))
+                    except (json.JSONDecodeError, UnicodeDecodeError, KeyError, ValueError) as e:
+                        logger.warning(f"Ligne de log invalide ignorée: {e}")
+                        continue
                     
-                    # Extrait les termes de recherche
-                    terms = self._extract_search_terms(log_entry.message)
-                    for term in terms:
-                        search_entries.append((log_id, term))
+                    batch.append((log_entry, frame.first_line + index, line_offset, len(line.rstrip(b'\r'))))
+                    if len(batch) >= self.index_batch_size:
+                        await self._index_batch(batch, str(log_file))
+                        batch = []
+            
+            if batch:
+                await self._index_batch(batch, str(log_file))
+            
+            logger.debug(f"Indexation de l'archive {log_file}: {line_count} lignes")
             
-            # Insère les termes de recherche
-            if search_entries:
+        except Exception as e:
+            logger.error(f"Erreur lors de l'indexation du fichier {log_file}: {e}")
+    
+    async def on_segment_compacted(self, container_id: str, old_path: Path, segment: CompactedSegment):
+        """
+        Réécrit les pointeurs d'un segment JSONL vers sa version compactée
+        
+        Les numéros de ligne sont conservés: chaque bloc remplace une plage de
+        lignes contiguës. Toute la réécriture se fait dans une transaction, les
+        recherches concurrentes voient l'ancien ou le nouveau fichier, jamais
+        un mélange.
+        """
+        # Rattrape les lignes écrites depuis la dernière indexation
+        await self._index_file(Path(old_path), incremental=True)
+        
+        old_file, new_file = str(old_path), str(segment.data_path)
+        async with self._connection() as db:
+            await db.execute("BEGIN IMMEDIATE")
+            try:
+                # Le segment compacté a pu être découvert par une réindexation concurrente
+                await db.execute("DELETE FROM log_index WHERE file_path = ?", (new_file,))
+                await db.executemany(
+                    """
+                    UPDATE log_index SET file_path = ?, byte_offset = ?, byte_length = ?
+                    WHERE file_path = ? AND line_number BETWEEN ? AND ?
+                    """,
+                    [
+                        (new_file, block.offset, block.length, old_file, block.first_row, block.first_row + block.count - 1)
+                        for block in segment.blocks
+                    ]
+                )
+                # Lignes invalides non reprises dans le segment compacté
+                await db.execute("DELETE FROM log_index WHERE file_path = ?", (old_file,))
+                await db.execute("COMMIT")
+            except BaseException:
+                if db.in_transaction:
+                    try:
+                        await db.execute("ROLLBACK")
+                    except aiosqlite.OperationalError:
+                        pass
+                raise
+        
+        logger.debug(f"Index: {old_file} remplacé par {new_file}")
+    
+    async def on_segment_dropped(self, container_id: str, paths: List[Path]):
+        """Supprime de l'index les entrées d'un segment supprimé par la rétention"""
+        async with self._connection() as db:
+            await db.execute("BEGIN IMMEDIATE")
+            try:
+                await db.executemany("DELETE FROM log_index WHERE file_path = ?", [(str(path),) for path in paths])
+                await db.execute("COMMIT")
+            except BaseException:
+                if db.in_transaction:
+                    try:
+                        await db.execute("ROLLBACK")
+                    except aiosqlite.OperationalError:
+                        pass
+                raise
+    
+    async def _index_batch(self, batch: List[Tuple[LogEntry, int, int, int]], file_path: str):
+        """Indexe un batch de logs (entrée, ligne, offset, longueur) en une seule transaction"""
+        if not batch:
+            return
+        
+        log_entries = [
+            (
+                log_entry.container_id,
+                log_entry.container_name,
+                log_entry.service_name,
+                log_entry.timestamp.isoformat(),
+                log_entry.level.value,
+                # Hash du message pour déduplication
+                hashlib.md5(log_entry.message.encode()).hexdigest(),
+                file_path,
+                line_number,
+                byte_offset,
+                byte_length
+            )
+            for log_entry, line_number, byte_offset, byte_length in batch
+        ]
+        
+        async with self._connection() as db:
+            await db.execute("BEGIN IMMEDIATE")
+            try:
+                # Insère en batch (le trigger retire les lignes remplacées de l'index FTS)
                 await db.executemany("""
-                    INSERT OR IGNORE INTO log_search_index (log_id, term)
-                    VALUES (?, ?)
-                """, search_entries)
+                    INSERT OR REPLACE INTO log_index 
+                    (container_id, container_name, service_name, timestamp, level, message_hash, file_path, line_number, byte_offset, byte_length)
+                    VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+                """, log_entries)
                 
-                await db.commit()
+                log_ids = await self._inserted_ids(db, batch, file_path)
+                
+                # Alimente l'index plein texte
+                await db.executemany(
+                    "INSERT INTO log_fts (rowid, message, container_id, service_name, level) VALUES (?, ?, ?, ?, ?)",
+                    [
+                        (log_id, log_entry.message, log_entry.container_id, log_entry.service_name or '', log_entry.level.value)
+                        for (log_entry, *_), log_id in zip(batch, log_ids)
+                    ]
+                )
+                
+                await db.execute("COMMIT")
+            except BaseException:
+                # Une annulation pendant l'attente du COMMIT le laisse s'exécuter:
+                # plus de transaction à annuler, l'exception d'origine doit remonter
+                if db.in_transaction:
+                    try:
+                        await db.execute("ROLLBACK")
+                    except aiosqlite.OperationalError:
+                        pass
+                raise
+    
+    async def _inserted_ids(self, db: aiosqlite.Connection, batch: List[Tuple[LogEntry, int, int, int]], file_path: str) -> List[int]:
+        """Retrouve les IDs attribués au batch qui vient d'être inséré"""
+        # La transaction détient le verrou d'écriture: les IDs AUTOINCREMENT du
+        # batch sont contigus et se terminent par last_insert_rowid()
+        cursor = await db.execute("SELECT last_insert_rowid()")
+        last_id = (await cursor.fetchone())[0]
+        first_id = last_id - len(batch) + 1
+        
+        # Vérification sur la seule plage de rowid (pas d'index file_path: O(batch))
+        cursor = await db.execute(
+            "SELECT TOTAL(file_path = ?), MIN(line_number), MAX(line_number) FROM log_index WHERE id BETWEEN ? AND ?",
+            (file_path, first_id, last_id)
+        )
+        count, min_line, max_line = await cursor.fetchone()
+        line_numbers = [line_number for _, line_number, *_ in batch]
+        if count == len(batch) and min_line == min(line_numbers) and max_line == max(line_numbers):
+            return list(range(first_id, last_id + 1))
+        
+        # Plage non contiguë (lignes en double dans le batch...): une seule requête par plage de lignes
+        cursor = await db.execute(
+            "SELECT line_number, id FROM log_index WHERE file_path = ? AND line_number BETWEEN ? AND ?",
+            (file_path, min(line_numbers), max(line_numbers))
+        )
+        ids_by_line = dict(await cursor.fetchall())
+        return [ids_by_line[line_number] for line_number in line_numbers]
     
     def _extract_search_terms(self, message: str) -> Set[str]:
         """Extrait les termes de recherche d'un message"""
-        import re
-
-        # Normalise le message
-        message = message.lower()
-        
-        # Extrait les mots (minimum 3 caractères)
-        words = set(re.findall(r'\b\w{3,}\b', message))
-        
-        # Filtre les mots courants (stop words)
-        stop_words = {
-            'the', 'and', 'for', 'are', 'but', 'not', 'you', 'all', 'can', 'had', 'her', 'was', 'one', 'our', 'out', 'day', 'get', 'has', 'him', 'his', 'how', 'its', 'may', 'new', 'now', 'old', 'see', 'two', 'who', 'boy', 'did', 'come', 'from', 'into', 'like', 'make', 'many', 'over', 'such', 'take', 'than', 'them', 'time', 'very', 'when', 'with'
-        }
-        
-        return words - stop_words
+        # Extrait les mots normalisés (minimum 3 caractères) hors mots courants
+        return set(SEARCH_TERM_PATTERN.findall(message.lower())) - STOP_WORDS
     
     async def search_logs(self, 
                          query: str,
@@ -288,35 +591,39 @@ class LogSearchService:
                          start_time: Optional[datetime] = None,
                          end_time: Optional[datetime] = None,
                          level: Optional[LogLevel] = None,
-                         limit: int = 1000) -> List[Dict]:
-        """Recherche dans les logs indexés"""
+                         limit: int = 1000,
+                         sort: str = "relevance") -> List[Dict]:
+        """
+        Recherche dans les logs indexés
+        
+        La requête supporte phrases ("..."), préfixes (term*), OR et exclusions (-term).
+        Avec une requête, sort="relevance" classe par score BM25, sort="time" par date.
+        """
         
         # Construit la requête SQL
         sql_parts = []
         params = []
         
-        # Recherche par terme
-        if query:
-            query_terms = self._extract_search_terms(query)
-            if query_terms:
-                # Utilise l'index de recherche pour la performance
-                sql_parts.append("""
-                    li.id IN (
-                        SELECT DISTINCT lsi.log_id 
-                        FROM log_search_index lsi 
-                        WHERE lsi.term IN ({})
-                    )
-                """.format(','.join('?' * len(query_terms))))
-                params.extend(query_terms)
+        # Recherche plein texte, restreinte au message
+        text_match = build_fts_query(query, stop_words=STOP_WORDS, min_term_length=3)
+        text_expression = text_match.expression if text_match and not text_match.excluded else None
+        match_clauses = [column_filter("message", text_expression)] if text_expression else []
+        
+        # Requête faite uniquement d'exclusions: tous les logs sauf ceux qui correspondent
+        if text_match and text_match.excluded:
+            sql_parts.append("li.id NOT IN (SELECT rowid FROM log_fts WHERE log_fts MATCH ?)")
+            params.append(column_filter("message", text_match.expression))
         
-        # Filtres additionnels
+        # Filtres additionnels (vérifiés en SQL, pré-filtrés par FTS en présence d'une requête)
         if container_id:
             sql_parts.append("li.container_id = ?")
             params.append(container_id)
+            match_clauses.append(column_filter("container_id", quote_fts_term(container_id)))
         
         if service_name:
             sql_parts.append("li.service_name = ?")
             params.append(service_name)
+            match_clauses.append(column_filter("service_name", quote_fts_term(service_name)))
         
         if start_time:
             sql_parts.append("li.timestamp >= ?")
@@ -329,59 +636,249 @@ class LogSearchService:
         if level:
             sql_parts.append("li.level = ?")
             params.append(level.value)
+            match_clauses.append(column_filter("level", quote_fts_term(level.value)))
         
-        # Construit la requête finale
-        where_clause = " AND ".join(sql_parts) if sql_parts else "1=1"
+        columns = """li.id, li.container_id, li.container_name, li.service_name,
+                     li.timestamp, li.level, li.file_path, li.line_number,
+                     li.byte_offset, li.byte_length"""
         
-        sql = f"""
-            SELECT li.container_id, li.container_name, li.service_name, 
-                   li.timestamp, li.level, li.file_path, li.line_number
-            FROM log_index li
-            WHERE {where_clause}
-            ORDER BY li.timestamp DESC
-            LIMIT ?
-        """
-        params.append(limit)
+        if text_expression:
+            # L'index FTS pilote la requête (CROSS JOIN fixe l'ordre des tables)
+            match_expression = " AND ".join(match_clauses)
+            where_clause = " AND ".join(["log_fts MATCH ?"] + sql_parts)
+            params.insert(0, match_expression)
+            
+            if sort == "relevance":
+                # BM25 sur les correspondances les plus récentes: le parcours par
+                # rowid décroissant s'arrête après relevance_window lignes
+                sql = f"""
+                    SELECT * FROM (
+                        SELECT {columns}, {LOG_FTS_BM25} AS score
+                        FROM log_fts CROSS JOIN log_index li ON li.id = log_fts.rowid
+                        WHERE {where_clause}
+                        ORDER BY log_fts.rowid DESC
+                        LIMIT ?
+                    )
+                    ORDER BY score
+                    LIMIT ?
+                """
+                params.extend([self.relevance_window, limit])
+            else:
+                sql = f"""
+                    SELECT {columns}, {LOG_FTS_BM25} AS score
+                    FROM log_fts CROSS JOIN log_index li ON li.id = log_fts.rowid
+                    WHERE {where_clause}
+                    ORDER BY li.timestamp DESC
+                    LIMIT ?
+                """
+                params.append(limit)
+        else:
+            where_clause = " AND ".join(sql_parts) if sql_parts else "1=1"
+            sql = f"""
+                SELECT {columns}, NULL
+                FROM log_index li
+                WHERE {where_clause}
+                ORDER BY li.timestamp DESC
+                LIMIT ?
+            """
+            params.append(limit)
         
         # Exécute la requête
-        results = []
-        async with aiosqlite.connect(self.db_path) as db:
+        highlights = {}
+        async with self._connection() as db:
             cursor = await db.execute(sql, params)
             rows = await cursor.fetchall()
             
-            for row in rows:
-                container_id, container_name, service_name, timestamp, level, file_path, line_number = row
-                
-                # Lit le log original depuis le fichier
-                try:
-                    log_content = await self._read_log_line(file_path, line_number)
-                    if log_content:
-                        results.append({
-                            'container_id': container_id,
-                            'container_name': container_name,
-                            'service_name': service_name,
-                            'timestamp': timestamp,
-                            'level': level,
-                            'message': log_content.get('message', ''),
-                            'metadata': log_content.get('metadata', {}),
-                            'file_path': file_path,
-                            'line_number': line_number
-                        })
-                except Exception as e:
-                    logger.warning(f"Erreur lors de la lecture du log {file_path}:{line_number}: {e}")
+            # Extraits surlignés calculés uniquement pour les lignes retournées
+            if text_expression and rows:
+                log_ids = [row[0] for row in rows]
+                cursor = await db.execute(
+                    f"""
+                    SELECT rowid, {snippet_sql("log_fts")} FROM log_fts
+                    WHERE log_fts MATCH ? AND rowid IN ({','.join('?' * len(log_ids))})
+                    """,
+                    [column_filter("message", text_expression)] + log_ids
+                )
+                highlights = dict(await cursor.fetchall())
+        
+        return await self._hydrate_rows(rows, highlights)
+    
+    async def iter_logs(self,
+                        container_id: Optional[str] = None,
+                        service_name: Optional[str] = None,
+                        start_time: Optional[datetime] = None,
+                        end_time: Optional[datetime] = None,
+                        level: Optional[LogLevel] = None,
+                        limit: Optional[int] = None,
+                        page_size: int = 1000) -> AsyncIterator[Dict]:
+        """
+        Parcourt les logs indexés du plus récent au plus ancien, page par page
+        
+        La pagination par clé (timestamp, id) garde une mémoire constante quel
+        que soit le volume exporté; limit=None parcourt toute la plage.
+        """
+        sql_parts = []
+        params = []
+        
+        if container_id:
+            sql_parts.append("li.container_id = ?")
+            params.append(container_id)
+        if service_name:
+            sql_parts.append("li.service_name = ?")
+            params.append(service_name)
+        if start_time:
+            sql_parts.append("li.timestamp >= ?")
+            params.append(start_time.isoformat())
+        if end_time:
+            sql_parts.append("li.timestamp <= ?")
+            params.append(end_time.isoformat())
+        if level:
+            sql_parts.append("li.level = ?")
+            params.append(level.value)
+        
+        remaining = limit
+        cursor_key = None
+        while remaining is None or remaining > 0:
+            page_limit = page_size if remaining is None else min(page_size, remaining)
+            where_parts = list(sql_parts)
+            page_params = list(params)
+            if cursor_key is not None:
+                where_parts.append("(li.timestamp, li.id) < (?, ?)")
+                page_params.extend(cursor_key)
+            where_clause = " AND ".join(where_parts) if where_parts else "1=1"
+            
+            sql = f"""
+                SELECT li.id, li.container_id, li.container_name, li.service_name,
+                       li.timestamp, li.level, li.file_path, li.line_number,
+                       li.byte_offset, li.byte_length, NULL
+                FROM log_index li
+                WHERE {where_clause}
+                ORDER BY li.timestamp DESC, li.id DESC
+                LIMIT ?
+            """
+            async with self._connection() as db:
+                cursor = await db.execute(sql, page_params + [page_limit])
+                rows = await cursor.fetchall()
+            if not rows:
+                return
+            
+            for result in await self._hydrate_rows(rows):
+                yield result
+            
+            if len(rows) < page_limit:
+                return
+            cursor_key = (rows[-1][4], rows[-1][0])
+            if remaining is not None:
+                remaining -= len(rows)
+    
+    async def _hydrate_rows(self, rows: List[Tuple], highlights: Optional[Dict[int, str]] = None) -> List[Dict]:
+        """Complète les lignes de l'index avec le message et les métadonnées originaux"""
+        highlights = highlights or {}
+        
+        # Lit les logs originaux: lectures groupées par fichier et triées par offset
+        pointers: Dict[str, List[Tuple[int, Optional[int], Optional[int]]]] = {}
+        for row in rows:
+            pointers.setdefault(row[6], []).append((row[7], row[8], row[9]))
+        records = await asyncio.get_running_loop().run_in_executor(None, self._read_records, pointers)
+        
+        results = []
+        for row in rows:
+            log_id, container_id, container_name, service_name, timestamp, level, file_path, line_number, _, _, score = row
+            
+            log_content = records.get((file_path, line_number))
+            if log_content:
+                results.append({
+                    'container_id': container_id,
+                    'container_name': container_name,
+                    'service_name': service_name,
+                    'timestamp': timestamp,
+                    'level': level,
+                    'message': log_content.get('message', ''),
+                    'metadata': log_content.get('metadata', {}),
+                    'file_path': file_path,
+                    'line_number': line_number,
+                    # BM25 FTS5: plus le score est bas, plus le log est pertinent
+                    'score': score,
+                    'highlight': highlights.get(log_id)
+                })
         
         return results
     
-    async def _read_log_line(self, file_path: str, line_number: int) -> Optional[Dict]:
-        """Lit une ligne spécifique d'un fichier de log"""
+    def _read_records(self, pointers: Dict[str, List[Tuple[int, Optional[int], Optional[int]]]]) -> Dict[Tuple[str, int], Dict]:
+        """
+        Lit des enregistrements par pointeurs (ligne, offset, longueur), fichier par fichier
+        
+        Les lectures sont triées par offset et les enregistrements proches sont
+        regroupés en un seul pread. Les entrées indexées avant l'ajout des offsets
+        sont retrouvées par un unique parcours séquentiel du fichier.
+        """
+        records = {}
+        for file_path, file_pointers in pointers.items():
+            try:
+                if file_path.endswith(COMPACTED_SUFFIX):
+                    # Segment compacté: un pointeur désigne le bloc qui contient la ligne
+                    rows = read_compacted_rows(file_path, [p for p in file_pointers if p[1] is not None])
+                    for line_number, record in rows.items():
+                        records[(file_path, line_number)] = record
+                    continue
+                
+                if is_archive_file(Path(file_path)):
+                    # Archive: seules les trames contenant les lignes sont décompressées (avec cache)
+                    reader = self.archive.open(file_path)
+                    for line_number, offset, length in file_pointers:
+                        if offset is None:
+                            continue
+                        record = self._decode_record(file_path, line_number, reader.read_range(offset, length))
+                        if record is not None:
+                            records[(file_path, line_number)] = record
+                    continue
+                
+                with open(file_path, 'rb') as f:
+                    located = sorted((p for p in file_pointers if p[1] is not None), key=lambda p: p[1])
+                    for line_number, chunk in self._pread_grouped(f.fileno(), located):
+                        record = self._decode_record(file_path, line_number, chunk)
+                        if record is not None:
+                            records[(file_path, line_number)] = record
+                    
+                    missing = {line_number for line_number, offset, _ in file_pointers if offset is None}
+                    if missing:
+                        f.seek(0)
+                        for current_line, line in enumerate(f, 1):
+                            if current_line in missing:
+                                record = self._decode_record(file_path, current_line, line)
+                                if record is not None:
+                                    records[(file_path, current_line)] = record
+                                missing.discard(current_line)
+                                if not missing:
+                                    break
+            except (OSError, ValueError, RuntimeError, zlib.error) as e:
+                logger.warning(f"Erreur lors de la lecture de {file_path}: {e}")
+        return records
+    
+    def _pread_grouped(self, fd: int, located: List[Tuple[int, int, int]]):
+        """Lit des plages triées en regroupant celles séparées de moins de read_coalesce_gap"""
+        i = 0
+        while i < len(located):
+            start = located[i][1]
+            end = start + located[i][2]
+            j = i + 1
+            while (j < len(located)
+                   and located[j][1] - end <= self.read_coalesce_gap
+                   and located[j][1] + located[j][2] - start <= self.read_max_span):
+                end = max(end, located[j][1] + located[j][2])
+                j += 1
+            
+            data = os.pread(fd, end - start, start)
+            for line_number, offset, length in located[i:j]:
+                yield line_number, data[offset - start:offset - start + length]
+            i = j
+    
+    def _decode_record(self, file_path: str, line_number: int, data: bytes) -> Optional[Dict]:
+        """Décode un enregistrement JSON lu depuis un fichier de logs"""
         try:
-            with open(file_path, 'r', encoding='utf-8') as f:
-                for i, line in enumerate(f, 1):
-                    if i == line_number:
-                        return json.loads(line.strip())
-            return None
-        except Exception as e:
-            logger.warning(f"Erreur lors de la lecture de {file_path}:{line_number}: {e}")
+            return json.loads(data)
+        except (json.JSONDecodeError, UnicodeDecodeError) as e:
+            logger.warning(f"Erreur lors de la lecture du log {file_path}:{line_number}: {e}")
             return None
     
     async def get_log_statistics(self, 
@@ -409,7 +906,7 @@ class LogSearchService:
         where_clause = " AND ".join(where_parts) if where_parts else "1=1"
         
         # Récupère les statistiques
-        async with aiosqlite.connect(self.db_path) as db:
+        async with self._connection() as db:
             # Nombre total de logs
             cursor = await db.execute(
                 f"SELECT COUNT(*) FROM log_index WHERE {where_clause}",
@@ -462,13 +959,13 @@ class LogSearchService:
     
     async def get_index_stats(self) -> Dict:
         """Récupère les statistiques de l'index"""
-        async with aiosqlite.connect(self.db_path) as db:
+        async with self._connection() as db:
             # Nombre total d'entrées indexées
             cursor = await db.execute("SELECT COUNT(*) FROM log_index")
             total_indexed = (await cursor.fetchone())[0]
             
-            # Nombre de termes de recherche
-            cursor = await db.execute("SELECT COUNT(DISTINCT term) FROM log_search_index")
+            # Nombre de termes de recherche (vocabulaire FTS5)
+            cursor = await db.execute("SELECT COUNT(*) FROM log_fts_vocab")
             unique_terms = (await cursor.fetchone())[0]
             
             # Taille de la base de données
@@ -478,5 +975,6 @@ class LogSearchService:
                 'total_indexed_logs': total_indexed,
                 'unique_search_terms': unique_terms,
                 'database_size_bytes': db_size,
+                'archive': self.archive.get_stats(),
                 'is_running': self.is_running
             }
@@ -0,0 +1,757 @@
+"""
+Stockage segmenté en ajout seul pour les logs des conteneurs
+
+Chaque conteneur dispose d'un répertoire contenant des segments de taille
+bornée, un segment ne couvrant qu'une partition horaire:
+
+- ``{segment_id}.jsonl``: les entrées de log (une ligne JSON par entrée)
+- ``{segment_id}.idx``: un en-tête (timestamps min/max, taille des données)
+  suivi d'un index clairsemé de blocs (offset, longueur, timestamps min/max)
+- ``{segment_id}.wdc``: un segment fermé compacté en blocs colonnaires
+  compressés, qui remplace les deux fichiers précédents
+
+Les requêtes temporelles et les lectures "tail N" ne lisent que les blocs
+concernés au lieu du fichier complet.
+"""
+import json
+import logging
+import os
+import struct
+import sys
+import threading
+import zlib
+from array import array
+from dataclasses import dataclass
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple, Union
+
+try:
+    import zstandard
+    ZSTD_AVAILABLE = True
+except ImportError:
+    ZSTD_AVAILABLE = False
+    zstandard = None
+
+logger = logging.getLogger(__name__)
+
+SEGMENT_MAGIC = b"WDSI"
+SEGMENT_VERSION = 1
+
+# magic, version, réservé, min_ts, max_ts, nb_entrées, taille_données,
+# offset du bloc ouvert, min_ts du bloc ouvert, max_ts du bloc ouvert, nb_entrées du bloc ouvert
+HEADER_STRUCT = struct.Struct("<4sHHqqQQQqqI")
+# offset, longueur, min_ts, max_ts, nb_entrées
+BLOCK_STRUCT = struct.Struct("<QIqqI")
+
+# Segments compactés: blocs puis index des blocs et pied de fichier
+COMPACTED_MAGIC = b"WDSC"
+COMPACTED_VERSION = 1
+COMPACTED_SUFFIX = ".wdc"
+# magic, version, réservé, min_ts, max_ts, nb_entrées, nb_blocs, offset de l'index des blocs
+COMPACTED_FOOTER_STRUCT = struct.Struct("<4sHHqqQQQ")
+# offset, longueur, min_ts, max_ts, nb_entrées, première ligne
+COMPACTED_BLOCK_STRUCT = struct.Struct("<QIqqIQ")
+# En-tête d'un bloc compacté: codec, première ligne, nb_entrées
+COMPACTED_PAYLOAD_STRUCT = struct.Struct("<B3xQI")
+CODEC_ZLIB = 0
+CODEC_ZSTD = 1
+
+# Marqueur de valeur nulle dans les colonnes de chaînes
+_NULL_LENGTH = 0xFFFFFFFF
+
+TS_MIN = -(2 ** 63)
+TS_MAX = 2 ** 63 - 1
+
+EPOCH = datetime(1970, 1, 1)
+
+
+def to_micros(timestamp: datetime) -> int:
+    """Convertit un datetime (naïf = UTC) en microsecondes depuis l'epoch"""
+    if timestamp.tzinfo is not None:
+        timestamp = timestamp.astimezone(timezone.utc).replace(tzinfo=None)
+    delta = timestamp - EPOCH
+    return (delta.days * 86400 + delta.seconds) * 1_000_000 + delta.microseconds
+
+
+def from_micros(timestamp: int) -> datetime:
+    """Convertit des microsecondes depuis l'epoch en datetime UTC naïf"""
+    return EPOCH + timedelta(microseconds=timestamp)
+
+
+@dataclass(frozen=True)
+class BlockIndexEntry:
+    """Bloc de données indexé dans un segment"""
+    offset: int
+    length: int
+    min_ts: int
+    max_ts: int
+    count: int
+
+    def overlaps(self, start_ts: int, end_ts: int) -> bool:
+        """Indique si le bloc peut contenir des entrées dans l'intervalle"""
+        return self.count > 0 and self.max_ts >= start_ts and self.min_ts <= end_ts
+
+
+@dataclass(frozen=True)
+class CompactedBlockEntry(BlockIndexEntry):
+    """Bloc colonnaire d'un segment compacté (lignes first_row à first_row + count - 1)"""
+    first_row: int
+
+
+class LogSegment:
+    """Segment de logs: fichier de données + index clairsemé"""
+
+    compacted = False
+
+    def __init__(self, directory: Path, segment_id: int, block_size: int):
+        self.directory = directory
+        self.segment_id = segment_id
+        self.block_size = block_size
+        self.data_path = directory / f"{segment_id:012d}.jsonl"
+        self.index_path = directory / f"{segment_id:012d}.idx"
+
+        self.min_ts = TS_MAX
+        self.max_ts = TS_MIN
+        self.record_count = 0
+        self.data_size = 0
+        self.blocks: List[BlockIndexEntry] = []
+
+        # Bloc en cours de remplissage
+        self.open_offset = 0
+        self.open_min = TS_MAX
+        self.open_max = TS_MIN
+        self.open_count = 0
+
+        self._lock = threading.Lock()
+
+    # Persistance de l'index
+
+    def load(self):
+        """Charge l'index depuis le disque et récupère les écritures non indexées"""
+        if self.index_path.exists():
+            with open(self.index_path, "rb") as f:
+                raw = f.read()
+            if len(raw) >= HEADER_STRUCT.size:
+                (magic, version, _, self.min_ts, self.max_ts, self.record_count,
+                 self.data_size, self.open_offset, self.open_min, self.open_max,
+                 self.open_count) = HEADER_STRUCT.unpack_from(raw, 0)
+                if magic != SEGMENT_MAGIC or version != SEGMENT_VERSION:
+                    raise ValueError(f"Index de segment invalide: {self.index_path}")
+                for pos in range(HEADER_STRUCT.size, len(raw) - BLOCK_STRUCT.size + 1, BLOCK_STRUCT.size):
+                    self.blocks.append(BlockIndexEntry(*BLOCK_STRUCT.unpack_from(raw, pos)))
+
+        actual_size = self.data_path.stat().st_size if self.data_path.exists() else 0
+        if actual_size < self.data_size:
+            # Données tronquées: l'index n'est plus fiable, on le reconstruit
+            logger.warning(f"Segment {self.data_path} tronqué, reconstruction de l'index")
+            self._reset()
+            self._recover_from(0, actual_size)
+            self._write_index(rewrite=True)
+        elif actual_size > self.data_size:
+            # Écritures non indexées (arrêt brutal entre données et index)
+            self._recover_from(self.data_size, actual_size)
+            self._write_index(rewrite=True)
+
+    def _reset(self):
+        """Réinitialise l'état de l'index"""
+        self.min_ts, self.max_ts = TS_MAX, TS_MIN
+        self.record_count = 0
+        self.data_size = 0
+        self.blocks = []
+        self.open_offset = 0
+        self.open_min, self.open_max = TS_MAX, TS_MIN
+        self.open_count = 0
+
+    def _recover_from(self, start: int, end: int):
+        """Réindexe les entrées présentes entre deux offsets du fichier de données"""
+        with open(self.data_path, "rb") as f:
+            f.seek(start)
+            position = start
+            for line in f:
+                if position + len(line) > end or not line.endswith(b"\n"):
+                    break
+                try:
+                    timestamp = to_micros(datetime.fromisoformat(json.loads(line)["timestamp"]))
+                except (ValueError, KeyError, TypeError):
+                    timestamp = self.max_ts if self.max_ts != TS_MIN else 0
+                self._account(timestamp, len(line))
+                position += len(line)
+
+        if position < end:
+            # Ligne partielle en fin de fichier: on la retire
+            with open(self.data_path, "r+b") as f:
+                f.truncate(position)
+
+    def _header_bytes(self) -> bytes:
+        """Sérialise l'en-tête du segment"""
+        return HEADER_STRUCT.pack(
+            SEGMENT_MAGIC, SEGMENT_VERSION, 0, self.min_ts, self.max_ts,
+            self.record_count, self.data_size, self.open_offset,
+            self.open_min, self.open_max, self.open_count
+        )
+
+    def _write_index(self, new_blocks: Iterable[BlockIndexEntry] = (), rewrite: bool = False):
+        """Écrit l'en-tête et ajoute les nouveaux blocs fermés à l'index"""
+        if rewrite or not self.index_path.exists():
+            with open(self.index_path, "wb") as f:
+                f.write(self._header_bytes())
+                for block in self.blocks:
+                    f.write(BLOCK_STRUCT.pack(block.offset, block.length, block.min_ts, block.max_ts, block.count))
+            return
+
+        with open(self.index_path, "r+b") as f:
+            f.write(self._header_bytes())
+            f.seek(0, os.SEEK_END)
+            for block in new_blocks:
+                f.write(BLOCK_STRUCT.pack(block.offset, block.length, block.min_ts, block.max_ts, block.count))
+
+    # Écriture
+
+    def _account(self, timestamp: int, size: int) -> Optional[BlockIndexEntry]:
+        """Met à jour les statistiques après l'ajout d'une entrée"""
+        self.min_ts = min(self.min_ts, timestamp)
+        self.max_ts = max(self.max_ts, timestamp)
+        self.open_min = min(self.open_min, timestamp)
+        self.open_max = max(self.open_max, timestamp)
+        self.record_count += 1
+        self.open_count += 1
+        self.data_size += size
+
+        if self.data_size - self.open_offset >= self.block_size:
+            return self._close_block()
+        return None
+
+    def _close_block(self) -> Optional[BlockIndexEntry]:
+        """Ferme le bloc en cours et l'ajoute à l'index"""
+        if self.open_count == 0:
+            return None
+        block = BlockIndexEntry(
+            self.open_offset, self.data_size - self.open_offset,
+            self.open_min, self.open_max, self.open_count
+        )
+        self.blocks.append(block)
+        self.open_offset = self.data_size
+        self.open_min, self.open_max = TS_MAX, TS_MIN
+        self.open_count = 0
+        return block
+
+    def append(self, records: List[Tuple[int, bytes]]):
+        """Ajoute des entrées (timestamp en µs, ligne JSON terminée par \\n)"""
+        if not records:
+            return
+        with self._lock:
+            with open(self.data_path, "ab") as f:
+                f.write(b"".join(line for _, line in records))
+
+            new_blocks = []
+            for timestamp, line in records:
+                block = self._account(timestamp, len(line))
+                if block:
+                    new_blocks.append(block)
+            self._write_index(new_blocks)
+
+    def seal(self):
+        """Ferme le dernier bloc (segment plein)"""
+        with self._lock:
+            block = self._close_block()
+            self._write_index([block] if block else [])
+
+    # Lecture
+
+    def snapshot_blocks(self) -> List[BlockIndexEntry]:
+        """Retourne les blocs du segment, y compris le bloc ouvert"""
+        with self._lock:
+            blocks = list(self.blocks)
+            if self.open_count:
+                blocks.append(BlockIndexEntry(
+                    self.open_offset, self.data_size - self.open_offset,
+                    self.open_min, self.open_max, self.open_count
+                ))
+        return blocks
+
+    def overlaps(self, start_ts: int, end_ts: int) -> bool:
+        """Indique si le segment peut contenir des entrées dans l'intervalle"""
+        return self.record_count > 0 and self.max_ts >= start_ts and self.min_ts <= end_ts
+
+    def read_block(self, block: BlockIndexEntry) -> List[bytes]:
+        """Lit les lignes d'un bloc via une lecture positionnée"""
+        fd = os.open(self.data_path, os.O_RDONLY)
+        try:
+            data = os.pread(fd, block.length, block.offset)
+        finally:
+            os.close(fd)
+        return data.splitlines()
+
+    @property
+    def paths(self) -> List[Path]:
+        """Fichiers du segment"""
+        return [self.data_path, self.index_path]
+
+
+# Encodage colonnaire des blocs compactés
+
+def _pack_array(values: array) -> bytes:
+    """Sérialise un tableau en petit-boutiste"""
+    if sys.byteorder == 'big':
+        values = array(values.typecode, values)
+        values.byteswap()
+    return values.tobytes()
+
+
+def _unpack_array(typecode: str, data: bytes) -> array:
+    """Désérialise un tableau petit-boutiste"""
+    values = array(typecode)
+    values.frombytes(data)
+    if sys.byteorder == 'big':
+        values.byteswap()
+    return values
+
+
+def _encode_strings(values: List[Optional[str]]) -> bytes:
+    """Colonne de chaînes: longueurs (uint32, nul = 0xFFFFFFFF) puis données UTF-8"""
+    lengths = array('I')
+    chunks = []
+    for value in values:
+        if value is None:
+            lengths.append(_NULL_LENGTH)
+            continue
+        encoded = value.encode('utf-8')
+        lengths.append(len(encoded))
+        chunks.append(encoded)
+    return _pack_array(lengths) + b"".join(chunks)
+
+
+def _decode_strings(data: bytes, count: int) -> List[Optional[str]]:
+    """Décode une colonne de chaînes"""
+    lengths = _unpack_array('I', data[:count * 4])
+    values: List[Optional[str]] = []
+    position = count * 4
+    for length in lengths:
+        if length == _NULL_LENGTH:
+            values.append(None)
+            continue
+        values.append(data[position:position + length].decode('utf-8'))
+        position += length
+    return values
+
+
+def _encode_dictionary(values: List[Optional[str]]) -> bytes:
+    """Colonne à faible cardinalité: dictionnaire des valeurs puis indices"""
+    dictionary: Dict[Optional[str], int] = {}
+    indices = array('I', (dictionary.setdefault(value, len(dictionary)) for value in values))
+    encoded_dictionary = _encode_strings(list(dictionary))
+    return struct.pack("<II", len(dictionary), len(encoded_dictionary)) + encoded_dictionary + _pack_array(indices)
+
+
+def _decode_dictionary(data: bytes, count: int) -> List[Optional[str]]:
+    """Décode une colonne dictionnaire"""
+    size, dictionary_length = struct.unpack_from("<II", data, 0)
+    dictionary = _decode_strings(data[8:8 + dictionary_length], size)
+    indices = _unpack_array('I', data[8 + dictionary_length:8 + dictionary_length + count * 4])
+    return [dictionary[index] for index in indices]
+
+
+def encode_columnar_block(records: List[Dict], first_row: int) -> bytes:
+    """
+    Encode des entrées consécutives en bloc colonnaire compressé
+
+    Colonnes: timestamps (int64 µs), niveau, conteneur, nom, service
+    (dictionnaires), message et métadonnées JSON (chaînes).
+    """
+    timestamps = array('q', (to_micros(datetime.fromisoformat(record['timestamp'])) for record in records))
+    columns = [
+        _pack_array(timestamps),
+        _encode_dictionary([record.get('level') for record in records]),
+        _encode_dictionary([record.get('container_id') for record in records]),
+        _encode_dictionary([record.get('container_name') for record in records]),
+        _encode_dictionary([record.get('service_name') for record in records]),
+        _encode_strings([record.get('message') for record in records]),
+        _encode_strings([
+            json.dumps(record['metadata'], ensure_ascii=False) if record.get('metadata') else None
+            for record in records
+        ]),
+    ]
+    body = b"".join(struct.pack("<I", len(column)) + column for column in columns)
+
+    if ZSTD_AVAILABLE:
+        codec, compressed = CODEC_ZSTD, zstandard.ZstdCompressor(level=3).compress(body)
+    else:
+        codec, compressed = CODEC_ZLIB, zlib.compress(body, 6)
+    return COMPACTED_PAYLOAD_STRUCT.pack(codec, first_row, len(records)) + compressed
+
+
+def decode_columnar_block(data: bytes) -> Tuple[int, List[Dict]]:
+    """
+    Décode un bloc colonnaire
+
+    Returns:
+        (première ligne, entrées au format LogEntry.to_dict)
+    """
+    codec, first_row, count = COMPACTED_PAYLOAD_STRUCT.unpack_from(data, 0)
+    compressed = data[COMPACTED_PAYLOAD_STRUCT.size:]
+    if codec == CODEC_ZSTD:
+        if not ZSTD_AVAILABLE:
+            raise ValueError("Bloc compressé en zstd mais zstandard n'est pas installé")
+        body = zstandard.ZstdDecompressor().decompress(compressed)
+    else:
+        body = zlib.decompress(compressed)
+
+    columns = []
+    position = 0
+    while position < len(body):
+        (length,) = struct.unpack_from("<I", body, position)
+        columns.append(body[position + 4:position + 4 + length])
+        position += 4 + length
+
+    timestamps = _unpack_array('q', columns[0])
+    levels = _decode_dictionary(columns[1], count)
+    container_ids = _decode_dictionary(columns[2], count)
+    container_names = _decode_dictionary(columns[3], count)
+    service_names = _decode_dictionary(columns[4], count)
+    messages = _decode_strings(columns[5], count)
+    metadata = _decode_strings(columns[6], count)
+
+    records = [
+        {
+            'timestamp': from_micros(timestamps[i]).isoformat(),
+            'level': levels[i],
+            'container_id': container_ids[i],
+            'container_name': container_names[i],
+            'service_name': service_names[i],
+            'message': messages[i],
+            'metadata': json.loads(metadata[i]) if metadata[i] else {}
+        }
+        for i in range(count)
+    ]
+    return first_row, records
+
+
+def read_compacted_rows(file_path: Union[str, Path],
+                        pointers: Iterable[Tuple[int, int, int]]) -> Dict[int, Dict]:
+    """
+    Lit des lignes d'un segment compacté à partir de pointeurs (ligne, offset, longueur)
+
+    Chaque bloc référencé n'est lu et décompressé qu'une fois.
+    """
+    by_block: Dict[Tuple[int, int], List[int]] = {}
+    for line_number, offset, length in pointers:
+        by_block.setdefault((offset, length), []).append(line_number)
+
+    rows = {}
+    fd = os.open(file_path, os.O_RDONLY)
+    try:
+        for (offset, length), line_numbers in sorted(by_block.items()):
+            first_row, records = decode_columnar_block(os.pread(fd, length, offset))
+            for line_number in line_numbers:
+                index = line_number - first_row
+                if 0 <= index < len(records):
+                    rows[line_number] = records[index]
+    finally:
+        os.close(fd)
+    return rows
+
+
+class CompactedSegment:
+    """Segment fermé compacté: blocs colonnaires compressés, en lecture seule"""
+
+    compacted = True
+
+    def __init__(self, directory: Path, segment_id: int):
+        self.directory = directory
+        self.segment_id = segment_id
+        self.data_path = directory / f"{segment_id:012d}{COMPACTED_SUFFIX}"
+
+        self.min_ts = TS_MAX
+        self.max_ts = TS_MIN
+        self.record_count = 0
+        self.data_size = 0
+        self.blocks: List[CompactedBlockEntry] = []
+
+    @property
+    def paths(self) -> List[Path]:
+        """Fichiers du segment"""
+        return [self.data_path]
+
+    def load(self):
+        """Charge l'index des blocs depuis le pied de fichier"""
+        with open(self.data_path, "rb") as f:
+            f.seek(0, os.SEEK_END)
+            self.data_size = f.tell()
+            if self.data_size < COMPACTED_FOOTER_STRUCT.size:
+                raise ValueError(f"Segment compacté tronqué: {self.data_path}")
+            f.seek(self.data_size - COMPACTED_FOOTER_STRUCT.size)
+            (magic, version, _, self.min_ts, self.max_ts, self.record_count,
+             block_count, index_offset) = COMPACTED_FOOTER_STRUCT.unpack(f.read(COMPACTED_FOOTER_STRUCT.size))
+            if magic != COMPACTED_MAGIC or version != COMPACTED_VERSION:
+                raise ValueError(f"Segment compacté invalide: {self.data_path}")
+            f.seek(index_offset)
+            raw = f.read(block_count * COMPACTED_BLOCK_STRUCT.size)
+
+        self.blocks = [
+            CompactedBlockEntry(*COMPACTED_BLOCK_STRUCT.unpack_from(raw, pos))
+            for pos in range(0, len(raw), COMPACTED_BLOCK_STRUCT.size)
+        ]
+
+    @classmethod
+    def write(cls, segment: LogSegment, block_rows: int = 4096) -> 'CompactedSegment':
+        """
+        Compacte un segment JSONL fermé
+
+        Les numéros de ligne du fichier source sont conservés (une ligne
+        invalide termine le bloc courant), ce qui permet de réécrire les
+        pointeurs de l'index de recherche bloc par bloc. Le fichier est écrit
+        sous un nom temporaire puis renommé: sa présence garantit qu'il est complet.
+        """
+        compacted = cls(segment.directory, segment.segment_id)
+        temp_path = compacted.data_path.with_suffix(COMPACTED_SUFFIX + ".tmp")
+
+        with open(segment.data_path, "rb") as source, open(temp_path, "wb") as target:
+            records: List[Dict] = []
+            first_row = 1
+
+            def flush_block():
+                if not records:
+                    return
+                payload = encode_columnar_block(records, first_row)
+                timestamps = [to_micros(datetime.fromisoformat(record['timestamp'])) for record in records]
+                block = CompactedBlockEntry(
+                    target.tell(), len(payload), min(timestamps), max(timestamps), len(records), first_row
+                )
+                target.write(payload)
+                compacted.blocks.append(block)
+                compacted.min_ts = min(compacted.min_ts, block.min_ts)
+                compacted.max_ts = max(compacted.max_ts, block.max_ts)
+                compacted.record_count += block.count
+
+            for line_number, line in enumerate(source, 1):
+                try:
+                    record = json.loads(line)
+                    datetime.fromisoformat(record['timestamp'])
+                except (ValueError, KeyError, TypeError):
+                    # Ligne invalide: les blocs restent des plages de lignes contiguës
+                    flush_block()
+                    records = []
+                    first_row = line_number + 1
+                    continue
+
+                records.append(record)
+                if len(records) >= block_rows:
+                    flush_block()
+                    records = []
+                    first_row = line_number + 1
+            flush_block()
+
+            index_offset = target.tell()
+            for block in compacted.blocks:
+                target.write(COMPACTED_BLOCK_STRUCT.pack(
+                    block.offset, block.length, block.min_ts, block.max_ts, block.count, block.first_row
+                ))
+            target.write(COMPACTED_FOOTER_STRUCT.pack(
+                COMPACTED_MAGIC, COMPACTED_VERSION, 0, compacted.min_ts, compacted.max_ts,
+                compacted.record_count, len(compacted.blocks), index_offset
+            ))
+            target.flush()
+            os.fsync(target.fileno())
+            compacted.data_size = target.tell()
+
+        os.replace(temp_path, compacted.data_path)
+        return compacted
+
+    def snapshot_blocks(self) -> List[CompactedBlockEntry]:
+        """Retourne les blocs du segment"""
+        return list(self.blocks)
+
+    def overlaps(self, start_ts: int, end_ts: int) -> bool:
+        """Indique si le segment peut contenir des entrées dans l'intervalle"""
+        return self.record_count > 0 and self.max_ts >= start_ts and self.min_ts <= end_ts
+
+    def read_records(self, block: CompactedBlockEntry) -> List[Dict]:
+        """Lit et décode les entrées d'un bloc"""
+        fd = os.open(self.data_path, os.O_RDONLY)
+        try:
+            data = os.pread(fd, block.length, block.offset)
+        finally:
+            os.close(fd)
+        return decode_columnar_block(data)[1]
+
+    def iter_rows(self) -> Iterator[Tuple[int, CompactedBlockEntry, Dict]]:
+        """Parcourt les entrées avec leur numéro de ligne et leur bloc"""
+        for block in self.blocks:
+            for index, record in enumerate(self.read_records(block)):
+                yield block.first_row + index, block, record
+
+
+AnySegment = Union[LogSegment, CompactedSegment]
+
+
+class SegmentedLogStore:
+    """Stockage des logs par conteneur en segments indexés"""
+
+    def __init__(self, root_path: Path, segment_size: int = 16 * 1024 * 1024,
+                 block_size: int = 32 * 1024, partition_seconds: int = 3600):
+        self.root_path = Path(root_path)
+        self.segment_size = segment_size
+        self.block_size = block_size
+        # Un segment ne couvre qu'une partition (horaire par défaut)
+        self.partition_micros = partition_seconds * 1_000_000
+
+        self._segments: Dict[str, List[AnySegment]] = {}
+        self._lock = threading.Lock()
+
+    def container_path(self, container_id: str) -> Path:
+        """Répertoire des segments d'un conteneur"""
+        return self.root_path / container_id
+
+    def list_containers(self) -> List[str]:
+        """Liste les conteneurs disposant de segments"""
+        if not self.root_path.exists():
+            return []
+        return sorted(
+            path.name for path in self.root_path.iterdir()
+            if path.is_dir() and (any(path.glob("*.idx")) or any(path.glob(f"*{COMPACTED_SUFFIX}")))
+        )
+
+    def partition_of(self, timestamp: int) -> int:
+        """Numéro de partition d'un timestamp (µs)"""
+        return timestamp // self.partition_micros
+
+    def segments(self, container_id: str) -> List[AnySegment]:
+        """Segments d'un conteneur, du plus ancien au plus récent"""
+        with self._lock:
+            segments = self._segments.get(container_id)
+            if segments is None:
+                segments = self._load_segments(container_id)
+                self._segments[container_id] = segments
+            return list(segments)
+
+    def _load_segments(self, container_id: str) -> List[AnySegment]:
+        """Charge les segments existants d'un conteneur"""
+        directory = self.container_path(container_id)
+        if not directory.exists():
+            return []
+
+        segments: Dict[int, AnySegment] = {}
+        for data_path in directory.glob(f"*{COMPACTED_SUFFIX}"):
+            try:
+                segment = CompactedSegment(directory, int(data_path.stem))
+                segment.load()
+                segments[segment.segment_id] = segment
+            except ValueError as e:
+                logger.error(f"Segment compacté ignoré {data_path}: {e}")
+
+        for data_path in directory.glob("*.jsonl"):
+            try:
+                segment_id = int(data_path.stem)
+                if segment_id in segments:
+                    # Compaction interrompue après l'écriture complète du segment compacté
+                    for path in (data_path, data_path.with_suffix(".idx")):
+                        if path.exists():
+                            path.unlink()
+                    continue
+                segment = LogSegment(directory, segment_id, self.block_size)
+                segment.load()
+                segments[segment_id] = segment
+            except ValueError as e:
+                logger.error(f"Segment ignoré {data_path}: {e}")
+
+        for temp_path in directory.glob(f"*{COMPACTED_SUFFIX}.tmp"):
+            temp_path.unlink()
+
+        return [segments[segment_id] for segment_id in sorted(segments)]
+
+    def _active_segment(self, container_id: str, timestamp: int) -> LogSegment:
+        """
+        Retourne le segment en cours d'écriture, en créant un nouveau si le
+        segment courant est plein, compacté ou si timestamp ouvre une nouvelle partition
+        """
+        segments = self.segments(container_id)
+        with self._lock:
+            segments = self._segments[container_id]
+            if segments:
+                current = segments[-1]
+                if (not current.compacted and current.data_size < self.segment_size
+                        and (current.record_count == 0
+                             or self.partition_of(timestamp) <= self.partition_of(current.max_ts))):
+                    return current
+
+            if segments and not segments[-1].compacted:
+                segments[-1].seal()
+            directory = self.container_path(container_id)
+            directory.mkdir(parents=True, exist_ok=True)
+            next_id = segments[-1].segment_id + 1 if segments else 0
+            segment = LogSegment(directory, next_id, self.block_size)
+            segments.append(segment)
+            return segment
+
+    def append(self, container_id: str, records: List[Tuple[int, bytes]]):
+        """Ajoute des entrées sérialisées au segment actif du conteneur"""
+        while records:
+            segment = self._active_segment(container_id, records[0][0])
+            # Remplit le segment jusqu'à sa taille cible ou la fin de sa partition
+            # (les entrées en retard restent dans la partition courante)
+            room = self.segment_size - segment.data_size
+            partition = max(
+                self.partition_of(records[0][0]),
+                self.partition_of(segment.max_ts) if segment.record_count else TS_MIN
+            )
+            chunk, size = [], 0
+            for record in records:
+                if chunk and (size + len(record[1]) > room or self.partition_of(record[0]) > partition):
+                    break
+                chunk.append(record)
+                size += len(record[1])
+            segment.append(chunk)
+            records = records[len(chunk):]
+
+    def iter_blocks_reverse(self, container_id: str, start_ts: int = TS_MIN,
+                            end_ts: int = TS_MAX) -> Iterator[Tuple[AnySegment, BlockIndexEntry]]:
+        """Parcourt les blocs pertinents du plus récent au plus ancien"""
+        segments = [s for s in self.segments(container_id) if s.overlaps(start_ts, end_ts)]
+        segments.sort(key=lambda s: (s.max_ts, s.segment_id), reverse=True)
+        for segment in segments:
+            for block in reversed(segment.snapshot_blocks()):
+                if block.overlaps(start_ts, end_ts):
+                    yield segment, block
+
+    def drop_segment(self, container_id: str, segment: AnySegment):
+        """Supprime un segment (rétention)"""
+        with self._lock:
+            segments = self._segments.get(container_id, [])
+            if segment in segments:
+                segments.remove(segment)
+        for path in segment.paths:
+            if path.exists():
+                path.unlink()
+
+    def compact_segment(self, segment: LogSegment, block_rows: int = 4096) -> CompactedSegment:
+        """Écrit la version compactée d'un segment fermé (sans l'activer)"""
+        if segment.compacted:
+            raise ValueError(f"Segment déjà compacté: {segment.data_path}")
+        return CompactedSegment.write(segment, block_rows)
+
+    def replace_segment(self, container_id: str, segment: LogSegment, compacted: CompactedSegment):
+        """Remplace un segment par sa version compactée puis supprime ses fichiers"""
+        with self._lock:
+            segments = self._segments.get(container_id, [])
+            if segment in segments:
+                segments[segments.index(segment)] = compacted
+        for path in segment.paths:
+            if path.exists():
+                path.unlink()
+
+    def container_size(self, container_id: str) -> int:
+        """Taille totale des données d'un conteneur"""
+        return sum(segment.data_size for segment in self.segments(container_id))
+
+    def get_stats(self) -> Dict:
+        """Statistiques du stockage"""
+        containers = self.list_containers()
+        segments = [segment for container_id in containers for segment in self.segments(container_id)]
+        return {
+            'containers': len(containers),
+            'segments': len(segments),
+            'compacted_segments': sum(1 for segment in segments if segment.compacted),
+            'records': sum(segment.record_count for segment in segments),
+            'data_bytes': sum(segment.data_size for segment in segments)
+        }
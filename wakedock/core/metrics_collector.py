@@ -4,15 +4,39 @@ Collecteur de métriques pour le monitoring temps réel des conteneurs Docker
 import asyncio
 import json
 import logging
-from dataclasses import asdict, dataclass
+import threading
+import time
+from bisect import bisect_left
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import asdict, dataclass, fields
 from datetime import datetime, timedelta
 from enum import Enum
 from pathlib import Path
-from typing import Dict, List, Optional
+from typing import Any, Callable, Dict, List, Optional, Tuple
 
 import aiofiles
+import numpy as np
+from docker.errors import NotFound
 
+from wakedock.core.cgroup_reader import CgroupReader
+from wakedock.core.container_registry import (
+    ContainerInfo,
+    ContainerListener,
+    ContainerRegistry,
+    get_container_registry,
+)
 from wakedock.core.docker_manager import DockerManager
+from wakedock.core.log_classifier import parse_rfc3339
+from wakedock.core.log_storage import from_micros, to_micros
+from wakedock.core.metrics_query import (
+    aggregate_series,
+    AggregatedSeries,
+    counter_deltas,
+    counter_rates,
+    GROUP_BY,
+)
+from wakedock.core.metrics_rollup import MetricsRollup
+from wakedock.core.metrics_tsdb import FLOAT_FIELD, INT_FIELD, MetricsTSDB, SeriesData
 
 logger = logging.getLogger(__name__)
 
@@ -66,6 +90,19 @@ class ContainerMetrics:
     # Autres métriques
     pids: int
     
+    # Débits par seconde des compteurs ci-dessus, calculés à l'ingestion
+    network_rx_rate: float = 0.0
+    network_tx_rate: float = 0.0
+    block_read_rate: float = 0.0
+    block_write_rate: float = 0.0
+    
+    # Accroissements des mêmes compteurs depuis la mesure précédente: leur
+    # somme sur une période donne les octets échangés, mesures manquées comprises
+    network_rx_delta: int = 0
+    network_tx_delta: int = 0
+    block_read_delta: int = 0
+    block_write_delta: int = 0
+    
     def to_dict(self) -> Dict:
         """Convertit en dictionnaire pour sérialisation"""
         return {
@@ -79,6 +116,25 @@ class ContainerMetrics:
         data['timestamp'] = datetime.fromisoformat(data['timestamp'])
         return cls(**data)
 
+# Compteurs cumulatifs -> champ de débit par seconde
+RATE_FIELDS: Dict[str, str] = {
+    'network_rx_bytes': 'network_rx_rate',
+    'network_tx_bytes': 'network_tx_rate',
+    'block_read_bytes': 'block_read_rate',
+    'block_write_bytes': 'block_write_rate'
+}
+
+# Compteurs cumulatifs -> champ d'accroissement depuis la mesure précédente
+DELTA_FIELDS: Dict[str, str] = {
+    counter: counter.replace('_bytes', '_delta') for counter in RATE_FIELDS
+}
+
+# Champs numériques stockés en colonnes dans la base de séries temporelles
+METRIC_FIELDS: Dict[str, str] = {
+    f.name: FLOAT_FIELD if f.type is float else INT_FIELD
+    for f in fields(ContainerMetrics) if f.type in (int, float)
+}
+
 @dataclass
 class Alert:
     """Alerte de monitoring"""
@@ -109,22 +165,171 @@ class ThresholdConfig:
     critical_threshold: float
     enabled: bool = True
 
-class MetricsCollector:
+class DurationHistogram:
+    """Histogramme cumulatif de durées (secondes), bornes à la Prometheus"""
+    
+    DEFAULT_BUCKETS = (0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+    
+    def __init__(self, buckets: Tuple[float, ...] = DEFAULT_BUCKETS):
+        self.buckets = tuple(sorted(buckets))
+        self.counts = [0] * (len(self.buckets) + 1)  # dernier compteur: +Inf
+        self.count = 0
+        self.sum = 0.0
+        self.max = 0.0
+        self.last = 0.0
+    
+    def observe(self, value: float):
+        """Enregistre une durée"""
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.count += 1
+        self.sum += value
+        self.max = max(self.max, value)
+        self.last = value
+    
+    def quantile(self, q: float) -> float:
+        """Estimation d'un quantile (borne supérieure du bucket qui le contient)"""
+        if not self.count:
+            return 0.0
+        rank = q * self.count
+        cumulative = 0
+        for bound, count in zip(self.buckets, self.counts):
+            cumulative += count
+            if cumulative >= rank:
+                return bound
+        return self.max
+    
+    def to_dict(self) -> Dict:
+        cumulative = 0
+        buckets = {}
+        for bound, count in zip(self.buckets, self.counts):
+            cumulative += count
+            buckets[str(bound)] = cumulative
+        buckets['+Inf'] = self.count
+        return {
+            'count': self.count,
+            'sum': round(self.sum, 6),
+            'avg': self.sum / self.count if self.count else 0.0,
+            'max': self.max,
+            'last': self.last,
+            'p50': self.quantile(0.5),
+            'p95': self.quantile(0.95),
+            'buckets': buckets
+        }
+
+class StatsSubscription:
+    """
+    Abonnement long au flux de stats Docker d'un conteneur (stats stream=True)
+    
+    Un thread lit le flux (une trame par seconde environ, precpu_stats déjà
+    renseigné par le daemon) et conserve la dernière trame reçue. Le flux est
+    rouvert avec un délai croissant après une erreur; l'abonnement se termine
+    si le conteneur n'existe plus. La lecture étant bloquante, close() prend
+    effet à la trame suivante.
+    """
+    
+    def __init__(self, docker_manager: DockerManager, container_id: str,
+                 reconnect_delay: float = 1.0, max_reconnect_delay: float = 30.0):
+        self.docker_manager = docker_manager
+        self.container_id = container_id
+        self.reconnect_delay = reconnect_delay
+        self.max_reconnect_delay = max_reconnect_delay
+        
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._frame: Optional[Dict] = None
+        self._frame_time = 0.0  # horloge monotone
+        
+        self.frames = 0
+        self.reconnects = 0
+        self.last_error: Optional[str] = None
+        self.ended = False  # conteneur disparu
+    
+    def start(self):
+        """Démarre la lecture du flux"""
+        if self._thread is not None:
+            return
+        self._thread = threading.Thread(
+            target=self._run,
+            name=f"wakedock-stats-{self.container_id[:12]}",
+            daemon=True
+        )
+        self._thread.start()
+    
+    def close(self):
+        """Arrête l'abonnement"""
+        self._stop.set()
+    
+    @property
+    def closed(self) -> bool:
+        return self._stop.is_set() or self.ended
+    
+    def latest(self) -> Tuple[Optional[Dict], float, int]:
+        """Dernière trame reçue, son âge en secondes et son numéro (nombre de trames reçues)"""
+        with self._lock:
+            if self._frame is None:
+                return None, 0.0, 0
+            return self._frame, time.monotonic() - self._frame_time, self.frames
+    
+    def _run(self):
+        delay = self.reconnect_delay
+        while not self._stop.is_set():
+            try:
+                for frame in self.docker_manager.get_container_stats(self.container_id, stream=True):
+                    if self._stop.is_set():
+                        return
+                    with self._lock:
+                        self._frame = frame
+                        self._frame_time = time.monotonic()
+                        self.frames += 1
+                    delay = self.reconnect_delay
+            except NotFound:
+                self.ended = True
+                logger.debug(f"Flux de stats terminé, conteneur {self.container_id[:12]} disparu")
+                return
+            except Exception as e:
+                self.last_error = str(e)
+                logger.debug(f"Flux de stats interrompu pour {self.container_id[:12]}: {e}")
+            
+            # Flux terminé ou en erreur: reconnexion après un délai croissant
+            if self._stop.wait(delay):
+                return
+            self.reconnects += 1
+            delay = min(delay * 2, self.max_reconnect_delay)
+
+class MetricsCollector(ContainerListener):
     """Collecteur de métriques pour les conteneurs Docker"""
     
-    def __init__(self, docker_manager: DockerManager, storage_path: str = "/var/log/wakedock/metrics"):
+    def __init__(self, docker_manager: DockerManager, storage_path: str = "/var/log/wakedock/metrics",
+                 registry: Optional[ContainerRegistry] = None):
         self.docker_manager = docker_manager
+        # Conteneurs suivis par les événements Docker (registre partagé avec le collecteur de logs)
+        self.registry = registry or get_container_registry(docker_manager)
         self.storage_path = Path(storage_path)
         self.storage_path.mkdir(parents=True, exist_ok=True)
+        # Séries par conteneur en chunks colonnaires (les alertes restent en JSONL)
+        self.tsdb = MetricsTSDB(self.storage_path / "tsdb", METRIC_FIELDS)
+        # Agrégats 1m/5m/1h conservés au-delà de retention_days
+        self.rollup = MetricsRollup(self.storage_path / "rollups", METRIC_FIELDS)
         
         # Configuration
         self.collection_interval = 5  # secondes
         self.retention_days = 7  # jours
         self.max_file_size = 50 * 1024 * 1024  # 50MB
+        self.max_concurrent_collections = 16  # Requêtes de stats Docker simultanées
+        self.collection_timeout = 10.0  # secondes par conteneur
+        # Un flux de stats par conteneur plutôt qu'une requête par cycle
+        # (évite l'échantillonnage d'une seconde du daemon à chaque requête)
+        self.use_stats_stream = True
+        self.max_frame_age = 10.0  # secondes, au-delà le flux est considéré bloqué
+        # Lecture directe des cgroups v2 sans passer par le daemon (repli sur l'API Docker)
+        self.use_cgroup_reader = True
+        self.cgroup_reader = CgroupReader()
         
         # État du collecteur
         self.is_running = False
         self.monitored_containers: Dict[str, str] = {}  # id -> name
+        self.service_names: Dict[str, Optional[str]] = {}  # id -> service compose
         self.collection_task: Optional[asyncio.Task] = None
         self.cleanup_task: Optional[asyncio.Task] = None
         
@@ -155,8 +360,28 @@ class MetricsCollector:
         # Callbacks pour les alertes
         self.alert_callbacks: List[callable] = []
         
-        # Cache pour les calculs de dérivées
+        # Dernière mesure de chaque conteneur, pour le calcul des débits
         self.previous_metrics: Dict[str, ContainerMetrics] = {}
+        
+        # Appels Docker bloquants: pool dédié, borné par max_concurrent_collections
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._in_flight: Dict[str, asyncio.Future] = {}
+        self.subscriptions: Dict[str, StatsSubscription] = {}
+        self._sampled_frames: Dict[str, int] = {}  # id -> numéro de la dernière trame échantillonnée
+        
+        # Durée des cycles de collecte et compteurs
+        self.cycle_histogram = DurationHistogram()
+        self.collection_stats = {
+            'cycles': 0,
+            'overruns': 0,  # cycles plus longs que collection_interval
+            'timeouts': 0,
+            'errors': 0,
+            'skipped_in_flight': 0,
+            'stale_frames': 0,
+            'repeated_frames': 0,
+            'counter_resets': 0,
+            'cgroup_fallbacks': 0
+        }
     
     async def start(self):
         """Démarre la collecte de métriques"""
@@ -166,8 +391,13 @@ class MetricsCollector:
         logger.info("Démarrage du collecteur de métriques")
         self.is_running = True
         
-        # Découvre les conteneurs en cours d'exécution
-        await self._discover_containers()
+        # Index des chunks, import des anciens fichiers et rattrapage des agrégats
+        await asyncio.get_running_loop().run_in_executor(None, self._open_storage)
+        
+        # Suit les conteneurs via le registre (événements Docker)
+        await self.registry.subscribe(self)
+        for container in self.registry.running():
+            self._watch_container(container)
         
         # Démarre les tâches de fond
         self.collection_task = asyncio.create_task(self._collection_worker())
@@ -186,146 +416,358 @@ class MetricsCollector:
             self.collection_task.cancel()
         if self.cleanup_task:
             self.cleanup_task.cancel()
+        await self.registry.unsubscribe(self)
+        
+        # Ferme les flux de stats
+        for subscription in self.subscriptions.values():
+            subscription.close()
+        self.subscriptions.clear()
+        
+        # Écrit les blocs de tête en mémoire (les intervalles en cours seront recalculés au démarrage)
+        try:
+            self.rollup.close_expired(to_micros(datetime.utcnow()))
+            await asyncio.get_running_loop().run_in_executor(None, self._flush_storage, True)
+        except Exception as e:
+            logger.error(f"Erreur lors de l'écriture des métriques en mémoire: {e}")
+        
+        # Les requêtes Docker en cours se terminent dans leurs threads
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
         
         # Nettoie l'état
         self.monitored_containers.clear()
+        self.service_names.clear()
         self.previous_metrics.clear()
+        self._in_flight.clear()
+    
+    async def _run_blocking(self, func: Callable, *args) -> Any:
+        """Exécute un appel Docker bloquant dans le pool du collecteur"""
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(
+                max_workers=self.max_concurrent_collections,
+                thread_name_prefix="wakedock-metrics"
+            )
+        return await asyncio.get_running_loop().run_in_executor(self._executor, func, *args)
     
     async def _discover_containers(self):
-        """Découvre les conteneurs en cours d'exécution"""
+        """Resynchronise les conteneurs surveillés avec le daemon (repli sans flux d'événements)"""
         try:
-            containers = self.docker_manager.list_containers(all=False)
-            for container in containers:
-                info = self.docker_manager.get_container_info(container.id)
-                if info:
-                    name = info.get('name', container.id[:12])
-                    self.monitored_containers[container.id] = name
-                    logger.debug(f"Conteneur ajouté au monitoring: {name}")
+            await self.registry.sync()
+            running = {container.id: container for container in self.registry.running()}
+            
+            for container_id in list(self.monitored_containers):
+                if container_id not in running:
+                    self._forget_container(container_id)
+            
+            for container in running.values():
+                self._watch_container(container)
         except Exception as e:
             logger.error(f"Erreur lors de la découverte des conteneurs: {e}")
     
+    def _watch_container(self, container: ContainerInfo):
+        """Ajoute un conteneur au monitoring"""
+        if container.id in self.monitored_containers:
+            return
+        self.monitored_containers[container.id] = container.name
+        self.service_names[container.id] = container.service_name
+        # Cgroup lisible: compteurs lus directement, sans flux de stats Docker
+        cgroup = self.use_cgroup_reader and self.cgroup_reader.resolve(container.id, container.pid, container.cgroup_parent)
+        if self.use_stats_stream and not cgroup:
+            self._subscription(container.id)
+        logger.debug(f"Conteneur ajouté au monitoring: {container.name}")
+    
+    async def on_container_started(self, container: ContainerInfo):
+        self._watch_container(container)
+    
+    async def on_container_stopped(self, container: ContainerInfo):
+        self._forget_container(container.id)
+    
+    async def on_container_updated(self, container: ContainerInfo):
+        if container.id in self.monitored_containers:
+            self.monitored_containers[container.id] = container.name
+    
+    def _forget_container(self, container_id: str):
+        """Retire un conteneur du monitoring"""
+        self.monitored_containers.pop(container_id, None)
+        self.service_names.pop(container_id, None)
+        self.previous_metrics.pop(container_id, None)
+        self.cgroup_reader.forget(container_id)
+        self._sampled_frames.pop(container_id, None)
+        subscription = self.subscriptions.pop(container_id, None)
+        if subscription is not None:
+            subscription.close()
+    
+    def _subscription(self, container_id: str) -> StatsSubscription:
+        """Flux de stats d'un conteneur, ouvert à la première demande"""
+        subscription = self.subscriptions.get(container_id)
+        if subscription is None:
+            subscription = StatsSubscription(self.docker_manager, container_id)
+            self.subscriptions[container_id] = subscription
+            subscription.start()
+        return subscription
+    
     async def _collection_worker(self):
-        """Worker principal de collecte de métriques"""
+        """
+        Worker principal de collecte de métriques
+        
+        Chaque cycle lit les compteurs cgroup v2 des conteneurs dont le
+        cgroup est accessible, puis échantillonne la dernière trame du flux
+        de stats des autres; sans flux (use_stats_stream désactivé), les
+        conteneurs sont interrogés en parallèle (au plus
+        max_concurrent_collections requêtes Docker simultanées, chacune
+        limitée à collection_timeout). Les cycles sont planifiés sur une
+        horloge monotone pour respecter collection_interval.
+        """
+        next_cycle = time.monotonic()
         while self.is_running:
             try:
-                start_time = datetime.utcnow()
+                started = time.monotonic()
+                
+                # Sans flux d'événements, la liste des conteneurs est scrutée à chaque cycle
+                if not self.registry.watching:
+                    await self._discover_containers()
                 
-                # Met à jour la liste des conteneurs
-                await self._discover_containers()
+                # Collecte les métriques de tous les conteneurs en parallèle
+                await self._collect_cycle()
                 
-                # Collecte les métriques de chaque conteneur
-                for container_id, container_name in list(self.monitored_containers.items()):
-                    try:
-                        metrics = await self._collect_container_metrics(container_id, container_name)
-                        if metrics:
-                            await self._store_metrics(metrics)
-                            await self._check_thresholds(metrics)
-                    except Exception as e:
-                        logger.warning(f"Erreur lors de la collecte pour {container_name}: {e}")
-                        # Retire le conteneur s'il n'existe plus
-                        if "not found" in str(e).lower():
-                            del self.monitored_containers[container_id]
+                elapsed = time.monotonic() - started
+                self.cycle_histogram.observe(elapsed)
+                self.collection_stats['cycles'] += 1
+                if elapsed > self.collection_interval:
+                    self.collection_stats['overruns'] += 1
+                    logger.warning(
+                        f"Cycle de collecte de {elapsed:.2f}s pour {len(self.monitored_containers)} conteneurs "
+                        f"(intervalle: {self.collection_interval}s)"
+                    )
                 
-                # Calcule le temps d'attente pour maintenir l'intervalle
-                elapsed = (datetime.utcnow() - start_time).total_seconds()
-                sleep_time = max(0, self.collection_interval - elapsed)
-                await asyncio.sleep(sleep_time)
+                # Prochain cycle: intervalle suivant, sans rattraper les cycles manqués
+                next_cycle += self.collection_interval
+                now = time.monotonic()
+                if next_cycle < now:
+                    next_cycle = now
+                await asyncio.sleep(next_cycle - now)
                 
             except asyncio.CancelledError:
                 break
             except Exception as e:
                 logger.error(f"Erreur dans le worker de collecte: {e}")
                 await asyncio.sleep(self.collection_interval)
+                next_cycle = time.monotonic()
+    
+    async def _collect_cycle(self):
+        """Collecte tous les conteneurs surveillés, puis stocke et vérifie les métriques"""
+        semaphore = asyncio.Semaphore(self.max_concurrent_collections)
+        
+        async def collect(container_id: str, container_name: str) -> Optional[ContainerMetrics]:
+            async with semaphore:
+                return await self._collect_with_timeout(container_id, container_name)
+        
+        containers = list(self.monitored_containers.items())
+        results: List[Optional[ContainerMetrics]] = []
+        if self.cgroup_reader.paths:
+            # Fichiers cgroup: lecture groupée hors de la boucle, les autres conteneurs passent par Docker
+            results, containers = await self._run_blocking(self._sample_cgroups, containers)
+        if self.use_stats_stream:
+            results += [self._sample_subscription(cid, name) for cid, name in containers]
+        else:
+            results += await asyncio.gather(*(collect(cid, name) for cid, name in containers))
+        
+        collected = [metrics for metrics in results if metrics]
+        if collected:
+            await self._store_metrics_batch(collected)
+        for metrics in collected:
+            await self._check_thresholds(metrics)
+    
+    def _sample_cgroups(self, containers: List[Tuple[str, str]]) -> Tuple[List[ContainerMetrics], List[Tuple[str, str]]]:
+        """
+        Métriques des conteneurs dont le cgroup est résolu
+        
+        Renvoie les métriques lues et les conteneurs à collecter par l'API
+        Docker: cgroup non résolu, ou devenu illisible (le conteneur passe
+        alors définitivement à l'API Docker).
+        """
+        collected, remaining = [], []
+        for container_id, container_name in containers:
+            if container_id not in self.cgroup_reader.paths:
+                remaining.append((container_id, container_name))
+                continue
+            
+            stats = self.cgroup_reader.read_stats(container_id)
+            if stats is None:
+                self.cgroup_reader.forget(container_id)
+                self.collection_stats['cgroup_fallbacks'] += 1
+                logger.info(f"Cgroup de {container_name} illisible, repli sur l'API Docker")
+                remaining.append((container_id, container_name))
+                continue
+            collected.append(self._parse_stats(container_id, container_name, self.service_names.get(container_id), stats))
+        return collected, remaining
+    
+    def _sample_subscription(self, container_id: str, container_name: str) -> Optional[ContainerMetrics]:
+        """Métriques d'un conteneur à partir de la dernière trame de son flux de stats"""
+        subscription = self._subscription(container_id)
+        if subscription.ended:
+            logger.info(f"Conteneur {container_name} disparu, retiré du monitoring")
+            self._forget_container(container_id)
+            return None
+        
+        frame, age, sequence = subscription.latest()
+        if frame is None:
+            # Flux en cours d'ouverture
+            return None
+        if age > self.max_frame_age:
+            self.collection_stats['stale_frames'] += 1
+            return None
+        if self._sampled_frames.get(container_id) == sequence:
+            # Trame déjà échantillonnée au cycle précédent (flux en retard sur l'intervalle)
+            self.collection_stats['repeated_frames'] += 1
+            return None
+        self._sampled_frames[container_id] = sequence
+        
+        try:
+            return self._parse_stats(container_id, container_name, self.service_names.get(container_id), frame)
+        except Exception as e:
+            self.collection_stats['errors'] += 1
+            logger.warning(f"Trame de stats invalide pour {container_name}: {e}")
+            return None
     
-    async def _collect_container_metrics(self, container_id: str, container_name: str) -> Optional[ContainerMetrics]:
+    async def _collect_with_timeout(self, container_id: str, container_name: str) -> Optional[ContainerMetrics]:
+        """Collecte un conteneur en limitant la durée de la requête Docker"""
+        # Une requête précédente encore bloquée occupe déjà un thread: pas de nouvelle requête
+        previous = self._in_flight.get(container_id)
+        if previous is not None and not previous.done():
+            self.collection_stats['skipped_in_flight'] += 1
+            return None
+        
+        task = asyncio.ensure_future(self._collect_container_metrics(container_id, container_name, raise_errors=True))
+        self._in_flight[container_id] = task
+        try:
+            # shield: à l'expiration, la requête se termine en arrière-plan
+            return await asyncio.wait_for(asyncio.shield(task), timeout=self.collection_timeout)
+        except asyncio.TimeoutError:
+            self.collection_stats['timeouts'] += 1
+            logger.warning(f"Délai dépassé pour la collecte des métriques de {container_name}")
+            task.add_done_callback(lambda t: t.cancelled() or t.exception())
+            return None
+        except NotFound:
+            logger.info(f"Conteneur {container_name} disparu, retiré du monitoring")
+            self._forget_container(container_id)
+            return None
+        except Exception as e:
+            self.collection_stats['errors'] += 1
+            logger.warning(f"Erreur lors de la collecte pour {container_name}: {e}")
+            # Retire le conteneur s'il n'existe plus
+            if "not found" in str(e).lower():
+                self._forget_container(container_id)
+            return None
+        finally:
+            if task.done():
+                self._in_flight.pop(container_id, None)
+    
+    async def _collect_container_metrics(self, container_id: str, container_name: str,
+                                         raise_errors: bool = False) -> Optional[ContainerMetrics]:
         """Collecte les métriques d'un conteneur spécifique"""
         try:
-            # Récupère les stats Docker
-            stats = self.docker_manager.get_container_stats(container_id, stream=False)
+            # Récupère les stats Docker (hors de la boucle: le daemon échantillonne pendant ~1s)
+            stats = await self._run_blocking(self.docker_manager.get_container_stats, container_id, False)
             if not stats:
                 return None
             
-            # Récupère les infos du conteneur
-            info = self.docker_manager.get_container_info(container_id)
-            service_name = None
-            if info:
-                labels = info.get('labels', {})
-                service_name = labels.get('com.docker.compose.service')
-            
-            timestamp = datetime.utcnow()
-            
-            # Parse les métriques CPU
-            cpu_stats = stats.get('cpu_stats', {})
-            precpu_stats = stats.get('precpu_stats', {})
-            
-            cpu_usage = cpu_stats.get('cpu_usage', {}).get('total_usage', 0)
-            system_usage = cpu_stats.get('system_cpu_usage', 0)
-            
-            # Calcule le pourcentage CPU
-            cpu_percent = self._calculate_cpu_percent(cpu_stats, precpu_stats)
-            
-            # Parse les métriques mémoire
-            memory_stats = stats.get('memory_stats', {})
-            memory_usage = memory_stats.get('usage', 0)
-            memory_limit = memory_stats.get('limit', 0)
-            memory_cache = memory_stats.get('stats', {}).get('cache', 0)
-            memory_percent = (memory_usage / memory_limit * 100) if memory_limit > 0 else 0
-            
-            # Parse les métriques réseau
-            networks = stats.get('networks', {})
-            network_rx_bytes = 0
-            network_tx_bytes = 0
-            network_rx_packets = 0
-            network_tx_packets = 0
-            
-            for network_data in networks.values():
-                network_rx_bytes += network_data.get('rx_bytes', 0)
-                network_tx_bytes += network_data.get('tx_bytes', 0)
-                network_rx_packets += network_data.get('rx_packets', 0)
-                network_tx_packets += network_data.get('tx_packets', 0)
-            
-            # Parse les métriques I/O
-            blkio_stats = stats.get('blkio_stats', {})
-            io_service_bytes = blkio_stats.get('io_service_bytes_recursive', [])
-            
-            block_read_bytes = 0
-            block_write_bytes = 0
-            
-            for io_stat in io_service_bytes:
-                if io_stat.get('op') == 'read':
-                    block_read_bytes += io_stat.get('value', 0)
-                elif io_stat.get('op') == 'write':
-                    block_write_bytes += io_stat.get('value', 0)
-            
-            # Parse les PIDs
-            pids_stats = stats.get('pids_stats', {})
-            pids = pids_stats.get('current', 0)
+            # Service compose: connu depuis la découverte, sinon inspection du conteneur
+            if container_id in self.service_names:
+                service_name = self.service_names[container_id]
+            else:
+                info = await self._run_blocking(self.docker_manager.get_container_info, container_id)
+                service_name = None
+                if info:
+                    labels = info.get('labels', {})
+                    service_name = labels.get('com.docker.compose.service')
             
-            return ContainerMetrics(
-                container_id=container_id,
-                container_name=container_name,
-                service_name=service_name,
-                timestamp=timestamp,
-                cpu_percent=cpu_percent,
-                cpu_usage=cpu_usage,
-                cpu_system_usage=system_usage,
-                memory_usage=memory_usage,
-                memory_limit=memory_limit,
-                memory_percent=memory_percent,
-                memory_cache=memory_cache,
-                network_rx_bytes=network_rx_bytes,
-                network_tx_bytes=network_tx_bytes,
-                network_rx_packets=network_rx_packets,
-                network_tx_packets=network_tx_packets,
-                block_read_bytes=block_read_bytes,
-                block_write_bytes=block_write_bytes,
-                pids=pids
-            )
+            return self._parse_stats(container_id, container_name, service_name, stats)
             
         except Exception as e:
+            if raise_errors:
+                raise
             logger.error(f"Erreur lors de la collecte des métriques pour {container_name}: {e}")
             return None
     
+    def _parse_stats(self, container_id: str, container_name: str, service_name: Optional[str],
+                     stats: Dict) -> ContainerMetrics:
+        """Construit les métriques d'un conteneur à partir d'une trame de stats Docker"""
+        # Instant de lecture des compteurs par le daemon: les débits ne dépendent pas de l'instant de collecte
+        timestamp = parse_rfc3339(stats.get('read') or '')
+        if timestamp is None or timestamp.year < 2000:
+            # Trame sans horodatage (lecture des cgroups) ou valeur nulle "0001-01-01T00:00:00Z"
+            timestamp = datetime.utcnow()
+        
+        # Parse les métriques CPU
+        cpu_stats = stats.get('cpu_stats', {})
+        precpu_stats = stats.get('precpu_stats', {})
+        
+        cpu_usage = cpu_stats.get('cpu_usage', {}).get('total_usage', 0)
+        system_usage = cpu_stats.get('system_cpu_usage', 0)
+        
+        # Calcule le pourcentage CPU
+        cpu_percent = self._calculate_cpu_percent(cpu_stats, precpu_stats)
+        
+        # Parse les métriques mémoire
+        memory_stats = stats.get('memory_stats', {})
+        memory_usage = memory_stats.get('usage', 0)
+        memory_limit = memory_stats.get('limit', 0)
+        memory_cache = memory_stats.get('stats', {}).get('cache', 0)
+        memory_percent = (memory_usage / memory_limit * 100) if memory_limit > 0 else 0
+        
+        # Parse les métriques réseau
+        networks = stats.get('networks', {})
+        network_rx_bytes = 0
+        network_tx_bytes = 0
+        network_rx_packets = 0
+        network_tx_packets = 0
+        
+        for network_data in networks.values():
+            network_rx_bytes += network_data.get('rx_bytes', 0)
+            network_tx_bytes += network_data.get('tx_bytes', 0)
+            network_rx_packets += network_data.get('rx_packets', 0)
+            network_tx_packets += network_data.get('tx_packets', 0)
+        
+        # Parse les métriques I/O
+        blkio_stats = stats.get('blkio_stats', {})
+        io_service_bytes = blkio_stats.get('io_service_bytes_recursive', [])
+        
+        block_read_bytes = 0
+        block_write_bytes = 0
+        
+        for io_stat in io_service_bytes:
+            if io_stat.get('op') == 'read':
+                block_read_bytes += io_stat.get('value', 0)
+            elif io_stat.get('op') == 'write':
+                block_write_bytes += io_stat.get('value', 0)
+        
+        # Parse les PIDs
+        pids_stats = stats.get('pids_stats', {})
+        pids = pids_stats.get('current', 0)
+        
+        return ContainerMetrics(
+            container_id=container_id,
+            container_name=container_name,
+            service_name=service_name,
+            timestamp=timestamp,
+            cpu_percent=cpu_percent,
+            cpu_usage=cpu_usage,
+            cpu_system_usage=system_usage,
+            memory_usage=memory_usage,
+            memory_limit=memory_limit,
+            memory_percent=memory_percent,
+            memory_cache=memory_cache,
+            network_rx_bytes=network_rx_bytes,
+            network_tx_bytes=network_tx_bytes,
+            network_rx_packets=network_rx_packets,
+            network_tx_packets=network_tx_packets,
+            block_read_bytes=block_read_bytes,
+            block_write_bytes=block_write_bytes,
+            pids=pids
+        )
+    
     def _calculate_cpu_percent(self, cpu_stats: Dict, precpu_stats: Dict) -> float:
         """Calcule le pourcentage d'utilisation CPU"""
         try:
@@ -353,19 +795,123 @@ class MetricsCollector:
             return 0.0
     
     async def _store_metrics(self, metrics: ContainerMetrics):
-        """Stocke les métriques dans un fichier"""
+        """Stocke les métriques dans la base de séries temporelles"""
+        await self._store_metrics_batch([metrics])
+    
+    async def _store_metrics_batch(self, batch: List[ContainerMetrics]):
+        """Ajoute les métriques d'un cycle aux blocs de tête, les chunks pleins sont écrits hors de la boucle"""
         try:
-            # Organise par jour
-            date_str = metrics.timestamp.strftime('%Y-%m-%d')
-            metrics_file = self.storage_path / f"metrics_{date_str}.jsonl"
+            for metrics in batch:
+                self._apply_rates(metrics)
+                timestamp = to_micros(metrics.timestamp)
+                values = {name: getattr(metrics, name) for name in METRIC_FIELDS}
+                self.tsdb.append(
+                    metrics.container_id,
+                    metrics.container_name,
+                    metrics.service_name,
+                    timestamp,
+                    values
+                )
+                self.rollup.add(
+                    metrics.container_id,
+                    metrics.container_name,
+                    metrics.service_name,
+                    timestamp,
+                    values
+                )
             
-            # Écrit les métriques
-            async with aiofiles.open(metrics_file, 'a', encoding='utf-8') as f:
-                await f.write(json.dumps(metrics.to_dict()) + '\n')
+            # Intervalles des conteneurs qui ne produisent plus de mesures
+            self.rollup.close_expired(to_micros(datetime.utcnow()), grace=2 * self.collection_interval)
+            
+            if self.tsdb.needs_flush() or self.rollup.needs_flush():
+                await asyncio.get_running_loop().run_in_executor(None, self._flush_storage)
                 
         except Exception as e:
             logger.error(f"Erreur lors du stockage des métriques: {e}")
     
+    def _apply_rates(self, metrics: ContainerMetrics):
+        """
+        Calcule les débits par seconde et les accroissements des compteurs cumulatifs
+        
+        Un compteur qui baisse (conteneur redémarré) est repassé par zéro:
+        l'accroissement est sa nouvelle valeur. La première mesure d'un
+        conteneur n'a ni débit ni accroissement.
+        """
+        previous = self.previous_metrics.get(metrics.container_id)
+        self.previous_metrics[metrics.container_id] = metrics
+        if previous is None:
+            return
+        
+        elapsed = (metrics.timestamp - previous.timestamp).total_seconds()
+        if elapsed <= 0:
+            # Compteurs lus au même instant (trame répétée par le daemon): débits inchangés
+            for rate_field in RATE_FIELDS.values():
+                setattr(metrics, rate_field, getattr(previous, rate_field))
+            return
+        
+        reset = False
+        for counter, rate_field in RATE_FIELDS.items():
+            current = getattr(metrics, counter)
+            delta = current - getattr(previous, counter)
+            if delta < 0:
+                delta = current
+                reset = True
+            setattr(metrics, rate_field, delta / elapsed)
+            setattr(metrics, DELTA_FIELDS[counter], delta)
+        if reset:
+            self.collection_stats['counter_resets'] += 1
+    
+    def _flush_storage(self, force: bool = False):
+        """Écrit les chunks pleins ou anciens (mesures brutes et agrégats)"""
+        self.tsdb.flush(force)
+        self.rollup.flush(force)
+    
+    def _open_storage(self):
+        """Charge les index, importe les anciens fichiers puis rattrape les agrégats"""
+        self.tsdb.load()
+        self._migrate_legacy_metrics()
+        self.rollup.load()
+        self.rollup.replay(self.tsdb, to_micros(datetime.utcnow()))
+    
+    def _migrate_legacy_metrics(self):
+        """Importe les anciens fichiers metrics_*.jsonl dans la base de séries temporelles"""
+        for metrics_file in sorted(self.storage_path.glob("metrics_*.jsonl")):
+            try:
+                rows: Dict[str, List[Dict]] = {}
+                with open(metrics_file, 'r', encoding='utf-8') as f:
+                    for line in f:
+                        try:
+                            data = json.loads(line)
+                            data['timestamp'] = to_micros(datetime.fromisoformat(data['timestamp']))
+                            rows.setdefault(data['container_id'], []).append(data)
+                        except Exception:
+                            continue
+                
+                for container_id, samples in rows.items():
+                    samples.sort(key=lambda sample: sample['timestamp'])
+                    last = samples[-1]
+                    timestamps = np.array([sample['timestamp'] for sample in samples], dtype=np.int64)
+                    columns = {
+                        name: np.array([sample.get(name) or 0 for sample in samples], dtype=kind)
+                        for name, kind in METRIC_FIELDS.items()
+                    }
+                    # Les anciens fichiers ne contiennent que les compteurs
+                    for counter, rate_field in RATE_FIELDS.items():
+                        columns[rate_field] = np.nan_to_num(counter_rates(timestamps, columns[counter]))
+                        columns[DELTA_FIELDS[counter]] = counter_deltas(columns[counter]).astype(np.int64)
+                    self.tsdb.import_series(SeriesData(
+                        container_id=container_id,
+                        name=last.get('container_name') or container_id[:12],
+                        service_name=last.get('service_name'),
+                        timestamps=timestamps,
+                        columns=columns
+                    ))
+                
+                metrics_file.unlink()
+                logger.info(f"Fichier de métriques importé: {metrics_file} ({sum(len(r) for r in rows.values())} échantillons)")
+            except Exception as e:
+                logger.error(f"Erreur lors de l'import de {metrics_file}: {e}")
+    
     async def _check_thresholds(self, metrics: ContainerMetrics):
         """Vérifie les seuils et génère des alertes si nécessaire"""
         try:
@@ -427,46 +973,41 @@ class MetricsCollector:
                         message=f"Mémoire élevée: {metrics.memory_percent:.1f}% (seuil: {memory_config.warning_threshold}%)"
                     ))
             
-            # Calcule les taux de réseau si on a des métriques précédentes
-            previous = self.previous_metrics.get(metrics.container_id)
-            if previous:
-                time_delta = (metrics.timestamp - previous.timestamp).total_seconds()
-                if time_delta > 0:
-                    # Taux de réception réseau
-                    rx_rate = (metrics.network_rx_bytes - previous.network_rx_bytes) / time_delta
-                    tx_rate = (metrics.network_tx_bytes - previous.network_tx_bytes) / time_delta
-                    
-                    # Vérifie les seuils réseau
-                    for metric_type, rate in [(MetricType.NETWORK_RX, rx_rate), (MetricType.NETWORK_TX, tx_rate)]:
-                        config = self.thresholds.get(metric_type)
-                        if config and config.enabled:
-                            if rate >= config.critical_threshold:
-                                alerts.append(Alert(
-                                    container_id=metrics.container_id,
-                                    container_name=metrics.container_name,
-                                    service_name=metrics.service_name,
-                                    timestamp=metrics.timestamp,
-                                    level=AlertLevel.CRITICAL,
-                                    metric_type=metric_type,
-                                    value=rate,
-                                    threshold=config.critical_threshold,
-                                    message=f"Trafic réseau critique: {rate/1024/1024:.1f} MB/s"
-                                ))
-                            elif rate >= config.warning_threshold:
-                                alerts.append(Alert(
-                                    container_id=metrics.container_id,
-                                    container_name=metrics.container_name,
-                                    service_name=metrics.service_name,
-                                    timestamp=metrics.timestamp,
-                                    level=AlertLevel.WARNING,
-                                    metric_type=metric_type,
-                                    value=rate,
-                                    threshold=config.warning_threshold,
-                                    message=f"Trafic réseau élevé: {rate/1024/1024:.1f} MB/s"
-                                ))
-            
-            # Stocke les métriques actuelles pour la prochaine fois
-            self.previous_metrics[metrics.container_id] = metrics
+            # Débits calculés à l'ingestion, comparés aux seuils par seconde
+            rate_checks = [
+                (MetricType.NETWORK_RX, metrics.network_rx_rate, "Trafic réseau critique", "Trafic réseau élevé"),
+                (MetricType.NETWORK_TX, metrics.network_tx_rate, "Trafic réseau critique", "Trafic réseau élevé"),
+                (MetricType.BLOCK_READ, metrics.block_read_rate, "Lecture disque critique", "Lecture disque élevée"),
+                (MetricType.BLOCK_WRITE, metrics.block_write_rate, "Écriture disque critique", "Écriture disque élevée")
+            ]
+            for metric_type, rate, critical_label, warning_label in rate_checks:
+                config = self.thresholds.get(metric_type)
+                if not config or not config.enabled:
+                    continue
+                if rate >= config.critical_threshold:
+                    alerts.append(Alert(
+                        container_id=metrics.container_id,
+                        container_name=metrics.container_name,
+                        service_name=metrics.service_name,
+                        timestamp=metrics.timestamp,
+                        level=AlertLevel.CRITICAL,
+                        metric_type=metric_type,
+                        value=rate,
+                        threshold=config.critical_threshold,
+                        message=f"{critical_label}: {rate/1024/1024:.1f} MB/s"
+                    ))
+                elif rate >= config.warning_threshold:
+                    alerts.append(Alert(
+                        container_id=metrics.container_id,
+                        container_name=metrics.container_name,
+                        service_name=metrics.service_name,
+                        timestamp=metrics.timestamp,
+                        level=AlertLevel.WARNING,
+                        metric_type=metric_type,
+                        value=rate,
+                        threshold=config.warning_threshold,
+                        message=f"{warning_label}: {rate/1024/1024:.1f} MB/s"
+                    ))
             
             # Traite les alertes
             for alert in alerts:
@@ -531,6 +1072,17 @@ class MetricsCollector:
         try:
             cutoff_date = datetime.utcnow() - timedelta(days=self.retention_days)
             
+            # Chunks de métriques: un fichier par conteneur et par jour
+            removed = await asyncio.get_running_loop().run_in_executor(
+                None, self.tsdb.drop_before, cutoff_date.date()
+            )
+            # Agrégats: rétention propre à chaque palier
+            removed += await asyncio.get_running_loop().run_in_executor(
+                None, self.rollup.drop_expired, datetime.utcnow().date()
+            )
+            if removed:
+                logger.info(f"{removed} fichiers de métriques supprimés")
+            
             for file_path in self.storage_path.glob("*.jsonl"):
                 try:
                     file_date = datetime.fromtimestamp(file_path.stat().st_mtime)
@@ -561,51 +1113,174 @@ class MetricsCollector:
             enabled=enabled
         )
     
+    async def query_metrics(self,
+                            container_id: Optional[str] = None,
+                            start: Optional[datetime] = None,
+                            end: Optional[datetime] = None,
+                            fields: Optional[List[str]] = None,
+                            step: Optional[float] = None,
+                            stat: str = 'avg',
+                            service_name: Optional[str] = None) -> List[SeriesData]:
+        """
+        Séries des conteneurs sur une période
+        
+        Avec une résolution (step, en secondes), le palier d'agrégats le plus
+        grossier dont le pas ne dépasse pas step est lu à la place des mesures
+        brutes, avec la statistique demandée (min, max, avg, p95, last). Les
+        mesures brutes de l'intervalle en cours complètent chaque série.
+        """
+        start_us = to_micros(start) if start else None
+        end_us = to_micros(end) if end else None
+        now = to_micros(datetime.utcnow())
+        tier = self.rollup.select_tier(step, start_us, now, self.retention_days)
+        
+        loop = asyncio.get_running_loop()
+        if tier is None:
+            series = await loop.run_in_executor(None, self.tsdb.query, container_id, start_us, end_us, fields)
+        else:
+            series = await loop.run_in_executor(
+                None, self.rollup.query, tier, container_id, start_us, end_us, fields, stat
+            )
+            # Intervalles encore ouverts: au plus un pas (et le délai de fermeture) de mesures brutes
+            tail_start = now - (tier.step + 2 * self.collection_interval) * 1_000_000
+            raw = await loop.run_in_executor(
+                None, self.tsdb.query, container_id, max(start_us or tail_start, tail_start), end_us, fields
+            )
+            series = self._append_raw_tail(series, raw, tier.step)
+        
+        # Filtre par service avant toute limite
+        if service_name:
+            series = [s for s in series if s.service_name == service_name]
+        return series
+    
+    def _append_raw_tail(self, series: List[SeriesData], raw: List[SeriesData], step: int) -> List[SeriesData]:
+        """Complète les séries d'agrégats par les mesures brutes postérieures au dernier intervalle fermé"""
+        by_container = {s.container_id: s for s in series}
+        for raw_series in raw:
+            aggregated = by_container.get(raw_series.container_id)
+            tail_start = (int(aggregated.timestamps[-1]) + step * 1_000_000
+                          if aggregated is not None and len(aggregated) else None)
+            selected = (raw_series.timestamps >= tail_start if tail_start is not None
+                        else np.ones(len(raw_series), dtype=bool))
+            if not selected.any():
+                continue
+            if aggregated is None:
+                aggregated = SeriesData(
+                    container_id=raw_series.container_id,
+                    name=raw_series.name,
+                    service_name=raw_series.service_name,
+                    timestamps=np.empty(0, dtype=np.int64),
+                    columns={name: np.empty(0) for name in ('count', *raw_series.columns)},
+                    resolution=step
+                )
+                by_container[raw_series.container_id] = aggregated
+                series.append(aggregated)
+            aggregated.timestamps = np.concatenate([aggregated.timestamps, raw_series.timestamps[selected]])
+            for name, column in aggregated.columns.items():
+                tail = (np.ones(int(selected.sum())) if name == 'count'
+                        else raw_series.columns[name][selected].astype(np.float64))
+                aggregated.columns[name] = np.concatenate([column, tail])
+            aggregated.name = raw_series.name
+            aggregated.service_name = raw_series.service_name
+        return series
+    
+    async def aggregate_metrics(self,
+                                metric: str,
+                                start: datetime,
+                                end: Optional[datetime] = None,
+                                step: float = 60,
+                                aggregation: str = 'avg',
+                                group_by: str = 'container',
+                                label: Optional[str] = None,
+                                percentile: float = 95.0,
+                                container_id: Optional[str] = None,
+                                service_name: Optional[str] = None) -> Tuple[np.ndarray, List[AggregatedSeries]]:
+        """
+        Série agrégée d'une métrique par groupe (conteneur, service ou label)
+        
+        Renvoie les débuts d'intervalles (microsecondes) et une série par
+        groupe, calculées avec NumPy sur les colonnes.
+        """
+        if metric not in METRIC_FIELDS:
+            raise ValueError(f"Métrique inconnue: {metric}")
+        if group_by not in GROUP_BY:
+            raise ValueError(f"Regroupement inconnu: {group_by}")
+        if group_by == 'label' and not label:
+            raise ValueError("Le regroupement par label nécessite le nom du label")
+        
+        # Statistique du palier d'agrégats utilisée selon l'agrégation
+        stat = {'avg': 'avg', 'max': 'max', 'rate': 'last', 'percentile': 'p95'}.get(aggregation, 'avg')
+        if aggregation == 'percentile' and percentile != 95.0:
+            # Seules les mesures brutes donnent un autre percentile exact
+            resolution = None
+        else:
+            resolution = step
+        
+        end = end or datetime.utcnow()
+        series = await self.query_metrics(
+            container_id, start=start, end=end, fields=[metric], step=resolution,
+            stat=stat, service_name=service_name
+        )
+        
+        groups = []
+        for s in series:
+            if group_by == 'container':
+                groups.append(s.container_id)
+            elif group_by == 'service':
+                groups.append(s.service_name)
+            else:
+                info = self.registry.get(s.container_id)
+                groups.append(info.labels.get(label) if info else None)
+        
+        return aggregate_series(
+            series, metric, groups, to_micros(start), to_micros(end), step, aggregation, percentile
+        )
+    
     async def get_recent_metrics(self, 
                                 container_id: Optional[str] = None,
                                 hours: int = 1,
-                                limit: int = 1000) -> List[ContainerMetrics]:
-        """Récupère les métriques récentes"""
+                                limit: int = 1000,
+                                resolution: Optional[float] = None,
+                                service_name: Optional[str] = None) -> List[ContainerMetrics]:
+        """
+        Récupère les métriques récentes
+        
+        Avec une résolution (secondes), renvoie les moyennes du palier
+        d'agrégats correspondant plutôt que les mesures brutes.
+        """
         try:
             cutoff_time = datetime.utcnow() - timedelta(hours=hours)
-            metrics = []
             
-            # Lit les fichiers de métriques récents
-            for days_back in range(hours // 24 + 2):
-                date = datetime.utcnow() - timedelta(days=days_back)
-                date_str = date.strftime('%Y-%m-%d')
-                metrics_file = self.storage_path / f"metrics_{date_str}.jsonl"
-                
-                if not metrics_file.exists():
-                    continue
-                
-                async with aiofiles.open(metrics_file, 'r', encoding='utf-8') as f:
-                    async for line in f:
-                        try:
-                            data = json.loads(line.strip())
-                            metric = ContainerMetrics.from_dict(data)
-                            
-                            if metric.timestamp < cutoff_time:
-                                continue
-                            
-                            if container_id and metric.container_id != container_id:
-                                continue
-                            
-                            metrics.append(metric)
-                            
-                            if len(metrics) >= limit:
-                                break
-                                
-                        except Exception as e:
-                            logger.warning(f"Ligne de métrique invalide ignorée: {e}")
-                            continue
-                
-                if len(metrics) >= limit:
-                    break
+            # Seuls les chunks du conteneur couvrant la période sont lus
+            series = await self.query_metrics(
+                container_id, start=cutoff_time, step=resolution, service_name=service_name
+            )
+            if not series:
+                return []
             
-            # Trie par timestamp
-            metrics.sort(key=lambda m: m.timestamp, reverse=True)
-            return metrics[:limit]
+            # Les plus récentes en premier, objets construits pour les seules lignes retenues
+            timestamps = np.concatenate([s.timestamps for s in series])
+            owners = np.concatenate([np.full(len(s), i) for i, s in enumerate(series)])
+            rows = np.concatenate([np.arange(len(s)) for s in series])
+            order = np.argsort(-timestamps, kind='stable')[:limit]
+            
+            metrics = []
+            for index in order:
+                s = series[owners[index]]
+                row = rows[index]
+                values = {}
+                for name, kind in METRIC_FIELDS.items():
+                    value = s.columns[name][row].item()
+                    # Les agrégats sont des flottants
+                    values[name] = int(round(value)) if kind == INT_FIELD else value
+                metrics.append(ContainerMetrics(
+                    container_id=s.container_id,
+                    container_name=s.name,
+                    service_name=s.service_name,
+                    timestamp=from_micros(int(timestamps[index])),
+                    **values
+                ))
+            return metrics
             
         except Exception as e:
             logger.error(f"Erreur lors de la récupération des métriques: {e}")
@@ -673,6 +1348,8 @@ class MetricsCollector:
             'collection_interval': self.collection_interval,
             'retention_days': self.retention_days,
             'storage_path': str(self.storage_path),
+            'storage': self.tsdb.get_stats(),
+            'rollups': self.rollup.get_stats(),
             'thresholds': {
                 metric_type.value: {
                     'warning': config.warning_threshold,
@@ -680,5 +1357,16 @@ class MetricsCollector:
                     'enabled': config.enabled
                 }
                 for metric_type, config in self.thresholds.items()
+            },
+            'collection': {
+                **self.collection_stats,
+                'max_concurrent': self.max_concurrent_collections,
+                'timeout': self.collection_timeout,
+                'in_flight': sum(1 for task in self._in_flight.values() if not task.done()),
+                'stats_stream': self.use_stats_stream,
+                'cgroup_reader': self.cgroup_reader.get_stats(),
+                'subscriptions': len(self.subscriptions),
+                'stream_reconnects': sum(sub.reconnects for sub in self.subscriptions.values()),
+                'cycle_seconds': self.cycle_histogram.to_dict()
             }
         }
@@ -0,0 +1,186 @@
+"""
+Agrégation vectorisée des séries de métriques
+
+Les séries colonnaires des conteneurs (mesures brutes ou agrégats) sont
+découpées en intervalles de step secondes et agrégées par groupe (conteneur,
+service ou label) avec NumPy, sans construire d'objet par mesure. Le résultat
+est compact: un axe de temps commun et un tableau de valeurs par groupe.
+"""
+import logging
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from wakedock.core.metrics_tsdb import SeriesData
+
+logger = logging.getLogger(__name__)
+
+AGGREGATIONS = ('avg', 'max', 'rate', 'percentile')
+GROUP_BY = ('container', 'service', 'label')
+
+# Nombre maximum d'intervalles par requête
+MAX_POINTS = 10000
+
+_US_PER_SECOND = 1_000_000
+
+
+@dataclass
+class AggregatedSeries:
+    """Série agrégée d'un groupe"""
+    group: Optional[str]
+    containers: List[str] = field(default_factory=list)
+    values: Optional[np.ndarray] = None
+
+    def to_dict(self) -> Dict:
+        return {
+            'group': self.group,
+            'containers': self.containers,
+            # NaN: aucune mesure dans l'intervalle
+            'values': [None if np.isnan(value) else round(value, 6) for value in self.values.tolist()]
+        }
+
+
+def counter_rates(timestamps: np.ndarray, values: np.ndarray) -> np.ndarray:
+    """
+    Taux par seconde d'un compteur cumulatif, associé à la mesure la plus récente
+
+    Une baisse du compteur (redémarrage du conteneur) est traitée comme une
+    remise à zéro: l'accroissement est la nouvelle valeur. Le premier
+    élément vaut NaN.
+    """
+    rates = np.full(len(values), np.nan)
+    if len(values) < 2:
+        return rates
+    values = values.astype(np.float64)
+    delta = np.diff(values)
+    delta = np.where(delta < 0, values[1:], delta)
+    elapsed = np.diff(timestamps) / _US_PER_SECOND
+    with np.errstate(divide='ignore', invalid='ignore'):
+        rates[1:] = np.where(elapsed > 0, delta / elapsed, np.nan)
+    return rates
+
+
+def counter_deltas(values: np.ndarray) -> np.ndarray:
+    """
+    Accroissement d'un compteur cumulatif depuis la mesure précédente
+
+    Même traitement des remises à zéro que counter_rates; le premier
+    élément vaut 0.
+    """
+    deltas = np.zeros(len(values))
+    if len(values) < 2:
+        return deltas
+    values = values.astype(np.float64)
+    delta = np.diff(values)
+    deltas[1:] = np.where(delta < 0, values[1:], delta)
+    return deltas
+
+
+def counter_increase(values: np.ndarray) -> float:
+    """Accroissement total d'un compteur cumulatif, remises à zéro comprises"""
+    return float(counter_deltas(values).sum())
+
+
+def _grouped_percentile(keys: np.ndarray, values: np.ndarray, size: int, q: float) -> np.ndarray:
+    """Percentile (interpolation linéaire) des valeurs de chaque clé"""
+    result = np.full(size, np.nan)
+    if not len(values):
+        return result
+    order = np.lexsort((values, keys))
+    keys, values = keys[order], values[order]
+    counts = np.bincount(keys, minlength=size)
+    present = np.flatnonzero(counts)
+    starts = np.cumsum(counts) - counts
+    position = starts[present] + (counts[present] - 1) * q / 100
+    lower = np.floor(position).astype(np.int64)
+    upper = np.ceil(position).astype(np.int64)
+    weight = position - lower
+    result[present] = values[lower] * (1 - weight) + values[upper] * weight
+    return result
+
+
+def aggregate_series(series: Sequence[SeriesData], metric: str, groups: Sequence[Optional[str]],
+                     start: int, end: int, step: float, aggregation: str = 'avg',
+                     percentile: float = 95.0) -> Tuple[np.ndarray, List[AggregatedSeries]]:
+    """
+    Agrège la colonne metric des séries par groupe et par intervalle
+
+    groups donne le groupe de chaque série. Pour 'rate', le taux par seconde
+    est calculé par conteneur puis sommé sur le groupe; les autres
+    agrégations portent sur l'ensemble des mesures du groupe. Renvoie les
+    débuts d'intervalles (microsecondes) et une série par groupe.
+    """
+    if aggregation not in AGGREGATIONS:
+        raise ValueError(f"Agrégation inconnue: {aggregation}")
+    if step <= 0:
+        raise ValueError("Le pas doit être positif")
+    if not 0 <= percentile <= 100:
+        raise ValueError("Le percentile doit être compris entre 0 et 100")
+
+    step_us = int(step * _US_PER_SECOND)
+    origin = start - start % step_us
+    buckets = int((end - origin) // step_us) + 1
+    if buckets > MAX_POINTS:
+        raise ValueError(f"Trop d'intervalles ({buckets}), maximum {MAX_POINTS}: augmentez le pas")
+    axis = origin + np.arange(buckets, dtype=np.int64) * step_us
+
+    names = list(dict.fromkeys(groups))
+    group_index = {name: i for i, name in enumerate(names)}
+    result = [AggregatedSeries(group=name) for name in names]
+
+    keys_parts, values_parts = [], []
+    # Agrégation 'rate': une ligne par conteneur et par intervalle, sommée ensuite par groupe
+    rate_keys, rate_values, rate_groups = [], [], []
+    for s, group in zip(series, groups):
+        g = group_index[group]
+        result[g].containers.append(s.container_id)
+        column = s.columns.get(metric)
+        if column is None or not len(s):
+            continue
+        values = counter_rates(s.timestamps, column) if aggregation == 'rate' else column.astype(np.float64)
+        selected = (s.timestamps >= origin) & (s.timestamps <= end) & ~np.isnan(values)
+        bucket = (s.timestamps[selected] - origin) // step_us
+        if aggregation == 'rate':
+            rate_keys.append(len(rate_groups) * buckets + bucket)
+            rate_values.append(values[selected])
+            rate_groups.append(g)
+        else:
+            keys_parts.append(g * buckets + bucket)
+            values_parts.append(values[selected])
+
+    size = len(names) * buckets
+    if aggregation == 'rate':
+        if rate_groups:
+            keys = np.concatenate(rate_keys)
+            values = np.concatenate(rate_values)
+            per_container = len(rate_groups) * buckets
+            counts = np.bincount(keys, minlength=per_container)
+            with np.errstate(divide='ignore', invalid='ignore'):
+                means = (np.bincount(keys, weights=values, minlength=per_container) / counts).reshape(-1, buckets)
+            owners = np.asarray(rate_groups)
+            sums = np.zeros((len(names), buckets))
+            present = np.zeros((len(names), buckets), dtype=bool)
+            np.add.at(sums, owners, np.nan_to_num(means))
+            np.logical_or.at(present, owners, ~np.isnan(means))
+            aggregated = np.where(present, sums, np.nan).ravel()
+        else:
+            aggregated = np.full(size, np.nan)
+    else:
+        keys = np.concatenate(keys_parts) if keys_parts else np.empty(0, dtype=np.int64)
+        values = np.concatenate(values_parts) if values_parts else np.empty(0)
+        if aggregation == 'avg':
+            counts = np.bincount(keys, minlength=size)
+            with np.errstate(divide='ignore', invalid='ignore'):
+                aggregated = np.bincount(keys, weights=values, minlength=size) / counts
+        elif aggregation == 'max':
+            aggregated = np.full(size, -np.inf)
+            np.maximum.at(aggregated, keys, values)
+            aggregated[np.isneginf(aggregated)] = np.nan
+        else:
+            aggregated = _grouped_percentile(keys, values, size, percentile)
+
+    aggregated = aggregated.reshape(len(names), buckets)
+    for g, item in enumerate(result):
+        item.values = aggregated[g]
+    return axis, result
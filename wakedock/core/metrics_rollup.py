@@ -0,0 +1,267 @@
+"""
+Agrégats continus des métriques des conteneurs (paliers 1m, 5m, 1h)
+
+Chaque mesure brute alimente, pour chaque palier, l'intervalle ouvert de son
+conteneur. À la fermeture d'un intervalle (première mesure de l'intervalle
+suivant, ou fin de l'intervalle dépassée) une ligne min/max/avg/p95/last par
+champ est ajoutée à la base de séries temporelles du palier.
+
+Les paliers ont leur propre rétention: les mesures brutes sont gardées
+quelques jours, les agrégats horaires un an. Au démarrage, les intervalles non
+encore agrégés sont recalculés à partir des mesures brutes.
+"""
+import logging
+from dataclasses import dataclass
+from datetime import date
+from pathlib import Path
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from wakedock.core.metrics_tsdb import FLOAT_FIELD, INT_FIELD, MetricsTSDB, SeriesData
+
+logger = logging.getLogger(__name__)
+
+ROLLUP_STATS = ('min', 'max', 'avg', 'p95', 'last')
+
+_US_PER_SECOND = 1_000_000
+_US_PER_DAY = 86400 * _US_PER_SECOND
+
+
+@dataclass(frozen=True)
+class RollupTier:
+    """Palier d'agrégation"""
+    name: str
+    step: int  # secondes
+    retention_days: int
+    chunk_size: int
+    flush_interval: float
+
+
+DEFAULT_TIERS: Tuple[RollupTier, ...] = (
+    RollupTier('1m', 60, 30, chunk_size=60, flush_interval=900.0),
+    RollupTier('5m', 300, 90, chunk_size=288, flush_interval=1800.0),
+    RollupTier('1h', 3600, 365, chunk_size=24, flush_interval=3600.0),
+)
+
+
+def rollup_schema(fields: Sequence[str]) -> Dict[str, str]:
+    """Colonnes d'un palier: nombre de mesures puis une colonne par champ et par statistique"""
+    schema = {'count': INT_FIELD}
+    for name in fields:
+        for stat in ROLLUP_STATS:
+            schema[f"{name}_{stat}"] = FLOAT_FIELD
+    return schema
+
+
+def aggregate(timestamps: np.ndarray, values: np.ndarray, step: int) -> Tuple[np.ndarray, np.ndarray, Dict[str, np.ndarray]]:
+    """
+    Agrège des mesures triées par intervalles de step secondes
+
+    values est une matrice (mesures x champs). Renvoie les débuts
+    d'intervalles, le nombre de mesures et une matrice (intervalles x champs)
+    par statistique.
+    """
+    step_us = step * _US_PER_SECOND
+    buckets = timestamps - timestamps % step_us
+    starts = np.flatnonzero(np.r_[True, buckets[1:] != buckets[:-1]])
+    ends = np.r_[starts[1:], len(timestamps)]
+    counts = ends - starts
+
+    stats = {
+        'min': np.minimum.reduceat(values, starts, axis=0),
+        'max': np.maximum.reduceat(values, starts, axis=0),
+        'avg': np.add.reduceat(values, starts, axis=0) / counts[:, None],
+        'p95': np.stack([np.percentile(values[s:e], 95, axis=0) for s, e in zip(starts, ends)]),
+        'last': values[ends - 1]
+    }
+    return buckets[starts], counts, stats
+
+
+class _OpenBucket:
+    """Intervalle en cours d'un conteneur pour un palier"""
+
+    def __init__(self, start: int, name: str, service_name: Optional[str]):
+        self.start = start
+        self.name = name
+        self.service_name = service_name
+        self.rows: List[np.ndarray] = []
+
+
+class MetricsRollup:
+    """Agrégats continus des métriques, un stockage colonnaire par palier"""
+
+    def __init__(self, path: Path, fields: Sequence[str], tiers: Sequence[RollupTier] = DEFAULT_TIERS):
+        self.path = Path(path)
+        self.fields = list(fields)
+        self.tiers = sorted(tiers, key=lambda tier: tier.step)
+        self.stores: Dict[str, MetricsTSDB] = {
+            tier.name: MetricsTSDB(
+                self.path / tier.name, rollup_schema(self.fields),
+                chunk_size=tier.chunk_size, flush_interval=tier.flush_interval
+            )
+            for tier in self.tiers
+        }
+        # (palier, conteneur) -> intervalle ouvert
+        self._open: Dict[Tuple[str, str], _OpenBucket] = {}
+        self.stats = {'buckets': 0, 'replayed_samples': 0}
+
+    def get_tier(self, name: str) -> RollupTier:
+        return next(tier for tier in self.tiers if tier.name == name)
+
+    def add(self, container_id: str, name: str, service_name: Optional[str],
+            timestamp: int, values: Dict[str, float]):
+        """Ajoute une mesure brute aux intervalles ouverts du conteneur"""
+        row = np.fromiter((values.get(field) or 0 for field in self.fields), dtype=np.float64, count=len(self.fields))
+        for tier in self.tiers:
+            step_us = tier.step * _US_PER_SECOND
+            start = timestamp - timestamp % step_us
+            key = (tier.name, container_id)
+            bucket = self._open.get(key)
+            if bucket is not None and start > bucket.start:
+                self._close(tier, container_id, bucket)
+                bucket = None
+            if bucket is None:
+                bucket = _OpenBucket(start, name, service_name)
+                self._open[key] = bucket
+            # Une mesure en retard est comptée dans l'intervalle ouvert
+            bucket.name = name
+            bucket.service_name = service_name
+            bucket.rows.append(row)
+
+    def close_expired(self, now: int, grace: float = 0.0):
+        """Ferme les intervalles terminés (conteneur arrêté, mesures interrompues)"""
+        limit = now - int(grace * _US_PER_SECOND)
+        for (tier_name, container_id), bucket in list(self._open.items()):
+            tier = self.get_tier(tier_name)
+            if bucket.start + tier.step * _US_PER_SECOND <= limit:
+                self._close(tier, container_id, bucket)
+
+    def _close(self, tier: RollupTier, container_id: str, bucket: _OpenBucket):
+        del self._open[(tier.name, container_id)]
+        if not bucket.rows:
+            return
+        rows = np.vstack(bucket.rows)
+        self._emit(tier, container_id, bucket.name, bucket.service_name, bucket.start, len(rows), {
+            'min': rows.min(axis=0),
+            'max': rows.max(axis=0),
+            'avg': rows.mean(axis=0),
+            'p95': np.percentile(rows, 95, axis=0),
+            'last': rows[-1]
+        })
+
+    def _emit(self, tier: RollupTier, container_id: str, name: str, service_name: Optional[str],
+              start: int, count: int, stats: Dict[str, np.ndarray]):
+        values = {'count': count}
+        for stat, row in stats.items():
+            for field, value in zip(self.fields, row.tolist()):
+                values[f"{field}_{stat}"] = value
+        self.stores[tier.name].append(container_id, name, service_name, start, values)
+        self.stats['buckets'] += 1
+
+    def replay(self, raw: MetricsTSDB, now: int):
+        """
+        Recalcule les intervalles non agrégés à partir des mesures brutes
+
+        Les intervalles terminés sont écrits, l'intervalle en cours est
+        rouvert pour continuer à recevoir les mesures.
+        """
+        for container_id in raw.containers():
+            starts = {}
+            for tier in self.tiers:
+                last = self.stores[tier.name].last_timestamp(container_id)
+                starts[tier.name] = (last + tier.step * _US_PER_SECOND if last is not None
+                                     else now - tier.retention_days * _US_PER_DAY)
+            # Une seule lecture des mesures brutes pour tous les paliers
+            series_list = raw.query(container_id, start=min(starts.values()), fields=self.fields)
+            if not series_list:
+                continue
+            series = series_list[0]
+            values = np.column_stack([series.columns[field].astype(np.float64) for field in self.fields])
+            self.stats['replayed_samples'] += len(series)
+
+            for tier in self.tiers:
+                step_us = tier.step * _US_PER_SECOND
+                selected = series.timestamps >= starts[tier.name]
+                if not selected.any():
+                    continue
+                timestamps = series.timestamps[selected]
+                buckets, counts, stats = aggregate(timestamps, values[selected], tier.step)
+                for i, bucket_start in enumerate(buckets.tolist()):
+                    if bucket_start + step_us > now:
+                        # Intervalle en cours: rouvert avec ses mesures
+                        bucket = _OpenBucket(bucket_start, series.name, series.service_name)
+                        bucket.rows = list(values[selected][timestamps >= bucket_start])
+                        self._open[(tier.name, container_id)] = bucket
+                        continue
+                    self._emit(tier, container_id, series.name, series.service_name, bucket_start,
+                               int(counts[i]), {stat: matrix[i] for stat, matrix in stats.items()})
+
+    def load(self):
+        for store in self.stores.values():
+            store.load()
+
+    def needs_flush(self) -> bool:
+        return any(store.needs_flush() for store in self.stores.values())
+
+    def flush(self, force: bool = False):
+        for store in self.stores.values():
+            store.flush(force)
+
+    def drop_expired(self, today: date) -> int:
+        """Applique la rétention de chaque palier"""
+        removed = 0
+        for tier in self.tiers:
+            removed += self.stores[tier.name].drop_before(date.fromordinal(today.toordinal() - tier.retention_days))
+        return removed
+
+    def select_tier(self, step: Optional[float], start: Optional[int], now: int,
+                    raw_retention_days: int) -> Optional[RollupTier]:
+        """
+        Palier le plus grossier dont le pas ne dépasse pas la résolution demandée
+
+        None désigne les mesures brutes. Si la période commence avant la
+        rétention du palier choisi, un palier plus grossier est utilisé.
+        """
+        options: List[Tuple[Optional[RollupTier], int, int]] = [(None, 0, raw_retention_days)]
+        options += [(tier, tier.step, tier.retention_days) for tier in self.tiers]
+        chosen = 0
+        for i, (_, step_seconds, _) in enumerate(options):
+            if step is not None and step_seconds <= step:
+                chosen = i
+        for tier, _, retention_days in options[chosen:]:
+            if start is None or start >= now - retention_days * _US_PER_DAY:
+                return tier
+        return options[-1][0]
+
+    def query(self, tier: RollupTier, container_id: Optional[str] = None, start: Optional[int] = None,
+              end: Optional[int] = None, fields: Optional[Sequence[str]] = None,
+              stat: str = 'avg') -> List[SeriesData]:
+        """Intervalles d'un palier, une colonne par champ pour la statistique demandée"""
+        if stat not in ROLLUP_STATS:
+            raise ValueError(f"Statistique inconnue: {stat}")
+        fields = self.fields if fields is None else [field for field in fields if field in self.fields]
+        results = self.stores[tier.name].query(
+            container_id, start=start, end=end, fields=['count', *(f"{field}_{stat}" for field in fields)]
+        )
+        for series in results:
+            series.columns = {
+                'count': series.columns['count'],
+                **{field: series.columns[f"{field}_{stat}"] for field in fields}
+            }
+            series.resolution = tier.step
+        return results
+
+    def get_stats(self) -> Dict:
+        return {
+            **self.stats,
+            'open_buckets': len(self._open),
+            'tiers': {
+                tier.name: {
+                    'step': tier.step,
+                    'retention_days': tier.retention_days,
+                    'chunks': self.stores[tier.name].get_stats()['chunks']
+                }
+                for tier in self.tiers
+            }
+        }
@@ -0,0 +1,555 @@
+"""
+Stockage colonnaire des séries temporelles de métriques des conteneurs
+
+Chaque conteneur dispose d'un bloc de tête en mémoire (un tableau par champ)
+qui reçoit les échantillons. Lorsqu'il est plein ou assez ancien, il est
+scellé en un chunk immuable ajouté au fichier du jour du conteneur:
+
+    tsdb/{container_id}/{YYYY-MM-DD}.tsc
+
+Un chunk contient une colonne compressée par champ:
+
+- timestamps et compteurs entiers: delta-of-delta puis zigzag (les valeurs
+  régulières deviennent des zéros)
+- flottants: XOR avec la valeur précédente, à la manière de Gorilla (les
+  valeurs proches ne diffèrent que de quelques bits)
+
+Les octets de même rang sont ensuite regroupés puis compressés par zlib; tout
+l'encodage est vectorisé avec NumPy. Un index en mémoire (conteneur, plage
+temporelle) reconstruit au démarrage à partir des en-têtes permet de ne lire
+que les chunks d'un conteneur qui recouvrent la plage demandée.
+"""
+import json
+import logging
+import os
+import struct
+import threading
+import time
+import zlib
+from array import array
+from dataclasses import dataclass, field
+from datetime import date
+from pathlib import Path
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from wakedock.core.log_storage import from_micros
+
+logger = logging.getLogger(__name__)
+
+CHUNK_MAGIC = b"WTSC"
+CHUNK_VERSION = 1
+CHUNK_SUFFIX = ".tsc"
+# magic, version, réservé, min_ts, max_ts, nb_échantillons, taille des métadonnées, taille des colonnes
+CHUNK_STRUCT = struct.Struct("<4sHHqqIII")
+
+# Types des champs: entiers (compteurs, octets) ou flottants (pourcentages)
+INT_FIELD = 'i8'
+FLOAT_FIELD = 'f8'
+_TYPECODES = {INT_FIELD: 'q', FLOAT_FIELD: 'd'}
+
+_US_PER_DAY = 86400 * 1_000_000
+
+
+def _shuffle(values: np.ndarray) -> bytes:
+    """Regroupe les octets de même rang (les octets de poids fort, presque tous nuls, se compressent très bien)"""
+    return zlib.compress(values.view(np.uint8).reshape(-1, 8).T.tobytes(), 6)
+
+
+def _unshuffle(data: bytes, count: int) -> np.ndarray:
+    """Inverse de _shuffle, renvoie des entiers non signés 64 bits"""
+    raw = np.frombuffer(zlib.decompress(data), dtype=np.uint8).reshape(8, count)
+    return np.ascontiguousarray(raw.T).view('<u8').ravel()
+
+
+def encode_ints(values: Sequence[int]) -> bytes:
+    """Encode une colonne entière: delta-of-delta, zigzag puis compression"""
+    x = np.asarray(values, dtype='<i8')
+    dod = np.diff(x, n=2, prepend=np.zeros(2, dtype='<i8'))
+    zigzag = (dod << 1) ^ (dod >> 63)
+    return _shuffle(zigzag.astype('<i8', copy=False))
+
+
+def decode_ints(data: bytes, count: int) -> np.ndarray:
+    """Décode une colonne entière"""
+    if count == 0:
+        return np.empty(0, dtype=np.int64)
+    zigzag = _unshuffle(data, count)
+    dod = (zigzag >> np.uint64(1)).astype(np.int64) ^ -(zigzag & np.uint64(1)).astype(np.int64)
+    return np.cumsum(np.cumsum(dod, dtype=np.int64), dtype=np.int64)
+
+
+def encode_floats(values: Sequence[float]) -> bytes:
+    """Encode une colonne flottante: XOR avec la valeur précédente puis compression"""
+    bits = np.asarray(values, dtype='<f8').view('<u8')
+    xored = bits.copy()
+    xored[1:] ^= bits[:-1]
+    return _shuffle(xored)
+
+
+def decode_floats(data: bytes, count: int) -> np.ndarray:
+    """Décode une colonne flottante"""
+    if count == 0:
+        return np.empty(0, dtype=np.float64)
+    return np.bitwise_xor.accumulate(_unshuffle(data, count)).view('<f8').astype(np.float64)
+
+
+_ENCODERS = {INT_FIELD: encode_ints, FLOAT_FIELD: encode_floats}
+_DECODERS = {INT_FIELD: decode_ints, FLOAT_FIELD: decode_floats}
+
+
+def day_of(timestamp: int) -> str:
+    """Jour (UTC) d'un timestamp en microsecondes"""
+    return from_micros(timestamp - timestamp % _US_PER_DAY).strftime('%Y-%m-%d')
+
+
+@dataclass(frozen=True)
+class ChunkMeta:
+    """Entrée de l'index: emplacement et plage temporelle d'un chunk"""
+    path: Path
+    offset: int  # début des colonnes dans le fichier
+    length: int
+    min_ts: int
+    max_ts: int
+    count: int
+    name: str
+    service_name: Optional[str]
+    # champ -> (type, offset dans les colonnes, longueur)
+    columns: Dict[str, Tuple[str, int, int]]
+
+
+@dataclass
+class SeriesData:
+    """Échantillons d'un conteneur, triés par timestamp (microsecondes UTC)"""
+    container_id: str
+    name: str
+    service_name: Optional[str]
+    timestamps: np.ndarray
+    columns: Dict[str, np.ndarray] = field(default_factory=dict)
+    # Pas des échantillons en secondes (None pour les mesures brutes)
+    resolution: Optional[int] = None
+
+    def __len__(self) -> int:
+        return len(self.timestamps)
+
+
+class HeadBlock:
+    """Bloc de tête en mémoire d'un conteneur, pour un seul jour"""
+
+    def __init__(self, container_id: str, name: str, service_name: Optional[str],
+                 day: str, schema: Dict[str, str]):
+        self.container_id = container_id
+        self.name = name
+        self.service_name = service_name
+        self.day = day
+        self.opened_at = time.monotonic()
+        self.timestamps = array('q')
+        self.columns = {name: array(_TYPECODES[kind]) for name, kind in schema.items()}
+
+    def __len__(self) -> int:
+        return len(self.timestamps)
+
+    def append(self, timestamp: int, values: Dict[str, float]):
+        self.timestamps.append(timestamp)
+        for name, column in self.columns.items():
+            value = values.get(name) or 0
+            column.append(int(value) if column.typecode == 'q' else float(value))
+
+    def to_series(self, schema: Dict[str, str]) -> SeriesData:
+        """Copie NumPy du bloc"""
+        return SeriesData(
+            container_id=self.container_id,
+            name=self.name,
+            service_name=self.service_name,
+            timestamps=np.array(self.timestamps, dtype=np.int64),
+            columns={name: np.array(column, dtype=schema[name]) for name, column in self.columns.items()}
+        )
+
+
+class MetricsTSDB:
+    """Base de séries temporelles colonnaire des métriques des conteneurs"""
+
+    def __init__(self, path: Path, schema: Dict[str, str],
+                 chunk_size: int = 720, flush_interval: float = 300.0):
+        self.path = Path(path)
+        self.path.mkdir(parents=True, exist_ok=True)
+        self.schema = dict(schema)
+        # Un chunk est scellé à chunk_size échantillons ou après flush_interval secondes
+        self.chunk_size = chunk_size
+        self.flush_interval = flush_interval
+
+        self.heads: Dict[str, HeadBlock] = {}
+        # Index: conteneur -> chunks triés par max_ts
+        self.index: Dict[str, List[ChunkMeta]] = {}
+        # Blocs scellés en cours d'écriture, encore visibles des requêtes
+        self._sealed: List[HeadBlock] = []
+        self._loaded = False
+
+        self._lock = threading.RLock()
+        self._write_lock = threading.Lock()
+
+        self.stats = {
+            'chunks_written': 0,
+            'samples_written': 0,
+            'raw_bytes': 0,
+            'encoded_bytes': 0
+        }
+
+    def load(self):
+        """Reconstruit l'index à partir des en-têtes des chunks (idempotent)"""
+        # Aucune écriture en cours: une fin de fichier incomplète serait tronquée à tort
+        with self._write_lock, self._lock:
+            if self._loaded:
+                return
+            index: Dict[str, List[ChunkMeta]] = {}
+            for container_dir in sorted(p for p in self.path.iterdir() if p.is_dir()):
+                chunks: List[ChunkMeta] = []
+                for chunk_file in sorted(container_dir.glob(f"*{CHUNK_SUFFIX}")):
+                    chunks.extend(self._scan_file(chunk_file))
+                if chunks:
+                    chunks.sort(key=lambda chunk: chunk.max_ts)
+                    index[container_dir.name] = chunks
+            # Les chunks écrits avant le chargement sont conservés
+            for container_id, chunks in self.index.items():
+                merged = index.setdefault(container_id, [])
+                known = {(chunk.path, chunk.offset) for chunk in merged}
+                merged.extend(chunk for chunk in chunks if (chunk.path, chunk.offset) not in known)
+                merged.sort(key=lambda chunk: chunk.max_ts)
+            self.index = index
+            self._loaded = True
+            logger.info(f"Index des métriques chargé: {sum(len(c) for c in index.values())} chunks, "
+                        f"{len(index)} conteneurs")
+
+    def _scan_file(self, chunk_file: Path) -> List[ChunkMeta]:
+        """Lit les en-têtes d'un fichier de chunks, une fin tronquée est supprimée"""
+        chunks = []
+        size = chunk_file.stat().st_size
+        position = 0
+        with open(chunk_file, 'rb') as f:
+            while position < size:
+                header = f.read(CHUNK_STRUCT.size)
+                if len(header) < CHUNK_STRUCT.size:
+                    break
+                magic, version, _, min_ts, max_ts, count, meta_length, length = CHUNK_STRUCT.unpack(header)
+                if magic != CHUNK_MAGIC or version != CHUNK_VERSION:
+                    break
+                offset = position + CHUNK_STRUCT.size + meta_length
+                if offset + length > size:
+                    break
+                try:
+                    meta = json.loads(f.read(meta_length))
+                except ValueError:
+                    break
+                chunks.append(ChunkMeta(
+                    path=chunk_file,
+                    offset=offset,
+                    length=length,
+                    min_ts=min_ts,
+                    max_ts=max_ts,
+                    count=count,
+                    name=meta['name'],
+                    service_name=meta.get('service_name'),
+                    columns={name: tuple(column) for name, column in meta['columns'].items()}
+                ))
+                f.seek(length, os.SEEK_CUR)
+                position = offset + length
+
+        if position < size:
+            # Écriture interrompue: la fin incomplète est retirée avant les prochains ajouts
+            logger.warning(f"Fin de fichier de métriques incomplète tronquée: {chunk_file} ({size - position} octets)")
+            os.truncate(chunk_file, position)
+        return chunks
+
+    def append(self, container_id: str, name: str, service_name: Optional[str],
+               timestamp: int, values: Dict[str, float]):
+        """Ajoute un échantillon au bloc de tête du conteneur"""
+        day = day_of(timestamp)
+        with self._lock:
+            head = self.heads.get(container_id)
+            if head is not None and head.day != day:
+                # Un chunk ne couvre qu'un jour
+                self._seal(container_id)
+                head = None
+            if head is None:
+                head = HeadBlock(container_id, name, service_name, day, self.schema)
+                self.heads[container_id] = head
+            head.name = name
+            head.service_name = service_name
+            head.append(timestamp, values)
+            if len(head) >= self.chunk_size:
+                self._seal(container_id)
+
+    def _seal(self, container_id: str):
+        head = self.heads.pop(container_id, None)
+        if head is not None and len(head):
+            self._sealed.append(head)
+
+    def needs_flush(self) -> bool:
+        """Vrai si des blocs scellés ou trop anciens sont à écrire"""
+        with self._lock:
+            if self._sealed:
+                return True
+            deadline = time.monotonic() - self.flush_interval
+            return any(head.opened_at <= deadline for head in self.heads.values())
+
+    def flush(self, force: bool = False):
+        """Écrit les blocs scellés (et les blocs de tête trop anciens, ou tous si force)"""
+        with self._write_lock:
+            with self._lock:
+                deadline = time.monotonic() - self.flush_interval
+                for container_id, head in list(self.heads.items()):
+                    if force or head.opened_at <= deadline:
+                        self._seal(container_id)
+                blocks = list(self._sealed)
+
+            for block in blocks:
+                try:
+                    chunk = self._write_chunk(
+                        block.container_id, block.name, block.service_name,
+                        block.to_series(self.schema)
+                    )
+                except Exception as e:
+                    # Le bloc reste en mémoire et sera réécrit au prochain vidage
+                    logger.error(f"Erreur lors de l'écriture des métriques de {block.name}: {e}")
+                    continue
+                with self._lock:
+                    self._add_to_index(block.container_id, chunk)
+                    self._sealed.remove(block)
+
+    def import_series(self, series: SeriesData):
+        """Écrit directement des échantillons historiques (découpés par jour et par chunk_size)"""
+        if not len(series):
+            return
+        order = np.argsort(series.timestamps, kind='stable')
+        timestamps = series.timestamps[order]
+        columns = {
+            name: np.asarray(series.columns.get(name, np.zeros(len(order))), dtype=kind)[order]
+            for name, kind in self.schema.items()
+        }
+        days = (timestamps - timestamps % _US_PER_DAY)
+        boundaries = np.flatnonzero(np.diff(days)) + 1
+        starts = [0, *boundaries.tolist()]
+        ends = [*boundaries.tolist(), len(timestamps)]
+
+        with self._write_lock:
+            for start, end in zip(starts, ends):
+                for chunk_start in range(start, end, self.chunk_size):
+                    chunk_end = min(chunk_start + self.chunk_size, end)
+                    part = SeriesData(
+                        container_id=series.container_id,
+                        name=series.name,
+                        service_name=series.service_name,
+                        timestamps=timestamps[chunk_start:chunk_end],
+                        columns={name: column[chunk_start:chunk_end] for name, column in columns.items()}
+                    )
+                    chunk = self._write_chunk(series.container_id, series.name, series.service_name, part)
+                    with self._lock:
+                        self._add_to_index(series.container_id, chunk)
+
+    def _write_chunk(self, container_id: str, name: str, service_name: Optional[str],
+                     series: SeriesData) -> ChunkMeta:
+        """Encode et ajoute un chunk au fichier du jour du conteneur"""
+        count = len(series)
+        encoded = [('timestamp', INT_FIELD, encode_ints(series.timestamps))]
+        for field_name, column in series.columns.items():
+            kind = self.schema.get(field_name, FLOAT_FIELD)
+            encoded.append((field_name, kind, _ENCODERS[kind](column)))
+
+        columns: Dict[str, Tuple[str, int, int]] = {}
+        position = 0
+        for field_name, kind, data in encoded:
+            columns[field_name] = (kind, position, len(data))
+            position += len(data)
+        body = b"".join(data for _, _, data in encoded)
+        meta = json.dumps({
+            'name': name,
+            'service_name': service_name,
+            'columns': columns
+        }).encode('utf-8')
+        min_ts = int(series.timestamps.min())
+        max_ts = int(series.timestamps.max())
+        header = CHUNK_STRUCT.pack(
+            CHUNK_MAGIC, CHUNK_VERSION, 0, min_ts, max_ts, count, len(meta), len(body)
+        )
+
+        container_dir = self.path / container_id
+        container_dir.mkdir(exist_ok=True)
+        chunk_file = container_dir / f"{day_of(min_ts)}{CHUNK_SUFFIX}"
+        with open(chunk_file, 'ab') as f:
+            f.seek(0, os.SEEK_END)
+            start = f.tell()
+            f.write(header + meta + body)
+
+        self.stats['chunks_written'] += 1
+        self.stats['samples_written'] += count
+        self.stats['raw_bytes'] += count * 8 * len(encoded)
+        self.stats['encoded_bytes'] += len(body)
+        return ChunkMeta(
+            path=chunk_file,
+            offset=start + CHUNK_STRUCT.size + len(meta),
+            length=len(body),
+            min_ts=min_ts,
+            max_ts=max_ts,
+            count=count,
+            name=name,
+            service_name=service_name,
+            columns=columns
+        )
+
+    def _add_to_index(self, container_id: str, chunk: ChunkMeta):
+        chunks = self.index.setdefault(container_id, [])
+        chunks.append(chunk)
+        if len(chunks) > 1 and chunks[-2].max_ts > chunk.max_ts:
+            chunks.sort(key=lambda c: c.max_ts)
+
+    def _read_chunk(self, chunk: ChunkMeta, fields: Sequence[str]) -> Dict[str, np.ndarray]:
+        """Lit et décode les colonnes demandées d'un chunk"""
+        with open(chunk.path, 'rb') as f:
+            f.seek(chunk.offset)
+            body = f.read(chunk.length)
+
+        result = {}
+        for field_name in ('timestamp', *fields):
+            column = chunk.columns.get(field_name)
+            if column is None:
+                # Champ ajouté après l'écriture du chunk
+                result[field_name] = np.zeros(chunk.count, dtype=self.schema.get(field_name, FLOAT_FIELD))
+                continue
+            kind, offset, length = column
+            result[field_name] = _DECODERS[kind](body[offset:offset + length], chunk.count)
+        return result
+
+    def containers(self) -> List[str]:
+        """Conteneurs ayant des échantillons"""
+        with self._lock:
+            return sorted(set(self.index) | set(self.heads) | {block.container_id for block in self._sealed})
+
+    def last_timestamp(self, container_id: str) -> Optional[int]:
+        """Timestamp du dernier échantillon d'un conteneur"""
+        self.load()
+        with self._lock:
+            candidates = [chunk.max_ts for chunk in self.index.get(container_id, [])[-1:]]
+            candidates += [max(block.timestamps) for block in self._sealed if block.container_id == container_id]
+            head = self.heads.get(container_id)
+            if head is not None and len(head):
+                candidates.append(max(head.timestamps))
+            return max(candidates) if candidates else None
+
+    def query(self, container_id: Optional[str] = None, start: Optional[int] = None,
+              end: Optional[int] = None, fields: Optional[Sequence[str]] = None) -> List[SeriesData]:
+        """
+        Échantillons d'un conteneur (ou de tous) entre start et end inclus
+
+        Seuls les chunks dont la plage recouvre [start, end] sont lus, et
+        seules les colonnes demandées sont décodées.
+        """
+        self.load()
+        fields = list(self.schema) if fields is None else [name for name in fields if name in self.schema]
+        start = -(2 ** 63) if start is None else start
+        end = 2 ** 63 - 1 if end is None else end
+
+        with self._lock:
+            container_ids = [container_id] if container_id else self.containers()
+            selected: Dict[str, List[ChunkMeta]] = {}
+            in_memory: Dict[str, List[SeriesData]] = {}
+            for cid in container_ids:
+                chunks = self.index.get(cid, [])
+                # Chunks triés par max_ts: recherche du premier chunk qui finit après start
+                low, high = 0, len(chunks)
+                while low < high:
+                    middle = (low + high) // 2
+                    if chunks[middle].max_ts < start:
+                        low = middle + 1
+                    else:
+                        high = middle
+                selected[cid] = [chunk for chunk in chunks[low:] if chunk.min_ts <= end]
+                blocks = [block for block in self._sealed if block.container_id == cid]
+                if cid in self.heads:
+                    blocks.append(self.heads[cid])
+                in_memory[cid] = [block.to_series(self.schema) for block in blocks]
+
+        results = []
+        for cid in container_ids:
+            parts_ts: List[np.ndarray] = []
+            parts: Dict[str, List[np.ndarray]] = {name: [] for name in fields}
+            name, service_name = None, None
+            for chunk in selected[cid]:
+                try:
+                    decoded = self._read_chunk(chunk, fields)
+                except Exception as e:
+                    logger.warning(f"Chunk de métriques illisible ignoré ({chunk.path}): {e}")
+                    continue
+                parts_ts.append(decoded['timestamp'])
+                for field_name in fields:
+                    parts[field_name].append(decoded[field_name])
+                name, service_name = chunk.name, chunk.service_name
+            for series in in_memory[cid]:
+                parts_ts.append(series.timestamps)
+                for field_name in fields:
+                    parts[field_name].append(series.columns[field_name])
+                name, service_name = series.name, series.service_name
+            if not parts_ts:
+                continue
+
+            timestamps = np.concatenate(parts_ts)
+            order = np.argsort(timestamps, kind='stable')
+            timestamps = timestamps[order]
+            mask = (timestamps >= start) & (timestamps <= end)
+            if not mask.any():
+                continue
+            results.append(SeriesData(
+                container_id=cid,
+                name=name,
+                service_name=service_name,
+                timestamps=timestamps[mask],
+                columns={
+                    field_name: np.concatenate(parts[field_name])[order][mask]
+                    for field_name in fields
+                }
+            ))
+        return results
+
+    def drop_before(self, cutoff: date) -> int:
+        """Supprime les fichiers des jours antérieurs à cutoff, renvoie le nombre de fichiers supprimés"""
+        self.load()
+        limit = cutoff.strftime('%Y-%m-%d')
+        removed = 0
+        with self._write_lock:
+            for container_dir in [p for p in self.path.iterdir() if p.is_dir()]:
+                for chunk_file in container_dir.glob(f"*{CHUNK_SUFFIX}"):
+                    if chunk_file.stem >= limit:
+                        continue
+                    with self._lock:
+                        chunks = self.index.get(container_dir.name, [])
+                        self.index[container_dir.name] = [c for c in chunks if c.path != chunk_file]
+                    try:
+                        chunk_file.unlink()
+                        removed += 1
+                    except OSError as e:
+                        logger.warning(f"Erreur lors de la suppression de {chunk_file}: {e}")
+                with self._lock:
+                    if not self.index.get(container_dir.name):
+                        self.index.pop(container_dir.name, None)
+                        try:
+                            container_dir.rmdir()
+                        except OSError:
+                            pass
+        return removed
+
+    def get_stats(self) -> Dict:
+        """Statistiques du stockage"""
+        with self._lock:
+            chunks = [chunk for chunks in self.index.values() for chunk in chunks]
+            return {
+                **self.stats,
+                'containers': len(self.containers()),
+                'chunks': len(chunks),
+                'samples': sum(chunk.count for chunk in chunks),
+                'disk_bytes': sum(chunk.length for chunk in chunks),
+                'head_samples': sum(len(head) for head in self.heads.values()),
+                'compression_ratio': (
+                    round(self.stats['raw_bytes'] / self.stats['encoded_bytes'], 2)
+                    if self.stats['encoded_bytes'] else None
+                )
+            }
@@ -132,7 +132,9 @@ class AlertRuleRequest(BaseModel):
     def validate_metric_type(cls, v):
         valid_metrics = [
             'cpu_percent', 'memory_percent', 'memory_usage_bytes',
-            'network_rx_bytes', 'network_tx_bytes', 'network_total_bytes'
+            'network_rx_bytes', 'network_tx_bytes', 'network_total_bytes',
+            'network_rx_rate', 'network_tx_rate', 'network_total_rate',
+            'block_read_rate', 'block_write_rate'
         ]
         if v not in valid_metrics:
             raise ValueError(f'Metric type must be one of: {valid_metrics}')
@@ -378,8 +380,8 @@ class DefaultAlertRules:
     NETWORK_HIGH_TRAFFIC = {
         "name": "High Network Traffic",
         "description": "Alert when network traffic exceeds 1GB/hour",
-        "metric_type": "network_total_bytes",
-        "threshold_value": 1073741824,  # 1GB
+        "metric_type": "network_total_rate",
+        "threshold_value": 1073741824 / 3600,  # 1GB/heure, en octets par seconde
         "comparison_operator": ">",
         "duration_minutes": 60,
         "severity": AlertSeverity.MEDIUM